@@ -0,0 +1,77 @@
+# actor.py
+"""
+按牌桌串行化的轻量 actor。
+
+每个键（游戏键；创建游戏与匹配开桌时为群ID）对应一个邮箱（deque），投递到同一邮箱的操作
+由该键专属的排空任务按顺序逐个执行；邮箱排空后任务退出并移除邮箱。
+不同键之间互不等待，也不存在全局锁。
+
+修改游戏状态的同步操作（开枪、道具与各指令的 _do_xxx）中没有 await，执行期间不会与其它操作交错，
+因此键上没有邮箱时直接内联执行，不创建任务，其顺序就是到达的顺序。
+协程操作会在 await 处让出事件循环，总是经由邮箱执行：AI 回合（在线程池中搜索期间该牌桌的其它操作排队）、
+共享存储下的操作（写入存储期间排队）。邮箱存在时，之后到达的同步操作也在其中排队，不会越过尚未结束的协程操作。
+"""
+import asyncio
+import inspect
+from collections import deque
+
+
+class ChannelActors:
+    """键 -> 邮箱 的 actor 表"""
+
+    def __init__(self):
+        self._mailboxes = {}
+        self._drains = {}  # 键 -> 排空该邮箱的任务
+
+    def __len__(self):
+        return len(self._mailboxes)
+
+    def __contains__(self, key: str) -> bool:
+        """该 actor 是否有正在执行或排队的协程操作"""
+        return key in self._mailboxes
+
+    async def run(self, key: str, fn, *args):
+        """
+        在 key 对应的 actor 中执行 fn(*args) 并返回其结果；fn 可以是普通函数或协程函数。
+        同一键的操作严格按投递顺序执行，前一个操作（包括其中的 await）结束后才会开始下一个。
+        """
+        box = self._mailboxes.get(key)
+        if box is None and not inspect.iscoroutinefunction(fn):
+            return fn(*args)
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        if box is None:
+            box = self._mailboxes[key] = deque()
+            box.append((fn, args, fut))
+            self._drains[key] = loop.create_task(self._drain(key, box))
+        else:
+            box.append((fn, args, fut))
+        return await fut
+
+    def close(self):
+        """取消所有正在执行与排队的操作（插件卸载时）"""
+        for task in list(self._drains.values()):
+            task.cancel()
+
+    async def _drain(self, key: str, box: deque):
+        try:
+            while box:
+                fn, args, fut = box[0]
+                try:
+                    res = fn(*args)
+                    if inspect.isawaitable(res):
+                        res = await res
+                except Exception as e:
+                    if not fut.done():
+                        fut.set_exception(e)
+                else:
+                    if not fut.done():
+                        fut.set_result(res)
+                box.popleft()
+        finally:
+            # 正常排空或任务被取消：移除邮箱，并取消仍在等待的操作
+            self._mailboxes.pop(key, None)
+            self._drains.pop(key, None)
+            for _, _, fut in box:
+                if not fut.done():
+                    fut.cancel()
@@ -0,0 +1,411 @@
+# ai.py
+"""
+人机对战的 AI 对手（庄家）。
+
+AI 只使用公开信息：弹夹的总数与实弹数（每轮开始时公布，之后每发都会揭晓），
+以及放大镜、一次性电话、逆转器在群内揭示过的子弹（见 knowledge.Knowledge）。
+在此基础上对「开枪 / 使用道具」做期望极大极小搜索：
+  - 轮到 AI 时取最大值，轮到对手时取最小值（零和），
+  - 未知子弹、过期药物、一次性电话、幸运星等随机结果作为机会节点按概率加权，
+  - 搜索深度以动作数计，弹夹打空（换轮）或达到深度时用局面估值代替。
+估值为 AI 的胜率估计（0~1）。
+
+搜索状态是一个整数元组，AI 固定为下标 0，置换表以其位压缩后的整数为键并按 LRU 淘汰；
+键只包含局面本身，因此表项可以在不同对局之间复用。
+道具按效果（registry.KINDS）合并计数，同一效果的不同道具在搜索中等价，
+幸运星赠送各效果道具的概率取自该局道具表的掉落权重。
+每次决策在截止时间内迭代加深，返回最后一次完整搜索得到的最佳动作。
+
+搜索是纯 CPU 计算，插件在线程池中调用 Searcher.choose，不阻塞事件循环。
+也可以作为自对战策略使用：
+    python -m astrbot_plugin_buckshot_roulette.selfplay --p1 astrbot_plugin_buckshot_roulette.ai:policy
+"""
+import random
+import time
+from collections import OrderedDict
+
+from .knowledge import Knowledge
+from .registry import DEFAULT_TABLE, KINDS, KIND_INDEX
+from .state import GameState, MAX_HP
+
+AI_ID = "buckshot-roulette-ai"
+AI_NAME = "庄家"
+
+# 难度 -> (最大搜索深度, 每步时间预算秒数, 随机失误概率)
+DIFFICULTIES = {
+    "easy": (2, 0.05, 0.3),
+    "normal": (4, 0.25, 0.0),
+    "hard": (12, 1.0, 0.0),
+}
+DIFFICULTY_ALIASES = {
+    "简单": "easy", "普通": "normal", "困难": "hard",
+    "easy": "easy", "normal": "normal", "hard": "hard",
+}
+
+SAW = KIND_INDEX["saw"]
+MAGNIFIER = KIND_INDEX["magnifier"]
+BEER = KIND_INDEX["beer"]
+CIGARETTE = KIND_INDEX["cigarette"]
+HANDCUFF = KIND_INDEX["handcuff"]
+MEDICINE = KIND_INDEX["medicine"]
+REVERSER = KIND_INDEX["reverser"]
+PHONE = KIND_INDEX["phone"]
+BOMB = KIND_INDEX["bomb"]
+LUCKY_STAR = KIND_INDEX["lucky_star"]
+SHIELD = KIND_INDEX["shield"]
+N_ITEMS = len(KINDS)
+
+# 动作编码：非负数为道具效果编号
+FIRE_SELF = -1
+FIRE_OTHER = -2
+
+# 搜索状态元组的下标
+TURN, HP0, HP1, SIZE, LIVE, KMASK, KBITS, DOUBLE, SH0, SH1, CUFF0, CUFF1, USED, INV0, INV1 = range(15)
+
+
+def snapshot(game: GameState, ai: int, knowledge: Knowledge) -> tuple:
+    """把游戏状态转换为以 ai 为下标 0 的搜索状态"""
+    me, other = game.players[ai], game.players[1 - ai]
+    mag = game.bullet
+    kmask, kbits = knowledge.masks(len(mag)) if knowledge is not None else (0, 0)
+    kinds = game.table.kinds
+    return (
+        0 if game.turn == ai else 1,
+        min(me.hp, 7), min(other.hp, 7),
+        len(mag), mag.live, kmask, kbits,
+        game.double, me.shield, other.shield, me.handcuff, other.handcuff, game.used_handcuff,
+        _kind_counts(me.items.counts, kinds), _kind_counts(other.items.counts, kinds),
+    )
+
+
+def _kind_counts(counts, kinds: tuple) -> tuple:
+    """按效果合并背包计数（每种最多计 15 个）"""
+    out = [0] * N_ITEMS
+    for idx, n in enumerate(counts):
+        if n:
+            out[kinds[idx]] += n
+    return tuple(min(n, 15) for n in out)
+
+
+def _pack(s: tuple) -> int:
+    """把搜索状态位压缩为一个整数，作为置换表的键"""
+    key = (s[TURN] | s[HP0] << 1 | s[HP1] << 4 | s[SIZE] << 7 | s[LIVE] << 11 | s[KMASK] << 15 | s[KBITS] << 23
+           | s[DOUBLE] << 31 | s[SH0] << 32 | s[SH1] << 33 | s[CUFF0] << 34 | s[CUFF1] << 35 | s[USED] << 36)
+    shift = 37
+    for n in s[INV0]:
+        key |= n << shift
+        shift += 4
+    for n in s[INV1]:
+        key |= n << shift
+        shift += 4
+    return key
+
+
+def evaluate(s: tuple) -> float:
+    """非终局局面的估值：以血量差为主，兼顾道具数与护盾"""
+    v = (0.5 + 0.08 * (s[HP0] - s[HP1]) + 0.015 * (sum(s[INV0]) - sum(s[INV1]))
+         + 0.03 * (s[SH0] - s[SH1]))
+    return 0.02 if v < 0.02 else 0.98 if v > 0.98 else v
+
+
+def actions(s: tuple) -> list:
+    """当前行动者的候选动作，剔除不会产生任何效果的道具"""
+    me = s[TURN]
+    inv = s[INV0 + me]
+    top = 1 << (s[SIZE] - 1)
+    out = [FIRE_OTHER, FIRE_SELF]
+    for idx in range(N_ITEMS):
+        if not inv[idx]:
+            continue
+        if idx == SAW and s[DOUBLE]:
+            continue
+        if idx == MAGNIFIER and s[KMASK] & top:
+            continue
+        if idx == CIGARETTE and s[HP0 + me] >= MAX_HP:
+            continue
+        if idx == HANDCUFF and (s[USED] or s[CUFF1 - me]):
+            continue
+        if idx == PHONE and s[KMASK] == (1 << s[SIZE]) - 1:
+            continue
+        if idx == SHIELD and s[SH0 + me]:
+            continue
+        out.append(idx)
+    return out
+
+
+def _top_live_prob(s: tuple) -> float:
+    top = 1 << (s[SIZE] - 1)
+    if s[KMASK] & top:
+        return 1.0 if s[KBITS] & top else 0.0
+    unknown = s[SIZE] - s[KMASK].bit_count()
+    return (s[LIVE] - s[KBITS].bit_count()) / unknown
+
+
+def _pop(c: list, live: bool):
+    """弹出下一发（c 为可修改的状态列表）"""
+    top = 1 << (c[SIZE] - 1)
+    c[SIZE] -= 1
+    c[KMASK] &= ~top
+    c[KBITS] &= ~top
+    if live:
+        c[LIVE] -= 1
+
+
+def _consume(c: list, me: int, idx: int):
+    inv = list(c[INV0 + me])
+    inv[idx] -= 1
+    c[INV0 + me] = tuple(inv)
+
+
+def _hurt(c: list, idx: int, amount: int):
+    c[HP0 + idx] = max(c[HP0 + idx] - amount, 0)
+
+
+def _fire(s: tuple, at_self: bool, live: bool) -> tuple:
+    c = list(s)
+    me = s[TURN]
+    other = 1 - me
+    _pop(c, live)
+    if live:
+        damage = 2 if s[DOUBLE] else 1
+        if at_self:
+            _hurt(c, me, damage)
+        elif c[SH0 + other]:
+            c[SH0 + other] = False
+        else:
+            _hurt(c, other, damage)
+    if not live and at_self:
+        pass
+    elif c[CUFF0 + other]:
+        c[CUFF0 + other] = False
+    else:
+        c[TURN] = other
+        c[USED] = False
+    c[DOUBLE] = False
+    return tuple(c)
+
+
+def outcomes(s: tuple, action: int, gifts: tuple = DEFAULT_TABLE.kind_probs) -> list:
+    """
+    动作的所有可能结果：[(概率, 后继状态)]。
+    :param gifts: 幸运星赠送各效果道具的概率（ItemTable.kind_probs）
+    """
+    me = s[TURN]
+    if action < 0:
+        p = _top_live_prob(s)
+        at_self = action == FIRE_SELF
+        out = []
+        if p > 0:
+            out.append((p, _fire(s, at_self, True)))
+        if p < 1:
+            out.append((1 - p, _fire(s, at_self, False)))
+        return out
+
+    c = list(s)
+    _consume(c, me, action)
+    other = 1 - me
+    if action == SAW:
+        c[DOUBLE] = True
+    elif action == CIGARETTE:
+        c[HP0 + me] = min(c[HP0 + me] + 1, MAX_HP)
+    elif action == HANDCUFF:
+        c[CUFF0 + other] = True
+        c[USED] = True
+    elif action == BOMB:
+        if c[SH0 + other]:
+            c[SH0 + other] = False
+        else:
+            _hurt(c, other, 2)
+    elif action == SHIELD:
+        c[SH0 + me] = True
+    elif action == MEDICINE:
+        hurt = list(c)
+        _hurt(hurt, me, 1)
+        c[HP0 + me] = min(c[HP0 + me] + 2, MAX_HP)
+        return [(0.5, tuple(c)), (0.5, tuple(hurt))]
+    elif action == LUCKY_STAR:
+        base = tuple(c)
+        c[HP0 + me] = min(c[HP0 + me] + 1, MAX_HP)
+        out = [(0.5, tuple(c))]
+        for gift, p in enumerate(gifts):
+            if not p:
+                continue
+            g = list(base)
+            inv = list(g[INV0 + me])
+            inv[gift] = min(inv[gift] + 1, 15)
+            g[INV0 + me] = tuple(inv)
+            out.append((0.5 * p, tuple(g)))
+        return out
+    elif action in (MAGNIFIER, BEER, REVERSER):
+        # 揭示 / 卸下 / 反转下一发：结果都会在群内公开
+        p = _top_live_prob(s)
+        top = 1 << (s[SIZE] - 1)
+        out = []
+        for live, prob in ((True, p), (False, 1 - p)):
+            if prob <= 0:
+                continue
+            k = list(c)
+            if action == BEER:
+                _pop(k, live)
+            else:
+                now = live if action == MAGNIFIER else not live
+                if action == REVERSER:
+                    k[LIVE] += 1 if now else -1
+                k[KMASK] |= top
+                k[KBITS] = k[KBITS] | top if now else k[KBITS] & ~top
+            out.append((prob, tuple(k)))
+        return out
+    elif action == PHONE:
+        size = s[SIZE]
+        kmask = s[KMASK]
+        unknown = size - kmask.bit_count()
+        p = (s[LIVE] - s[KBITS].bit_count()) / unknown if unknown else 0.0
+        base = tuple(c)
+        out = []
+        for idx in range(size):
+            bit = 1 << idx
+            if kmask & bit:
+                out.append((1 / size, base))
+                continue
+            if p > 0:
+                k = list(c)
+                k[KMASK] |= bit
+                k[KBITS] |= bit
+                out.append((p / size, tuple(k)))
+            if p < 1:
+                k = list(c)
+                k[KMASK] |= bit
+                out.append(((1 - p) / size, tuple(k)))
+        return out
+    return [(1.0, tuple(c))]
+
+
+class _Timeout(Exception):
+    pass
+
+
+class Searcher:
+    """带 LRU 置换表的期望极大极小搜索；一个实例同一时间只能被一个线程使用"""
+
+    def __init__(self, table_size: int = 200000):
+        """
+        :param table_size: 置换表最多保存的局面数
+        """
+        self.table = OrderedDict()
+        self.table_size = table_size
+        self.gifts = DEFAULT_TABLE.kind_probs
+        self.nodes = 0
+        self.hits = 0
+        self.deadline = 0.0
+
+    def choose(self, s: tuple, difficulty: str = "normal", rng=random, gifts: tuple = None) -> tuple:
+        """
+        为 AI（下标 0）选择动作，返回 (动作, 完成的搜索深度, 搜索节点数)。
+        动作为 FIRE_SELF / FIRE_OTHER 或道具效果编号。
+        :param gifts: 该局道具表的 kind_probs，默认为内置道具表；与上次不同时清空置换表
+        """
+        gifts = gifts or DEFAULT_TABLE.kind_probs
+        if gifts != self.gifts:
+            self.table.clear()
+            self.gifts = gifts
+        max_depth, budget, noise = DIFFICULTIES.get(difficulty, DIFFICULTIES["normal"])
+        moves = actions(s)
+        if noise and rng.random() < noise:
+            return moves[rng.randrange(len(moves))], 0, 0
+        self.nodes = 0
+        self.deadline = time.perf_counter() + budget
+        best, depth = FIRE_OTHER, 0
+        try:
+            for d in range(1, max_depth + 1):
+                best = self._root(s, moves, d)
+                depth = d
+        except _Timeout:
+            pass
+        return best, depth, self.nodes
+
+    def _root(self, s: tuple, moves: list, depth: int) -> int:
+        best, best_v = moves[0], -1.0
+        for action in moves:
+            v = self._expect(s, action, depth)
+            if v > best_v:
+                best, best_v = action, v
+        return best
+
+    def _expect(self, s: tuple, action: int, depth: int) -> float:
+        total = 0.0
+        for p, child in outcomes(s, action, self.gifts):
+            if child[HP0] <= 0:
+                v = 0.0
+            elif child[HP1] <= 0:
+                v = 1.0
+            elif depth <= 1 or child[SIZE] == 0:
+                v = evaluate(child)
+            else:
+                v = self._value(child, depth - 1)
+            total += p * v
+        return total
+
+    def _value(self, s: tuple, depth: int) -> float:
+        table = self.table
+        key = _pack(s)
+        hit = table.get(key)
+        if hit is not None and hit[0] >= depth:
+            table.move_to_end(key)
+            self.hits += 1
+            return hit[1]
+        self.nodes += 1
+        if not self.nodes & 63:
+            # 在线程池中运行时短暂让出 GIL，让事件循环线程及时得到调度
+            time.sleep(0)
+            if time.perf_counter() > self.deadline:
+                raise _Timeout
+        maximize = s[TURN] == 0
+        best = -1.0 if maximize else 2.0
+        for action in actions(s):
+            v = self._expect(s, action, depth)
+            if v > best if maximize else v < best:
+                best = v
+        table[key] = (depth, best)
+        table.move_to_end(key)
+        if len(table) > self.table_size:
+            table.popitem(last=False)
+        return best
+
+
+def held_item(game: GameState, kind: int) -> int:
+    """当前行动玩家持有的、具有该效果的第一个道具编号"""
+    counts = game.current.items.counts
+    kinds = game.table.kinds
+    for idx, n in enumerate(counts):
+        if n and kinds[idx] == kind:
+            return idx
+    raise ValueError(f"未持有效果为 {KINDS[kind]} 的道具")
+
+
+def action_text(action: int, game: GameState) -> str:
+    """动作在该局中对应的聊天关键词"""
+    if action == FIRE_SELF:
+        return "自己"
+    if action == FIRE_OTHER:
+        return "对方"
+    return game.table.names[held_item(game, action)]
+
+
+# ------------- 自对战策略 -------------
+
+_policy_searcher = None
+
+
+def policy(game: GameState, rng, known):
+    """selfplay 策略接口：以 normal 难度搜索（只知道下一发，不追踪更早揭示的子弹）"""
+    global _policy_searcher
+    if _policy_searcher is None:
+        _policy_searcher = Searcher()
+    knowledge = Knowledge(game.table)
+    if known is not None:
+        knowledge.known[0] = known
+    s = snapshot(game, game.turn, knowledge)
+    action, _, _ = _policy_searcher.choose(s, "normal", rng, game.table.kind_probs)
+    if action < 0:
+        return ("fire", action == FIRE_SELF)
+    return ("item", held_item(game, action))
@@ -0,0 +1,566 @@
+# batchsim.py
+"""
+恶魔轮盘向量化批量模拟器（需要 NumPy）。
+
+把 N 局互相独立的对局放进 NumPy 数组中同步推进：血量、手铐、护盾为 (N, 2) 矩阵，
+弹夹为整数位图向量，背包为 (N, 2, 道具数) 计数矩阵。每一步所有未结束的对局各执行一个动作，
+按动作类型分组后整组结算，因此单核即可在数秒内跑完百万局，
+用于在修改规则前扫描弹夹大小、实弹概率与道具掉落权重等参数。
+
+规则与 engine 保持一致，并可用 --parity 与逐局的标量规则对拍：
+向量路径的每个随机数都按对局记录下来，再按相同顺序回放给 engine，逐步比较两边的完整状态。
+
+在插件目录的上一级目录中运行：
+    python -m astrbot_plugin_buckshot_roulette.batchsim -n 1000000 --sizes 3-8 2-6 --live-prob 0.4 0.5
+    python -m astrbot_plugin_buckshot_roulette.batchsim --parity 2000
+"""
+import argparse
+import itertools
+import json
+import sys
+import time
+
+import numpy as np
+
+from . import engine
+from .selfplay import _new_totals, _merge, format_report
+from .state import GameState, PlayerState, ITEM_NAMES, ITEM_INDEX, MAX_HP, MAX_ITEMS
+
+# 动作编码：0 打自己，1 打对方，ITEM_BASE + 道具编号 为使用道具
+FIRE_SELF = 0
+FIRE_OTHER = 1
+ITEM_BASE = 2
+
+MAX_STEPS = 10000
+
+SAW = ITEM_INDEX["手锯"]
+MAGNIFIER = ITEM_INDEX["放大镜"]
+BEER = ITEM_INDEX["啤酒"]
+CIGARETTE = ITEM_INDEX["香烟"]
+HANDCUFF = ITEM_INDEX["手铐"]
+REVERSER = ITEM_INDEX["逆转器"]
+BOMB = ITEM_INDEX["炸弹"]
+SHIELD = ITEM_INDEX["护盾"]
+
+
+class BatchSim:
+    """
+    N 局对局的结构化数组状态。
+    known 为各玩家已知的下一发子弹（-1 未知 / 0 空包弹 / 1 实弹），供策略使用，不影响规则。
+    """
+
+    def __init__(self, n: int, seed: int = 0, min_size: int = 3, max_size: int = 8,
+                 live_prob: float = 0.5, item_weights=None,
+                 start_items: tuple = engine.START_ITEMS, round_items: tuple = engine.ROUND_ITEMS,
+                 trace: bool = False):
+        """
+        :param n: 对局数
+        :param min_size: 弹夹最少子弹数
+        :param max_size: 弹夹最多子弹数（不超过 62）
+        :param live_prob: 每发子弹为实弹的概率
+        :param item_weights: 按道具编号排列的掉落权重，默认等权
+        :param start_items: 开局道具数范围（先手少拿一个）
+        :param round_items: 每轮发放的道具数范围
+        :param trace: 是否按对局记录每个随机数（对拍用）
+        """
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.live_prob = live_prob
+        weights = np.ones(len(ITEM_NAMES)) if item_weights is None else np.asarray(item_weights, dtype=float)
+        self._item_cum = np.cumsum(weights)
+        self.start_items = start_items
+        self.round_items = round_items
+        self.trace = [[] for _ in range(n)] if trace else None
+
+        self.active = np.ones(n, dtype=bool)
+        self.winner = np.full(n, -1, dtype=np.int8)
+        self.first = np.zeros(n, dtype=np.int8)
+        self.turn = np.zeros(n, dtype=np.int8)
+        self.hp = np.full((n, 2), MAX_HP, dtype=np.int8)
+        self.items = np.zeros((n, 2, len(ITEM_NAMES)), dtype=np.uint8)
+        self.total = np.zeros((n, 2), dtype=np.uint8)
+        self.handcuff = np.zeros((n, 2), dtype=bool)
+        self.shield = np.zeros((n, 2), dtype=bool)
+        self.bits = np.zeros(n, dtype=np.int64)
+        self.size = np.zeros(n, dtype=np.int8)
+        self.live = np.zeros(n, dtype=np.int8)
+        self.double = np.zeros(n, dtype=bool)
+        self.used_handcuff = np.zeros(n, dtype=bool)
+        self.round = np.zeros(n, dtype=np.int32)
+        self.known = np.full((n, 2), -1, dtype=np.int8)
+        # 统计
+        self.shots = np.zeros(n, dtype=np.int32)
+        self.item_uses = np.zeros(len(ITEM_NAMES), dtype=np.int64)
+
+    # ------------- 随机数 -------------
+
+    def _draw(self, g: np.ndarray) -> np.ndarray:
+        """为 g 中每局各取一个 [0, 1) 均匀随机数"""
+        u = self.rng.random(len(g))
+        if self.trace is not None:
+            for i, v in zip(g.tolist(), u.tolist()):
+                self.trace[i].append(v)
+        return u
+
+    def _randint(self, g: np.ndarray, lo: int, hi: int) -> np.ndarray:
+        return lo + (self._draw(g) * (hi - lo + 1)).astype(np.int64)
+
+    def _draw_items(self, g: np.ndarray) -> np.ndarray:
+        cum = self._item_cum
+        idx = np.searchsorted(cum, self._draw(g) * cum[-1], side="right")
+        return np.minimum(idx, len(cum) - 1)
+
+    # ------------- 基础操作 -------------
+
+    def _fill(self, g: np.ndarray, who: np.ndarray, item: np.ndarray):
+        """在不超过上限的前提下为 (g, who) 各加入一个道具"""
+        ok = self.total[g, who] < MAX_ITEMS
+        g, who, item = g[ok], who[ok], item[ok]
+        self.items[g, who, item] += 1
+        self.total[g, who] += 1
+
+    def _new_magazine(self, g: np.ndarray):
+        size = self._randint(g, self.min_size, self.max_size)
+        bits = np.zeros(len(g), dtype=np.int64)
+        live = np.zeros(len(g), dtype=np.int8)
+        for j in range(self.max_size):
+            m = size > j
+            if not m.any():
+                break
+            hit = self._draw(g[m]) < self.live_prob
+            bits[m] |= hit.astype(np.int64) << j
+            live[m] += hit
+        self.bits[g] = bits
+        self.size[g] = size
+        self.live[g] = live
+
+    def _pop(self, g: np.ndarray) -> np.ndarray:
+        """取出下一发，返回是否为实弹"""
+        top = self.size[g].astype(np.int64) - 1
+        live = (self.bits[g] >> top) & 1 == 1
+        self.bits[g] &= (np.int64(1) << top) - 1
+        self.size[g] = top
+        self.live[g] -= live
+        self.known[g] = -1
+        return live
+
+    def _finish(self, g: np.ndarray, loser: np.ndarray):
+        self.active[g] = False
+        self.winner[g] = 1 - loser
+
+    def _hurt(self, g: np.ndarray, who: np.ndarray, amount) -> np.ndarray:
+        """造成伤害，返回各局是否因此结束"""
+        self.hp[g, who] -= amount
+        dead = self.hp[g, who] <= 0
+        self._finish(g[dead], who[dead])
+        return dead
+
+    def start(self):
+        """开始全部对局：生成弹夹、随机先后手、发放开局道具"""
+        g = np.arange(self.n)
+        self._new_magazine(g)
+        self.turn[:] = self.first[:] = self._randint(g, 0, 1)
+        base = self._randint(g, *self.start_items)
+        for who, count in ((self.turn.astype(np.int64), base - 1), (1 - self.turn.astype(np.int64), base)):
+            for k in range(self.start_items[1]):
+                m = count > k
+                self._fill(g[m], who[m], self._draw_items(g[m]))
+
+    def _next_round(self, g: np.ndarray):
+        if not len(g):
+            return
+        self.round[g] += 1
+        self._new_magazine(g)
+        self.known[g] = -1
+        count = self._randint(g, *self.round_items)
+        me = self.turn[g].astype(np.int64)
+        for k in range(self.round_items[1]):
+            m = count > k
+            if not m.any():
+                break
+            sub, cur = g[m], me[m]
+            self._fill(sub, cur, self._draw_items(sub))
+            self._fill(sub, 1 - cur, self._draw_items(sub))
+
+    # ------------- 开枪 -------------
+
+    def _fire(self, g: np.ndarray, at_self: bool):
+        me = self.turn[g].astype(np.int64)
+        other = 1 - me
+        double = self.double[g]
+        live = self._pop(g)
+        self.shots[g] += 1
+        damage = np.where(double, 2, 1).astype(np.int8)
+        alive = np.ones(len(g), dtype=bool)
+        if at_self:
+            hit = np.flatnonzero(live)
+            alive[hit[self._hurt(g[hit], me[hit], damage[hit])]] = False
+        else:
+            blocked = live & self.shield[g, other]
+            self.shield[g[blocked], other[blocked]] = False
+            hit = np.flatnonzero(live & ~blocked)
+            alive[hit[self._hurt(g[hit], other[hit], damage[hit])]] = False
+        g, other, live = g[alive], other[alive], live[alive]
+        keep = ~live if at_self else np.zeros(len(g), dtype=bool)
+        cuffed = ~keep & self.handcuff[g, other]
+        self.handcuff[g[cuffed], other[cuffed]] = False
+        switch = ~keep & ~cuffed
+        self.turn[g[switch]] = other[switch]
+        self.used_handcuff[g[switch]] = False
+        self.double[g] = False
+        self._next_round(g[self.size[g] == 0])
+
+    # ------------- 道具效果（规则同 engine.EFFECTS） -------------
+
+    def _saw(self, g, me):
+        self.double[g] = True
+
+    def _magnifier(self, g, me):
+        top = self.size[g].astype(np.int64) - 1
+        self.known[g, me] = (self.bits[g] >> top) & 1
+
+    def _beer(self, g, me):
+        self._pop(g)
+        self._next_round(g[self.size[g] == 0])
+
+    def _cigarette(self, g, me):
+        m = self.hp[g, me] < MAX_HP
+        self.hp[g[m], me[m]] += 1
+
+    def _handcuff(self, g, me):
+        m = ~self.used_handcuff[g]
+        self.handcuff[g[m], 1 - me[m]] = True
+        self.used_handcuff[g[m]] = True
+
+    def _expired_medicine(self, g, me):
+        heal = self._draw(g) < 0.5
+        hg, hm = g[heal], me[heal]
+        self.hp[hg, hm] += np.minimum(MAX_HP - self.hp[hg, hm], 2)
+        self._hurt(g[~heal], me[~heal], 1)
+
+    def _reverser(self, g, me):
+        top = self.size[g].astype(np.int64) - 1
+        self.bits[g] ^= np.int64(1) << top
+        now = (self.bits[g] >> top) & 1
+        self.live[g] += np.where(now == 1, 1, -1).astype(np.int8)
+        self.known[g, me] = now
+        self.known[g, 1 - me] = -1
+
+    def _once_phone(self, g, me):
+        # 只消耗一个随机数（揭示的位置），不改变状态
+        self._draw(g)
+
+    def _bomb(self, g, me):
+        other = 1 - me
+        blocked = self.shield[g, other]
+        self.shield[g[blocked], other[blocked]] = False
+        self._hurt(g[~blocked], other[~blocked], 2)
+
+    def _lucky_star(self, g, me):
+        heal = self._draw(g) < 0.5
+        m = heal & (self.hp[g, me] < MAX_HP)
+        self.hp[g[m], me[m]] += 1
+        gift = ~heal
+        sub, who = g[gift], me[gift]
+        self.items[sub, who, self._draw_items(sub)] += 1
+        self.total[sub, who] += 1
+
+    def _shield(self, g, me):
+        self.shield[g, me] = True
+
+    # ------------- 推进 -------------
+
+    def step(self, policies: tuple, seat_policy: np.ndarray):
+        """
+        所有未结束的对局各执行一个动作。
+        :param policies: 向量化策略函数元组，policy(sim, g) -> 动作编码数组
+        :param seat_policy: (N, 2) 数组，各局两个座位所用策略在 policies 中的下标
+        :return: (执行动作的对局下标, 动作编码)
+        """
+        act = np.flatnonzero(self.active)
+        actions = np.empty(len(act), dtype=np.int64)
+        chosen = seat_policy[act, self.turn[act]]
+        for k, policy in enumerate(policies):
+            m = chosen == k
+            if m.any():
+                actions[m] = policy(self, act[m])
+        # 按动作编码一次排序分组，每组整体结算
+        order = np.argsort(actions.astype(np.int8))
+        counts = np.bincount(actions, minlength=ITEM_BASE + len(ITEM_NAMES))
+        groups = np.split(act[order], np.cumsum(counts)[:-1])
+        for code in np.flatnonzero(counts).tolist():
+            g = groups[code]
+            if code == FIRE_SELF or code == FIRE_OTHER:
+                self._fire(g, code == FIRE_SELF)
+            else:
+                ITEM_HANDLERS[code - ITEM_BASE](self, g, self.turn[g].astype(np.int64))
+        # 效果结算完毕后统一移除本步使用的道具（每局一步只有一个动作）
+        used = actions >= ITEM_BASE
+        g, item = act[used], actions[used] - ITEM_BASE
+        me = self.turn[g]
+        self.items[g, me, item] -= 1
+        self.total[g, me] -= 1
+        self.item_uses += np.bincount(item, minlength=len(ITEM_NAMES))
+        return act, actions
+
+    def totals(self, specs: tuple, seat_policy: np.ndarray) -> dict:
+        """按 selfplay 的统计格式汇总全部对局"""
+        totals = _new_totals()
+        done = self.winner >= 0
+        totals["games"] = self.n
+        totals["unfinished"] = int(self.n - done.sum())
+        totals["seat_wins"] = np.bincount(self.winner[done], minlength=2).tolist()
+        winners = seat_policy[np.flatnonzero(done), self.winner[done]]
+        for k, name in enumerate(specs):
+            n = int((winners == k).sum())
+            totals["policy_wins"][name] = totals["policy_wins"].get(name, 0) + n
+        totals["first_wins"] = int((self.winner[done] == self.first[done]).sum())
+        totals["shots"] = int(self.shots.sum())
+        totals["rounds"] = int(self.round.sum())
+        totals["max_shots"] = int(self.shots.max()) if self.n else 0
+        totals["items"] = self.item_uses.tolist()
+        return totals
+
+
+ITEM_HANDLERS = {
+    SAW: BatchSim._saw,
+    MAGNIFIER: BatchSim._magnifier,
+    BEER: BatchSim._beer,
+    CIGARETTE: BatchSim._cigarette,
+    HANDCUFF: BatchSim._handcuff,
+    ITEM_INDEX["过期药物"]: BatchSim._expired_medicine,
+    REVERSER: BatchSim._reverser,
+    ITEM_INDEX["一次性电话"]: BatchSim._once_phone,
+    BOMB: BatchSim._bomb,
+    ITEM_INDEX["幸运星"]: BatchSim._lucky_star,
+    SHIELD: BatchSim._shield,
+}
+
+
+# ------------- 向量化策略（与 selfplay 中的同名策略对应） -------------
+
+def random_policy(sim: BatchSim, g: np.ndarray) -> np.ndarray:
+    """在开枪（自己 / 对方）与使用任一持有道具之间均匀随机选择"""
+    held = sim.items[g, sim.turn[g]] > 0
+    options = 2 + held.sum(axis=1)
+    pick = (sim.rng.random(len(g)) * options).astype(np.int64)
+    nth = np.cumsum(held, axis=1) > (pick - 2)[:, None]
+    item = np.argmax(nth & held, axis=1)
+    return np.where(pick < 2, pick, ITEM_BASE + item)
+
+
+def heuristic_policy(sim: BatchSim, g: np.ndarray) -> np.ndarray:
+    """selfplay.heuristic_policy 的向量化版本（不进行兑换）"""
+    me = sim.turn[g].astype(np.int64)
+    other = 1 - me
+    counts = sim.items[g, me]
+    has = counts > 0
+    known = sim.known[g, me]
+    size = sim.size[g]
+    guess = np.where(known >= 0, known == 1, sim.live[g].astype(np.int64) * 2 > size)
+    conds = [
+        (sim.hp[g, me] < MAX_HP) & has[:, CIGARETTE],
+        has[:, BOMB] & ~sim.shield[g, other],
+        has[:, SHIELD] & ~sim.shield[g, me],
+        (known < 0) & has[:, MAGNIFIER],
+        guess & has[:, SAW] & ~sim.double[g],
+        guess & has[:, HANDCUFF] & ~sim.used_handcuff[g] & ~sim.handcuff[g, other],
+        guess,
+        has[:, REVERSER],
+        has[:, BEER] & (size > 1),
+    ]
+    choices = [
+        ITEM_BASE + CIGARETTE, ITEM_BASE + BOMB, ITEM_BASE + SHIELD, ITEM_BASE + MAGNIFIER,
+        ITEM_BASE + SAW, ITEM_BASE + HANDCUFF, FIRE_OTHER, ITEM_BASE + REVERSER, ITEM_BASE + BEER,
+    ]
+    return np.select(conds, choices, FIRE_SELF)
+
+
+POLICIES = {
+    "random": random_policy,
+    "heuristic": heuristic_policy,
+}
+
+
+def _seat_policy(n: int, swap: bool) -> np.ndarray:
+    """各局两个座位的策略下标；swap 时奇数局交换座位"""
+    seat = np.tile(np.array([0, 1]), (n, 1))
+    if swap:
+        seat[1::2] = (1, 0)
+    return seat
+
+
+def run_batch(specs: tuple, n: int, seed: int = 0, swap: bool = True, **params) -> dict:
+    """进行一批 n 局向量化对局，返回 selfplay 格式的统计"""
+    sim = BatchSim(n, seed, **params)
+    policies = tuple(POLICIES[s] for s in specs)
+    seat = _seat_policy(n, swap)
+    sim.start()
+    for _ in range(MAX_STEPS):
+        if not sim.active.any():
+            break
+        sim.step(policies, seat)
+    return sim.totals(specs, seat)
+
+
+def simulate(specs: tuple, games: int, seed: int = 0, batch: int = 200000,
+             swap: bool = True, **params) -> dict:
+    """按 batch 局一批依次模拟 games 局，第 b 批使用种子 seed + b"""
+    totals = _new_totals()
+    start = time.perf_counter()
+    for b, s in enumerate(range(0, games, batch)):
+        _merge(totals, run_batch(specs, min(batch, games - s), seed + b, swap, **params))
+    elapsed = time.perf_counter() - start
+    totals["elapsed"] = elapsed
+    totals["workers"] = 1
+    totals["games_per_sec"] = totals["games"] / elapsed if elapsed else 0.0
+    totals["games_per_sec_per_core"] = totals["games_per_sec"]
+    return totals
+
+
+# ------------- 与标量规则对拍 -------------
+
+class ReplayRandom:
+    """按顺序回放向量路径记录的均匀随机数，接口与 engine 使用的 random 方法一致"""
+
+    def __init__(self, values: list):
+        self.values = values
+        self.pos = 0
+
+    def random(self) -> float:
+        self.pos += 1
+        return self.values[self.pos - 1]
+
+    def randint(self, a: int, b: int) -> int:
+        return a + int(self.random() * (b - a + 1))
+
+    def randrange(self, n: int) -> int:
+        return int(self.random() * n)
+
+    def getrandbits(self, k: int) -> int:
+        bits = 0
+        for j in range(k):
+            if self.random() < 0.5:
+                bits |= 1 << j
+        return bits
+
+
+def _diff(sim: BatchSim, i: int, game: GameState, rr: ReplayRandom) -> str:
+    """比较第 i 局的向量状态与标量状态，返回第一处差异（无差异返回空串）"""
+    mag = game.bullet
+    pairs = [
+        ("结束", not sim.active[i], game.status == "over"),
+        ("胜者", int(sim.winner[i]) if sim.winner[i] >= 0 else None, game.winner),
+        ("行动方", int(sim.turn[i]), game.turn),
+        ("弹夹", (int(sim.bits[i]), int(sim.size[i]), int(sim.live[i])), (mag.bits, mag.size, mag.live)),
+        ("双倍", bool(sim.double[i]), game.double),
+        ("手铐已用", bool(sim.used_handcuff[i]), game.used_handcuff),
+        ("轮数", int(sim.round[i]), game.round),
+        ("随机数", len(sim.trace[i]), rr.pos),
+    ]
+    for k, p in enumerate(game.players):
+        pairs += [
+            (f"玩家{k + 1}血量", int(sim.hp[i, k]), p.hp),
+            (f"玩家{k + 1}道具", sim.items[i, k].tolist(), list(p.items.counts)),
+            (f"玩家{k + 1}道具数", int(sim.total[i, k]), p.items.total),
+            (f"玩家{k + 1}手铐", bool(sim.handcuff[i, k]), p.handcuff),
+            (f"玩家{k + 1}护盾", bool(sim.shield[i, k]), p.shield),
+        ]
+    for name, vec, ref in pairs:
+        if vec != ref:
+            return f"{name}：向量 {vec} / 标量 {ref}"
+    return ""
+
+
+def check_parity(n: int = 2000, seed: int = 0, specs: tuple = ("heuristic", "random")) -> list:
+    """
+    用默认规则参数进行 n 局向量化对局，同时把相同的动作与随机数回放给 engine，
+    每一步比较全部状态。返回差异描述列表（为空即一致）。
+    """
+    sim = BatchSim(n, seed, trace=True)
+    policies = tuple(POLICIES[s] for s in specs)
+    seat = _seat_policy(n, True)
+    games, replays = [], []
+    sim.start()
+    for i in range(n):
+        game = GameState(PlayerState("p1", "1"))
+        game.players[1] = PlayerState("p2", "2")
+        rr = ReplayRandom(sim.trace[i])
+        engine.start(game, rr)
+        games.append(game)
+        replays.append(rr)
+    errors = [f"第 {i} 局开局 {d}" for i in range(n) if (d := _diff(sim, i, games[i], replays[i]))]
+    steps = 0
+    while not errors and sim.active.any() and steps < MAX_STEPS:
+        steps += 1
+        act, actions = sim.step(policies, seat)
+        for i, code in zip(act.tolist(), actions.tolist()):
+            game, rr = games[i], replays[i]
+            if code < ITEM_BASE:
+                engine.fire(game, code == FIRE_SELF, rr)
+            else:
+                engine.use_item(game, code - ITEM_BASE, rr)
+            d = _diff(sim, i, game, rr)
+            if d:
+                errors.append(f"第 {i} 局第 {steps} 步（动作 {code}）{d}")
+    return errors
+
+
+# ------------- 命令行 -------------
+
+def _parse_weights(pairs: list) -> list:
+    weights = [1.0] * len(ITEM_NAMES)
+    for pair in pairs:
+        name, _, value = pair.partition("=")
+        if name not in ITEM_INDEX:
+            raise SystemExit(f"未知道具：{name}")
+        weights[ITEM_INDEX[name]] = float(value)
+    return weights
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="恶魔轮盘向量化批量模拟器")
+    parser.add_argument("-n", "--games", type=int, default=1000000, help="每组参数的对局数")
+    parser.add_argument("--p1", default="heuristic", choices=POLICIES, help="玩家1的策略")
+    parser.add_argument("--p2", default="heuristic", choices=POLICIES, help="玩家2的策略")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--batch", type=int, default=200000, help="每批同步推进的对局数")
+    parser.add_argument("--sizes", nargs="+", default=["3-8"], help="要扫描的弹夹大小范围，如 3-8 2-6")
+    parser.add_argument("--live-prob", nargs="+", type=float, default=[0.5], help="要扫描的实弹概率")
+    parser.add_argument("--weight", action="append", default=[], help="道具掉落权重，如 炸弹=2（可重复）")
+    parser.add_argument("--no-swap", action="store_true", help="不交换座位（默认奇数局交换）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出统计结果")
+    parser.add_argument("--parity", type=int, metavar="N", help="与标量规则对拍 N 局后退出")
+    args = parser.parse_args(argv)
+    specs = (args.p1, args.p2)
+
+    if args.parity:
+        errors = check_parity(args.parity, args.seed, specs)
+        if errors:
+            print("\n".join(errors[:20]))
+            sys.exit(1)
+        print(f"对拍通过：{args.parity} 局向量化对局与标量规则逐步一致")
+        return
+
+    weights = _parse_weights(args.weight)
+    results = []
+    for sizes, prob in itertools.product(args.sizes, args.live_prob):
+        lo, _, hi = sizes.partition("-")
+        totals = simulate(
+            specs, args.games, args.seed, args.batch, not args.no_swap,
+            min_size=int(lo), max_size=int(hi or lo), live_prob=prob, item_weights=weights,
+        )
+        totals["items"] = dict(zip(ITEM_NAMES, totals["items"]))
+        results.append(dict(totals, sizes=sizes, live_prob=prob))
+        if not args.json:
+            print(f"== 弹夹 {sizes} 发，实弹概率 {prob} ==")
+            print(format_report(specs, dict(totals, items=list(totals["items"].values()))))
+    if args.json:
+        print(json.dumps({"policies": list(specs), "weights": weights, "results": results},
+                         ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
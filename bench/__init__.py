@@ -0,0 +1,13 @@
+# bench/__init__.py
+"""
+恶魔轮盘性能基准与压测套件。
+
+用桩实现的 AstrBot Context / AstrMessageEvent / MessageChain 加载插件（无需安装 AstrBot），
+端到端驱动 创建游戏 → 加入游戏 → 开始游戏 → on_message 开枪/道具 的完整流程，
+并提供各指令与各道具的微基准、底层组件基准以及多群合成负载。
+结果以 JSON 保存，便于在版本之间对比。
+
+在插件目录的上一级目录中运行：
+    python -m astrbot_plugin_buckshot_roulette.bench
+    python -m astrbot_plugin_buckshot_roulette.bench --quick --compare bench-v1.1.1-old.json
+"""
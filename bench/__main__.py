@@ -0,0 +1,184 @@
+# bench/__main__.py
+"""
+基准套件命令行入口：依次运行所选场景（每个场景使用一个全新的插件实例），
+打印摘要并把完整结果保存为 JSON；指定 --compare 时与旧结果逐项对比延迟与吞吐。
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import time
+
+from .scenarios import ADMIN, SCENARIOS, Harness
+from .stubs import load_plugin
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def plugin_version() -> str:
+    try:
+        with open(os.path.join(PLUGIN_DIR, "metadata.yaml"), encoding="utf-8") as fp:
+            m = re.search(r"^version:\s*(\S+)", fp.read(), re.M)
+        return m.group(1) if m else "unknown"
+    except OSError:
+        return "unknown"
+
+
+def plugin_config(opts) -> dict:
+    """基准使用的插件配置：默认关闭限流、日志、战绩库与休眠，只测处理本身的开销"""
+    return {
+        "admin": [ADMIN],
+        "journal": opts.journal,
+        "stats": opts.journal,
+        "channelRate": 1e9 if not opts.rate_limit else 1.0,
+        "platformRate": 1e9 if not opts.rate_limit else 20.0,
+        "channelRequestRate": 0 if not opts.rate_limit else 10.0,
+        "userRequestRate": 0 if not opts.rate_limit else 2.0,
+        "moveDebounce": 0 if not opts.rate_limit else 1.0,
+        "maxTables": 0,
+        "maxActiveGames": 0,
+    }
+
+
+async def run(opts) -> dict:
+    main_module = load_plugin()
+    results = {}
+    for name in opts.only:
+        h = Harness(main_module, plugin_config(opts))
+        start = time.perf_counter()
+        try:
+            results[name] = await SCENARIOS[name](h, opts, random.Random(opts.seed))
+        finally:
+            await h.close()
+        print(f"[{name}] 完成，用时 {time.perf_counter() - start:.1f} 秒", file=sys.stderr)
+    return results
+
+
+def _latencies(node, path=""):
+    """遍历结果树，产出 (路径, 延迟摘要) 对"""
+    if isinstance(node, dict):
+        if "p50_us" in node:
+            yield path, node
+            return
+        for key, value in node.items():
+            yield from _latencies(value, f"{path}.{key}" if path else key)
+
+
+def _throughputs(node, path=""):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            sub = f"{path}.{key}" if path else key
+            if key in ("msgs_per_sec", "ops_per_sec", "rss_per_game_bytes",
+                       "overhead_pct_of_fire_p50", "measured_overhead_pct_p50", "nodes_per_sec",
+                       "bytes_per_game", "traced_bytes_per_game", "fire_alloc_bytes_per_op",
+                       "item_alloc_bytes_per_op"):
+                yield sub, value
+            else:
+                yield from _throughputs(value, sub)
+
+
+def summarize(results: dict) -> str:
+    lines = []
+    for path, lat in _latencies(results):
+        lines.append(f"{path:<48} p50 {lat['p50_us']:>9.1f}us  p99 {lat['p99_us']:>9.1f}us  n={lat['count']}")
+    for path, value in _throughputs(results):
+        lines.append(f"{path:<48} {value:,.1f}")
+    return "\n".join(lines)
+
+
+def compare(old: dict, new: dict) -> str:
+    """按相同路径对比两份结果：延迟为 新/旧 倍数（>1 变慢），吞吐为 新/旧 倍数（<1 变慢）"""
+    lines = [f"对比 {old['meta']['version']} ({old['meta']['timestamp']}) -> {new['meta']['version']}"]
+    before = dict(_latencies(old["results"]))
+    for path, lat in _latencies(new["results"]):
+        ref = before.get(path)
+        if ref and ref.get("p50_us") and ref.get("p99_us"):
+            lines.append(
+                f"{path:<48} p50 x{lat['p50_us'] / ref['p50_us']:.2f}  p99 x{lat['p99_us'] / ref['p99_us']:.2f}"
+            )
+    before = dict(_throughputs(old["results"]))
+    for path, value in _throughputs(new["results"]):
+        if before.get(path):
+            lines.append(f"{path:<48} x{value / before[path]:.2f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="恶魔轮盘基准与压测")
+    parser.add_argument("--only", default=",".join(SCENARIOS),
+                        help=f"要运行的场景，逗号分隔（可选：{', '.join(SCENARIOS)}）")
+    parser.add_argument("--quick", action="store_true", help="缩小规模，快速冒烟")
+    parser.add_argument("--iterations", type=int, default=2000, help="每个微基准的迭代次数")
+    parser.add_argument("--games", type=int, default=10000, help="内存场景中的进行中对局数")
+    parser.add_argument("--games-e2e", type=int, default=2000, help="端到端场景的完整对局数")
+    parser.add_argument("--channels", type=int, default=2000, help="合成负载的群数")
+    parser.add_argument("--messages", type=int, default=200000, help="合成负载的消息总数")
+    parser.add_argument("--concurrency", type=int, default=500, help="合成负载每批并发处理的消息数")
+    parser.add_argument("--stats-games", type=int, default=1000000, help="战绩库场景写入的对局数")
+    parser.add_argument("--replay-games", type=int, default=100000, help="回放场景记录并重放的对局数")
+    parser.add_argument("--parked-games", type=int, default=100000, help="休眠场景中的对局数")
+    parser.add_argument("--workers", type=int, default=4, help="多进程场景的工作进程数")
+    parser.add_argument("--cluster-seconds", type=float, default=5.0, help="多进程场景每轮运行的秒数")
+    parser.add_argument("--cluster-channels", type=int, default=8, help="多进程场景中各进程共同服务的群数")
+    parser.add_argument("--move-ratio", type=float, default=0.15, help="合成负载中游戏操作所占比例")
+    parser.add_argument("--journal", action="store_true", help="开启游戏日志与战绩库（写入临时目录）")
+    parser.add_argument("--rate-limit", action="store_true", help="使用默认的出站限流与入站流控参数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("-o", "--output", help="结果 JSON 路径，默认 bench-<版本>-<时间>.json")
+    parser.add_argument("--compare", help="与之对比的旧结果 JSON")
+    opts = parser.parse_args(argv)
+    opts.only = [s for s in opts.only.split(",") if s]
+    unknown = [s for s in opts.only if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景：{', '.join(unknown)}")
+    if opts.quick:
+        opts.iterations, opts.games, opts.games_e2e = 200, 1000, 200
+        opts.channels, opts.messages = 200, 20000
+        opts.stats_games = 50000
+        opts.replay_games = 5000
+        opts.parked_games = 5000
+        opts.cluster_seconds = 2.0
+
+    version = plugin_version()
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    output = os.path.abspath(opts.output or f"bench-{version}-{stamp}.json")
+    baseline = None
+    if opts.compare:
+        with open(opts.compare, encoding="utf-8") as fp:
+            baseline = json.load(fp)
+
+    # 插件的数据目录是相对路径，在临时目录中运行以免污染当前目录
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            results = asyncio.run(run(opts))
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "meta": {
+            "version": version,
+            "timestamp": stamp,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": {k: v for k, v in vars(opts).items() if k not in ("output", "compare")},
+        },
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as fp:
+        json.dump(report, fp, ensure_ascii=False, indent=2)
+    print(summarize(results))
+    if baseline is not None:
+        print(compare(baseline, report))
+    print(f"结果已保存到 {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# bench/cluster.py
+"""
+多进程共享存储压测。
+
+N 个工作进程各自运行一个插件实例，连接同一个共享存储（SQLite 文件，或 respserver 提供的 Redis 协议替身），
+在同一批群里随机地创建、加入、开始对局并代当前玩家开枪或使用道具；
+每个进程的缓存都可能落后于其它进程的写入，由插件的版本校验与冲突重试保证一致。
+
+每种后端分别以 1 个与 N 个进程运行，报告成功写入的操作吞吐、版本冲突率（冲突 / (写入 + 冲突)）、
+重新读取次数与放弃的操作数，并做两项一致性检查：
+  - 各群群版本之和应等于所有进程成功写入的次数（没有丢失或重复的写入）；
+  - 存储中的每局都能按种子重放操作流得到相同的状态（没有被交错写坏的对局）。
+"""
+import asyncio
+import multiprocessing
+import os
+import random
+import time
+
+from .. import replay
+from ..state import GameState
+from ..store import open_store
+from .stubs import load_plugin
+
+
+def _worker_config(url: str) -> dict:
+    return {
+        "journal": False,
+        "stats": False,
+        "channelRate": 1e9,
+        "platformRate": 1e9,
+        "channelRequestRate": 0,
+        "userRequestRate": 0,
+        "moveDebounce": 0,
+        "maxTables": 0,
+        "store": url,
+    }
+
+
+async def _drive(h, channels: list, seconds: float, rng) -> dict:
+    p = h.plugin
+    attempts = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        cid = rng.choice(channels)
+        a, b = h.players(cid)
+        await p._channel(h.event("", a, cid))
+        game = h.game(cid)
+        if game is None:
+            await h.call(p.create_game, h.event("/恶魔轮盘 创建游戏", a, cid))
+        elif game.status == "waiting":
+            await h.call(p.join_game, h.event("/恶魔轮盘 加入游戏", b, cid))
+        elif game.status == "full":
+            await h.call(p.start_game, h.event("/恶魔轮盘 开始游戏", a, cid))
+        else:
+            await h.call(p.on_message, h.event(h.move_for(game, rng), game.current.id, cid))
+        attempts += 1
+    elapsed = time.perf_counter() - start
+    store = p.metrics.counter_values("store")
+    return {"attempts": attempts, "elapsed": elapsed, **{k: store.get(k, 0) for k in
+                                                          ("write", "conflict", "reload", "gave_up")}}
+
+
+def _worker(url: str, channels: list, seconds: float, seed: int, ready, go, results):
+    # 子进程中才导入场景模块，避免与 scenarios 的循环导入
+    from .scenarios import Harness
+
+    main_module = load_plugin()
+    h = Harness(main_module, _worker_config(url))
+
+    async def run():
+        try:
+            ready.put(os.getpid())
+            await asyncio.to_thread(go.wait)
+            return await _drive(h, channels, seconds, random.Random(seed))
+        finally:
+            await h.close()
+
+    results.put(asyncio.run(run()))
+
+
+def _check(url: str, data_dir: str, channels: list) -> dict:
+    """一致性检查：群版本之和（即存储记录到的写入次数）与各局能否重放"""
+    store = open_store(url, data_dir)
+    try:
+        writes = sum(store.channel_version(cid) for cid in channels)
+        games = replayable = 0
+        for cid in channels:
+            for gid in store.versions(cid):
+                _, rec = store.load(gid)
+                games += 1
+                replayable += replay.restore(GameState.from_record(rec))
+    finally:
+        store.close()
+    return {"store_writes": writes, "live_games": games, "replayable_games": replayable}
+
+
+def run_cluster(url: str, data_dir: str, workers: int, channels: list, seconds: float, seed: int) -> dict:
+    """启动 workers 个工作进程在 channels 上运行 seconds 秒（阻塞），返回汇总结果与一致性检查"""
+    ctx = multiprocessing.get_context("spawn")
+    ready, results, go = ctx.Queue(), ctx.Queue(), ctx.Event()
+    procs = [
+        ctx.Process(target=_worker, args=(url, channels, seconds, seed * 1000 + i, ready, go, results))
+        for i in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    for _ in procs:
+        ready.get(timeout=60)
+    go.set()
+    per_worker = [results.get(timeout=seconds + 120) for _ in procs]
+    for proc in procs:
+        proc.join(30)
+    total = {k: sum(w[k] for w in per_worker) for k in ("attempts", "write", "conflict", "reload", "gave_up")}
+    elapsed = max(w["elapsed"] for w in per_worker)
+    check = _check(url, data_dir, channels)
+    return {
+        "workers": workers,
+        **total,
+        "ops_per_sec": total["write"] / elapsed if elapsed else 0.0,
+        "conflict_rate": total["conflict"] / (total["write"] + total["conflict"]) if total["write"] else 0.0,
+        **check,
+        "lost_or_duplicate_writes": check["store_writes"] - total["write"],
+    }
@@ -0,0 +1,210 @@
+# bench/respserver.py
+"""
+Redis 协议（RESP2）的本地替身服务，供 RedisStore 的测试与多进程压测使用，无需安装 Redis。
+
+只实现 RedisStore 用到的命令：PING / AUTH / SELECT / GET / SET / MGET / DEL / EXISTS / INCR /
+HSET / HDEL / HGETALL / WATCH / UNWATCH / MULTI / EXEC / DISCARD / FLUSHALL，
+语义与 Redis 一致：单线程执行，MULTI 之后的命令排队到 EXEC 时原子执行，
+WATCH 的键在 EXEC 之前被任何连接改动过则 EXEC 返回空数组。不支持过期、持久化与多库（SELECT 仅应答）。
+
+单独运行：python -m <插件包>.bench.respserver --port 6390
+"""
+import argparse
+import asyncio
+import threading
+
+WRITES = frozenset((b"SET", b"DEL", b"INCR", b"HSET", b"HDEL"))
+
+
+class RespServer:
+    """内存键值服务：字符串值为 bytes，哈希值为 dict"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.data = {}
+        self._touched = {}  # 键 -> 改动计数，供 WATCH 比较
+        self._server = None
+        self._loop = None
+        self._thread = None
+        self.commands = 0
+
+    # ------------- 命令 -------------
+    def _touch(self, key: bytes):
+        self._touched[key] = self._touched.get(key, 0) + 1
+
+    def _execute(self, cmd: bytes, args: list):
+        data = self.data
+        if cmd in WRITES:
+            self._touch(args[0])
+        if cmd == b"GET":
+            return data.get(args[0])
+        if cmd == b"SET":
+            data[args[0]] = args[1]
+            return "OK"
+        if cmd == b"MGET":
+            return [data.get(k) for k in args]
+        if cmd == b"DEL":
+            n = 0
+            for k in args:
+                if data.pop(k, None) is not None:
+                    n += 1
+                    self._touch(k)
+            return n
+        if cmd == b"EXISTS":
+            return sum(1 for k in args if k in data)
+        if cmd == b"INCR":
+            v = int(data.get(args[0], b"0")) + 1
+            data[args[0]] = b"%d" % v
+            return v
+        if cmd == b"HSET":
+            h = data.setdefault(args[0], {})
+            added = 0
+            for i in range(1, len(args), 2):
+                added += args[i] not in h
+                h[args[i]] = args[i + 1]
+            return added
+        if cmd == b"HDEL":
+            h = data.get(args[0], {})
+            n = sum(1 for f in args[1:] if h.pop(f, None) is not None)
+            if not h:
+                data.pop(args[0], None)
+            return n
+        if cmd == b"HGETALL":
+            return [x for kv in data.get(args[0], {}).items() for x in kv]
+        if cmd == b"FLUSHALL":
+            for k in data:
+                self._touch(k)
+            data.clear()
+            return "OK"
+        if cmd == b"PING":
+            return "PONG"
+        if cmd in (b"AUTH", b"SELECT"):
+            return "OK"
+        return Exception(f"ERR unknown command '{cmd.decode(errors='replace')}'")
+
+    # ------------- 协议 -------------
+    @staticmethod
+    def _encode(value, out: bytearray):
+        if value is None:
+            out += b"$-1\r\n"
+        elif isinstance(value, Exception):
+            out += b"-%s\r\n" % str(value).encode()
+        elif isinstance(value, str):
+            out += b"+%s\r\n" % value.encode()
+        elif isinstance(value, int):
+            out += b":%d\r\n" % value
+        elif isinstance(value, bytes):
+            out += b"$%d\r\n%s\r\n" % (len(value), value)
+        else:
+            out += b"*%d\r\n" % len(value)
+            for v in value:
+                RespServer._encode(v, out)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        watched = {}
+        queued = None  # MULTI 之后排队的命令，None 表示不在事务中
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                n = int(line[1:-2])
+                parts = []
+                for _ in range(n):
+                    size = int((await reader.readline())[1:-2])
+                    parts.append((await reader.readexactly(size + 2))[:-2])
+                cmd, args = parts[0].upper(), parts[1:]
+                self.commands += 1
+                if cmd == b"MULTI":
+                    queued, reply = [], "OK"
+                elif cmd == b"EXEC":
+                    if queued is None:
+                        reply = Exception("ERR EXEC without MULTI")
+                    elif any(self._touched.get(k, 0) != v for k, v in watched.items()):
+                        reply = None
+                    else:
+                        reply = [self._execute(c, a) for c, a in queued]
+                    queued = None
+                    watched.clear()
+                    if reply is None:
+                        writer.write(b"*-1\r\n")
+                        await writer.drain()
+                        continue
+                elif cmd == b"DISCARD":
+                    queued, reply = None, "OK"
+                    watched.clear()
+                elif cmd == b"WATCH":
+                    for k in args:
+                        watched.setdefault(k, self._touched.get(k, 0))
+                    reply = "OK"
+                elif cmd == b"UNWATCH":
+                    watched.clear()
+                    reply = "OK"
+                elif queued is not None:
+                    queued.append((cmd, args))
+                    reply = "QUEUED"
+                else:
+                    reply = self._execute(cmd, args)
+                out = bytearray()
+                self._encode(reply, out)
+                writer.write(out)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    # ------------- 运行 -------------
+    async def serve(self):
+        """在当前事件循环中启动服务，返回实际监听的端口"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    def start(self) -> int:
+        """在后台线程中运行服务，返回监听端口"""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.serve())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="resp-server", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.port
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Redis 协议的本地替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    opts = parser.parse_args(argv)
+    server = RespServer(opts.host, opts.port)
+
+    async def run():
+        await server.serve()
+        print(f"监听 {server.url}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
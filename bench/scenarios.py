@@ -0,0 +1,1658 @@
+# bench/scenarios.py
+"""
+基准场景。
+
+每个场景是一个协程函数 scenario(h, opts, rng) -> 结果 dict，
+h 为全新的 Harness（一个独立的插件实例），opts 为命令行参数。
+延迟统一以微秒报告，测量的是一次处理函数调用（消费完其异步生成器）所用的时间。
+"""
+import asyncio
+import functools
+import gc
+import json
+import math
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from .. import ai, board, engine, registry, replay, selfplay
+from ..inbound import FloodGuard
+from ..journal import GameJournal
+from ..magazine import Magazine
+from ..matchmaking import MatchQueue
+from ..metrics import Metrics
+from ..profiler import SamplingProfiler, supported as profiling_supported
+from ..scheduler import TimerScheduler
+from ..stats import GameResult, StatsStore
+from ..state import GameState, PlayerState, ITEM_NAMES, ITEM_INDEX, MAX_HP, MAX_ITEMS
+from ..store import open_store
+from .cluster import run_cluster
+from .respserver import RespServer
+from .stubs import AstrMessageEvent, Context
+
+ADMIN = "bench-admin"
+FIRE = ("自己", "对方")
+# 合成负载中的闲聊文本：多数与游戏无关，少数是关键词但往往不是当前玩家发出的
+CHATTER = (
+    "哈哈哈", "在吗", "今天吃什么", "+1", "？", "收到", "晚安", "[图片]", "/help",
+    "这把我要赢", "有人打游戏吗", "自己", "对方", "啤酒", "放大镜",
+    "恶魔轮盘真好玩，手锯配实弹直接两血", "https://example.com/some/long/link?ref=chat",
+)
+MAX_MOVES = 1000
+
+
+class Latency:
+    """延迟样本（纳秒）"""
+
+    __slots__ = ("samples",)
+
+    def __init__(self):
+        self.samples = []
+
+    def add(self, ns: int):
+        self.samples.append(ns)
+
+    def summary(self) -> dict:
+        s = sorted(self.samples)
+        n = len(s)
+        if not n:
+            return {"count": 0}
+
+        def pct(q):
+            return s[max(0, math.ceil(q * n) - 1)] / 1000
+
+        return {
+            "count": n,
+            "mean_us": sum(s) / n / 1000,
+            "p50_us": pct(0.50),
+            "p99_us": pct(0.99),
+            "max_us": s[-1] / 1000,
+        }
+
+
+def rss_bytes() -> int:
+    """当前进程常驻内存（Linux 读 /proc，其它平台退化为峰值 RSS）"""
+    try:
+        with open("/proc/self/statm") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class Harness:
+    """包装一个插件实例，提供事件构造、计时调用与开局等辅助方法"""
+
+    def __init__(self, main_module, config: dict):
+        self.plugin = main_module.BuckshotRoulette(Context(), config)
+        self.game_key = main_module.game_key
+
+    def game(self, cid: str, table: int = 1):
+        """该群指定牌桌（默认 1 号桌）的游戏，不存在时为 None"""
+        return self.plugin.games.get(self.game_key(cid, table))
+
+    @staticmethod
+    def event(text: str, sender: str, cid: str) -> AstrMessageEvent:
+        return AstrMessageEvent(text, sender, group=cid)
+
+    @staticmethod
+    def players(cid: str) -> tuple:
+        return f"{cid}:a", f"{cid}:b"
+
+    async def call(self, handler, *args) -> int:
+        """调用一个处理函数并消费完其全部回复，返回耗时（纳秒）"""
+        start = time.perf_counter_ns()
+        async for _ in handler(*args):
+            pass
+        return time.perf_counter_ns() - start
+
+    async def new_game(self, cid: str, lat: Latency = None):
+        """通过指令依次创建、加入并开始一局游戏，返回 GameState"""
+        p = self.plugin
+        a, b = self.players(cid)
+        for handler, sender, text in (
+            (p.create_game, a, "/恶魔轮盘 创建游戏"),
+            (p.join_game, b, "/恶魔轮盘 加入游戏"),
+            (p.start_game, a, "/恶魔轮盘 开始游戏"),
+        ):
+            ns = await self.call(handler, self.event(text, sender, cid))
+            if lat is not None:
+                lat.add(ns)
+        return self.game(cid)
+
+    async def ensure_game(self, cid: str):
+        game = self.game(cid)
+        if game is None or game.status != "started":
+            if game is not None:
+                await self.call(self.plugin.end_game, self.event("", ADMIN, cid))
+            game = await self.new_game(cid)
+        return game
+
+    async def give(self, cid: str, player_id: str, item: str, n: int = 1):
+        await self.call(self.plugin.debug_give_item, self.event("", ADMIN, cid), player_id, item, n)
+
+    async def heal(self, cid: str, game: GameState):
+        for pl in game.players:
+            if pl.hp != MAX_HP:
+                await self.call(self.plugin.debug_set_hp, self.event("", ADMIN, cid), pl.id, MAX_HP)
+
+    @staticmethod
+    def move_for(game: GameState, rng) -> str:
+        """随机选择当前玩家的一个合法操作：开枪或使用一个持有的道具"""
+        options = [*FIRE, *dict.fromkeys(game.current.items.names())]
+        return rng.choice(options)
+
+    async def close(self):
+        await self.plugin.terminate()
+
+
+# ------------- 内存 -------------
+
+async def memory(h: Harness, opts, rng) -> dict:
+    """
+    创建大量进行中的对局，按 RSS 增量估算每局内存占用（含插件的索引与定时器）。
+    state 一项只比较游戏状态本身：slotted GameState 与旧的嵌套 dict（_legacy_game）各建 --games 局，
+    用 tracemalloc 统计每局占用的字节数，并对同样的开枪与道具（啤酒）操作统计每次操作分配的峰值字节数与耗时。
+    """
+    gc.collect()
+    base = rss_bytes()
+    for i in range(opts.games):
+        await h.new_game(f"mem{i}")
+    gc.collect()
+    grown = rss_bytes() - base
+    return {
+        "live_games": len(h.plugin.games),
+        "rss_delta_bytes": grown,
+        "rss_per_game_bytes": grown / opts.games if opts.games else 0,
+        "state": _state_memory(opts.games, opts.iterations * 10, rng),
+    }
+
+
+def _legacy_game(rng) -> dict:
+    """slotted GameState 之前的游戏状态：玩家为 dict、道具为名称列表、弹夹为字符串列表，按 "player1"/"player2" 取玩家"""
+    def player(i):
+        return {"name": f"玩家{i}", "id": str(i), "hp": MAX_HP,
+                "item": [rng.choice(ITEM_NAMES) for _ in range(4)], "handcuff": False, "shield": False}
+
+    return {"player1": player(1), "player2": player(2), "status": "started", "bullet": _legacy_magazine(rng),
+            "currentTurn": rng.randint(1, 2), "double": False, "round": 0, "usedHandcuff": False}
+
+
+def _legacy_next_round(game: dict, rng):
+    game["round"] += 1
+    game["bullet"] = _legacy_magazine(rng)
+    pool = list(ITEM_NAMES)
+    for _ in range(rng.randint(2, 5)):
+        game[f"player{game['currentTurn']}"]["item"].append(rng.choice(pool))
+        game[f"player{1 if game['currentTurn'] == 2 else 2}"]["item"].append(rng.choice(pool))
+    game["player1"]["item"] = game["player1"]["item"][:MAX_ITEMS]
+    game["player2"]["item"] = game["player2"]["item"][:MAX_ITEMS]
+
+
+def _legacy_fire(game: dict, at_self: bool, rng):
+    """旧实现开枪时对状态的修改（不含文本）"""
+    cur_p = f"player{game['currentTurn']}"
+    oth_p = f"player{1 if game['currentTurn'] == 2 else 2}"
+    bullet = game["bullet"].pop() if game["bullet"] else None
+    if not bullet:
+        _legacy_next_round(game, rng)
+        return
+    if bullet == "实弹":
+        damage = 2 if game["double"] else 1
+        if at_self:
+            game[cur_p]["hp"] -= damage
+        elif game[oth_p].get("shield", False):
+            game[oth_p]["shield"] = False
+        else:
+            game[oth_p]["hp"] -= damage
+    if not (bullet == "空包弹" and at_self):
+        if not game[oth_p]["handcuff"]:
+            game["currentTurn"] = 1 if game["currentTurn"] == 2 else 2
+            game["usedHandcuff"] = False
+        else:
+            game[oth_p]["handcuff"] = False
+    game["double"] = False
+    if len(game["bullet"]) == 0:
+        _legacy_next_round(game, rng)
+
+
+def _legacy_beer(game: dict, rng):
+    """旧实现使用啤酒时对状态的修改（不含文本）"""
+    cur_p = f"player{game['currentTurn']}"
+    if game["bullet"]:
+        game["bullet"].pop()
+        if len(game["bullet"]) == 0:
+            _legacy_next_round(game, rng)
+    if "啤酒" in game[cur_p]["item"]:
+        game[cur_p]["item"].remove("啤酒")
+
+
+def _state_memory(games: int, actions: int, rng) -> dict:
+    beer = ITEM_INDEX["啤酒"]
+
+    def slotted():
+        game = GameState(PlayerState("玩家1", "1"))
+        game.players[1] = PlayerState("玩家2", "2")
+        engine.start(game, rng)
+        return game
+
+    def slotted_fire(game):
+        for p in game.players:
+            p.hp = MAX_HP
+        engine.fire(game, rng.random() < 0.5, rng)
+
+    def slotted_beer(game):
+        game.current.items.add(beer)
+        engine.use_item(game, beer, rng)
+
+    def legacy_fire(game):
+        game["player1"]["hp"] = game["player2"]["hp"] = MAX_HP
+        _legacy_fire(game, rng.random() < 0.5, rng)
+
+    def legacy_beer(game):
+        game[f"player{game['currentTurn']}"]["item"].append("啤酒")
+        _legacy_beer(game, rng)
+
+    res = {}
+    for name, make, fire, use in (("slotted", slotted, slotted_fire, slotted_beer),
+                                  ("legacy_dict", functools.partial(_legacy_game, rng), legacy_fire, legacy_beer)):
+        gc.collect()
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        held = [make() for _ in range(games)]
+        per_game = (tracemalloc.get_traced_memory()[0] - base) / games
+        out = {"traced_bytes_per_game": per_game}
+        for action, fn in (("fire", fire), ("item", use)):
+            peak = 0
+            for i in range(actions):
+                game = held[i % games]
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                fn(game)
+                peak += tracemalloc.get_traced_memory()[1] - before
+            out[f"{action}_alloc_bytes_per_op"] = peak / actions
+        tracemalloc.stop()
+        for action, fn in (("fire", fire), ("item", use)):
+            start = time.perf_counter_ns()
+            for i in range(actions):
+                fn(held[i % games])
+            out[action] = _per_op(time.perf_counter_ns() - start, actions)
+        res[name] = out
+        del held
+    new, old = res["slotted"], res["legacy_dict"]
+    res["legacy_ratio"] = {
+        key: old[key] / new[key] if new[key] else 0.0
+        for key in ("traced_bytes_per_game", "fire_alloc_bytes_per_op", "item_alloc_bytes_per_op")
+    }
+    return res
+
+
+# ------------- 休眠 -------------
+
+PARK_BUDGET = 1000
+PARK_EVERY = 100  # 开局阶段每开这么多局执行一次休眠检查
+
+
+async def hibernate(h: Harness, opts, rng) -> dict:
+    """
+    休眠：以 1000 局为内存预算依次开 --parked-games 局（默认十万局，各在一个群），超出预算的最久未活动的牌桌休眠到 hibernate.db。
+    休眠检查本由定时器每 HIBERNATE_TICK 秒触发，这里每开 PARK_EVERY 局、每发一条消息后直接执行一次，结果不受开局速度影响。
+    报告每局新增的常驻内存（与 memory 场景中全部留在内存的每局占用对比）、休眠库中每局的字节数、开局速度，
+    向休眠的群发一条闲聊的耗时（不唤醒，chatter_woke 应为 0），
+    向休眠的群发一条开枪消息的耗时（含在线程中读取、重放重建）与向内存中的群开枪的耗时，
+    以及每次休眠检查的耗时与其间事件循环的调度延迟（休眠库的写入在线程中进行，期间事件循环照常调度）。
+    """
+    p = h.plugin
+    p.config["maxActiveGames"] = PARK_BUDGET
+    n = opts.parked_games
+    tick, lag = Latency(), Latency()
+
+    async def hibernate_tick():
+        if len(p.games) <= PARK_BUDGET:
+            return
+        done = False
+
+        async def ticker():
+            while not done:
+                begin = time.perf_counter_ns()
+                await asyncio.sleep(0.001)
+                lag.add(max(0, time.perf_counter_ns() - begin - 1_000_000))
+
+        probe = asyncio.create_task(ticker())
+        begin = time.perf_counter_ns()
+        await p._hibernate()
+        tick.add(time.perf_counter_ns() - begin)
+        done = True
+        await probe
+
+    gc.collect()
+    base = rss_bytes()
+    start = time.perf_counter_ns()
+    for i in range(n):
+        await h.new_game(f"park{i}")
+        if i % PARK_EVERY == PARK_EVERY - 1:
+            await hibernate_tick()
+    await hibernate_tick()
+    elapsed = time.perf_counter_ns() - start
+    gc.collect()
+    grown = rss_bytes() - base
+    parked = p.hibernation.count()
+    await asyncio.to_thread(p.hibernation.checkpoint)
+    res = {
+        "games": n,
+        "live_games": len(p.games),
+        "parked_games": parked,
+        "rss_delta_bytes": grown,
+        "rss_per_game_bytes": grown / n if n else 0,
+        "db_bytes_per_game": p.hibernation.stats()["db_bytes"] / parked if parked else 0,
+        "open_game": _per_op(elapsed, n),
+    }
+    chatter, woken = Latency(), 0
+    for _ in range(opts.iterations):
+        # 休眠的群中的闲聊：同步判断后直接过滤，不唤醒
+        cid = f"park{rng.randrange(n)}"
+        parked_before = h.game(cid) is None
+        chatter.add(await h.call(p.on_message, h.event("哈哈哈", h.players(cid)[0], cid)))
+        woken += parked_before and h.game(cid) is not None
+    res["chatter_parked"] = chatter.summary()
+    res["chatter_woke"] = woken
+    wake, live = Latency(), Latency()
+    for _ in range(opts.iterations):
+        cid = f"park{rng.randrange(n)}"
+        a, b = h.players(cid)
+        lat = live if h.game(cid) is not None else wake
+        # 唤醒前不知道轮到谁，以玩家1发言计时；轮到玩家2时再由其开枪（不计时）
+        lat.add(await h.call(p.on_message, h.event(rng.choice(FIRE), a, cid)))
+        game = h.game(cid)
+        if game is not None and game.status == "started" and game.current.id == b:
+            await h.call(p.on_message, h.event(rng.choice(FIRE), b, cid))
+        await hibernate_tick()
+    res["message_parked"] = wake.summary()
+    res["message_live"] = live.summary()
+    res["hibernate_tick"] = tick.summary()
+    res["loop_lag_during_tick"] = lag.summary()
+    return res
+
+
+# ------------- 底层组件 -------------
+
+def _per_op(ns: int, n: int) -> dict:
+    return {"ops": n, "ns_per_op": ns / n, "ops_per_sec": n * 1e9 / ns if ns else 0.0}
+
+
+def _legacy_magazine(rng) -> list:
+    """位图弹夹之前的实现：3~8 发，每发各 50% 为实弹或空包弹，再洗牌；末尾为下一发"""
+    bullets = ["实弹" if rng.random() < 0.5 else "空包弹" for _ in range(rng.randint(3, 8))]
+    rng.shuffle(bullets)
+    return bullets
+
+
+async def components(h: Harness, opts, rng) -> dict:
+    """
+    各组件的微基准。弹夹一项对比位图 Magazine 与旧的字符串列表实现（magazine_list_*）：
+    生成并逐发取空、统计剩余实弹数、查看下一发；旧实现从列表末尾取弹，pop(0) 一项给出从头部取弹的代价。
+    位图只在内存与取弹、统计上占优：查看下一发经 peek() 多一次方法调用，比列表下标取值慢，
+    magazine_peek_inline 给出不经方法调用、直接移位取位的耗时。
+    """
+    n = opts.iterations * 100
+    res = {}
+
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        mag = Magazine.random(rng)
+        while mag:
+            mag.pop()
+    res["magazine_generate_and_drain"] = _per_op(time.perf_counter_ns() - start, n)
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        bullets = _legacy_magazine(rng)
+        while bullets:
+            bullets.pop()
+    res["magazine_list_generate_and_drain"] = _per_op(time.perf_counter_ns() - start, n)
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        bullets = _legacy_magazine(rng)
+        while bullets:
+            bullets.pop(0)
+    res["magazine_list_generate_and_drain_front"] = _per_op(time.perf_counter_ns() - start, n)
+    mags = [Magazine.random(rng) for _ in range(1000)]
+    lists = [_legacy_magazine(rng) for _ in range(1000)]
+    start = time.perf_counter_ns()
+    for i in range(n):
+        mags[i % 1000].live
+    res["magazine_count_live"] = _per_op(time.perf_counter_ns() - start, n)
+    start = time.perf_counter_ns()
+    for i in range(n):
+        sum(1 for b in lists[i % 1000] if b == "实弹")
+    res["magazine_list_count_live"] = _per_op(time.perf_counter_ns() - start, n)
+    start = time.perf_counter_ns()
+    for i in range(n):
+        mags[i % 1000].peek()
+    res["magazine_peek"] = _per_op(time.perf_counter_ns() - start, n)
+    start = time.perf_counter_ns()
+    for i in range(n):
+        mag = mags[i % 1000]
+        mag.bits >> (mag.size - 1) & 1 == 1
+    res["magazine_peek_inline"] = _per_op(time.perf_counter_ns() - start, n)
+    start = time.perf_counter_ns()
+    for i in range(n):
+        lists[i % 1000][-1] == "实弹"
+    res["magazine_list_peek"] = _per_op(time.perf_counter_ns() - start, n)
+
+    tpl = h.plugin.templates
+    counts = bytes([1, 0, 2, 1, 0, 1, 0, 0, 1, 1, 1])
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        tpl.inventory(counts, registry.DEFAULT_TABLE)
+    res["template_inventory"] = _per_op(time.perf_counter_ns() - start, n)
+
+    sched = TimerScheduler()
+    start = time.perf_counter_ns()
+    timers = [sched.call_later(3600 + i * 1e-3, _noop) for i in range(n)]
+    res["timer_schedule"] = _per_op(time.perf_counter_ns() - start, n)
+    start = time.perf_counter_ns()
+    for t in timers:
+        t.cancel()
+    res["timer_cancel"] = _per_op(time.perf_counter_ns() - start, n)
+    sched.close()
+    await sched.wait_closed()
+    res["timers_100k"] = await _timer_load(rng)
+
+    game = GameState(PlayerState("a", "1"))
+    game.players[1] = PlayerState("b", "2")
+    engine.start(game, rng)
+    rec = game.to_record()
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = GameJournal(tmp)
+        journal.start()
+        await asyncio.to_thread(journal.loaded.wait)
+        start = time.perf_counter_ns()
+        for i in range(n):
+            journal.record("fire", f"g{i % 1000}", rec)
+        enqueued = time.perf_counter_ns() - start
+        await asyncio.to_thread(journal.close, 120.0)
+        durable = time.perf_counter_ns() - start
+    res["journal_record"] = _per_op(enqueued, n)
+    res["journal_durable"] = _per_op(durable, n)
+    res["journal_long_game"] = await _journal_long_game(game)
+    return res
+
+
+# 日志字节数对比中一局的操作数，每步向操作流追加 2 字节
+JOURNAL_ACTIONS = 500
+
+
+async def _journal_long_game(game: GameState) -> dict:
+    """
+    一局打到 JOURNAL_ACTIONS 步时每条日志记录的平均字符数：每条记录只带新增的操作（delta），
+    对比每条都带完整操作流的旧格式（full_log，随对局长度线性增长）。
+    """
+    game.log = bytearray()
+    full = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = GameJournal(tmp)
+        journal.start()
+        await asyncio.to_thread(journal.loaded.wait)
+        for _ in range(JOURNAL_ACTIONS):
+            game.log += b"\x01\x02"
+            rec = game.to_record()
+            full += len(json.dumps(["fire", "g", rec], ensure_ascii=False, separators=(",", ":"))) + 1
+            journal.record("fire", "g", rec)
+        await asyncio.to_thread(journal.close, 120.0)
+        delta = journal.written
+    return {
+        "actions": JOURNAL_ACTIONS,
+        "delta_chars_per_record": delta / JOURNAL_ACTIONS,
+        "full_log_chars_per_record": full / JOURNAL_ACTIONS,
+        "ratio": full / delta if delta else 0.0,
+    }
+
+
+def _noop():
+    pass
+
+
+# 定时器压力测试的定时器数，与它们在压力测试期间陆续触发的时间范围（秒）
+TIMER_LOAD = 100_000
+TIMER_SPREAD = (0.2, 300.0)
+
+
+async def _loop_lag(seconds: float = 1.0, period: float = 0.01) -> dict:
+    """事件循环调度延迟：每 period 秒用 call_later 安排一次探针，记录实际执行时间比预定晚了多少"""
+    loop = asyncio.get_running_loop()
+    lat = Latency()
+    done = loop.create_future()
+    end = loop.time() + seconds
+
+    def probe(expected: float):
+        now = loop.time()
+        lat.add(int((now - expected) * 1e9))
+        if now >= end:
+            done.set_result(None)
+        else:
+            loop.call_later(period, probe, now + period)
+
+    loop.call_later(period, probe, loop.time() + period)
+    await done
+    return lat.summary()
+
+
+async def _sleep_then(delay: float):
+    await asyncio.sleep(delay)
+
+
+async def _timer_load(rng) -> dict:
+    """
+    挂起 10 万个定时器（其中一部分在测量期间陆续触发）时的内存与事件循环延迟：
+    scheduler 为 TimerScheduler，tasks 为旧实现的每个超时一个 sleep 任务；idle 为没有定时器时的循环延迟。
+    每种实现先在 tracemalloc 下挂起一遍统计 Python 分配的字节数，再不带 tracemalloc 挂起一遍测 RSS 增量与循环延迟。
+    """
+    delays = [rng.uniform(*TIMER_SPREAD) for _ in range(TIMER_LOAD)]
+    res = {"timers": TIMER_LOAD, "idle": {"loop_lag": await _loop_lag()}}
+
+    async def arm_scheduler():
+        sched = TimerScheduler()
+        timers = [sched.call_later(d, _noop) for d in delays]
+
+        async def close():
+            sched.close()
+            await sched.wait_closed()
+        return close, timers
+
+    async def arm_tasks():
+        tasks = [asyncio.create_task(_sleep_then(d)) for d in delays]
+        await asyncio.sleep(0)  # 让任务都进入 sleep
+
+        async def close():
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return close, tasks
+
+    for name, arm in (("scheduler", arm_scheduler), ("tasks", arm_tasks)):
+        out = {}
+        for traced in (True, False):
+            gc.collect()
+            if traced:
+                tracemalloc.start()
+                base = tracemalloc.get_traced_memory()[0]
+            else:
+                rss = rss_bytes()
+            start = time.perf_counter_ns()
+            close, handles = await arm()
+            armed = time.perf_counter_ns() - start
+            if traced:
+                out["traced_bytes_per_timer"] = (tracemalloc.get_traced_memory()[0] - base) / TIMER_LOAD
+                tracemalloc.stop()
+            else:
+                gc.collect()
+                out["rss_bytes_per_timer"] = (rss_bytes() - rss) / TIMER_LOAD
+                out["arm"] = _per_op(armed, TIMER_LOAD)
+                out["loop_lag"] = await _loop_lag()
+            res_close = close()
+            if asyncio.iscoroutine(res_close):
+                await res_close
+            del handles
+        res[name] = out
+    return res
+
+
+# ------------- 指令处理函数 -------------
+
+async def handlers(h: Harness, opts, rng) -> dict:
+    """逐个指令处理函数的微基准；每次计时前在计时之外准备好所需状态"""
+    p = h.plugin
+    E = h.event
+    lat = {}
+
+    async def bench(name, cid, prepare, run):
+        rec = lat[name] = Latency()
+        for _ in range(opts.iterations):
+            await prepare(cid)
+            rec.add(await run(cid))
+
+    async def no_game(cid):
+        if h.game(cid) is not None:
+            await h.call(p.end_game, E("", ADMIN, cid))
+
+    async def waiting(cid):
+        await no_game(cid)
+        await h.call(p.create_game, E("", h.players(cid)[0], cid))
+
+    async def full(cid):
+        await waiting(cid)
+        await h.call(p.join_game, E("", h.players(cid)[1], cid))
+
+    async def started(cid):
+        await h.heal(cid, await h.ensure_game(cid))
+
+    async def fresh(cid):
+        # 会累积道具的操作每次都换新的一局，避免背包计数无限增长
+        await no_game(cid)
+        await h.new_game(cid)
+
+    async def cigarettes(cid):
+        await fresh(cid)
+        await h.give(cid, h.game(cid).current.id, "香烟", 2)
+
+    async def nothing(cid):
+        pass
+
+    await bench("create_game", "h-create", no_game,
+                lambda cid: h.call(p.create_game, E("", h.players(cid)[0], cid)))
+    await bench("join_game", "h-join", waiting,
+                lambda cid: h.call(p.join_game, E("", h.players(cid)[1], cid)))
+    await bench("start_game", "h-start", full,
+                lambda cid: h.call(p.start_game, E("", h.players(cid)[0], cid)))
+    await bench("show_game_info", "h-info", started,
+                lambda cid: h.call(p.show_game_info, E("", h.players(cid)[0], cid)))
+    await bench("show_odds", "h-odds", started,
+                lambda cid: h.call(p.show_odds, E("", h.players(cid)[0], cid)))
+    await bench("exchange_item", "h-exchange", cigarettes,
+                lambda cid: h.call(p.exchange_item, E("", h.game(cid).current.id, cid), "香烟", "护盾"))
+    await bench("end_game", "h-end", started,
+                lambda cid: h.call(p.end_game, E("", h.players(cid)[0], cid)))
+    await bench("debug_give_item", "h-give", fresh,
+                lambda cid: h.call(p.debug_give_item, E("", ADMIN, cid), h.players(cid)[0], "护盾", 1))
+    await bench("debug_set_hp", "h-hp", started,
+                lambda cid: h.call(p.debug_set_hp, E("", ADMIN, cid), h.players(cid)[0], MAX_HP))
+    await bench("debug_query_bullet", "h-bullet", started,
+                lambda cid: h.call(p.debug_query_bullet, E("", ADMIN, cid)))
+    await bench("debug_query_game", "h-query", started,
+                lambda cid: h.call(p.debug_query_game, E("", ADMIN, cid)))
+    await bench("on_message_fire", "h-fire", started,
+                lambda cid: h.call(p.on_message, E(rng.choice(FIRE), h.game(cid).current.id, cid)))
+    await bench("on_message_bystander", "h-fire", started,
+                lambda cid: h.call(p.on_message, E("自己", "bystander", cid)))
+    await bench("on_message_no_game", "h-quiet", nothing,
+                lambda cid: h.call(p.on_message, E("哈哈哈", "bystander", cid)))
+    return {name: rec.summary() for name, rec in lat.items()}
+
+
+# ------------- 道具 -------------
+
+async def items(h: Harness, opts, rng) -> dict:
+    """
+    每个道具的使用耗时：plugin 为经 on_message 的完整处理（含文本渲染与日志入队），
+    engine 为仅调用规则引擎的耗时。
+    """
+    p = h.plugin
+    res = {}
+    for name in ITEM_NAMES:
+        idx = ITEM_INDEX[name]
+        cid = f"item-{name}"
+        plugin_lat = Latency()
+        for _ in range(opts.iterations):
+            game = await h.ensure_game(cid)
+            await h.heal(cid, game)
+            await h.give(cid, game.current.id, name)
+            plugin_lat.add(await h.call(p.on_message, h.event(name, game.current.id, cid)))
+
+        engine_lat = Latency()
+        game = None
+        for _ in range(opts.iterations):
+            if game is None or game.status == "over":
+                game = GameState(PlayerState("a", "1"))
+                game.players[1] = PlayerState("b", "2")
+                engine.start(game, rng)
+            for pl in game.players:
+                pl.hp = MAX_HP
+            game.current.items.add(idx)
+            start = time.perf_counter_ns()
+            engine.use_item(game, idx, rng)
+            engine_lat.add(time.perf_counter_ns() - start)
+        res[name] = {"plugin": plugin_lat.summary(), "engine": engine_lat.summary()}
+    return res
+
+
+# ------------- 端到端 -------------
+
+async def e2e(h: Harness, opts, rng) -> dict:
+    """
+    完整对局：创建 → 加入 → 开始 → 双方随机开枪或使用道具直到分出胜负。
+    api_calls_per_game 为合并回复后每局的平台 API 调用数；api_calls_per_game_unbatched 为旧做法
+    （一次操作产生的每一行各发一条消息）下的调用数，由每次回复合并前的行数统计得到。
+    """
+    p = h.plugin
+    lat = {k: Latency() for k in ("create_game", "join_game", "start_game", "fire", "item")}
+    moves = 0
+    unbatched = [0]
+    reply = p._reply
+
+    async def counting_reply(event, gid, lines, image=None):
+        unbatched[0] += 1 if lines is None or isinstance(lines, str) else len(lines)
+        return await reply(event, gid, lines, image)
+
+    p._reply = counting_reply
+    start = time.perf_counter()
+    for i in range(opts.games_e2e):
+        cid = f"e2e{i}"
+        a, b = h.players(cid)
+        lat["create_game"].add(await h.call(p.create_game, h.event("", a, cid)))
+        lat["join_game"].add(await h.call(p.join_game, h.event("", b, cid)))
+        lat["start_game"].add(await h.call(p.start_game, h.event("", a, cid)))
+        for _ in range(MAX_MOVES):
+            game = h.game(cid)
+            if game is None:
+                break
+            text = h.move_for(game, rng)
+            ns = await h.call(p.on_message, h.event(text, game.current.id, cid))
+            lat["fire" if text in FIRE else "item"].add(ns)
+            moves += 1
+        else:
+            await h.call(p.end_game, h.event("", ADMIN, cid))
+    elapsed = time.perf_counter() - start
+    del p._reply
+    games = opts.games_e2e or 1
+    return {
+        "games": opts.games_e2e,
+        "moves_per_game": moves / games,
+        "msgs_per_sec": (moves + 3 * opts.games_e2e) / elapsed if elapsed else 0.0,
+        "api_calls_per_game": p.outbox.stats()["calls_per_game"],
+        "api_calls_per_game_unbatched": unbatched[0] / games,
+        "latency": {k: v.summary() for k, v in lat.items()},
+    }
+
+
+# ------------- 多群合成负载 -------------
+
+async def load(h: Harness, opts, rng) -> dict:
+    """
+    模拟大量群同时活跃：每条消息随机落到某个群，按 move_ratio 的概率是当前玩家的合法操作，
+    其余为群友闲聊（偶尔包含关键词）。消息以 concurrency 条为一批并发处理，
+    对局结束的群由玩家重新开局（计入 command 类）。
+    """
+    p = h.plugin
+    cids = [f"load{i}" for i in range(opts.channels)]
+    for cid in cids:
+        await h.new_game(cid)
+    lat = {"move": Latency(), "chatter": Latency(), "command": Latency()}
+
+    async def send(kind, handler, event):
+        lat[kind].add(await h.call(handler, event))
+
+    sent = 0
+    start = time.perf_counter()
+    while sent < opts.messages:
+        batch = []
+        for _ in range(min(opts.concurrency, opts.messages - sent)):
+            cid = rng.choice(cids)
+            game = h.game(cid)
+            if game is None:
+                batch.append(h.new_game(cid, lat["command"]))
+                sent += 3
+            elif game.status == "started" and rng.random() < opts.move_ratio:
+                batch.append(send("move", p.on_message, h.event(h.move_for(game, rng), game.current.id, cid)))
+                sent += 1
+            else:
+                sender = rng.choice(h.players(cid)) if rng.random() < 0.2 else f"{cid}:u{rng.randrange(20)}"
+                batch.append(send("chatter", p.on_message, h.event(rng.choice(CHATTER), sender, cid)))
+                sent += 1
+        await asyncio.gather(*batch)
+    elapsed = time.perf_counter() - start
+    return {
+        "channels": opts.channels,
+        "messages": sent,
+        "concurrency": opts.concurrency,
+        "move_ratio": opts.move_ratio,
+        "msgs_per_sec": sent / elapsed if elapsed else 0.0,
+        "live_games": len(p.games),
+        "latency": {k: v.summary() for k, v in lat.items()},
+    }
+
+
+# ------------- 并发操作与状态不变量 -------------
+
+STRESS_CHANNELS = 1000
+STRESS_BATCHES = 30
+STRESS_AI_SHARE = 4  # 每 4 个群中有 1 个是人机对战
+
+
+def _invariant_violations(h: Harness) -> list:
+    """
+    检查插件的状态不变量，返回违例描述（应为空）：
+    各局的状态、血量、道具数与弹夹合法，按种子重放操作流得到相同的状态（每次操作都是原子地执行并记录的）；
+    玩家索引、牌桌索引、消息路由与定时器和 games 一一对应；所有邮箱都已排空。
+    """
+    p = h.plugin
+    bad = []
+    for gid, g in p.games.items():
+        cid, number = gid.rsplit("#", 1)
+        if int(number) not in p._tables.get(cid, ()):
+            bad.append(f"{gid}: 不在牌桌索引中")
+        for pl in g.players:
+            if pl is None:
+                continue
+            if pl.id != ai.AI_ID and p._seats.get((cid, pl.id)) != gid:
+                bad.append(f"{gid}: {pl.id} 的玩家索引为 {p._seats.get((cid, pl.id))}")
+            if g.status == "started" and not 0 < pl.hp <= MAX_HP:
+                bad.append(f"{gid}: {pl.id} 血量 {pl.hp}")
+            if len(pl.items) > MAX_ITEMS:
+                bad.append(f"{gid}: {pl.id} 道具数 {len(pl.items)}")
+        if g.status == "started":
+            route = p._routes.get(gid)
+            if route is None or route[0] != g.current.id:
+                bad.append(f"{gid}: 路由 {route and route[0]}，当前玩家 {g.current.id}")
+            if not len(g.bullet) or not 0 <= g.bullet.live <= len(g.bullet):
+                bad.append(f"{gid}: 弹夹 {g.bullet.live}/{len(g.bullet)}")
+            if not replay.restore(GameState.from_record(g.to_record(), g.table)):
+                bad.append(f"{gid}: 重放结果与当前状态不一致")
+        elif g.status not in ("waiting", "full"):
+            bad.append(f"{gid}: 状态 {g.status}")
+    games = set(p.games)
+    for name, keys in (("路由", set(p._routes)), ("定时器", set(p._timers)), ("玩家索引", set(p._seats.values())),
+                       ("揭示信息", set(p._knowledge)), ("对方群揭示信息", set(p._remote_knowledge)),
+                       ("战绩累计", set(p._tallies))):
+        if not keys <= games:
+            bad.append(f"{name}中有已不存在的游戏：{sorted(keys - games)[:5]}")
+    if set(p._timers) != games:
+        bad.append(f"缺少定时器：{sorted(games - set(p._timers))[:5]}")
+    tables = sum(len(t) for t in p._tables.values())
+    if tables != len(games):
+        bad.append(f"牌桌索引 {tables} 张，游戏 {len(games)} 局")
+    if len(p.actors):
+        bad.append(f"仍有 {len(p.actors)} 个邮箱未排空")
+    return bad
+
+
+async def stress(h: Harness, opts, rng) -> dict:
+    """
+    并发压力：STRESS_CHANNELS 个群同时对局，其中每 STRESS_AI_SHARE 个群有一个是人机对战（AI 回合经邮箱执行，
+    思考期间该牌桌的其它操作排队）。每一批为每个群同时投递：当前玩家的开枪或道具（各连发两次）、
+    对手的抢先操作，并以 2% 的概率由管理员结束游戏；整批打乱后并发执行，各操作在同一牌桌上相互重叠。
+    被结束或已分出胜负的群在下一批重新开局。全部批次跑完、AI 回合结束后检查状态不变量（见 _invariant_violations）。
+    报告消息吞吐、各类消息的延迟、批次进行中观察到的最大邮箱数与违例（应为 0）。
+    """
+    p = h.plugin
+    cids = [f"stress{i}" for i in range(STRESS_CHANNELS)]
+    vs_ai = set(cids[::STRESS_AI_SHARE])
+
+    async def open_table(cid):
+        a, b = h.players(cid)
+        await h.call(p.create_game, h.event("/恶魔轮盘 创建游戏", a, cid))
+        if cid in vs_ai:
+            await h.call(p.join_game, h.event("/恶魔轮盘 加入游戏 AI 简单", a, cid), "AI", "简单")
+        else:
+            await h.call(p.join_game, h.event("/恶魔轮盘 加入游戏", b, cid))
+        await h.call(p.start_game, h.event("/恶魔轮盘 开始游戏", a, cid))
+
+    for cid in cids:
+        await open_table(cid)
+    lat = {k: Latency() for k in ("move", "repeat", "out_of_turn", "end_game", "restart")}
+    busiest = 0
+
+    async def send(kind, handler, *args):
+        lat[kind].add(await h.call(handler, *args))
+
+    async def restart(cid):
+        begin = time.perf_counter_ns()
+        await open_table(cid)
+        lat["restart"].add(time.perf_counter_ns() - begin)
+
+    async def probe():
+        nonlocal busiest
+        for _ in range(10):
+            busiest = max(busiest, len(p.actors))
+            await asyncio.sleep(0)
+
+    sent = 0
+    start = time.perf_counter()
+    for _ in range(STRESS_BATCHES):
+        batch = [probe()]
+        for cid in cids:
+            game = h.game(cid)
+            if game is None:
+                batch.append(restart(cid))
+                continue
+            if game.status != "started":
+                continue
+            current, other = game.current.id, game.opponent.id
+            if current != ai.AI_ID:
+                move = h.move_for(game, rng)
+                batch.append(send("move", p.on_message, h.event(move, current, cid)))
+                batch.append(send("repeat", p.on_message, h.event(move, current, cid)))
+                sent += 2
+            if other != ai.AI_ID:
+                batch.append(send("out_of_turn", p.on_message, h.event(rng.choice(FIRE), other, cid)))
+                sent += 1
+            if rng.random() < 0.02:
+                batch.append(send("end_game", p.end_game, h.event("/恶魔轮盘 结束游戏", ADMIN, cid)))
+                sent += 1
+        rng.shuffle(batch)
+        await asyncio.gather(*batch)
+    while p._ai_tasks:
+        await asyncio.gather(*p._ai_tasks.values(), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    violations = _invariant_violations(h)
+    return {
+        "channels": STRESS_CHANNELS,
+        "ai_channels": len(vs_ai),
+        "messages": sent,
+        "msgs_per_sec": sent / elapsed if elapsed else 0.0,
+        "live_games": len(p.games),
+        "max_mailboxes": busiest,
+        "latency": {k: v.summary() for k, v in lat.items()},
+        "violations": len(violations),
+        "violation_samples": violations[:10],
+    }
+
+
+# ------------- 多牌桌路由 -------------
+
+TABLE_COUNTS = (1, 10, 100, 500)
+
+
+async def _legacy_on_message(h: Harness, event):
+    """
+    引入路由索引之前的 on_message 过滤路径，只作对比：每条消息遍历发言所在群的全部牌桌，
+    找到发言者是当前玩家的那一局后，再在“自己”/“对方”与其道具名列表中线性查找消息内容。
+    命中时只产出消息内容，不执行操作。
+    """
+    p = h.plugin
+    cid = event.get_group_id() or event.session_id
+    sender = event.get_sender_id()
+    for number in p._tables.get(cid, ()):
+        g = p.games[h.game_key(cid, number)]
+        if g.status != "started" or g.current.id != sender:
+            continue
+        content = event.message_obj.message_str.strip()
+        if content in ["自己", "对方"] or content in g.current.items.names(g.table.names):
+            yield content
+        return
+
+
+async def tables(h: Harness, opts, rng) -> dict:
+    """
+    同一个群中有 1 / 10 / 100 / 500 张进行中的牌桌时，on_message 的路由耗时：
+    not_move 为当前玩家的闲聊、not_turn 为非当前玩家发送“自己”、bystander 为未入座的群友发送“自己”，
+    三者都在路由索引处被过滤；fire 为当前玩家开枪的完整处理（开枪前把双方血量补满，对局不会结束）。
+    legacy_* 为同样三种消息在旧实现（逐桌扫描，见 _legacy_on_message）下的过滤耗时，
+    legacy_speedup 为旧实现与路由索引的 p50 之比。
+    """
+    p = h.plugin
+    E = h.event
+    res = {}
+    for count in TABLE_COUNTS:
+        cid = f"tables{count}"
+        for i in range(count):
+            a, b = f"{cid}:{i}a", f"{cid}:{i}b"
+            await h.call(p.create_game, E("", a, cid))
+            await h.call(p.join_game, E("", b, cid))
+            await h.call(p.start_game, E("", a, cid))
+        games = [h.game(cid, n) for n in range(1, count + 1)]
+        misses = ("not_move", "not_turn", "bystander")
+        lat = {k: Latency() for k in (*misses, "fire", *(f"legacy_{k}" for k in misses))}
+        legacy = functools.partial(_legacy_on_message, h)
+        for _ in range(opts.iterations):
+            n = rng.randrange(count) + 1
+            game = h.game(cid, n)
+            for prefix, handler in (("", p.on_message), ("legacy_", legacy)):
+                lat[prefix + "not_move"].add(await h.call(handler, E("哈哈哈", game.current.id, cid)))
+                lat[prefix + "not_turn"].add(await h.call(handler, E("自己", game.opponent.id, cid)))
+                lat[prefix + "bystander"].add(await h.call(handler, E("自己", f"{cid}:u{n}", cid)))
+            await h.heal(cid, game)
+            lat["fire"].add(await h.call(p.on_message, E(rng.choice(FIRE), game.current.id, cid)))
+        summary = {k: v.summary() for k, v in lat.items()}
+        res[str(count)] = {
+            "live_tables": sum(g is not None and g.status == "started" for g in games),
+            "latency": summary,
+            "legacy_speedup": {k: summary[f"legacy_{k}"]["p50_us"] / summary[k]["p50_us"] for k in misses},
+        }
+    first, last = res[str(TABLE_COUNTS[0])]["latency"], res[str(TABLE_COUNTS[-1])]["latency"]
+    res["p50_ratio"] = {k: last[k]["p50_us"] / first[k]["p50_us"] for k in first}
+    return res
+
+
+# ------------- 指标开销 -------------
+
+async def metrics(h: Harness, opts, rng) -> dict:
+    """
+    插件内置指标在热路径上的开销：单次计数、单次直方图记录与一对计时调用的耗时，
+    一次开枪所付出的全部指标开销占开枪处理耗时（p50）的比例，
+    以及开启 / 关闭指标时实测的开枪耗时对比。
+    """
+    m = h.plugin.metrics
+    n = opts.iterations * 100
+    res = {}
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        m.inc("messages", "bench")
+    res["counter_inc"] = _per_op(time.perf_counter_ns() - start, n)
+    start = time.perf_counter_ns()
+    for i in range(n):
+        m.observe("bench", 20000 + i)
+    res["histogram_observe"] = _per_op(time.perf_counter_ns() - start, n)
+    clock = time.perf_counter_ns
+    start = clock()
+    for _ in range(n):
+        clock()
+        clock()
+    res["timer_pair"] = _per_op(clock() - start, n)
+
+    # A/B：同一插件实例上交替以 100 次为一组开关指标（关闭时换上什么都不记录的 Metrics）
+    on, off = Latency(), Latency()
+    null = _NullMetrics(m.gauges)
+    cid = "metrics-fire"
+    try:
+        for block in range(opts.iterations // 100 * 2):
+            enabled = block % 2 == 0
+            h.plugin.metrics = m if enabled else null
+            for _ in range(100):
+                game = await h.ensure_game(cid)
+                await h.heal(cid, game)
+                ns = await h.call(h.plugin.on_message, h.event(rng.choice(FIRE), game.current.id, cid))
+                (on if enabled else off).add(ns)
+    finally:
+        h.plugin.metrics = m
+    on, off = on.summary(), off.summary()
+    # 一次开枪：开枪目标计数一次，一次直方图记录与一对计时
+    per_fire = (res["counter_inc"]["ns_per_op"] + res["histogram_observe"]["ns_per_op"]
+                + res["timer_pair"]["ns_per_op"])
+    res["fire_with_metrics"] = on
+    res["fire_without_metrics"] = off
+    res["overhead_ns_per_fire"] = per_fire
+    res["overhead_pct_of_fire_p50"] = per_fire / (on["p50_us"] * 1000) * 100
+    res["measured_overhead_pct_p50"] = (on["p50_us"] / off["p50_us"] - 1) * 100
+    return res
+
+
+# ------------- 战绩库 -------------
+
+async def stats(h: Harness, opts, rng) -> dict:
+    """
+    战绩库写入吞吐（入队到全部提交）与查询延迟：
+    先写入 --stats-games 局（默认一百万局，分布在 1000 个群、每群 200 名玩家中），
+    再随机查询各群排行榜前 10 名与玩家战绩。
+    """
+    n = opts.stats_games
+    channels, per_channel = 1000, 200
+    chunk = 10000
+    res = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = StatsStore(os.path.join(tmp, "stats.db"))
+        store.start()
+        await asyncio.to_thread(store.ready.wait)
+        enqueue_ns = 0
+        start = time.perf_counter_ns()
+        for base in range(0, n, chunk):
+            results = []
+            for _ in range(min(chunk, n - base)):
+                cid = f"g{rng.randrange(channels)}"
+                a, b = rng.sample(range(per_channel), 2)
+                won = rng.random() < 0.5
+                results.append(GameResult(cid, "win", rng.randint(0, 4), (
+                    (f"{cid}:{a}", f"p{a}", won, rng.randint(1, 12), rng.randint(0, 10), rng.randint(0, 6), rng.randint(0, 6)),
+                    (f"{cid}:{b}", f"p{b}", not won, rng.randint(1, 12), rng.randint(0, 10), rng.randint(0, 6), rng.randint(0, 6)),
+                )))
+            t = time.perf_counter_ns()
+            for r in results:
+                store.record(r)
+            enqueue_ns += time.perf_counter_ns() - t
+            # 定期等写线程追上，限制队列中待写结果占用的内存
+            if (base // chunk) % 10 == 9:
+                await asyncio.to_thread(store.flush)
+        await asyncio.to_thread(store.flush)
+        elapsed = time.perf_counter_ns() - start
+        res["enqueue"] = _per_op(enqueue_ns, n)
+        res["write"] = {"games": n, "seconds": elapsed / 1e9, "ops_per_sec": n * 1e9 / elapsed}
+
+        board, record = Latency(), Latency()
+        for _ in range(opts.iterations):
+            cid = f"g{rng.randrange(channels)}"
+            t = time.perf_counter_ns()
+            store.leaderboard(cid, 10)
+            board.add(time.perf_counter_ns() - t)
+            t = time.perf_counter_ns()
+            store.player_record(cid, f"{cid}:{rng.randrange(per_channel)}")
+            record.add(time.perf_counter_ns() - t)
+        res["leaderboard_top10"] = board.summary()
+        res["player_record"] = record.summary()
+        res["db_bytes"] = os.path.getsize(store.path)
+        await asyncio.to_thread(store.close)
+    return res
+
+
+# ------------- 回放 -------------
+
+def _recorded_game(seed: int, policy, rng) -> bytes:
+    """用自对战策略进行一局带种子的对局，返回其回放"""
+    game = GameState(PlayerState("a", "1"))
+    game.players[1] = PlayerState("b", "2")
+    replay.seed_game(game, seed)
+    engine.start(game, game.rng)
+    replay.record(game, replay.START)
+    for _ in range(selfplay.MAX_STEPS):
+        if game.status == "over":
+            break
+        action = policy(game, rng, None)
+        if action[0] == "fire":
+            engine.fire(game, action[1], game.rng)
+            replay.record(game, replay.FIRE_SELF if action[1] else replay.FIRE_OTHER)
+        elif action[0] == "item":
+            engine.use_item(game, action[1], game.rng)
+            replay.record(game, replay.ITEM, action[1])
+        elif engine.exchange(game, action[1], action[2]) == "ok":
+            replay.record(game, replay.EXCHANGE, action[1], action[2])
+    return replay.encode(game)
+
+
+async def replays(h: Harness, opts, rng) -> dict:
+    """
+    回放编码的体积与重放速度：用启发式策略进行 --replay-games 局带种子的对局并记录回放，
+    统计每局字节数，再逐局解码、重放并校验终局状态。
+    """
+    n = opts.replay_games
+    policy = selfplay.resolve_policy("heuristic")
+    start = time.perf_counter_ns()
+    blobs = [_recorded_game(rng.getrandbits(64), policy, rng) for _ in range(n)]
+    elapsed = time.perf_counter_ns() - start
+    sizes = sorted(len(b) for b in blobs)
+    res = {
+        "record": {"games": n, "ops_per_sec": n * 1e9 / elapsed},
+        "bytes_per_game": sum(sizes) / n,
+        "bytes_p99": sizes[int(n * 0.99)],
+        "bytes_max": sizes[-1],
+    }
+    start = time.perf_counter_ns()
+    for b in blobs:
+        replay.decode(b)
+    res["decode"] = {"ops_per_sec": n * 1e9 / (time.perf_counter_ns() - start)}
+    verified = replay.verify_all(enumerate(blobs))
+    res["verify"] = {"failed": len(verified["failed"]), "ops_per_sec": verified["games_per_sec"]}
+    return res
+
+
+# ------------- 道具表 -------------
+
+async def item_table(h: Harness, opts, rng) -> dict:
+    """
+    道具抽取与查表的耗时：legacy 为旧实现（每次抽取时由道具字典构造名称列表再 random.choice），
+    uniform 为内置道具表的别名表抽取，weighted 为掉落权重各不相同的同名道具表；
+    另给出按名称查道具编号与编译一张道具表的耗时。
+    """
+    n = opts.iterations * 1000
+    table = registry.DEFAULT_TABLE
+    config = dict(table.config, items=[dict(it, weight=i + 1) for i, it in enumerate(table.config["items"])])
+    weighted = registry.compile_table(config)
+    legacy = dict.fromkeys(table.names)
+    r = random.Random(rng.getrandbits(64))
+    res = {}
+
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        r.choice(list(legacy.keys()))
+    res["draw_legacy"] = _per_op(time.perf_counter_ns() - start, n)
+    for key, t in (("draw_uniform", table), ("draw_weighted", weighted)):
+        draw = t.draw
+        start = time.perf_counter_ns()
+        for _ in range(n):
+            draw(r)
+        res[key] = _per_op(time.perf_counter_ns() - start, n)
+
+    # 加权抽取的经验分布与配置权重的最大偏差
+    hits = [0] * len(weighted)
+    for _ in range(n):
+        hits[weighted.draw(r)] += 1
+    total = sum(weighted.weights)
+    res["weighted_max_error"] = max(abs(h / n - w / total) for h, w in zip(hits, weighted.weights))
+
+    lookup = table.lookup
+    names = table.names
+    start = time.perf_counter_ns()
+    for i in range(n):
+        lookup.get(names[i % len(names)])
+    res["lookup"] = _per_op(time.perf_counter_ns() - start, n)
+    m = max(1, n // 1000)
+    start = time.perf_counter_ns()
+    for _ in range(m):
+        registry.compile_table(table.config)
+    res["compile"] = _per_op(time.perf_counter_ns() - start, m)
+    return res
+
+
+# ------------- AI 搜索 -------------
+
+def _ai_state(rng) -> tuple:
+    """典型的满载局面：8 发子弹、双方各 8 个道具、随机血量"""
+    game = GameState(PlayerState("a", "1"))
+    game.players[1] = PlayerState("b", "2")
+    game.status = "started"
+    game.bullet = Magazine(rng.getrandbits(8), 8)
+    for p in game.players:
+        while p.items.fill(rng.randrange(len(ITEM_NAMES))):
+            pass
+        p.hp = rng.randint(2, MAX_HP)
+    return ai.snapshot(game, 0, ai.Knowledge())
+
+
+async def ai_search(h: Harness, opts, rng) -> dict:
+    """
+    AI 各难度在满载局面下的单步决策耗时、每秒搜索节点数、完成的搜索深度与置换表命中数，
+    以及搜索在线程池中进行时事件循环的调度延迟（每 1 毫秒唤醒一次的协程实际迟到了多久）。
+    """
+    n = max(5, opts.iterations // 100)
+    states = [_ai_state(rng) for _ in range(n)]
+    res = {}
+    for difficulty in ai.DIFFICULTIES:
+        searcher = ai.Searcher()
+        lat = Latency()
+        nodes = elapsed = depth = 0
+        for s in states:
+            start = time.perf_counter_ns()
+            _, d, k = searcher.choose(s, difficulty, rng)
+            ns = time.perf_counter_ns() - start
+            lat.add(ns)
+            nodes += k
+            elapsed += ns
+            depth += d
+        res[difficulty] = {
+            "move": lat.summary(),
+            "nodes_per_sec": nodes * 1e9 / elapsed if elapsed else 0.0,
+            "mean_depth": depth / n,
+            "table_hits": searcher.hits,
+            "table_size": len(searcher.table),
+        }
+
+    lag = Latency()
+    searcher = ai.Searcher()
+    loop = asyncio.get_running_loop()
+    done = False
+
+    async def ticker():
+        while not done:
+            start = time.perf_counter_ns()
+            await asyncio.sleep(0.001)
+            lag.add(max(0, time.perf_counter_ns() - start - 1_000_000))
+
+    tick = asyncio.create_task(ticker())
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        for s in states[:5]:
+            await loop.run_in_executor(pool, searcher.choose, s, "normal", rng)
+    done = True
+    await tick
+    res["loop_lag_during_search"] = lag.summary()
+    return res
+
+
+# ------------- 多进程共享存储 -------------
+
+async def cluster(h: Harness, opts, rng) -> dict:
+    """分别以 SQLite 与 Redis 协议替身为共享存储，用 1 个与 N 个进程跑同一批群（见 cluster.py）"""
+    channels = [f"cl{i}" for i in range(opts.cluster_channels)]
+    counts = sorted({1, opts.workers})
+    data_dir = os.path.abspath("cluster")
+    res = {"sqlite": {}, "redis": {}}
+    for workers in counts:
+        res["sqlite"][f"{workers}_workers"] = await asyncio.to_thread(
+            run_cluster, "sqlite://" + os.path.join(data_dir, f"cluster-{workers}.db"), data_dir, workers, channels,
+            opts.cluster_seconds, opts.seed,
+        )
+    server = RespServer()
+    server.start()
+    try:
+        for workers in counts:
+            store = open_store(server.url, data_dir)
+            store.client.call("FLUSHALL")
+            store.close()
+            res["redis"][f"{workers}_workers"] = await asyncio.to_thread(
+                run_cluster, server.url, data_dir, workers, channels, opts.cluster_seconds, opts.seed
+            )
+    finally:
+        server.close()
+    return res
+
+
+# ------------- 入站流控 -------------
+
+async def flood(h: Harness, opts, rng) -> dict:
+    """
+    刷屏的群：当前玩家每个操作连发 3 次，10 名旁观者在每次操作之间各发一次「对战信息」。
+    以插件默认的入站流控参数（FloodGuard 默认值）运行，报告放行与各原因丢弃的请求数，
+    以及对战信息命中渲染缓存与每次重新渲染的耗时对比。
+    """
+    p = h.plugin
+    cid = "flood"
+    spectators = [f"{cid}:s{i}" for i in range(10)]
+    saved = p.flood
+    p.flood = FloodGuard()
+    before = p.metrics.counter_values("requests")
+    try:
+        for _ in range(opts.iterations // 10):
+            game = await h.ensure_game(cid)
+            await h.heal(cid, game)
+            move = rng.choice(FIRE)
+            for _ in range(3):
+                await h.call(p.on_message, h.event(move, game.current.id, cid))
+            for spectator in spectators:
+                await h.call(p.show_game_info, h.event("/恶魔轮盘 对战信息", spectator, cid))
+    finally:
+        p.flood = saved
+    after = p.metrics.counter_values("requests")
+    requests = {k: after.get(k, 0) - before.get(k, 0) for k in after}
+
+    cached, uncached = Latency(), Latency()
+    game = await h.ensure_game(cid)
+    info = h.event("/恶魔轮盘 对战信息", ADMIN, cid)
+    for _ in range(opts.iterations):
+        cached.add(await h.call(p.show_game_info, info))
+        p._renders.clear()
+        uncached.add(await h.call(p.show_game_info, info))
+    cached, uncached = cached.summary(), uncached.summary()
+    return {
+        "requests": requests,
+        "dropped_pct": 100 * (1 - requests.get("processed", 0) / sum(requests.values())) if requests else 0.0,
+        "info_cached": cached,
+        "info_uncached": uncached,
+        "info_p50_speedup": uncached["p50_us"] / cached["p50_us"] if cached["p50_us"] else 0.0,
+    }
+
+
+# ------------- 对战图片 -------------
+
+BOARD_GAMES = 100
+
+
+async def board_image(h: Harness, opts, rng) -> dict:
+    """
+    对战图片（需要 Pillow）：与文字版对战信息对比，
+    cold 为从底图整帧绘制并编码、warm 为上一帧上只重绘一个变化的血量区域并编码、cached 为状态未变时直接返回 PNG；
+    内存按 BOARD_GAMES 局各保留一帧时的 RSS 增量估算每局占用。
+    """
+    if not board.available():
+        return {"skipped": "未安装 Pillow"}
+    p = h.plugin
+    gids = []
+    for i in range(BOARD_GAMES):
+        cid = f"board{i}"
+        await h.new_game(cid)
+        gids.append(h.game_key(cid, 1))
+    lat = {"text": Latency(), "cold": Latency(), "warm": Latency(), "cached": Latency()}
+    clock = time.perf_counter_ns
+    # 不缓存 PNG，使 cold / warm 每次都真正绘制与编码
+    renderer = board.BoardRenderer(max_frames=BOARD_GAMES, max_pngs=0)
+    start = clock()
+    renderer.prepare(p.item_table)
+    sprites_us = (clock() - start) / 1000
+    for _ in range(opts.iterations):
+        gid = rng.choice(gids)
+        game = p.games[gid]
+        start = clock()
+        p.render_info(gid)
+        lat["text"].add(clock() - start)
+        renderer.forget(gid)
+        start = clock()
+        renderer.render(gid, game, 1, "-")
+        lat["cold"].add(clock() - start)
+        player = game.players[rng.randrange(2)]
+        player.hp = player.hp % MAX_HP + 1
+        start = clock()
+        renderer.render(gid, game, 1, "-")
+        lat["warm"].add(clock() - start)
+    cached = board.BoardRenderer()
+    for _ in range(opts.iterations):
+        game = p.games[gid]
+        cached.render(gid, game, 1, "-")
+        start = clock()
+        cached.render(gid, game, 1, "-")
+        lat["cached"].add(clock() - start)
+
+    gc.collect()
+    base = rss_bytes()
+    frames = board.BoardRenderer(max_frames=BOARD_GAMES, max_pngs=BOARD_GAMES)
+    for gid in gids:
+        frames.render(gid, p.games[gid], 1, "-")
+    gc.collect()
+    grown = rss_bytes() - base
+    stats = frames.stats()
+    res = {"sprites_prepare_us": sprites_us, "latency": {k: v.summary() for k, v in lat.items()}}
+    res["warm_speedup_p50"] = res["latency"]["cold"]["p50_us"] / res["latency"]["warm"]["p50_us"]
+    res.update({
+        "frame_bytes": board.WIDTH * board.HEIGHT * 3,
+        "png_bytes_per_game": stats["png_bytes"] / BOARD_GAMES,
+        "rss_per_game_bytes": grown / BOARD_GAMES,
+    })
+    return res
+
+
+# ------------- 观战转播 -------------
+
+SPECTATOR_COUNTS = (1, 100, 1000)
+
+
+async def spectate(h: Harness, opts, rng) -> dict:
+    """
+    观战转播：一局分别有 1 / 100 / 1000 个观战群时，当前玩家开枪的处理耗时（渲染一次并投递到各队列，计入该局的 actor），
+    以及从开枪开始到每个观战群收到转播的延迟（fanout）与最后一个群收到的延迟（fanout_last）。
+    slow 为观战群所在平台每次发送耗时 50 毫秒时、100 个观战群下的开枪耗时，应与快速平台相当（慢平台不拖慢对局）。
+    """
+    p = h.plugin
+    ctx = p.context
+    send = ctx.send_message
+    res = {}
+    events = max(10, opts.iterations // 20)
+
+    async def run(cid: str, count: int, delay: float = 0.0) -> dict:
+        for i in range(count):
+            p.spectators.subscribe(h.game_key(cid, 1), f"aiocqhttp:GroupMessage:{cid}-s{i}", f"{cid}-s{i}")
+        moves, fanout, last = Latency(), Latency(), Latency()
+        state = {"left": 0, "start": 0, "done": None}
+
+        async def spectator_send(umo, chain):
+            if delay:
+                await asyncio.sleep(delay)
+            if umo.startswith("aiocqhttp:GroupMessage:" + cid + "-s"):
+                now = time.perf_counter_ns()
+                fanout.add(now - state["start"])
+                state["left"] -= 1
+                if not state["left"]:
+                    last.add(now - state["start"])
+                    state["done"].set()
+            return await send(umo, chain)
+
+        ctx.send_message = spectator_send
+        try:
+            for _ in range(events):
+                game = await h.ensure_game(cid)
+                await h.heal(cid, game)
+                state["left"], state["done"] = count, asyncio.Event()
+                state["start"] = time.perf_counter_ns()
+                moves.add(await h.call(p.on_message, h.event(rng.choice(FIRE), game.current.id, cid)))
+                await asyncio.wait_for(state["done"].wait(), 60)
+        finally:
+            ctx.send_message = send
+            p.spectators.finish(h.game_key(cid, 1))
+        return {"move": moves.summary(), "fanout": fanout.summary(), "fanout_last": last.summary()}
+
+    for count in SPECTATOR_COUNTS:
+        res[str(count)] = await run(f"spectate{count}", count)
+    res["slow"] = await run("spectate-slow", 100, 0.05)
+    res["slow"].pop("fanout")
+    return res
+
+
+# ------------- 跨群匹配 -------------
+
+QUEUE_SIZES = (1000, 10000, 50000)
+ARRIVAL_RATES = (0.2, 1, 10, 100)
+RATING_SPREAD = 300
+MATCH_SECONDS = 600
+
+
+async def matchmaking(h: Harness, opts, rng) -> dict:
+    """
+    跨群匹配队列（纯数据结构，虚拟时钟）：
+    ops：队列中已有 1000 / 10000 / 50000 名互不匹配的玩家时，新玩家入队并配对、退出队列与一次放宽检查的耗时；
+    sim：玩家按每秒 0.2 / 1 / 10 / 100 人到达（评分服从均值 1500、标准差 300 的正态分布），模拟 10 分钟，
+    报告平均队列长度、配对等待时间（虚拟秒）与配对双方评分差的分布，以及超时人数。
+    """
+    res = {"ops": {}, "sim": {}}
+    sizes = QUEUE_SIZES[:2] if opts.quick else QUEUE_SIZES
+    for size in sizes:
+        now = [0.0]
+        # 初始容许评分差为 0 且不放宽：评分各不相同的玩家彼此都不会配对，队列保持 size 人
+        q = MatchQueue(window=0, widen=0, clock=lambda: now[0])
+        for i in range(size):
+            q.enqueue(f"w{i}", "", "g", "u", rng.gauss(1500, RATING_SPREAD))
+        q.window, q.widen = 100, 25
+        enqueue, cancel = Latency(), Latency()
+        rounds = min(opts.iterations, size // 10)
+        for i in range(rounds):
+            t = time.perf_counter_ns()
+            pair = q.enqueue(f"n{i}", "", "g", "u", rng.gauss(1500, RATING_SPREAD))
+            enqueue.add(time.perf_counter_ns() - t)
+            # 补回被配走的玩家，保持队列长度
+            if pair is not None:
+                q.window = 0
+                q.enqueue(f"r{i}", "", "g", "u", rng.gauss(1500, RATING_SPREAD))
+                q.window = 100
+            victim = f"w{rng.randrange(size)}"
+            if victim in q:
+                t = time.perf_counter_ns()
+                entry = q.cancel(victim)
+                cancel.add(time.perf_counter_ns() - t)
+                q.window = 0
+                q.enqueue(victim, "", "g", "u", entry.rating)
+                q.window = 100
+        buckets = q.stats()["buckets"]
+        # 每个玩家入队 5 秒后到期一次放宽检查；这里一次处理全部到期检查（多数配对出队），按检查次数平摊
+        now[0] = 5.0
+        checks = len(q)
+        t = time.perf_counter_ns()
+        q.tick()
+        res["ops"][str(size)] = {
+            "enqueue": enqueue.summary(), "cancel": cancel.summary(),
+            "tick_per_check_us": (time.perf_counter_ns() - t) / max(1, checks) / 1000,
+            "buckets": buckets,
+        }
+        await asyncio.sleep(0)
+    for rate in ARRIVAL_RATES[:3] if opts.quick else ARRIVAL_RATES:
+        now = [0.0]
+        q = MatchQueue(clock=lambda: now[0])
+        waits, spreads, sizes_seen = [], [], []
+        step = 1.0
+        seq = 0
+        while now[0] < MATCH_SECONDS:
+            # 每秒到达人数服从泊松分布
+            arrivals = 0
+            threshold = math.exp(-rate * step)
+            p_acc = rng.random()
+            while p_acc > threshold:
+                arrivals += 1
+                p_acc *= rng.random()
+            for _ in range(arrivals):
+                seq += 1
+                pair = q.enqueue(f"p{seq}", "", "g", "u", rng.gauss(1500, RATING_SPREAD))
+                if pair is not None:
+                    waits.append(now[0] - pair[0].since)
+                    spreads.append(abs(pair[0].rating - pair[1].rating))
+            if now[0] % 5 == 0:
+                for first, second in q.tick()[0]:
+                    waits.append(max(now[0] - first.since, now[0] - second.since))
+                    spreads.append(abs(first.rating - second.rating))
+            sizes_seen.append(len(q))
+            now[0] += step
+        res["sim"][str(rate)] = {
+            "players": seq,
+            "matches": len(spreads),
+            "avg_queue": sum(sizes_seen) / len(sizes_seen),
+            "wait_s": _quantiles(waits),
+            "rating_diff": _quantiles(spreads),
+            "expired": q.stats()["expired"],
+        }
+        await asyncio.sleep(0)
+    return res
+
+
+# ------------- 性能采样 -------------
+
+async def profiler(h: Harness, opts, rng) -> dict:
+    """
+    采样分析器开启时的开销：同一插件实例上交替以 0.25 秒的连续开枪为一组开 / 关采样，对比开枪耗时；
+    并报告采样次数、落在插件代码中的样本比例，以及采样得到的自身耗时最多的函数。
+    关闭时插件中没有任何埋点，无需单独测量。
+    """
+    if not profiling_supported():
+        return {"skipped": "当前平台不支持 SIGPROF 采样"}
+    prof = SamplingProfiler()
+    on, off = Latency(), Latency()
+    cid = "profile-fire"
+    ticks = samples = fires = 0
+    stacks = {}
+    for block in range(max(2, opts.iterations // 100)):
+        enabled = block % 2 == 0
+        if enabled:
+            prof.start(3600)
+        try:
+            deadline = time.perf_counter() + 0.25
+            while time.perf_counter() < deadline:
+                if fires % 200 == 0 and h.game(cid) is not None:
+                    # 回血让对局不会结束，每 200 次开枪换一局，避免对局记录越来越长
+                    await h.call(h.plugin.end_game, h.event("", ADMIN, cid))
+                fires += 1
+                game = await h.ensure_game(cid)
+                await h.heal(cid, game)
+                ns = await h.call(h.plugin.on_message, h.event(rng.choice(FIRE), game.current.id, cid))
+                (on if enabled else off).add(ns)
+        finally:
+            if enabled:
+                prof.stop()
+                ticks += prof.ticks
+                samples += prof.samples
+                for stack, k in prof.stacks.items():
+                    stacks[stack] = stacks.get(stack, 0) + k
+    prof.stacks.clear()
+    prof.stacks.update(stacks)
+    on, off = on.summary(), off.summary()
+    return {
+        "interval_ms": prof.interval * 1000,
+        "fire_profiling": on,
+        "fire_not_profiling": off,
+        "measured_overhead_pct_p50": (on["p50_us"] / off["p50_us"] - 1) * 100,
+        "ticks": ticks,
+        "plugin_samples": samples,
+        "top_self": [[label, k / samples * 100] for label, k in prof.top_self(10)] if samples else [],
+    }
+
+
+def _quantiles(values: list) -> dict:
+    s = sorted(values)
+    if not s:
+        return {"count": 0}
+    n = len(s)
+    return {"mean": sum(s) / n, "p50": s[(n - 1) // 2], "p90": s[math.ceil(0.9 * n) - 1], "max": s[-1]}
+
+
+class _NullMetrics(Metrics):
+    def inc(self, name, label="", n=1):
+        pass
+
+    def observe(self, handler, ns):
+        pass
+
+
+SCENARIOS = {
+    "memory": memory,
+    "components": components,
+    "handlers": handlers,
+    "items": items,
+    "e2e": e2e,
+    "load": load,
+    "stress": stress,
+    "metrics": metrics,
+    "ai": ai_search,
+    "stats": stats,
+    "replay": replays,
+    "registry": item_table,
+    "tables": tables,
+    "cluster": cluster,
+    "flood": flood,
+    "board": board_image,
+    "spectate": spectate,
+    "matchmaking": matchmaking,
+    "profiler": profiler,
+    "hibernate": hibernate,
+}
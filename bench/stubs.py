@@ -0,0 +1,150 @@
+# bench/stubs.py
+"""
+AstrBot 插件 API 的最小桩实现。
+
+只实现插件实际用到的部分：register / Star / Context.send_message、指令组与事件类型装饰器、
+消息事件的发送者与会话信息，以及 MessageChain 与 Plain / Image 消息段。装饰器不做任何注册，被装饰的方法保持原样，
+因此基准代码可以直接调用 plugin.create_game(event) 等处理函数并消费其异步生成器。
+"""
+import enum
+import importlib
+import logging
+import sys
+import types
+
+PLUGIN_PACKAGE = __package__.rpartition(".")[0]
+
+
+def register(*args, **kwargs):
+    return lambda cls: cls
+
+
+class Star:
+    def __init__(self, context):
+        self.context = context
+
+
+class MessageChain:
+    def __init__(self, chain: list = None):
+        self.chain = chain or []
+
+    def message(self, text: str) -> "MessageChain":
+        self.chain.append(text)
+        return self
+
+
+class Plain:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class Image:
+    def __init__(self, file: str):
+        self.file = file
+
+    @classmethod
+    def fromBytes(cls, data: bytes) -> "Image":
+        img = cls("base64://")
+        img.data = data
+        return img
+
+
+class Context:
+    """桩 Context：只统计主动发送的消息数，保留最近一条"""
+
+    def __init__(self):
+        self.sent = 0
+        self.last = None
+
+    async def send_message(self, umo: str, chain: MessageChain) -> bool:
+        self.sent += 1
+        self.last = (umo, chain)
+        return True
+
+
+class _MessageObject:
+    __slots__ = ("message_str",)
+
+    def __init__(self, text: str):
+        self.message_str = text
+
+
+class AstrMessageEvent:
+    """桩消息事件：group 为空时视为私聊"""
+
+    def __init__(self, text: str, sender_id: str, group: str = "", sender_name: str = None,
+                 platform: str = "aiocqhttp"):
+        self.message_obj = _MessageObject(text)
+        self._sender_id = sender_id
+        self._sender_name = sender_name or sender_id
+        self._group = group
+        self._platform = platform
+        self.session_id = group or sender_id
+        kind = "GroupMessage" if group else "FriendMessage"
+        self.unified_msg_origin = f"{platform}:{kind}:{self.session_id}"
+
+    def get_group_id(self) -> str:
+        return self._group
+
+    def get_sender_id(self) -> str:
+        return self._sender_id
+
+    def get_sender_name(self) -> str:
+        return self._sender_name
+
+    def get_platform_name(self) -> str:
+        return self._platform
+
+    def plain_result(self, text: str) -> str:
+        return text
+
+    def chain_result(self, chain: list) -> list:
+        return chain
+
+
+class _CommandGroup:
+    """指令组装饰器的桩：子指令与子指令组都原样返回被装饰的函数"""
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __call__(self, *args, **kwargs):
+        return self.fn(*args, **kwargs)
+
+    def command(self, name: str):
+        return lambda fn: fn
+
+    def group(self, name: str):
+        return lambda fn: _CommandGroup(fn)
+
+
+def command_group(name: str):
+    return lambda fn: _CommandGroup(fn)
+
+
+def event_message_type(kind):
+    return lambda fn: fn
+
+
+class EventMessageType(enum.Enum):
+    ALL = "all"
+
+
+def install():
+    """把桩 API 注册为 astrbot.api.all（覆盖已安装的 AstrBot，避免真实注册表介入）"""
+    api_all = types.ModuleType("astrbot.api.all")
+    for name in ("register", "Star", "Context", "AstrMessageEvent", "MessageChain", "Plain", "Image",
+                 "command_group", "event_message_type", "EventMessageType"):
+        setattr(api_all, name, globals()[name])
+    api_all.logger = logging.getLogger("astrbot")
+    api = types.ModuleType("astrbot.api")
+    api.all = api_all
+    root = types.ModuleType("astrbot")
+    root.api = api
+    sys.modules.update({"astrbot": root, "astrbot.api": api, "astrbot.api.all": api_all})
+
+
+def load_plugin():
+    """安装桩 API 后导入插件主模块，返回 main 模块"""
+    install()
+    return importlib.import_module(f"{PLUGIN_PACKAGE}.main")
@@ -0,0 +1,251 @@
+# board.py
+"""
+对战信息的图片渲染（可选，依赖 Pillow；未安装时插件继续使用文字消息）。
+
+画面由固定的区域组成：标题（桌号与轮数）、双方的名字行（含当前回合标记与手铐 / 护盾 / 手锯状态）、
+血量条、每个道具格，以及弹夹行（实弹 / 空包弹数量与下一发为实弹的概率）。
+  - 插件加载时预先栅格化所有贴图：底图（边框与固定标签）、血量格、空道具格、子弹图标，
+    道具图标按道具表指纹缓存，首次遇到某张道具表时栅格化一次；
+  - 每局保留上一帧画面与其各区域的键，重绘时只把键发生变化的区域用底图擦除后重画（脏区域重绘）；
+    帧按最近使用淘汰，被淘汰的牌桌下次渲染时从底图整帧重画；
+  - 编码后的 PNG 按画面状态的哈希缓存，状态未变时不再绘制与编码。
+"""
+import io
+import os
+from collections import OrderedDict
+
+from .state import MAX_HP, MAX_ITEMS
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # Pillow 为可选依赖
+    Image = ImageDraw = ImageFont = None
+
+# 未配置字体时依次尝试的中文字体
+FONT_CANDIDATES = (
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/wenquanyi/wqy-microhei/wqy-microhei.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "C:/Windows/Fonts/msyh.ttc",
+)
+
+# 布局（像素）
+PAD = 12
+SLOT = 36          # 道具格间距，图标为 SLOT - 4
+ICON = SLOT - 4
+LABEL_W = 96
+HEADER_H = 28
+NAME_H = 24
+PIP = 16           # 血量格间距，格子为 PIP - 4
+MAG_H = 40
+WIDTH = PAD * 2 + LABEL_W + MAX_ITEMS * SLOT
+PLAYER_H = NAME_H + SLOT + 8
+HEIGHT = PAD * 2 + HEADER_H + 2 * PLAYER_H + MAG_H
+
+BACKGROUND = (32, 30, 36)
+PANEL = (46, 43, 52)
+TEXT = (232, 228, 220)
+DIM = (140, 134, 128)
+ACCENT = (214, 168, 72)
+HP_FULL = (196, 60, 60)
+HP_EMPTY = (72, 60, 64)
+LIVE = (208, 72, 56)
+BLANK = (92, 136, 196)
+# 道具图标底色，按效果编号索引
+KIND_COLORS = (
+    (150, 92, 60), (90, 130, 150), (176, 140, 60), (120, 110, 100), (110, 110, 130), (90, 150, 100),
+    (140, 90, 150), (70, 120, 120), (170, 70, 60), (190, 170, 70), (80, 110, 170),
+)
+# 无中文字体时图标上的缩写，按效果编号索引
+KIND_ABBR = ("SAW", "MAG", "BEER", "CIG", "CUF", "MED", "REV", "TEL", "BOM", "STAR", "SHD")
+
+# 名字行的状态标记（手铐 / 护盾 / 手锯），按是否有中文字体索引
+FLAG_LABELS = (("CUFF", "SHIELD", "x2"), ("手铐", "护盾", "双倍伤害"))
+
+# 区域：名称 -> (x, y, 宽, 高)
+REGIONS = {"header": (PAD, PAD, WIDTH - 2 * PAD, HEADER_H)}
+for _p in range(2):
+    _y = PAD + HEADER_H + _p * PLAYER_H
+    REGIONS[f"name{_p}"] = (PAD + LABEL_W, _y, WIDTH - 2 * PAD - LABEL_W, NAME_H)
+    REGIONS[f"hp{_p}"] = (PAD, _y + NAME_H, LABEL_W, SLOT)
+    for _k in range(MAX_ITEMS):
+        REGIONS[f"slot{_p}_{_k}"] = (PAD + LABEL_W + _k * SLOT, _y + NAME_H, SLOT, SLOT)
+REGIONS["magazine"] = (PAD, HEIGHT - PAD - MAG_H, WIDTH - 2 * PAD, MAG_H)
+
+
+def available() -> bool:
+    """是否安装了 Pillow"""
+    return Image is not None
+
+
+def _load_font(path: str, size: int):
+    """返回 (字体, 是否可显示中文)；path 为空时尝试常见中文字体，都不存在则用 Pillow 内置字体"""
+    for candidate in ((path,) if path else FONT_CANDIDATES):
+        if os.path.exists(candidate):
+            font = ImageFont.truetype(candidate, size)
+            break
+    else:
+        font = ImageFont.load_default(size)
+    # 缺字时不同汉字都渲染为同一个缺字方框
+    return font, bytes(font.getmask("轮")) != bytes(font.getmask("盘"))
+
+
+class _Frame:
+    """一局的上一帧：画面与各区域的键"""
+
+    __slots__ = ("image", "keys")
+
+    def __init__(self, image):
+        self.image = image
+        self.keys = {}
+
+
+class BoardRenderer:
+    """对战信息图片的渲染器：贴图缓存 + 每局的上一帧 + 按状态哈希的 PNG 缓存"""
+
+    def __init__(self, font_path: str = "", max_frames: int = 32, max_pngs: int = 256,
+                 compress_level: int = 1):
+        """
+        :param font_path: 字体文件路径，留空时自动查找中文字体
+        :param max_frames: 最多保留多少局的上一帧（每帧约 WIDTH * HEIGHT * 3 字节）
+        :param max_pngs: 最多缓存多少张编码后的 PNG
+        :param compress_level: PNG 的 zlib 压缩级别，画面以色块为主，低级别已足够小
+        """
+        self.font, self.cjk = _load_font(font_path, 14)
+        self.small, _ = _load_font(font_path, 11)
+        self.icon_font, _ = _load_font(font_path, 18 if self.cjk else 10)
+        self.max_frames = max_frames
+        self.max_pngs = max_pngs
+        self.compress_level = compress_level
+        self._frames = OrderedDict()   # 游戏键 -> _Frame
+        self._pngs = OrderedDict()     # 画面状态哈希 -> PNG 字节
+        self._icons = {}               # 道具表指纹 -> 按道具编号索引的图标
+        self.regions_drawn = 0         # 累计重绘的区域数
+        self._background = self._draw_background()
+        self._pip_full = self._tile((PIP - 4, PIP - 4), HP_FULL)
+        self._pip_empty = self._tile((PIP - 4, PIP - 4), HP_EMPTY)
+        self._slot_empty = self._tile((ICON, ICON), PANEL, outline=HP_EMPTY)
+        self._live = self._tile((10, 22), LIVE)
+        self._blank = self._tile((10, 22), BLANK)
+
+    # ------------- 贴图 -------------
+    @staticmethod
+    def _tile(size: tuple, fill: tuple, outline: tuple = None):
+        img = Image.new("RGB", size, BACKGROUND)
+        ImageDraw.Draw(img).rounded_rectangle((0, 0, size[0] - 1, size[1] - 1), radius=4, fill=fill,
+                                              outline=outline)
+        return img
+
+    def _draw_background(self):
+        img = Image.new("RGB", (WIDTH, HEIGHT), BACKGROUND)
+        draw = ImageDraw.Draw(img)
+        for p in range(2):
+            y = PAD + HEADER_H + p * PLAYER_H
+            draw.rounded_rectangle((PAD - 4, y - 2, WIDTH - PAD + 3, y + PLAYER_H - 6), radius=6, fill=PANEL)
+            label = f"玩家{p + 1}" if self.cjk else f"P{p + 1}"
+            draw.text((PAD, y + 4), label, font=self.font, fill=DIM)
+        return img
+
+    def _item_icons(self, table) -> list:
+        """该道具表的道具图标（按道具编号索引），每张表只栅格化一次"""
+        icons = self._icons.get(table.fingerprint)
+        if icons is None:
+            icons = self._icons[table.fingerprint] = []
+            for name, kind in zip(table.names, table.kinds):
+                img = self._tile((ICON, ICON), KIND_COLORS[kind % len(KIND_COLORS)])
+                glyph = name[0] if self.cjk else KIND_ABBR[kind]
+                ImageDraw.Draw(img).text((ICON / 2, ICON / 2), glyph, font=self.icon_font, fill=TEXT, anchor="mm")
+                icons.append(img)
+        return icons
+
+    def prepare(self, table):
+        """预先栅格化一张道具表的图标（插件加载与道具表热重载时调用）"""
+        self._item_icons(table)
+
+    # ------------- 画面状态 -------------
+    @staticmethod
+    def _keys(game, table_no: int, next_odds: str) -> dict:
+        """画面各区域的键：键相同的区域画出来完全一样"""
+        keys = {"header": (table_no, game.round)}
+        for p, pl in enumerate(game.players):
+            keys[f"name{p}"] = (pl.name, game.turn == p, pl.handcuff, pl.shield, game.double and game.turn == p)
+            keys[f"hp{p}"] = pl.hp
+            slots = [idx for idx, n in enumerate(pl.items.counts) for _ in range(n)]
+            for k in range(MAX_ITEMS):
+                keys[f"slot{p}_{k}"] = slots[k] if k < len(slots) else None
+        mag = game.bullet
+        keys["magazine"] = (mag.live, mag.blank, next_odds)
+        return keys
+
+    # ------------- 绘制 -------------
+    def _draw_region(self, img, name: str, key, game):
+        """在底图的该区域副本上绘制后整块贴回，绘制内容不会溢出到相邻区域"""
+        x, y, w, h = REGIONS[name]
+        tile = self._background.crop((x, y, x + w, y + h))
+        draw = ImageDraw.Draw(tile)
+        if name == "header":
+            table_no, rnd = key
+            # 与换轮消息一致：开局为第 0 轮，第一次换弹后为第 1 轮
+            text = f"恶魔轮盘 · {table_no} 号桌 · 第 {rnd} 轮" if self.cjk else f"Table {table_no} - Round {rnd}"
+            draw.text((0, 4), text, font=self.font, fill=ACCENT)
+        elif name.startswith("name"):
+            pname, current, cuffed, shielded, doubled = key
+            flags = [label for on, label in zip((cuffed, shielded, doubled), FLAG_LABELS[self.cjk]) if on]
+            draw.text((0, 4), ("> " if current else "") + pname, font=self.font, fill=ACCENT if current else TEXT)
+            draw.text((w - 2, 6), " ".join(flags), font=self.small, fill=DIM, anchor="ra")
+        elif name.startswith("hp"):
+            for i in range(MAX_HP):
+                tile.paste(self._pip_full if i < key else self._pip_empty, ((i % 6) * PIP, 4 + (i // 6) * PIP))
+        elif name.startswith("slot"):
+            tile.paste(self._slot_empty if key is None else self._item_icons(game.table)[key], (0, 0))
+        else:
+            live, blank, next_odds = key
+            for i in range(live + blank):
+                tile.paste(self._live if i < live else self._blank, (i * 14, 8))
+            label = (f"实弹 {live} / 空包弹 {blank}，下一发实弹 {next_odds}" if self.cjk
+                     else f"live {live} / blank {blank}, next live {next_odds}")
+            draw.text((w - 2, 12), label, font=self.small, fill=TEXT, anchor="ra")
+        img.paste(tile, (x, y))
+        self.regions_drawn += 1
+
+    def render(self, gid: str, game, table_no: int, next_odds: str) -> tuple:
+        """
+        渲染一局的对战信息图片，返回 (PNG 字节, 命中情况)：
+        cached 为画面状态未变、直接返回缓存的 PNG；warm 为在上一帧上只重绘变化的区域；cold 为从底图整帧绘制。
+        """
+        keys = self._keys(game, table_no, next_odds)
+        state = hash((game.table.fingerprint, *keys.values()))
+        png = self._pngs.get(state)
+        if png is not None:
+            self._pngs.move_to_end(state)
+            return png, "cached"
+        frame = self._frames.get(gid)
+        if frame is None:
+            frame = self._frames[gid] = _Frame(self._background.copy())
+            outcome = "cold"
+            if len(self._frames) > self.max_frames:
+                self._frames.popitem(last=False)
+        else:
+            self._frames.move_to_end(gid)
+            outcome = "warm"
+        drawn = frame.keys
+        for name, key in keys.items():
+            if drawn.get(name, drawn) != key:
+                self._draw_region(frame.image, name, key, game)
+                drawn[name] = key
+        buf = io.BytesIO()
+        frame.image.save(buf, "PNG", compress_level=self.compress_level)
+        png = self._pngs[state] = buf.getvalue()
+        if len(self._pngs) > self.max_pngs:
+            self._pngs.popitem(last=False)
+        return png, outcome
+
+    def forget(self, gid: str):
+        """游戏结束或移出内存：丢弃其上一帧"""
+        self._frames.pop(gid, None)
+
+    def stats(self) -> dict:
+        return {"frames": len(self._frames), "pngs": len(self._pngs),
+                "png_bytes": sum(map(len, self._pngs.values())), "regions_drawn": self.regions_drawn}
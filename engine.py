@@ -0,0 +1,263 @@
+# engine.py
+"""
+恶魔轮盘规则引擎。
+
+纯同步、无 IO：所有规则都直接作用于 GameState，随机数来自调用方传入的 rng
+（任何提供 random/randint/randrange/getrandbits 的对象，默认使用 random 模块），
+并以事件元组列表描述发生了什么。聊天文本由插件根据事件渲染，
+自对战模拟器（selfplay.py）则直接消费事件。
+
+事件均为 (类型, *参数) 元组，类型如下：
+  开枪    ("shot", 是否打自己, 是否实弹)
+          ("damage", 受伤玩家下标, 伤害) / ("shield_block", 护盾玩家下标)
+          ("keep_turn",) 空包弹打自己保留行动权 / ("turn", 新行动玩家下标) / ("handcuffed",)
+          ("empty",) 弹夹已空
+  轮次    ("round", 轮数, 子弹数, 实弹数, 空包弹数, 每人道具数)
+  结束    ("over", 胜者下标, 败者下标)
+  跳过    ("skipped", 被跳过的玩家下标)
+  道具    ("item", 道具编号, 结果, *参数)，结果见各效果函数（registry.EFFECTS 中有汇总）
+          ("consumed", 道具编号)
+
+道具的编号、掉落权重与兑换规则来自每局的道具表 game.table（见 registry.py），
+这里只实现各种效果，道具表把每个道具编号映射到其中之一。
+"""
+import random as _random
+
+from .magazine import Magazine
+from .state import GameState, MAX_HP
+
+# 开局道具数在 START_ITEMS 范围内随机，先手少拿一个
+START_ITEMS = (3, 6)
+# 每轮开始时双方各获得的道具数范围
+ROUND_ITEMS = (2, 5)
+
+
+def _finish(game: GameState, loser: int, events: list):
+    game.status = "over"
+    game.winner = 1 - loser
+    events.append(("over", 1 - loser, loser))
+
+
+def _hurt(game: GameState, idx: int, amount: int, events: list) -> bool:
+    """对玩家造成伤害，致死时结束游戏并返回 True"""
+    game.players[idx].hp -= amount
+    events.append(("damage", idx, amount))
+    if game.players[idx].hp <= 0:
+        _finish(game, idx, events)
+        return True
+    return False
+
+
+def start(game: GameState, rng=_random) -> list:
+    """开始游戏：生成弹夹、随机先后手、发放开局道具"""
+    game.status = "started"
+    game.bullet = Magazine.random(rng)
+    game.turn = rng.randint(0, 1)
+    game.double = False
+    game.round = 0
+    game.used_handcuff = False
+    base = rng.randint(*START_ITEMS)
+    draw = game.table.draw
+    for _ in range(base - 1):
+        game.current.items.fill(draw(rng))
+    for _ in range(base):
+        game.opponent.items.fill(draw(rng))
+    return [("start", game.turn, base - 1, base)]
+
+
+def next_round(game: GameState, rng=_random) -> tuple:
+    """进入下一轮：重新生成弹夹，并为双方发放新的随机道具（不超过上限）"""
+    game.round += 1
+    game.bullet = mag = Magazine.random(rng)
+    count = rng.randint(*ROUND_ITEMS)
+    cur, oth = game.current.items, game.opponent.items
+    draw = game.table.draw
+    for _ in range(count):
+        cur.fill(draw(rng))
+        oth.fill(draw(rng))
+    return ("round", game.round, len(mag), mag.live, mag.blank, count)
+
+
+def fire(game: GameState, at_self: bool, rng=_random) -> list:
+    """当前玩家开枪；at_self 为 True 时对自己开枪"""
+    events = []
+    if not game.bullet:
+        events.append(("empty",))
+        events.append(next_round(game, rng))
+        return events
+    me = game.turn
+    other = 1 - me
+    live = game.bullet.pop()
+    events.append(("shot", at_self, live))
+    if live:
+        damage = 2 if game.double else 1
+        if at_self:
+            if _hurt(game, me, damage, events):
+                return events
+        elif game.players[other].shield:
+            game.players[other].shield = False
+            events.append(("shield_block", other))
+        elif _hurt(game, other, damage, events):
+            return events
+    if not live and at_self:
+        events.append(("keep_turn",))
+    elif game.players[other].handcuff:
+        game.players[other].handcuff = False
+        events.append(("handcuffed",))
+    else:
+        game.switch_turn()
+        game.used_handcuff = False
+        events.append(("turn", game.turn))
+    game.double = False
+    if not game.bullet:
+        events.append(next_round(game, rng))
+    return events
+
+
+def skip_turn(game: GameState) -> list:
+    """跳过当前玩家的回合（挂机超时）：行动权交给对方，并清除手锯、手铐效果"""
+    afk = game.turn
+    game.switch_turn()
+    game.current.handcuff = False
+    game.double = False
+    game.used_handcuff = False
+    return [("skipped", afk), ("turn", game.turn)]
+
+
+def forfeit(game: GameState, loser: int) -> list:
+    """玩家认输（主动结束或挂机判负）"""
+    events = []
+    _finish(game, loser, events)
+    return events
+
+
+# ------------- 道具效果 -------------
+# 每个函数签名为 (game, me, item, rng, events)，item 为所使用道具的编号，
+# 向 events 追加 ("item", item, 结果, *参数)
+
+def _saw(game, me, item, rng, events):
+    game.double = True
+    events.append(("item", item, "ok"))
+
+
+def _magnifier(game, me, item, rng, events):
+    if not game.bullet:
+        events.append(("item", item, "empty"))
+    else:
+        events.append(("item", item, "ok", game.bullet.peek()))
+
+
+def _beer(game, me, item, rng, events):
+    if not game.bullet:
+        events.append(("item", item, "empty"))
+        return
+    events.append(("item", item, "ok", game.bullet.pop()))
+    if not game.bullet:
+        events.append(next_round(game, rng))
+
+
+def _cigarette(game, me, item, rng, events):
+    p = game.players[me]
+    if p.hp < MAX_HP:
+        p.hp += 1
+        events.append(("item", item, "ok"))
+    else:
+        events.append(("item", item, "full"))
+
+
+def _handcuff(game, me, item, rng, events):
+    if game.used_handcuff:
+        events.append(("item", item, "used"))
+        return
+    game.players[1 - me].handcuff = True
+    game.used_handcuff = True
+    events.append(("item", item, "ok"))
+
+
+def _expired_medicine(game, me, item, rng, events):
+    p = game.players[me]
+    if rng.random() < 0.5:
+        recover = min(MAX_HP - p.hp, 2)
+        p.hp += recover
+        events.append(("item", item, "heal", recover))
+        return
+    p.hp -= 1
+    events.append(("item", item, "hurt", 1))
+    if p.hp <= 0:
+        _finish(game, me, events)
+
+
+def _reverser(game, me, item, rng, events):
+    if not game.bullet:
+        events.append(("item", item, "empty"))
+    else:
+        events.append(("item", item, "ok", game.bullet.flip_top()))
+
+
+def _once_phone(game, me, item, rng, events):
+    size = len(game.bullet)
+    if size == 0:
+        events.append(("item", item, "empty"))
+        return
+    pos = rng.randint(0, size - 1)
+    # 位图自底向上编号，最高位为第一发
+    events.append(("item", item, "ok", size - pos, game.bullet.at(pos)))
+
+
+def _bomb(game, me, item, rng, events):
+    other = game.players[1 - me]
+    if other.shield:
+        other.shield = False
+        events.append(("item", item, "blocked"))
+        return
+    events.append(("item", item, "ok", 2))
+    _hurt(game, 1 - me, 2, events)
+
+
+def _lucky_star(game, me, item, rng, events):
+    p = game.players[me]
+    if rng.random() < 0.5:
+        if p.hp < MAX_HP:
+            p.hp += 1
+            events.append(("item", item, "heal"))
+        else:
+            events.append(("item", item, "full"))
+    else:
+        new_item = game.table.draw(rng)
+        p.items.add(new_item)
+        events.append(("item", item, "gift", new_item))
+
+
+def _shield(game, me, item, rng, events):
+    game.players[me].shield = True
+    events.append(("item", item, "ok"))
+
+
+# 按效果编号（registry.KINDS 的顺序）排列
+EFFECTS = (_saw, _magnifier, _beer, _cigarette, _handcuff, _expired_medicine,
+           _reverser, _once_phone, _bomb, _lucky_star, _shield)
+
+
+def use_item(game: GameState, item: int, rng=_random) -> list:
+    """当前玩家使用道具：结算效果后从背包中移除该道具（调用方需确保持有该道具）"""
+    me = game.turn
+    events = []
+    EFFECTS[game.table.kinds[item]](game, me, item, rng, events)
+    if game.players[me].items.remove(item):
+        events.append(("consumed", item))
+    return events
+
+
+def exchange(game: GameState, source: int, target: int) -> str:
+    """
+    当前玩家用 exchange_cost（默认 2）个 source 兑换 1 个 target，兑换规则见道具表。
+    返回 "ok"，或失败原因 "invalid"（规则不允许）/ "insufficient"（数量不足）。
+    """
+    table = game.table
+    if target not in table.exchanges[source]:
+        return "invalid"
+    items = game.current.items
+    if not items.remove(source, table.exchange_cost):
+        return "insufficient"
+    items.add(target)
+    return "ok"
@@ -0,0 +1,194 @@
+# hibernate.py
+"""
+长时间无人操作的游戏休眠到磁盘。
+
+进行中游戏数超过预算时，插件把最久没有活动的群的游戏休眠：
+把游戏记录（GameState.to_record()）压缩后写入 hibernate.db（SQLite），再从内存中移除该局的全部状态；
+该群（或跨群对局的另一方所在群）下一次发送指令或开枪 / 道具关键词时（闲聊不唤醒），插件从这里取回记录并按日志恢复的同一流程重建该局。
+
+内存中只保留各休眠游戏所在的群与对方群，以及每个群涉及的休眠局数，判断一个群是否需要唤醒是一次字典查找；
+休眠的游戏在库中按群与对方群建索引，唤醒一个群是一次索引查询。
+库在插件重载后仍然有效：启动时读出群集合，休眠的游戏在其群下一次活动时照常唤醒。
+休眠、唤醒与闲置回收都由插件放到线程中执行（asyncio.to_thread），不阻塞事件循环；各方法持有同一把锁，不会交错。
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+logger = logging.getLogger("astrbot")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS parked (
+    gid TEXT PRIMARY KEY,
+    channel TEXT NOT NULL,
+    remote TEXT,
+    parked_at REAL NOT NULL,
+    data BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS parked_channel ON parked (channel);
+CREATE INDEX IF NOT EXISTS parked_remote ON parked (remote) WHERE remote IS NOT NULL;
+CREATE INDEX IF NOT EXISTS parked_at ON parked (parked_at);
+"""
+
+
+def pack(rec: list) -> bytes:
+    """游戏记录 -> 压缩后的字节串"""
+    return zlib.compress(json.dumps(rec, separators=(",", ":")).encode(), 6)
+
+
+def unpack(data: bytes) -> list:
+    return json.loads(zlib.decompress(data))
+
+
+class GameHibernator:
+    """休眠游戏的存储；访问磁盘的方法可在任意线程中调用（单次操作为一条 SQLite 语句或一个小事务），同一时刻只执行一个"""
+
+    def __init__(self, path: str):
+        """
+        :param path: 数据库文件路径，首次休眠时才创建
+        """
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self._games = {}     # 库中休眠的游戏键 -> (群ID, 对方群ID 或 None)
+        self._channels = {}  # 有休眠游戏的群（含跨群对局的对方群）-> 涉及该群的休眠局数
+        self.parked = 0      # 累计休眠的局数
+        self.woken = 0       # 累计唤醒的局数
+        if os.path.exists(path):
+            self._open()
+            for gid, cid, remote in self._conn.execute("SELECT gid, channel, remote FROM parked"):
+                self._add(gid, cid, remote)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def _add(self, gid: str, cid: str, remote):
+        self._drop(gid)
+        self._games[gid] = (cid, remote)
+        channels = self._channels
+        for c in (cid, remote):
+            if c is not None:
+                channels[c] = channels.get(c, 0) + 1
+
+    def _drop(self, gid: str):
+        entry = self._games.pop(gid, None)
+        if entry is None:
+            return
+        channels = self._channels
+        for c in entry:
+            if c is not None:
+                n = channels.get(c, 0)
+                if n > 1:
+                    channels[c] = n - 1
+                else:
+                    channels.pop(c, None)
+
+    def __contains__(self, cid: str) -> bool:
+        """该群是否有休眠的游戏"""
+        return cid in self._channels
+
+    def __bool__(self) -> bool:
+        """是否有待唤醒的群"""
+        return bool(self._channels)
+
+    def park(self, games: list):
+        """
+        在一个事务中写入一批休眠游戏，写入成功后调用方才能从内存中移除它们。
+        :param games: [(游戏键, 群ID, 对方群ID 或 None, 游戏记录)]
+        """
+        now = time.time()
+        rows = [(gid, cid, remote, now, pack(rec)) for gid, cid, remote, rec in games]
+        with self._lock:
+            if self._conn is None:
+                self._open()
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO parked (gid, channel, remote, parked_at, data) VALUES (?, ?, ?, ?, ?)", rows,
+                )
+            for gid, cid, remote, _ in games:
+                self._add(gid, cid, remote)
+            self.parked += len(games)
+
+    def discard(self, gids: list):
+        """删除指定的休眠游戏（写入期间内存中的游戏又有了变化，库中的记录已过时）"""
+        with self._lock:
+            if self._conn is None:
+                return
+            with self._conn:
+                self._conn.executemany("DELETE FROM parked WHERE gid = ?", [(gid,) for gid in gids])
+            for gid in gids:
+                self._drop(gid)
+
+    def take(self, cid: str) -> list:
+        """
+        取出并删除该群（作为创建者或对方）的全部休眠游戏：[(游戏键, 游戏记录, 休眠时间戳)]。
+        跨群对局被一方唤醒后，另一方的群也不再计入该局，没有其它休眠游戏时随之移出。
+        """
+        with self._lock:
+            if cid not in self._channels:
+                return []
+            with self._conn:
+                rows = self._conn.execute(
+                    "SELECT gid, channel, remote, parked_at, data FROM parked WHERE channel = ? "
+                    "UNION ALL SELECT gid, channel, remote, parked_at, data FROM parked WHERE remote = ?",
+                    (cid, cid),
+                ).fetchall()
+                self._conn.executemany("DELETE FROM parked WHERE gid = ?", [(row[0],) for row in rows])
+            for row in rows:
+                self._drop(row[0])
+            # 库中记录与内存不一致（如被外部删除）时也不再反复查询该群
+            self._channels.pop(cid, None)
+        games = []
+        for gid, channel, remote, parked_at, data in rows:
+            try:
+                games.append((gid, unpack(data), parked_at))
+            except (zlib.error, ValueError):
+                logger.exception("恶魔轮盘休眠的游戏 %s 已损坏，丢弃", gid)
+        self.woken += len(games)
+        return games
+
+    def expire(self, before: float) -> list:
+        """删除休眠时间早于 before 的游戏（闲置回收），返回被删除的游戏键"""
+        with self._lock:
+            if self._conn is None:
+                return []
+            with self._conn:
+                gids = [row[0] for row in self._conn.execute("SELECT gid FROM parked WHERE parked_at < ?", (before,))]
+                self._conn.execute("DELETE FROM parked WHERE parked_at < ?", (before,))
+            for gid in gids:
+                self._drop(gid)
+        return gids
+
+    def count(self) -> int:
+        """库中休眠的局数（内存中的计数，不访问磁盘）"""
+        return len(self._games)
+
+    def checkpoint(self):
+        """把 WAL 中的内容写回主库并截断 WAL 文件，之后 db_bytes 即为库的实际大小"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        """关闭连接；正在执行的休眠或唤醒完成后才关闭"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> dict:
+        return {
+            "channels": len(self._channels),
+            "parked": self.parked,
+            "woken": self.woken,
+            # WAL 模式下新写入的页先留在 -wal 文件中，一并计入
+            "db_bytes": sum(os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p)),
+        }
@@ -0,0 +1,84 @@
+# inbound.py
+"""
+入站流控。
+
+活跃的群里当前玩家常把「自己」或道具名连发多次，旁观者也会反复发送「对战信息」。
+插件在处理游戏请求（开枪、使用道具与玩家指令）之前依次检查：
+  - 去抖（仅开枪与道具）：同一玩家在同一牌桌上发送的相同操作，距上一次被处理的同一操作不足 debounce 秒、
+    且该局状态（版本号）自那时起没有变化时视为重复。人在看到上一次的结果之前重发同一操作几乎总是误触或刷屏，
+    丢弃它可以避免重复的一枪打在已切换的回合上；上一次操作已改变了局面（如空包弹打自己后保留行动权再开一枪、
+    连用两个同样的道具）时则是新的操作，照常放行；
+  - 每群、每名玩家两级令牌桶：令牌不足时直接丢弃（不排队，以免积压的请求在局面改变后才被执行）。
+被丢弃的请求不回复，只计入指标（见 main.py 的 requests 计数器）。
+"""
+import time
+
+from .outbound import TokenBucket
+
+
+class FloodGuard:
+    """每群 / 每名玩家的令牌桶 + 相同操作去抖"""
+
+    def __init__(self, channel_rate: float = 10.0, channel_burst: int = 20,
+                 user_rate: float = 2.0, user_burst: int = 5, debounce: float = 1.0,
+                 max_entries: int = 10000):
+        """
+        :param channel_rate: 每个群每秒可处理的游戏请求数，0 为不限制
+        :param channel_burst: 每个群允许的突发请求数
+        :param user_rate: 每名玩家（按群区分）每秒可发起的游戏请求数，0 为不限制
+        :param user_burst: 每名玩家允许的突发请求数
+        :param debounce: 相同操作的去抖窗口（秒），0 为不去抖
+        :param max_entries: 令牌桶与去抖记录超过该数量时清理已闲置的条目
+        """
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.debounce = debounce
+        self.max_entries = max_entries
+        self._channels = {}
+        self._users = {}
+        self._recent = {}   # (游戏键, 玩家ID) -> (上一次被处理的操作, 当时该局的版本, 时间)
+        self._sweep_at = max_entries
+
+    @staticmethod
+    def _take(table: dict, key, rate: float, burst: int) -> bool:
+        bucket = table.get(key)
+        if bucket is None:
+            bucket = table[key] = TokenBucket(rate, burst)
+        return bucket.take()
+
+    def admit(self, cid: str, user: str):
+        """为一次请求申请群与玩家两级令牌：放行时返回 None，否则返回丢弃原因（channel_limited / user_limited）"""
+        if len(self._users) + len(self._recent) > self._sweep_at:
+            self._sweep()
+        if self.user_rate and not self._take(self._users, (cid, user), self.user_rate, self.user_burst):
+            return "user_limited"
+        if self.channel_rate and not self._take(self._channels, cid, self.channel_rate, self.channel_burst):
+            return "channel_limited"
+        return None
+
+    def admit_move(self, cid: str, user: str, gid: str, content: str, version=None):
+        """
+        开枪或使用道具：先去抖再申请令牌，放行时返回 None，否则返回丢弃原因（debounced 或令牌不足的原因）。
+        version 为该局当前的状态版本，与上一次放行时相同才可能视为重复。
+        """
+        if self.debounce:
+            now = time.monotonic()
+            last = self._recent.get((gid, user))
+            if last is not None and last[0] == content and last[1] == version and now - last[2] < self.debounce:
+                return "debounced"
+            reason = self.admit(cid, user)
+            if reason is None:
+                self._recent[gid, user] = (content, version, now)
+            return reason
+        return self.admit(cid, user)
+
+    def _sweep(self):
+        """清理已回满（闲置足够久）的令牌桶与过期的去抖记录；之后到条目数翻倍时才再次清理"""
+        now = time.monotonic()
+        for table in (self._users, self._channels):
+            for key in [k for k, b in table.items() if b.tokens + (now - b.stamp) * b.rate >= b.capacity]:
+                del table[key]
+        self._recent = {k: v for k, v in self._recent.items() if now - v[2] < self.debounce}
+        self._sweep_at = max(self.max_entries, 2 * (len(self._users) + len(self._recent)))
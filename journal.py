@@ -0,0 +1,170 @@
+# journal.py
+"""
+进行中游戏的预写日志（write-behind journal）。
+
+每次状态变化都以一条紧凑记录 [操作, 键, 游戏记录(, 操作流偏移)] 追加到 journal.log（键为游戏键「群ID#桌号」，旧版日志为群ID），
+记录由插件在事件循环中入队（不做任何磁盘 IO）。操作流（见 replay.py）只追加不修改，
+同一局已写过的部分不再重复写入：记录中只带新增的操作，并注明其在操作流中的起始偏移，重放日志时再拼接回完整的操作流，
+每条记录的大小因此与对局长度无关。记录
+由单独的写线程批量写入并 fsync，并周期性地把所有存活游戏压缩为 snapshot.json，
+随后截断日志。插件重载后从快照 + 日志恢复各牌桌的最新状态。
+"""
+import json
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger("astrbot")
+
+# 表示游戏已被移除的操作，恢复时遇到即删除该群的记录
+TERMINAL_OPS = frozenset(("over", "end", "timeout"))
+
+# 游戏记录（GameState.to_record()）中的种子与操作流（十六进制）字段
+SEED, LOG = 10, 11
+
+
+class GameJournal:
+    """
+    追加式游戏日志。
+    record() 可在事件循环中随意调用，仅做一次无锁入队；
+    写盘、fsync 与快照压缩全部在后台写线程中完成。
+    """
+
+    def __init__(self, data_dir: str, flush_interval: float = 0.5, snapshot_every: int = 5000):
+        """
+        :param data_dir: 日志与快照所在目录
+        :param flush_interval: 两次批量写盘之间的最长间隔（秒）
+        :param snapshot_every: 累计写入多少条记录后生成一次快照并截断日志
+        """
+        self.data_dir = data_dir
+        self.journal_path = os.path.join(data_dir, "journal.log")
+        self.snapshot_path = os.path.join(data_dir, "snapshot.json")
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self._queue = queue.SimpleQueue()
+        self._latest = {}       # 写线程维护：cid -> 最新游戏记录
+        self._since_snapshot = 0
+        self._thread = None
+        self._logged = {}       # 事件循环侧：cid -> (种子, 已写入日志的操作流长度（十六进制字符数）)
+        self.written = 0        # 写线程累计写入日志的字符数
+        self.loaded = threading.Event()
+        self.recovered = {}     # 启动时恢复出的 cid -> 游戏记录，由插件按需取用
+
+    # ------------- 事件循环侧 -------------
+    def start(self):
+        """启动写线程；线程会先在后台加载历史记录，再开始消费队列"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="buckshot-journal", daemon=True)
+            self._thread.start()
+
+    def record(self, op: str, cid: str, rec):
+        """
+        入队一条状态变化记录，rec 为 GameState.to_record() 的结果或 None。
+        该局此前已写入过操作流时只入队新增的部分（rec 的副本），写线程与恢复时按偏移拼接。
+        """
+        logged = self._logged
+        if op in TERMINAL_OPS or rec is None or len(rec) <= LOG or rec[LOG] is None:
+            logged.pop(cid, None)
+            self._queue.put((op, cid, rec))
+            return
+        log = rec[LOG]
+        prior = logged.get(cid)
+        logged[cid] = (rec[SEED], len(log))
+        if prior is None or prior[0] != rec[SEED] or prior[1] > len(log):
+            # 该局首次写入（或同一桌号上开了新的一局）：写入完整的操作流
+            self._queue.put((op, cid, rec))
+            return
+        delta = list(rec)
+        delta[LOG] = log[prior[1]:]
+        self._queue.put((op, cid, delta, prior[1] // 2))
+
+    def close(self, timeout: float = 5.0):
+        """写入剩余记录、生成最终快照并停止写线程（会阻塞，应在线程池中调用）"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # ------------- 写线程侧 -------------
+    def _run(self):
+        os.makedirs(self.data_dir, exist_ok=True)
+        try:
+            self._latest = self._load()
+        except Exception:
+            logger.exception("恶魔轮盘日志加载失败，将从空状态开始")
+            self._latest = {}
+        self.recovered = dict(self._latest)
+        self.loaded.set()
+        with open(self.journal_path, "a", encoding="utf-8") as fp:
+            while True:
+                try:
+                    first = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                batch = [first]
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = None in batch
+                records = [r for r in batch if r is not None]
+                if records:
+                    data = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in records)
+                    fp.write(data)
+                    fp.flush()
+                    os.fsync(fp.fileno())
+                    self.written += len(data)
+                    for r in records:
+                        self._apply(self._latest, *r)
+                    self._since_snapshot += len(records)
+                if stop or self._since_snapshot >= self.snapshot_every:
+                    self._write_snapshot()
+                    fp.seek(0)
+                    fp.truncate()
+                    self._since_snapshot = 0
+                if stop:
+                    return
+
+    @staticmethod
+    def _apply(state: dict, op: str, cid: str, rec, offset: int = None):
+        """把一条记录应用到 cid -> 游戏记录；带偏移的记录只含新增的操作流，拼接到该局已有的操作流之后"""
+        if op in TERMINAL_OPS or rec is None:
+            state.pop(cid, None)
+            return
+        if offset is not None:
+            prior = state.get(cid)
+            log = prior[LOG] if prior is not None and len(prior) > LOG else None
+            if log is not None and len(log) >= offset * 2 and prior[SEED] == rec[SEED]:
+                # 快照写入后、截断日志前崩溃时，快照之后的记录会再应用一次，按偏移截取保证重复应用结果不变
+                rec[LOG] = log[:offset * 2] + rec[LOG]
+            else:
+                # 之前的记录缺失（日志损坏）：状态仍可恢复，但该局无法回放
+                rec[LOG] = None
+        state[cid] = rec
+
+    def _load(self) -> dict:
+        """读取快照并重放其后的日志；日志末尾因崩溃而残缺的行会被忽略"""
+        state = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding="utf-8") as fp:
+                state = json.load(fp)
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding="utf-8") as fp:
+                for line in fp:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._apply(state, *entry)
+        return state
+
+    def _write_snapshot(self):
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fp:
+            json.dump(self._latest, fp, ensure_ascii=False, separators=(",", ":"))
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp, self.snapshot_path)
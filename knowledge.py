@@ -0,0 +1,174 @@
+# knowledge.py
+"""
+弹夹的公开信息与实弹概率。
+
+每轮开始时公布实弹与空包弹数量，之后每发子弹（开枪、啤酒）出膛时揭晓，
+放大镜、逆转器、一次性电话揭示的子弹发送在使用者的群内：同群对局中这些信息对双方玩家（以及 AI）相同，
+跨群对局中对手的群只收到隐去了结果的转播，因此插件为对局双方的群各保存一份 Knowledge。
+Knowledge 随规则引擎的事件增量记录这些事实；看不到结果的一方只知道对手用逆转器翻转了下一发：
+这一发若已知则随之取反，否则记为「已翻转」，此时该群只知道翻转之前的实弹数。
+
+子弹在生成时相互独立、各以 50% 为实弹，因此在已知实弹总数的条件下，
+未揭示的位置上实弹的所有排列等可能：
+  - 某个未揭示位置为实弹的概率 = 未揭示的实弹数 / 未揭示的位置数，
+  - 接下来 k 发中恰有 j 发实弹的概率服从超几何分布（已揭示的位置直接计入）。
+已翻转的位置按翻转前的值参与上面的计算，再把该位置为实弹的概率取反（1 - p）。
+odds() 与 live_in_next() 以 (弹夹长度, 实弹数, 已知位掩码, 已知实弹位, 已翻转位) 为键缓存结果，
+其中实弹数按已翻转位置翻转前的值计；每次开枪后只有键变化，相同的知识状态不会重复计算。
+"""
+from functools import lru_cache
+from math import comb
+
+from .magazine import Magazine
+from .registry import DEFAULT_TABLE, KIND_INDEX, ItemTable
+
+MAGNIFIER = KIND_INDEX["magnifier"]
+BEER = KIND_INDEX["beer"]
+REVERSER = KIND_INDEX["reverser"]
+PHONE = KIND_INDEX["phone"]
+
+
+class Knowledge:
+    """
+    一局游戏中一方（一个群）已知的子弹。
+    以「本轮第几发（从 0 计）」记录，不受弹夹位图下标随出膛变化的影响；
+    由插件把每次操作的事件交给 observe 更新；道具事件按该局道具表中的效果识别。
+    """
+
+    __slots__ = ("fired", "known", "flipped", "kinds")
+
+    def __init__(self, table: ItemTable = DEFAULT_TABLE):
+        self.fired = 0
+        self.known = {}       # 第几发 -> 是否为实弹（当前值）
+        self.flipped = set()  # 被对手的逆转器翻转过、本方不知道其值的位置
+        self.kinds = table.kinds
+
+    def reset(self):
+        self.fired = 0
+        self.known.clear()
+        self.flipped.clear()
+
+    def _eject(self):
+        self.known.pop(self.fired, None)
+        self.flipped.discard(self.fired)
+        self.fired += 1
+
+    def observe(self, events: list, secret: bool = True):
+        """
+        按一次操作的事件更新；secret 为 False 表示本方看不到这次操作中放大镜、逆转器与一次性电话的结果
+        （跨群对局中由对手执行的操作）。
+        """
+        known = self.known
+        for ev in events:
+            kind = ev[0]
+            if kind == "shot":
+                self._eject()
+            elif kind in ("round", "start"):
+                self.reset()
+            elif kind == "item" and ev[2] == "ok":
+                idx = self.kinds[ev[1]]
+                if idx == BEER:
+                    self._eject()
+                elif not secret:
+                    if idx == REVERSER:
+                        pos = self.fired
+                        if pos in known:
+                            known[pos] = not known[pos]
+                        else:
+                            self.flipped ^= {pos}
+                elif idx == MAGNIFIER or idx == REVERSER:
+                    known[self.fired] = ev[3]
+                    self.flipped.discard(self.fired)
+                elif idx == PHONE:
+                    pos = self.fired + ev[3] - 1
+                    known[pos] = ev[4]
+                    self.flipped.discard(pos)
+
+    def masks(self, size: int) -> tuple:
+        """转换为与 Magazine 相同的自底向上位图：(已知位掩码, 已知实弹位)"""
+        kmask = kbits = 0
+        for pos, live in self.known.items():
+            idx = size - 1 - (pos - self.fired)
+            if 0 <= idx < size:
+                kmask |= 1 << idx
+                if live:
+                    kbits |= 1 << idx
+        return kmask, kbits
+
+    def top(self):
+        """下一发是否为实弹，未知时为 None"""
+        return self.known.get(self.fired)
+
+    def key(self, mag: Magazine) -> tuple:
+        """
+        当前知识状态：(弹夹长度, 实弹数, 已知位掩码, 已知实弹位, 已翻转位)。
+        有已翻转的位置时，实弹数按这些位置翻转前的值计（即本方能推算出的数量），而不是弹夹的真实实弹数。
+        """
+        size = mag.size
+        live = mag.live
+        fmask = 0
+        for pos in self.flipped:
+            idx = size - 1 - (pos - self.fired)
+            if 0 <= idx < size:
+                fmask |= 1 << idx
+                # 该位置当前为实弹时，翻转前为空包弹
+                live += -1 if mag.bits >> idx & 1 else 1
+        return (size, live, *self.masks(size), fmask)
+
+
+@lru_cache(maxsize=4096)
+def odds(size: int, live: int, kmask: int, kbits: int, fmask: int = 0) -> tuple:
+    """按发射顺序（第 0 项为下一发）返回每发子弹为实弹的概率"""
+    unknown = size - kmask.bit_count()
+    p = (live - kbits.bit_count()) / unknown if unknown else 0.0
+    out = []
+    for idx in range(size - 1, -1, -1):
+        bit = 1 << idx
+        if kmask & bit:
+            out.append(1.0 if kbits & bit else 0.0)
+        else:
+            out.append(1.0 - p if fmask & bit else p)
+    return tuple(out)
+
+
+@lru_cache(maxsize=4096)
+def live_in_next(size: int, live: int, kmask: int, kbits: int, fmask: int = 0, k: int = 2) -> tuple:
+    """接下来 k 发中恰有 j 发实弹的概率（j = 0..k）"""
+    k = min(k, size)
+    window = ((1 << k) - 1) << (size - k)     # 下 k 发对应的最高 k 位
+    known_live = (kbits & window).bit_count()
+    flips = (fmask & window).bit_count()      # 窗口内已翻转的位置数
+    draws = k - (kmask & window).bit_count() - flips  # 窗口内其余未揭示的位置数
+    unknown = size - kmask.bit_count()
+    hidden_live = live - kbits.bit_count()    # 未揭示位置（翻转前）中的实弹数
+    total = comb(unknown, hidden_live)
+    dist = [0.0] * (k + 1)
+    # 未翻转的位置抽到 j 发实弹、已翻转的位置翻转前有 f 发实弹（翻转后为 flips - f 发）
+    for j in range(min(draws, hidden_live) + 1):
+        for f in range(min(flips, hidden_live - j) + 1):
+            n = comb(draws, j) * comb(flips, f) * comb(unknown - draws - flips, hidden_live - j - f)
+            if n:
+                dist[known_live + j + flips - f] += n / total
+    return tuple(dist)
+
+
+def live_range(size: int, live: int, kmask: int, kbits: int, fmask: int = 0) -> tuple:
+    """弹夹中真实实弹数的可能范围 (最少, 最多)；没有已翻转的位置时两者相同"""
+    flips = fmask.bit_count()
+    if not flips:
+        return live, live
+    unknown = size - kmask.bit_count()
+    hidden_live = live - kbits.bit_count()
+    # 翻转前有 f 发实弹的已翻转位置，翻转后实弹数为 live - f + (flips - f)
+    most = min(flips, hidden_live)
+    least = max(0, flips - (unknown - hidden_live))
+    return live + flips - 2 * most, live + flips - 2 * least
+
+
+def percent(p: float) -> str:
+    """概率的展示文本：确定时不带小数"""
+    if p <= 0.0:
+        return "0%"
+    if p >= 1.0:
+        return "100%"
+    return f"{p:.1%}"
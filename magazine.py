@@ -0,0 +1,79 @@
+# magazine.py
+"""
+位压缩弹夹。
+
+弹夹用一个整数位图加长度表示：第 i 位为自底向上第 i 发子弹（1 为实弹），
+第 size-1 位即下一发。同时维护实弹计数，因此出膛、查看、
+反转下一发、随机位置揭示以及实弹/空包弹数量查询均为 O(1)。
+"""
+import random
+
+LIVE = "实弹"
+BLANK = "空包弹"
+
+
+def bullet_name(live: bool) -> str:
+    """将子弹的布尔表示转换为展示用名称"""
+    return LIVE if live else BLANK
+
+
+class Magazine:
+    """整数位图弹夹"""
+
+    __slots__ = ("bits", "size", "live")
+
+    def __init__(self, bits: int = 0, size: int = 0):
+        self.bits = bits
+        self.size = size
+        self.live = bits.bit_count()
+
+    @classmethod
+    def random(cls, rng=random, min_size: int = 3, max_size: int = 8) -> "Magazine":
+        """
+        随机生成一个弹夹：
+          - 子弹数量在 min_size ~ max_size 之间
+          - 每发子弹独立地以50%概率为实弹，因此无需再洗牌
+        """
+        size = rng.randint(min_size, max_size)
+        return cls(rng.getrandbits(size), size)
+
+    @property
+    def blank(self) -> int:
+        return self.size - self.live
+
+    def __len__(self):
+        return self.size
+
+    def __bool__(self):
+        return self.size > 0
+
+    def peek(self) -> bool:
+        """查看下一发是否为实弹（弹夹不能为空）"""
+        return self.bits >> (self.size - 1) & 1 == 1
+
+    def pop(self) -> bool:
+        """取出下一发，返回其是否为实弹（弹夹不能为空）"""
+        self.size -= 1
+        live = self.bits >> self.size & 1 == 1
+        if live:
+            self.bits ^= 1 << self.size
+            self.live -= 1
+        return live
+
+    def flip_top(self) -> bool:
+        """反转下一发子弹的类型，返回反转后是否为实弹（弹夹不能为空）"""
+        mask = 1 << (self.size - 1)
+        self.bits ^= mask
+        if self.bits & mask:
+            self.live += 1
+            return True
+        self.live -= 1
+        return False
+
+    def at(self, idx: int) -> bool:
+        """查看自底向上第 idx 发是否为实弹，其发射顺序为第 size - idx 发"""
+        return self.bits >> idx & 1 == 1
+
+    def to_list(self) -> list:
+        """按自底向上顺序展开为子弹名称列表（末尾为下一发），供调试展示"""
+        return [bullet_name(self.bits >> i & 1) for i in range(self.size)]
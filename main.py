@@ -1,25 +1,77 @@
 # main.py
 from astrbot.api.all import *  # 导入所有API
 import asyncio
-import textwrap
-import random
+import functools
+import itertools
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-def generate_random_bullet_list():
+from . import ai, board, engine, registry, replay
+from .state import GameState, PlayerState, MAX_HP, MAX_ITEMS
+from .magazine import bullet_name
+from .journal import GameJournal
+from .hibernate import GameHibernator
+from .scheduler import TimerScheduler
+from .templates import TemplatePack
+from .outbound import Outbox
+from .inbound import FloodGuard
+from .spectate import Spectators
+from .matchmaking import DEFAULT_RATING, MatchQueue
+from .actor import ChannelActors
+from .metrics import Metrics
+from .profiler import SamplingProfiler, supported as profiling_supported
+from .knowledge import Knowledge, odds, live_in_next, live_range, percent
+from .stats import GameResult, StatsStore
+from .store import StoreConflict, StoreError, open_store
+
+logger = logging.getLogger("astrbot")
+
+PLUGIN_NAME = "astrbot_plugin_buckshot_roulette"
+# 插件数据目录（AstrBot 工作目录下的 data/plugin_data/<插件名>）
+DATA_DIR = os.path.join("data", "plugin_data", PLUGIN_NAME)
+# 共享存储下一次操作因版本冲突重试的最多次数
+STORE_RETRIES = 3
+# 共享存储后端不可用时抛出的异常（连接断开、数据库锁超时、服务端报错等）
+STORE_ERRORS = (StoreError, OSError, sqlite3.Error)
+# 匹配队列放宽容许评分差与检查超时的间隔（秒）
+MATCH_TICK = 5.0
+# 内存中的游戏超出预算后，到下一次休眠检查的间隔（秒）
+HIBERNATE_TICK = 1.0
+# 一次性能采样窗口的默认与最长秒数
+PROFILE_SECONDS = 10
+MAX_PROFILE_SECONDS = 300
+# 揭示膛内子弹的道具效果：观战转播中隐去其结果
+SECRET_EFFECTS = frozenset(registry.KIND_INDEX[kind] for kind in ("magnifier", "reverser", "phone"))
+
+
+def game_key(cid: str, table: int) -> str:
+    """游戏键「群ID#桌号」：self.games、日志以及各项按局保存的状态都以它为键"""
+    return f"{cid}#{table}"
+
+
+def parse_table(text: str):
     """
-    随机生成一个弹夹列表：
-      - 子弹数量在 3 ~ 8 之间
-      - 每发子弹为 "实弹" 或 "空包弹"（各50%概率）
-      - 最后洗牌后返回
+    桌号文本 -> 桌号，不是桌号时返回 None。
+    只接受 ASCII 数字：str.isdigit() 对「²」等 Unicode 数字也为真，但 int() 无法转换。
     """
-    bullet_count = random.randint(3, 8)
-    bullets = []
-    for _ in range(bullet_count):
-        bullets.append("实弹" if random.random() < 0.5 else "空包弹")
-    random.shuffle(bullets)
-    return bullets
+    return int(text) if text.isascii() and text.isdigit() else None
+
+
+def split_key(gid: str) -> tuple:
+    """游戏键 -> (群ID, 桌号)；旧版日志以群ID为键，此时桌号为 None"""
+    cid, sep, table = gid.rpartition("#")
+    number = parse_table(table) if sep else None
+    if number is None:
+        return gid, None
+    return cid, number
+
 
 @register(
-    "astrbot_plugin_buckshot_roulette",  # 插件唯一识别名
+    PLUGIN_NAME,                         # 插件唯一识别名
     "w33d",                              # 作者
     "恶魔轮盘 - Buckshot Roulette",       # 简短描述
     "1.1.1"                              # 版本号
@@ -41,69 +93,930 @@ class BuckshotRoulette(Star):
             config = {}
         self.config = {
             "admin": config.get("admin", []),             # 管理员列表（ID列表）
-            "maxWaitTime": config.get("maxWaitTime", 180)   # 等待玩家2加入的最大秒数
-        }
-        self.games = {}  # 存储各群/会话的游戏数据
-
-        # 定义可用道具（已移除肾上腺素，新增加炸弹、幸运星、护盾）
-        self.item_list = {
-            "手锯": {
-                "description": "下一发造成双倍伤害，不可叠加",
-                "use": self.use_saw,
-            },
-            "放大镜": {
-                "description": "查看当前膛内的子弹",
-                "use": self.use_magnifier,
-            },
-            "啤酒": {
-                "description": "卸下当前膛内的子弹",
-                "use": self.use_beer,
-            },
-            "香烟": {
-                "description": "恢复1点生命值",
-                "use": self.use_cigarette,
-            },
-            "手铐": {
-                "description": "让对方跳过下一回合",
-                "use": self.use_handcuff,
-            },
-            "过期药物": {
-                "description": "50%几率恢复2血；50%几率损失1血",
-                "use": self.use_expired_medicine,
-            },
-            "逆转器": {
-                "description": "将最后一发子弹类型反转",
-                "use": self.use_reverser,
-            },
-            "一次性电话": {
-                "description": "随机告知枪膛中某发子弹的类型（不移除）",
-                "use": self.use_once_phone,
-            },
-            "炸弹": {
-                "description": "投掷后对对手造成2点伤害（若对方有护盾则抵消）",
-                "use": self.use_zhandan,
-            },
-            "幸运星": {
-                "description": "随机获得血量恢复或额外道具",
-                "use": self.use_xingyunxing,
-            },
-            "护盾": {
-                "description": "获得护盾效果，下一次攻击伤害将被抵消",
-                "use": self.use_hudun,
-            },
+            "maxWaitTime": config.get("maxWaitTime", 180),  # 等待玩家2加入的最大秒数
+            "journal": config.get("journal", True),         # 是否持久化进行中的游戏
+            "turnTimeout": config.get("turnTimeout", 0),    # 回合挂机超时秒数，0 为不限制
+            "afkAction": config.get("afkAction", "forfeit"),  # 挂机超时处理：forfeit 判负 / skip 跳过回合
+            "idleTimeout": config.get("idleTimeout", 3600),  # 游戏无任何操作多久后自动回收，0 为不回收
+            "locale": config.get("locale", "zh_CN"),        # 消息语言包
+            "channelRate": config.get("channelRate", 1.0),  # 每个群每秒最多发送的消息数
+            "platformRate": config.get("platformRate", 20.0),  # 每个平台每秒最多发送的消息数
+            "metricsFile": config.get("metricsFile", ""),   # Prometheus 指标文件路径，留空不导出
+            "metricsInterval": config.get("metricsInterval", 60),  # 指标文件写入间隔秒数
+            "aiDifficulty": config.get("aiDifficulty", "normal"),  # 人机对战默认难度：easy / normal / hard
+            "stats": config.get("stats", True),             # 是否记录玩家战绩与排行榜
+            "maxTables": config.get("maxTables", 10),       # 每个群同时存在的牌桌上限，0 为不限制
+            "store": config.get("store", "memory"),         # 游戏状态存储：memory / sqlite / redis://...
+            "channelRequestRate": config.get("channelRequestRate", 10.0),  # 每个群每秒可处理的游戏请求数，0 为不限制
+            "channelRequestBurst": config.get("channelRequestBurst", 20),  # 每个群允许的突发游戏请求数
+            "userRequestRate": config.get("userRequestRate", 2.0),         # 每名玩家每秒可发起的游戏请求数，0 为不限制
+            "userRequestBurst": config.get("userRequestBurst", 5),         # 每名玩家允许的突发游戏请求数
+            "moveDebounce": config.get("moveDebounce", 1.0),  # 相同开枪 / 道具操作的去抖秒数，0 为不去抖
+            "imageMode": config.get("imageMode", False),    # 对战信息与开局 / 换轮播报附带对战图片（需要 Pillow）
+            "imageFont": config.get("imageFont", ""),       # 图片使用的字体文件，留空自动查找中文字体
+            "spectatorLimit": config.get("spectatorLimit", 100),  # 每局最多可转播到的群数，0 为关闭观战
+            "spectatorQueue": config.get("spectatorQueue", 20),   # 每个观战群最多积压的转播消息数
+            "matchTimeout": config.get("matchTimeout", 300),      # 匹配的最长等待秒数，0 为关闭匹配
+            "matchWindow": config.get("matchWindow", 100),        # 匹配刚开始时容许的最大评分差，之后逐渐放宽
+            "maxActiveGames": config.get("maxActiveGames", 5000),  # 内存中最多保留的游戏数，超出时休眠最久未活动的，0 为不限制
         }
+        # 游戏状态存储：每次状态变化都按版本号写入存储（乐观并发控制），self.games 是本进程的读缓存。
+        # 共享存储（sqlite / redis）下多个进程可以服务同一批群：处理前按群版本号校验缓存，有变化时重新读取该群的牌桌，
+        # 提交时发现版本冲突则丢弃本地副本、重新读取后重试（见 _attempt）。
+        # 共享存储的读写都在专用的存储线程中执行，不阻塞事件循环，也让后端连接只被一个线程使用。
+        # 配置有误时直接报错而不退回内存存储，以免多个进程各自为政
+        self.store = open_store(self.config["store"], DATA_DIR)
+        self._shared = self.store.shared
+        self._store_pool = None
+        if self._shared:
+            self._store_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="buckshot-store")
+        self._versions = {}  # 游戏键 -> 缓存副本的版本
+        self._synced = {}    # 群ID -> 缓存已同步到的群版本
+        self._unsaved = None  # 共享存储：操作中提交、尚待写入存储的 (op, 游戏键)，由 _attempt 写入
+        self._writing = {}    # 游戏键 -> 该局正在写入存储的 Future
+        self._epochs = {}     # 群ID -> 本进程对该群缓存的写入与同步次数，用于识别读取期间缓存已变化的同步结果
+        self._syncing = {}    # 群ID -> 正在进行的同步任务，同群同时到来的同步合并为一次读取
+        self._results = {}   # 游戏键 -> 已结束对局的结果，提交成功后才入队写入战绩库
+        self._broadcasts = {}  # 游戏键 -> (待转播给观战群的文本, 已直接收到该消息的会话)，提交成功后才投递
+        # 各牌桌的游戏数据：游戏键（群ID#桌号）-> GameState，一个群可同时开多张牌桌
+        self.games = {}
+        # 玩家索引：(群ID, 玩家ID) -> 该玩家所在牌桌的游戏键，每名玩家在一个群中同时只坐一张桌（AI 不登记）
+        # _seated 记录每张桌已登记的 (群ID, 玩家ID)，_tables 记录每个群现有的桌号；三者都在 _commit 中随状态同步更新
+        self._seats = {}
+        self._seated = {}
+        self._tables = {}
+        # 消息路由索引：游戏键 -> (当前行动玩家ID, 该玩家可触发的关键词集合)
+        # 仅包含已开始的游戏；on_message 经玩家索引找到发言者的牌桌，再一次哈希查找即可过滤无关消息
+        self._routes = {}
+        # 游戏日志：记录每次状态变化，重载后按群懒恢复（见 get_channel_id）；共享存储本身即持久化，不再使用日志
+        self.journal = None
+        self._pending = None  # 群ID -> 日志中待恢复的游戏键，首次恢复时按群归类
+        if self.config["journal"] and not self._shared:
+            self.journal = GameJournal(DATA_DIR)
+            self.journal.start()
+        # 休眠：内存中的游戏数超过 maxActiveGames 时，由定时的休眠检查从最久没有活动的群开始把牌桌移出内存，
+        # 该群下次活动时唤醒（见 _hibernate / _wake）。共享存储本身在进程外，休眠只需丢弃缓存、下次同步时重新读取；
+        # 否则把记录压缩后在线程中写入 hibernate.db，写入完成前游戏仍留在内存中
+        self._recent = OrderedDict()  # 群ID -> None，按最近一次状态变化或指令排序，最久未活动的在前
+        self._hibernate_timer = None
+        self._parking = {}  # 游戏键 -> (写入 hibernate.db 时的 GameState, 版本)；写入期间被唤醒时值为 None
+        self._waking = {}   # 群ID -> 正在进行的唤醒任务，同群同时到来的唤醒合并为一次读取
+        self.hibernation = None
+        if not self._shared:
+            self.hibernation = GameHibernator(os.path.join(DATA_DIR, "hibernate.db"))
+        # 所有游戏共用一个定时器调度器，每局最多持有一个定时器（游戏键 -> Timer）
+        self.scheduler = TimerScheduler()
+        self._timers = {}
+        self._afk_streak = {}  # 游戏键 -> 连续因挂机被跳过的回合数
+        # 出站管道：一次操作合并为一条消息，并按群/平台限流
+        self.outbox = Outbox(
+            channel_rate=self.config["channelRate"],
+            platform_rate=self.config["platformRate"],
+        )
+        # 观战转播：每个观战群一个有界队列，经出站管道以不透支的方式后台发送
+        self.spectators = Spectators(
+            functools.partial(self.outbox.send_background, self.context),
+            queue_size=self.config["spectatorQueue"],
+        )
+        # 跨群匹配：全局队列按评分配对，容许的评分差随等待时间放宽；配对后在先入队玩家的群开桌，
+        # 对方群订阅该局的转播以看到对手的行动（见 _do_match）
+        self.matchmaking = MatchQueue(
+            window=self.config["matchWindow"], widen_every=MATCH_TICK, timeout=self.config["matchTimeout"],
+        )
+        self._match_timer = None
+        # 入站流控：开枪、道具与玩家指令先经过去抖与每群 / 每名玩家的令牌桶，超限的请求直接丢弃（管理员不受限）
+        self.flood = FloodGuard(
+            channel_rate=self.config["channelRequestRate"],
+            channel_burst=self.config["channelRequestBurst"],
+            user_rate=self.config["userRequestRate"],
+            user_burst=self.config["userRequestBurst"],
+            debounce=self.config["moveDebounce"],
+        )
+        # 只读指令（对战信息、概率）的渲染缓存：(游戏键, 指令) -> (渲染时该局的版本, 文本)，状态变化后版本不同即失效
+        self._renders = {}
+        # 按牌桌串行执行所有修改游戏状态的操作（创建游戏按群串行），同群的不同牌桌互不等待。
+        # 同步操作中没有 await，直接内联执行；AI 回合与共享存储下的操作含 await，经邮箱执行，期间该牌桌的其它操作排队
+        self.actors = ChannelActors()
+        # 运行时指标：计数器与处理耗时直方图常驻开启，可选定期导出为 Prometheus 文本文件
+        self.metrics = Metrics(self._gauges)
+        self._metrics_path = self.config["metricsFile"]
+        if self._metrics_path and not os.path.isabs(self._metrics_path):
+            self._metrics_path = os.path.join(DATA_DIR, self._metrics_path)
+        self._export_timer = None
+        # 按需开启的采样分析器（debug 性能采样），窗口之外不设定时器与信号处理，热路径上没有任何埋点
+        self.profiler = SamplingProfiler()
+        # 各进行中游戏已公开揭示的子弹，用于概率提示与 AI 决策（游戏键 -> Knowledge）；
+        # 跨群对局中这是主场群一方所知，玩家2所在群一方所知的另存一份（游戏键 -> Knowledge）
+        self._knowledge = {}
+        self._remote_knowledge = {}
+        # 玩家战绩：各进行中游戏双方的 [开枪, 道具, 造成伤害, 承受伤害]，结束时入队写入 SQLite
+        self._tallies = {}
+        self.stats = None
+        if self.config["stats"]:
+            self.stats = StatsStore(os.path.join(DATA_DIR, "stats.db"))
+            self.stats.start()
+        # 人机对战：AI 的搜索在单线程池中进行，不阻塞事件循环；置换表在各局之间共用
+        self._ai_pool = None
+        self._ai_searcher = ai.Searcher()
+        self._ai_games = {}  # 游戏键 -> AI 难度
+        self._ai_tasks = {}  # 游戏键 -> 正在思考的 AI 回合任务
+
+        # 道具表：数据目录下的 items.json 优先，否则使用插件自带的默认配置，可由「debug 重载道具」热重载。
+        # 新游戏使用当前道具表，进行中的游戏保留开局时的表；_item_tables 按指纹保存用过的表，供日志恢复
+        try:
+            self.item_table = self._load_items()
+        except (OSError, ValueError):
+            logger.exception("恶魔轮盘道具配置有误，使用默认道具")
+            self.item_table = registry.DEFAULT_TABLE
+        self._item_tables = {self.item_table.fingerprint: self.item_table}
+        # 用过的各道具表中所有的开枪与道具关键词：共享存储下 on_message 先用它滤掉闲聊，只有可能是操作的消息才同步缓存
+        self._move_words = frozenset(("自己", "对方")).union(self.item_table.lookup)
+        # 各效果的内置文本描述函数，道具配置中未提供自定义文本时使用
+        self._item_texts = tuple({
+            "saw": self.saw_text,
+            "magnifier": self.magnifier_text,
+            "beer": self.beer_text,
+            "cigarette": self.cigarette_text,
+            "handcuff": self.handcuff_text,
+            "medicine": self.expired_medicine_text,
+            "reverser": self.reverser_text,
+            "phone": self.once_phone_text,
+            "bomb": self.zhandan_text,
+            "lucky_star": self.xingyunxing_text,
+            "shield": self.hudun_text,
+        }[kind] for kind in registry.KINDS)
+        # 消息模板与道具说明行在加载时一次性编译
+        self.templates = TemplatePack.load(self.config["locale"])
+        # 图片模式：渲染器在加载时栅格化全部贴图；未安装 Pillow 时退回文字消息
+        self.board = None
+        if self.config["imageMode"]:
+            if board.available():
+                self.board = board.BoardRenderer(self.config["imageFont"])
+                self.board.prepare(self.item_table)
+            else:
+                logger.warning("恶魔轮盘图片模式需要安装 Pillow，继续使用文字消息")
 
     def get_channel_id(self, event: AstrMessageEvent) -> str:
         """
         获取唯一群聊ID（或session_id）。
         优先返回群ID；若为私聊，则返回session_id。
+        若该群有重载前遗留、尚未恢复的游戏，则在此时将其恢复到 self.games。
+        唤醒休眠的游戏与共享存储下同步缓存都需要读取磁盘或存储，不在此进行，指令处理函数改用 _channel。
+        """
+        cid = event.get_group_id() or event.session_id
+        if self.journal and self.journal.recovered:
+            self._resume(cid)
+        recent = self._recent
+        if cid in recent:
+            recent.move_to_end(cid)
+        return cid
+
+    async def _channel(self, event: AstrMessageEvent) -> str:
+        """同 get_channel_id；使用共享存储时先在存储线程中同步该群的缓存，该群有休眠的游戏时先唤醒"""
+        cid = self.get_channel_id(event)
+        await self._load_channel(cid)
+        return cid
+
+    async def _load_channel(self, cid: str):
+        """
+        使该群的牌桌都在内存中（不计为该群的活动）：共享存储下同步缓存，否则恢复日志中待恢复的、唤醒休眠的牌桌。
+        匹配与观战等操作其它群牌桌的路径在查看该群的牌桌与玩家索引前调用。
+        """
+        if self._shared:
+            await self._sync(cid)
+            return
+        if self._is_pending(cid):
+            self._resume(cid)
+        if cid in self.hibernation:
+            await self._wake(cid)
+
+    def _index_pending(self):
+        """
+        首次恢复时把日志恢复记录按群归类到 _pending。此后闲置回收时间内所在群都没有活动的牌桌
+        按闲置回收结束（见 _expire_pending）；未开启闲置回收时它们永远不会被回收，直接全部恢复。
+        """
+        pending = self._pending = {}
+        for key, rec in list(self.journal.recovered.items()):
+            pending.setdefault(split_key(key)[0], []).append(key)
+            remote = GameState.record_remote(rec) if rec is not None else None
+            if remote is not None:
+                # 跨群对局由任一方的群先恢复
+                pending.setdefault(remote[0], []).append(key)
+        idle = self.config["idleTimeout"]
+        if idle > 0:
+            self.scheduler.call_later(idle, self._expire_pending)
+        else:
+            for cid in list(pending):
+                self._resume(cid)
+
+    def _is_pending(self, cid: str) -> bool:
+        """该群是否有日志中待恢复的游戏"""
+        if not (self.journal and self.journal.recovered):
+            return False
+        if self._pending is None:
+            self._index_pending()
+        return cid in self._pending
+
+    def _expire_pending(self):
+        """闲置回收时间到：日志中仍未恢复的牌桌（所在群一直没有活动）与在内存中闲置到期一样结束"""
+        recovered = self.journal.recovered
+        for key in recovered:
+            self._record("timeout", key, None)
+        self.metrics.inc("games_finished", "idle", len(recovered))
+        recovered.clear()
+        self._pending.clear()
+
+    def _resume(self, cid: str):
+        """从日志恢复记录中取出该群各牌桌的游戏（已有同键游戏的除外）"""
+        recovered = self.journal.recovered
+        if self._pending is None:
+            self._index_pending()
+        for key in self._pending.pop(cid, ()):
+            rec = recovered.pop(key, None)
+            if rec is not None:
+                # 跨群对局也登记在另一方的群下，一并移除
+                remote = GameState.record_remote(rec)
+                for other in (split_key(key)[0], remote[0] if remote is not None else None):
+                    keys = self._pending.get(other)
+                    if keys is not None and other != cid:
+                        keys.remove(key)
+                        if not keys:
+                            del self._pending[other]
+            gid = key
+            if split_key(key)[1] is None:
+                # 旧版日志按群记录，恢复为该群的 1 号桌并改用新键记录
+                gid = game_key(cid, 1)
+                self.journal.record("end", key, None)
+            if rec is None or gid in self.games:
+                continue
+            self._restore(gid, rec)
+            if gid in self.games:
+                rec = self._save(gid)
+                if gid != key:
+                    self._record("resume", gid, rec)
+
+    def _restore(self, gid: str, rec: list):
+        """按日志或存储中的记录重建一局游戏并恢复其索引、定时器与 AI"""
+        table = self._find_table(GameState.record_fingerprint(rec))
+        if table is None:
+            logger.warning("恶魔轮盘无法恢复 %s 的游戏：找不到开局时使用的道具配置", gid)
+            return
+        self.games[gid] = game = GameState.from_record(rec, table)
+        # 揭示过的子弹与本局累计的战绩不在记录中，随重放操作流一并重建；无法重放时从零开始
+        knowledge = (Knowledge(table), Knowledge(table))
+        tallies = ([0, 0, 0, 0], [0, 0, 0, 0])
+        mover = [0]
+
+        def observe(scratch, op, args, events):
+            self._observe(knowledge, game.remote is not None, mover[0], events)
+            self._tally(tallies, mover[0], events)
+            mover[0] = scratch.turn
+
+        if not replay.restore(game, observe):
+            knowledge = (Knowledge(table), Knowledge(table))
+            tallies = ([0, 0, 0, 0], [0, 0, 0, 0])
+        self._refresh_index(gid)
+        self._arm_timer(gid)
+        if game.remote is not None:
+            self._link_peers(gid, game)
+        if game.status == "started":
+            self._knowledge[gid] = knowledge[0]
+            if game.remote is not None:
+                self._remote_knowledge[gid] = knowledge[1]
+            self._tallies[gid] = tallies
+        if game.player_by_id(ai.AI_ID) is not None:
+            self._ai_games.setdefault(gid, self.config["aiDifficulty"])
+            self._ai_turn_check(gid)
+
+    # ------------- 休眠 -------------
+    def _schedule_hibernate(self):
+        """内存中的游戏数超过预算：安排一次休眠检查（已安排时不重复）"""
+        if self._hibernate_timer is None:
+            self._hibernate_timer = self.scheduler.call_later(HIBERNATE_TICK, self._hibernate)
+
+    async def _hibernate(self):
+        """
+        定时的休眠检查：内存中的游戏数超过预算时，从最久没有活动的群开始休眠其牌桌，直到回到预算以内，
+        再回收休眠超过闲置回收时间的牌桌。等待加入的牌桌（很快会超时回收）、有操作排队、AI 正在思考、
+        正在写入存储或正在休眠的牌桌不休眠，这样的群保留在原来的位置。
+        """
+        self._hibernate_timer = None
+        budget = self.config["maxActiveGames"]
+        recent = self._recent
+        kept = []
+        parked = []
+        excess = len(self.games) - len(self._parking) - budget if budget else 0
+        while len(parked) < excess and recent:
+            cid = recent.popitem(last=False)[0]
+            busy = False
+            for number in self._tables.get(cid, ()):
+                gid = game_key(cid, number)
+                g = self.games.get(gid)
+                if g is None:
+                    continue
+                if (g.status == "waiting" or gid in self.actors or gid in self._ai_tasks
+                        or gid in self._writing or gid in self._parking):
+                    busy = True
+                else:
+                    parked.append(gid)
+            if busy:
+                kept.append(cid)
+        for cid in reversed(kept):
+            recent[cid] = None
+            recent.move_to_end(cid, last=False)
+        if parked:
+            await self._park(parked)
+        idle = self.config["idleTimeout"]
+        if self.hibernation is not None and idle > 0:
+            # 休眠期间不计时，休眠超过闲置回收时间的牌桌在此一并清理
+            try:
+                expired = await asyncio.to_thread(self.hibernation.expire, time.time() - idle)
+            except sqlite3.Error:
+                logger.exception("恶魔轮盘回收闲置的休眠游戏失败")
+            else:
+                self.metrics.inc("games_finished", "idle", len(expired))
+
+    async def _park(self, gids: list):
+        """
+        休眠一批牌桌：先在线程中把记录写入 hibernate.db，成功后再从内存、状态存储与日志中移除（共享存储只丢弃缓存）。
+        写入期间游戏仍在内存中照常处理；写入完成时已有新操作或已被唤醒的牌桌留在内存中，过时的记录从库中删除。
+        """
+        if self._shared:
+            for gid in gids:
+                self._evict(gid)
+                self._synced.pop(split_key(gid)[0], None)
+            self.metrics.inc("hibernate", "parked", len(gids))
+            return
+        rows = []
+        for gid in gids:
+            g = self.games[gid]
+            self._parking[gid] = (g, self._versions.get(gid))
+            rows.append((gid, split_key(gid)[0], g.remote[0] if g.remote is not None else None, g.to_record()))
+        try:
+            await asyncio.to_thread(self.hibernation.park, rows)
+        except sqlite3.Error:
+            logger.exception("恶魔轮盘休眠游戏失败，保留在内存中")
+            for gid in gids:
+                self._parking.pop(gid, None)
+            return
+        parked = 0
+        stale = []
+        for gid in gids:
+            entry = self._parking[gid]
+            if entry is None:
+                # 写入期间该群被唤醒，唤醒时已取走库中的记录
+                del self._parking[gid]
+                continue
+            g, version = entry
+            if (self.games.get(gid) is not g or self._versions.get(gid) != version
+                    or gid in self.actors or gid in self._ai_tasks):
+                stale.append(gid)
+                continue
+            del self._parking[gid]
+            del self.games[gid]
+            self._save(gid)
+            self._record("park", gid, None)
+            self._evict(gid)
+            parked += 1
+        if stale:
+            # 删除完成前这些游戏键仍留在 _parking 中，期间的唤醒不会用过时的记录覆盖内存中的游戏
+            try:
+                await asyncio.to_thread(self.hibernation.discard, stale)
+            except sqlite3.Error:
+                logger.exception("恶魔轮盘删除过时的休眠记录失败")
+            for gid in stale:
+                self._parking.pop(gid, None)
+        self.metrics.inc("hibernate", "parked", parked)
+
+    async def _wake(self, cid: str):
+        """唤醒该群休眠的牌桌；同群同时到来的唤醒共用一次读取"""
+        task = self._waking.get(cid)
+        if task is None:
+            task = self._waking[cid] = asyncio.get_running_loop().create_task(self._wake_channel(cid))
+            task.add_done_callback(lambda _: self._waking.pop(cid, None))
+        await asyncio.shield(task)
+
+    async def _wake_channel(self, cid: str):
+        """
+        在线程中取出该群（作为创建者或跨群对局的对方）休眠的牌桌，按日志恢复的同一流程重建，并重新写入状态存储与日志。
+        休眠超过闲置回收时间的牌桌直接丢弃；读取失败时记录日志，该群的游戏留在库中，下一次活动时再试。
+        """
+        start = time.perf_counter_ns()
+        try:
+            taken = await asyncio.to_thread(self.hibernation.take, cid)
+        except sqlite3.Error:
+            logger.exception("恶魔轮盘唤醒休眠的游戏失败")
+            return
+        idle = self.config["idleTimeout"]
+        now = time.time()
+        kept = []
+        for gid, rec, parked_at in taken:
+            if gid in self._parking:
+                # 正在休眠、尚未移出内存：内存中的游戏才是最新的
+                self._parking[gid] = None
+                continue
+            if gid in self.games:
+                if self.games[gid].seed == GameState.record_seed(rec):
+                    # 休眠后、日志写入 park 之前进程退出：日志已恢复出同一局
+                    continue
+                # 桌号已被另一局占用（不应发生）：改用空闲桌号唤醒，不能改时放回休眠库，不丢弃
+                moved = self._rekey(gid, rec)
+                if moved is None:
+                    logger.error("恶魔轮盘休眠的牌桌 %s 的桌号与玩家都已被占用，放回休眠库", gid)
+                    kept.append((gid, split_key(gid)[0], (GameState.record_remote(rec) or (None,))[0], rec))
+                    continue
+                logger.warning("恶魔轮盘休眠的牌桌 %s 的桌号已被占用，改为 %s 唤醒", gid, moved)
+                gid = moved
+            if idle > 0 and now - parked_at >= idle:
+                self.metrics.inc("games_finished", "idle")
+                continue
+            self._restore(gid, rec)
+            if gid in self.games:
+                self._record("wake", gid, self._save(gid))
+                self._recent[split_key(gid)[0]] = None
+                self.metrics.inc("hibernate", "woken")
+        if kept:
+            try:
+                await asyncio.to_thread(self.hibernation.park, kept)
+            except sqlite3.Error:
+                logger.exception("恶魔轮盘放回休眠库失败，丢弃牌桌 %s", "、".join(row[0] for row in kept))
+        self.metrics.observe("wake", time.perf_counter_ns() - start)
+
+    def _rekey(self, gid: str, rec: list):
+        """
+        休眠的牌桌唤醒时其游戏键已被另一局占用：返回该群一个空闲桌号的游戏键。
+        其玩家已入座其它牌桌时返回 None（一名玩家在一个群中只能坐一张桌）。
+        """
+        cid = split_key(gid)[0]
+        remote = GameState.record_remote(rec)
+        for idx, pid in enumerate(GameState.record_player_ids(rec)):
+            if (remote[0] if idx and remote is not None else cid, pid) in self._seats:
+                return None
+        tables = self._tables.get(cid, ())
+        number = next(n for n in itertools.count(1) if n not in tables and game_key(cid, n) not in self._parking)
+        return game_key(cid, number)
+
+    # ------------- 共享存储 -------------
+    async def _store_io(self, fn, *args):
+        """在存储线程中执行一次共享存储调用 fn(*args) 并返回其结果"""
+        return await asyncio.get_running_loop().run_in_executor(self._store_pool, fn, *args)
+
+    def _touch(self, cid: str):
+        """本进程写入或同步了该群的缓存：使此前开始的同步读取作废"""
+        self._epochs[cid] = self._epochs.get(cid, 0) + 1
+
+    async def _sync(self, cid: str):
+        """
+        同步该群的缓存：群版本与已同步的版本不同（其它进程写入过）时，丢弃已被移除的牌桌、换上版本变化的牌桌。
+        读取在存储线程中进行，群版本未变时只有一次读取；同群同时到来的同步共用一次读取。
+        存储不可用时记录日志，继续使用缓存。
+        """
+        task = self._syncing.get(cid)
+        if task is None:
+            task = self._syncing[cid] = asyncio.get_running_loop().create_task(self._sync_channel(cid))
+            task.add_done_callback(lambda _: self._syncing.pop(cid, None))
+        await asyncio.shield(task)
+
+    async def _sync_channel(self, cid: str):
+        for _ in range(STORE_RETRIES):
+            epoch = self._epochs.get(cid, 0)
+            known = {}
+            for number in self._tables.get(cid, ()):
+                gid = game_key(cid, number)
+                known[gid] = self._versions.get(gid)
+            try:
+                fetched = await self._store_io(self._fetch, cid, self._synced.get(cid), known)
+            except STORE_ERRORS:
+                logger.warning("恶魔轮盘读取状态存储失败，暂用本地缓存", exc_info=True)
+                self.metrics.inc("store", "error")
+                return
+            if self._epochs.get(cid, 0) != epoch:
+                # 读取期间本进程写入或同步过该群，读到的可能比缓存旧，重新读取
+                continue
+            if fetched is not None:
+                self._apply(cid, *fetched)
+            return
+
+    def _fetch(self, cid: str, synced, known: dict):
+        """
+        （存储线程）群版本与 synced 不同时，读取该群存活的各局版本，以及其中版本与 known（缓存中各局的版本）不同的记录。
+        返回 (群版本, 游戏键 -> 版本, 游戏键 -> (版本, 记录) 或 None)；群版本未变时返回 None。
+        """
+        store = self.store
+        version = store.channel_version(cid)
+        if version == synced:
+            return None
+        live = store.versions(cid)
+        return version, live, {gid: store.load(gid) for gid, v in live.items() if known.get(gid) != v}
+
+    def _apply(self, cid: str, version: int, live: dict, loaded: dict):
+        """把读到的该群状态换入缓存；正在写入存储的牌桌以写入结果为准（冲突时会重新同步）"""
+        writing = self._writing
+        for number in list(self._tables.get(cid, ())):
+            gid = game_key(cid, number)
+            if gid not in live and gid not in writing:
+                self._evict(gid)
+                self._ai_games.pop(gid, None)
+        for gid, entry in loaded.items():
+            if gid in writing or self._versions.get(gid) == live[gid]:
+                continue
+            self._evict(gid)
+            if entry is None:
+                # 读取版本之后、读取记录之前该局已被移除
+                self._ai_games.pop(gid, None)
+                continue
+            self._versions[gid], rec = entry
+            self._restore(gid, rec)
+            self.metrics.inc("store", "reload")
+        self._synced[cid] = version
+        self._touch(cid)
+
+    def _evict(self, gid: str):
+        """丢弃本进程缓存的该局及按局保存的本地状态（AI 难度除外），并撤销其索引与定时器"""
+        self.games.pop(gid, None)
+        self._versions.pop(gid, None)
+        self._results.pop(gid, None)
+        self._broadcasts.pop(gid, None)
+        self._afk_streak.pop(gid, None)
+        self._knowledge.pop(gid, None)
+        self._remote_knowledge.pop(gid, None)
+        self._tallies.pop(gid, None)
+        self._forget_renders(gid)
+        self._refresh_index(gid)
+        self._arm_timer(gid)
+
+    def _save_args(self, gid: str):
+        """
+        写入该局当前状态所需的 (群ID, 游戏键, 记录, 缓存副本的版本)，游戏已移除时记录为 None（删除）；
+        已移除且从未写入过时返回 None。
+        进程内存储只记版本号，不开日志时没有人读取记录，此时不序列化，以该局的 GameState 代替记录。
+        """
+        g = self.games.get(gid)
+        expected = self._versions.get(gid, 0)
+        if g is None and not expected:
+            return None
+        rec = None
+        if g is not None:
+            rec = g.to_record() if self._shared or self.journal else g
+        return split_key(gid)[0], gid, rec, expected
+
+    def _saved(self, cid: str, gid: str, rec, written: tuple):
+        """写入成功：记下该局的新版本；written 为存储返回的 (版本, 群版本)"""
+        version, channel = written
+        if rec is None:
+            self._versions.pop(gid, None)
+        else:
+            self._versions[gid] = version
+        if self._synced.get(cid) == channel - 1:
+            # 上次同步后该群只有本次写入，缓存仍是最新
+            self._synced[cid] = channel
+        self.metrics.inc("store", "write")
+
+    def _save(self, gid: str):
+        """
+        把该局的当前状态按缓存副本的版本写入存储（游戏已移除时删除），返回写入的记录（移除时为 None）。
+        该局已被其它进程写入新版本时抛出 StoreConflict。共享存储由 _attempt 在存储线程中写入，不经过这里。
+        """
+        args = self._save_args(gid)
+        if args is None:
+            return None
+        self._saved(*args[:3], self.store.write(*args))
+        return args[2]
+
+    async def _attempt(self, fn, args: tuple):
+        """
+        （共享存储）执行一次修改游戏状态的同步操作 fn(*args)，再在存储线程中写入它提交的状态，
+        写入成功后才更新日志、转播与 AI 等对外的副作用（见 _commit）。
+        该局还有更早的写入未完成时先等它完成；更早的写入失败，或发现其它进程已写入新版本时，
+        丢弃本地副本、重新同步该群后在最新状态上重试，连续冲突 STORE_RETRIES 次时放弃。
+        存储不可用时记录日志并放弃。放弃时返回 None。
+        """
+        for _ in range(STORE_RETRIES):
+            self._unsaved = None
+            result = fn(*args)
+            if self._unsaved is None:
+                return result
+            op, gid = self._unsaved
+            self._unsaved = None
+            cid = split_key(gid)[0]
+            try:
+                prior = self._writing.get(gid)
+                while prior is not None:
+                    if not await asyncio.shield(prior):
+                        raise StoreConflict(gid)
+                    prior = self._writing.get(gid)
+                rec = await self._write(gid)
+            except StoreConflict:
+                self.metrics.inc("store", "conflict")
+                self._evict(gid)
+                self._synced.pop(cid, None)
+                self._touch(cid)
+                await self._sync(cid)
+                continue
+            except STORE_ERRORS:
+                logger.warning("恶魔轮盘写入状态存储失败，操作未生效", exc_info=True)
+                self.metrics.inc("store", "error")
+                # 本地副本已领先于存储，丢弃后下次按存储重新读取
+                self._evict(gid)
+                self._synced.pop(cid, None)
+                self._touch(cid)
+                return None
+            self._finish(op, gid, rec)
+            return result
+        self.metrics.inc("store", "gave_up")
+        return None
+
+    async def _write(self, gid: str):
+        """在存储线程中写入该局（同 _save），写入期间登记在 _writing 中，其 Future 的结果为是否写入成功"""
+        args = self._save_args(gid)
+        if args is None:
+            return None
+        cid = args[0]
+        done = self._writing[gid] = asyncio.get_running_loop().create_future()
+        ok = False
+        self._touch(cid)
+        try:
+            written = await self._store_io(self.store.write, *args)
+            ok = True
+        finally:
+            self._touch(cid)
+            del self._writing[gid]
+            done.set_result(ok)
+        self._saved(*args[:3], written)
+        return args[2]
+
+    def _load_items(self) -> registry.ItemTable:
+        """
+        加载道具配置：数据目录下有 items.json 时使用它，否则使用插件自带的默认配置。
+        非默认配置会按指纹存档到数据目录的 item_tables/ 下，供日志恢复与回放工具找回。
+        配置有误时抛出 OSError / ValueError。
+        """
+        path = os.path.join(DATA_DIR, "items.json")
+        if not os.path.exists(path):
+            return registry.DEFAULT_TABLE
+        table = registry.load_table(path)
+        if table.fingerprint != registry.DEFAULT_TABLE.fingerprint:
+            registry.archive(table, os.path.join(DATA_DIR, "item_tables"))
+        return table
+
+    def _find_table(self, fingerprint: int):
+        """按指纹取道具表：本次运行用过的表、内置表或存档中的表，找不到时返回 None"""
+        table = self._item_tables.get(fingerprint)
+        if table is None:
+            try:
+                table = registry.find_table(fingerprint, os.path.join(DATA_DIR, "item_tables"))
+            except (OSError, ValueError):
+                logger.exception("恶魔轮盘道具配置存档损坏")
+            if table is not None:
+                self._item_tables[fingerprint] = table
+                self._move_words = self._move_words.union(table.lookup)
+        return table
+
+    def _commit(self, op: str, gid: str):
+        """
+        每次状态变化后的统一收尾：写入存储，再更新玩家索引与消息路由、写入日志、重置该局定时器（见 _finish）。
+        共享存储下只立即更新玩家索引，写入与其余收尾由 _attempt 在本次操作返回后进行。
+        """
+        if self._shared:
+            self._refresh_index(gid)
+            self._unsaved = (op, gid)
+            return
+        self._finish(op, gid, self._save(gid))
+
+    def _finish(self, op: str, gid: str, rec):
+        """状态已写入存储（rec 为写入的记录）：结算战绩、更新索引、写入日志、重置定时器，并转播、安排 AI 与休眠"""
+        result = self._results.pop(gid, None)
+        if result is not None:
+            self.stats.record(result)
+        self._refresh_index(gid)
+        self._record(op, gid, rec)
+        self._arm_timer(gid)
+        if op != "skip":
+            self._afk_streak.pop(gid, None)
+        if self._metrics_path and self._export_timer is None:
+            self._export_timer = self.scheduler.call_later(self.config["metricsInterval"], self._export_metrics)
+        if self.spectators.watching(gid):
+            self._broadcast(gid)
+        if gid not in self.games:
+            self._knowledge.pop(gid, None)
+            self._remote_knowledge.pop(gid, None)
+            self._tallies.pop(gid, None)
+            self._forget_renders(gid)
+        if gid in self._ai_games:
+            self._ai_turn_check(gid)
+        budget = self.config["maxActiveGames"]
+        if budget and gid in self.games:
+            recent = self._recent
+            cid = split_key(gid)[0]
+            recent[cid] = None
+            recent.move_to_end(cid)
+            if len(self.games) > budget:
+                self._schedule_hibernate()
+
+    def _broadcast(self, gid: str):
+        """
+        把本次状态变化暂存的观战文本投递给观战群（渲染一次，所有订阅者共用同一条消息链），
+        已直接收到这条消息的会话（如跨群对局中行动玩家自己的群）除外；游戏已结束时结束转播。
         """
-        gid = event.get_group_id()
-        if gid:
-            return gid
-        return event.session_id
+        text, skip = self._broadcasts.pop(gid, (None, None))
+        over = gid not in self.games
+        if text is None and over:
+            text = f"{self._spectator_header(gid)}\n对局已结束。"
+        if text is not None:
+            self.spectators.publish(gid, MessageChain().message(text), skip)
+        if over:
+            self.spectators.finish(gid)
+
+    def _stash_broadcast(self, gid: str, text: str, skip: str = None):
+        """暂存本次状态变化的观战文本（带标题），提交成功后由 _broadcast 投递；skip 为已直接收到该消息的会话"""
+        if self.spectators.watching(gid):
+            self._broadcasts[gid] = (f"{self._spectator_header(gid)}{text}", skip)
+
+    def _spectator_header(self, gid: str) -> str:
+        cid, number = split_key(gid)
+        game = self.games.get(gid)
+        kind = "跨群对战" if game is not None and game.remote is not None else "观战"
+        return f"══恶魔轮盘·{kind}══\n[{cid} 群 {number} 号桌]"
+
+    def _link_peers(self, gid: str, game: GameState):
+        """跨群对局：双方的群互相订阅该局的转播，各自看到对手的行动（不计入观战群数上限）"""
+        self.spectators.subscribe(gid, game.origin, split_key(gid)[0])
+        self.spectators.subscribe(gid, game.remote[1], game.remote[0])
+
+    def _record(self, op: str, gid: str, rec):
+        """将该牌桌游戏的当前状态 rec 作为一条 op 记录写入日志（仅入队，不阻塞）"""
+        if self.journal:
+            self.journal.record(op, gid, rec)
+
+    def _arm_timer(self, gid: str):
+        """
+        取消该局原有定时器，并按当前状态重新设置：
+        等待中 -> 等待加入超时；进行中且开启挂机超时 -> 回合超时；其余 -> 闲置回收。
+        游戏已不存在时仅做取消。
+        """
+        old = self._timers.pop(gid, None)
+        if old is not None:
+            old.cancel()
+        g = self.games.get(gid)
+        if g is None:
+            return
+        if g.status == "waiting":
+            delay, kind = self.config["maxWaitTime"], "join"
+        elif g.status == "started" and self.config["turnTimeout"] > 0:
+            delay, kind = self.config["turnTimeout"], "afk"
+        else:
+            delay, kind = self.config["idleTimeout"], "idle"
+        if delay > 0:
+            self._timers[gid] = self.scheduler.call_later(delay, self._on_timeout, gid, kind)
+
+    def _on_timeout(self, gid: str, kind: str):
+        """定时器到期回调（由调度器同步调用）：登记到期并交给该牌桌的 actor 处理"""
+        self._timers.pop(gid, None)
+        asyncio.get_running_loop().create_task(self._handle_timeout(gid, kind))
+
+    async def _handle_timeout(self, gid: str, kind: str):
+        res = await self._run("timeout", gid, self._do_timeout, gid, kind)
+        if res is None:
+            return
+        origin, text = res
+        await self.outbox.send(self.context, origin, split_key(gid)[0], MessageChain().message(text), gid)
+        if gid not in self.games:
+            self.outbox.game_finished(gid)
+
+    def _do_timeout(self, gid: str, kind: str):
+        """
+        取消等待中的游戏、处理挂机玩家或回收闲置游戏，返回 (origin, 通知文本)。
+        若到期后、轮到本操作执行前该局已有新操作（定时器已被重新设置），则忽略本次到期。
+        """
+        g = self.games.get(gid)
+        if g is None or gid in self._timers:
+            return None
+        if kind == "join":
+            text = f"{self.at_id(g.players[0].name)}，等待玩家2超时，{split_key(gid)[1]} 号桌的游戏已取消。"
+            del self.games[gid]
+            self._commit("timeout", gid)
+            self.metrics.inc("games_finished", "join_timeout")
+        elif kind == "idle" or self._afk_streak.get(gid, 0) >= 2:
+            # 双方都已连续挂机时不再来回跳过，直接回收
+            text = f"══恶魔轮盘══\n{split_key(gid)[1]} 号桌的游戏长时间无人操作，已自动结束。"
+            del self.games[gid]
+            self._commit("timeout", gid)
+            self.metrics.inc("games_finished", "idle")
+        elif self.config["afkAction"] == "skip":
+            afk = g.current
+            engine.skip_turn(g)
+            replay.record(g, replay.SKIP)
+            self._afk_streak[gid] = self._afk_streak.get(gid, 0) + 1
+            text = (
+                f"══恶魔轮盘══\n{self.at_id(afk.name)} 超过 {self.config['turnTimeout']} 秒未行动，回合被跳过！\n"
+                f"现在由 {self.at_id(g.current.name)} 决定下一步！"
+            )
+            self._stash_broadcast(gid, "\n" + text.split("\n", 1)[1], g.origin)
+            self._commit("skip", gid)
+        else:
+            afk = g.current
+            self._forfeit(g, g.turn)
+            lines = self.game_over(gid, winner=g.opponent, loser=afk, outcome="afk")
+            self.metrics.inc("games_finished", "afk_forfeit")
+            text = f"{self.at_id(afk.name)} 超过 {self.config['turnTimeout']} 秒未行动，自动认输。\n" + "\n".join(lines)
+        return g.origin, text
+
+    async def _run(self, name: str, key: str, fn, *args):
+        """
+        在 key（游戏键，或创建游戏时的群ID）对应的 actor 中执行同步操作 fn(*args)，并记录指令耗时（不含回复限流）。
+        该牌桌有 AI 正在思考或共享存储的写入未完成时，操作在邮箱中排队，耗时包含排队时间；否则直接内联执行。
+        """
+        start = time.perf_counter_ns()
+        try:
+            if self._shared:
+                return await self.actors.run(key, self._attempt, fn, args)
+            return await self.actors.run(key, fn, *args)
+        finally:
+            self.metrics.observe(name, time.perf_counter_ns() - start)
+
+    def _gauges(self) -> dict:
+        """读取指标时现算的仪表值"""
+        games = {"waiting": 0, "full": 0, "started": 0}
+        for g in self.games.values():
+            games[g.status] = games.get(g.status, 0) + 1
+        return {"games": games, "timers": {"": len(self.scheduler)}, "mailboxes": {"": len(self.actors)}}
+
+    async def _export_metrics(self):
+        """定时把指标写入 Prometheus 文本文件，并安排下一次写入"""
+        self._export_timer = self.scheduler.call_later(self.config["metricsInterval"], self._export_metrics)
+        await asyncio.to_thread(self._write_metrics, self.metrics.prometheus())
+
+    def _write_metrics(self, text: str):
+        # 先写临时文件再替换，避免收集器读到写了一半的文件
+        try:
+            os.makedirs(os.path.dirname(self._metrics_path) or ".", exist_ok=True)
+            tmp = self._metrics_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as fp:
+                fp.write(text)
+            os.replace(tmp, self._metrics_path)
+        except OSError:
+            logger.warning("恶魔轮盘指标文件写入失败", exc_info=True)
+
+    async def _reply(self, event: AstrMessageEvent, gid, lines, image: bytes = None):
+        """
+        将一次操作产生的所有文本行合并为一条消息并限流（按发言所在的群），返回供 yield 的结果；
+        gid 为本次操作所属牌桌的游戏键（不属于任何牌桌时为 None），若该局游戏已结束，则同时结算本局的 API 调用统计。
+        lines 为 None 表示操作因存储版本冲突或存储不可用被放弃；image 为附在文字之后的 PNG 图片。
+        """
+        if lines is None:
+            lines = "══恶魔轮盘══\n牌桌状态正被同时修改或暂时无法保存，操作未生效，请稍后重试。"
+        in_game = gid is not None and (gid in self.games or self.outbox.tracking(gid))
+        await self.outbox.throttle(event.get_group_id() or event.session_id, event.get_platform_name(),
+                                   gid if in_game else None)
+        if in_game and gid not in self.games:
+            self.outbox.game_finished(gid)
+        text = lines if isinstance(lines, str) else "\n".join(lines)
+        if image is not None:
+            return event.chain_result([Plain(text), Image.fromBytes(image)])
+        return event.plain_result(text)
+
+    def _round_board(self, gid: str, round_before: int):
+        """一次操作进入了新的一轮时，随换轮播报附上的对战图片"""
+        game = self.games.get(gid)
+        if self.board is None or game is None or game.round == round_before:
+            return None
+        return self.render_board(gid)
+
+    @staticmethod
+    def _chain(lines, image: bytes = None) -> MessageChain:
+        """主动发送的消息链：文本，以及可选的图片"""
+        text = lines if isinstance(lines, str) else "\n".join(lines)
+        if image is None:
+            return MessageChain().message(text)
+        return MessageChain([Plain(text), Image.fromBytes(image)])
+
+    async def terminate(self):
+        """插件卸载/重载时：停止定时器与 AI 思考，写完剩余日志并生成快照"""
+        self.scheduler.close()
+        await self.scheduler.wait_closed()
+        for task in self._ai_tasks.values():
+            task.cancel()
+        self.actors.close()
+        if self._ai_pool is not None:
+            self._ai_pool.shutdown(wait=False, cancel_futures=True)
+        if self._metrics_path:
+            await asyncio.to_thread(self._write_metrics, self.metrics.prometheus())
+        if self.journal:
+            await asyncio.to_thread(self.journal.close)
+        if self.stats:
+            await asyncio.to_thread(self.stats.close)
+        self.spectators.close()
+        self.profiler.stop()
+        if self.hibernation is not None:
+            await asyncio.to_thread(self.hibernation.close)
+        if self._store_pool is not None:
+            # 等排队中的写入完成后再关闭连接
+            await asyncio.to_thread(self._store_pool.shutdown)
+        self.store.close()
 
     # ------------- 游戏基本指令 -------------
+    # 修改游戏状态的指令都拆为「指令入口」与「_do_xxx 同步逻辑」两部分：
+    # 逻辑在该牌桌的 actor 中串行执行并返回回复文本，回复在 actor 之外限流发送。
     @command_group("恶魔轮盘")
     def demon_roulette(self):
         """恶魔轮盘游戏主指令组"""
@@ -112,184 +1025,674 @@ class BuckshotRoulette(Star):
     @demon_roulette.command("创建游戏")
     async def create_game(self, event: AstrMessageEvent):
         """
-        创建游戏：当本群中没有正在进行的游戏时可创建，
-        创建后等待另一名玩家加入，超时自动取消。
+        创建游戏：在本群开一张新牌桌（桌号自动分配），一个群可同时进行多局游戏。
+        创建后等待另一名玩家加入，超时自动取消；同一时间每人只能坐在一张牌桌上。
         """
-        cid = self.get_channel_id(event)
-        if cid not in self.games:
-            self.games[cid] = {
-                "player1": {
-                    "name": event.get_sender_name(),
-                    "id": event.get_sender_id(),
-                    "hp": 6,
-                    "item": [],
-                    "handcuff": False,
-                    "shield": False
-                },
-                "status": "waiting",
-            }
-            asyncio.create_task(self.wait_for_join_timeout(cid, event))
-            yield event.plain_result(textwrap.dedent(f""" ══恶魔轮盘══\n游戏创建成功！\n玩家1：{event.get_sender_name()} ({event.get_sender_id()})\n玩家2：正在等待中……\n\n请发送“/恶魔轮盘 加入游戏”加入本游戏，超时后将自动取消！
-            """))
-        else:
-            status = self.games[cid].get("status", "")
-            if status == "waiting":
-                yield event.plain_result("══恶魔轮盘══\n本群已有游戏在等待玩家，请发送“/恶魔轮盘 加入游戏”加入。")
-            else:
-                yield event.plain_result("══恶魔轮盘══\n当前群中已有游戏正在进行，无法重复创建。")
-
-    async def wait_for_join_timeout(self, cid: str, event: AstrMessageEvent):
-        """等待玩家2加入，超时则自动取消游戏"""
-        await asyncio.sleep(self.config["maxWaitTime"])
-        if cid in self.games and self.games[cid]["status"] == "waiting":
-            del self.games[cid]
-            await self.context.send_message(
-                event.unified_msg_origin,
-                MessageChain().message(f"{event.at_sender()}，等待玩家2超时，游戏已取消。")
-            )
+        cid = await self._channel(event)
+        if not self._admit(event, cid):
+            return
+        text = await self._run("create_game", cid, self._do_create, event, cid)
+        yield await self._reply(event, self._seats.get((cid, event.get_sender_id())), text)
+
+    def _do_create(self, event: AstrMessageEvent, cid: str) -> str:
+        seat = self._seats.get((cid, event.get_sender_id()))
+        if seat is not None:
+            if self.games[seat].status == "waiting":
+                return f"══恶魔轮盘══\n你已在 {split_key(seat)[1]} 号桌等待玩家加入，无法重复创建。"
+            return f"══恶魔轮盘══\n你正在 {split_key(seat)[1]} 号桌的游戏中，无法重复创建。"
+        tables = self._tables.get(cid, ())
+        limit = self.config["maxTables"]
+        if limit and len(tables) >= limit:
+            return f"══恶魔轮盘══\n本群已有 {len(tables)} 张牌桌（上限 {limit} 张），请等待空出的牌桌。"
+        number = next(n for n in itertools.count(1) if n not in tables)
+        gid = game_key(cid, number)
+        table = self.item_table
+        game = GameState(PlayerState(event.get_sender_name(), event.get_sender_id(), len(table)), table)
+        game.origin = event.unified_msg_origin
+        replay.seed_game(game)
+        self.games[gid] = game
+        self._commit("create", gid)
+        # 已入座的玩家退出匹配队列
+        self.matchmaking.cancel(event.get_sender_id())
+        return self.templates.render("create", name=event.get_sender_name(), id=event.get_sender_id(), table=number)
 
     @demon_roulette.command("加入游戏")
-    async def join_game(self, event: AstrMessageEvent):
+    async def join_game(self, event: AstrMessageEvent, opponent: str = "", difficulty: str = ""):
         """
-        加入游戏：仅当游戏处于等待状态时可加入，
+        加入游戏：发送「加入游戏 桌号」加入指定牌桌，不带桌号时加入桌号最小的等待中牌桌，
         且你不能加入自己创建的游戏。
+        创建者发送「加入游戏 AI [简单/普通/困难]」可让 AI 庄家作为玩家2加入，进行人机对战。
         """
-        cid = self.get_channel_id(event)
-        if cid not in self.games:
-            yield event.plain_result("══恶魔轮盘══\n当前没有可加入的游戏，请先创建。")
-            return
-        if self.games[cid]["status"] != "waiting":
-            yield event.plain_result("══恶魔轮盘══\n游戏已满或正在进行中。")
-            return
-        if self.games[cid]["player1"]["id"] == event.get_sender_id():
-            yield event.plain_result("══恶魔轮盘══\n你不能加入自己创建的游戏。")
-            return
-        self.games[cid]["player2"] = {
-            "name": event.get_sender_name(),
-            "id": event.get_sender_id(),
-            "hp": 6,
-            "item": [],
-            "handcuff": False,
-            "shield": False
-        }
-        self.games[cid]["status"] = "full"
-        yield event.plain_result(textwrap.dedent(f"""\ 
-            ══恶魔轮盘══\n成功加入游戏！\n玩家1：{self.games[cid]['player1']['name']} ({self.games[cid]['player1']['id']})\n玩家2：{event.get_sender_name()} ({event.get_sender_id()})\n\n请由玩家1发送“/恶魔轮盘 开始游戏”以正式开始对战！
-            """))
+        cid = await self._channel(event)
+        if not self._admit(event, cid):
+            return
+        sender = event.get_sender_id()
+        vs_ai = opponent.upper() in ("AI", "人机", "庄家")
+        if vs_ai or not opponent:
+            gid = self._seats.get((cid, sender))
+            if gid is None and not vs_ai:
+                waiting = [n for n in self._tables.get(cid, ()) if self.games[game_key(cid, n)].status == "waiting"]
+                gid = game_key(cid, min(waiting)) if waiting else None
+        else:
+            number = parse_table(opponent)
+            gid = game_key(cid, number) if number is not None else None
+        if gid is None or gid not in self.games:
+            yield await self._reply(event, None, "══恶魔轮盘══\n当前没有可加入的游戏，请先创建。")
+            return
+        yield await self._reply(
+            event, gid, await self._run("join_game", gid, self._do_join, event, gid, vs_ai, difficulty)
+        )
+
+    def _do_join(self, event: AstrMessageEvent, gid: str, vs_ai: bool = False, difficulty: str = "") -> str:
+        if gid not in self.games:
+            return "══恶魔轮盘══\n当前没有可加入的游戏，请先创建。"
+        game = self.games[gid]
+        cid, number = split_key(gid)
+        seat = self._seats.get((cid, event.get_sender_id()))
+        if seat is not None and seat != gid:
+            return f"══恶魔轮盘══\n你已在 {split_key(seat)[1]} 号桌中，无法同时加入其它牌桌。"
+        if game.status != "waiting":
+            return f"══恶魔轮盘══\n{number} 号桌已满或正在进行中。"
+        if vs_ai:
+            if game.players[0].id != event.get_sender_id():
+                return "══恶魔轮盘══\n只有游戏创建者才能邀请 AI 加入。"
+            level = ai.DIFFICULTY_ALIASES.get(difficulty or self.config["aiDifficulty"])
+            if level is None:
+                return "══恶魔轮盘══\n未知的难度，可选：简单、普通、困难。"
+            game.players[1] = PlayerState(ai.AI_NAME, ai.AI_ID, len(game.table))
+            self._ai_games[gid] = level
+        elif game.players[0].id == event.get_sender_id():
+            return "══恶魔轮盘══\n你不能加入自己创建的游戏。"
+        else:
+            game.players[1] = PlayerState(event.get_sender_name(), event.get_sender_id(), len(game.table))
+        game.status = "full"
+        self._commit("join", gid)
+        self.matchmaking.cancel(event.get_sender_id())
+        p1, p2 = game.players
+        return self.templates.render("join", p1_name=p1.name, p1_id=p1.id, p2_name=p2.name, p2_id=p2.id, table=number)
 
     @demon_roulette.command("开始游戏")
     async def start_game(self, event: AstrMessageEvent):
         """
-        开始游戏：仅允许游戏创建者（玩家1）操作，
+        开始游戏：仅允许游戏创建者（玩家1）操作，开始自己所在的牌桌，
         系统将随机生成弹夹、随机决定先后手，并为双方发放随机道具。
         """
-        cid = self.get_channel_id(event)
-        if cid not in self.games:
-            yield event.plain_result("══恶魔轮盘══\n没有可开始的游戏，请先创建或加入。")
-            return
-        if self.games[cid]["status"] != "full":
-            yield event.plain_result("══恶魔轮盘══\n游戏尚未凑满两人，无法开始。")
-            return
-        if self.games[cid]["player1"]["id"] != event.get_sender_id():
-            yield event.plain_result("══恶魔轮盘══\n只有游戏创建者（玩家1）才能开始游戏。")
-            return
-        self.games[cid]["status"] = "started"
-        self.games[cid]["bullet"] = generate_random_bullet_list()
-        self.games[cid]["currentTurn"] = random.randint(1, 2)
-        self.games[cid]["double"] = False
-        self.games[cid]["round"] = 0
-        self.games[cid]["usedHandcuff"] = False
-
-        first_p = f"player{self.games[cid]['currentTurn']}"
-        second_p = f"player{1 if self.games[cid]['currentTurn'] == 2 else 2}"
-        item_count_base = random.randint(3, 6)
-        for _ in range(item_count_base - 1):
-            self.games[cid][first_p]["item"].append(random.choice(list(self.item_list.keys())))
-        for _ in range(item_count_base):
-            self.games[cid][second_p]["item"].append(random.choice(list(self.item_list.keys())))
-        bullet_list = self.games[cid]["bullet"]
-        yield event.plain_result(textwrap.dedent(f"""\ 
-            ══恶魔轮盘══\n游戏开始!\n玩家1：{self.games[cid]["player1"]["name"]} ({self.games[cid]["player1"]["id"]})\n玩家2：{self.games[cid]["player2"]["name"]} ({self.games[cid]["player2"]["id"]})\n由 {self.at_id(self.games[cid][first_p]["name"])} 先手!\n先手获得 {item_count_base - 1} 个道具，后手获得 {item_count_base} 个道具.\n当前弹夹中共有 {len(bullet_list)} 发子弹,\n其中实弹 {self.count_bullet(bullet_list, "实弹")} 发, 空包弹 {self.count_bullet(bullet_list, "空包弹")} 发.\n请发送“/恶魔轮盘 对战信息”查看详细情况，祝你好运!
-        """))
+        cid = await self._channel(event)
+        if not self._admit(event, cid):
+            return
+        gid = self._seats.get((cid, event.get_sender_id()))
+        if gid is None:
+            yield await self._reply(event, None, "══恶魔轮盘══\n没有可开始的游戏，请先创建或加入。")
+            return
+        game = self.games.get(gid)
+        waiting = game is not None and game.status != "started"
+        text = await self._run("start_game", gid, self._do_start, event, gid)
+        # 本次指令开始了游戏时附上开局的对战图片（牌桌未满、不是创建者等被拒绝时不附）
+        game = self.games.get(gid)
+        started = waiting and game is not None and game.status == "started"
+        yield await self._reply(event, gid, text, self.render_board(gid) if started else None)
+
+    def _do_start(self, event: AstrMessageEvent, gid: str) -> str:
+        if gid not in self.games:
+            return "══恶魔轮盘══\n没有可开始的游戏，请先创建或加入。"
+        game = self.games[gid]
+        if game.status != "full":
+            return "══恶魔轮盘══\n游戏尚未凑满两人，无法开始。"
+        if game.players[0].id != event.get_sender_id():
+            return "══恶魔轮盘══\n只有游戏创建者（玩家1）才能开始游戏。"
+        start = self._start(gid, game)
+        self._commit("start", gid)
+        return self._start_text(gid, game, start)
+
+    def _start(self, gid: str, game: GameState) -> tuple:
+        """开局：生成弹夹与道具并记入回放，建立该局的公开信息与战绩累计，返回开局事件"""
+        start = engine.start(game, game.rng)[0]
+        replay.record(game, replay.START)
+        self._knowledge[gid] = Knowledge(game.table)
+        if game.remote is not None:
+            self._remote_knowledge[gid] = Knowledge(game.table)
+        self._tallies[gid] = ([0, 0, 0, 0], [0, 0, 0, 0])
+        return start
+
+    def _start_text(self, gid: str, game: GameState, start: tuple) -> str:
+        _, first, first_items, second_items = start
+        mag = game.bullet
+        p1, p2 = game.players
+        return self.templates.render(
+            "start",
+            p1_name=p1.name, p1_id=p1.id, p2_name=p2.name, p2_id=p2.id,
+            first=self.at_id(game.players[first].name),
+            first_items=first_items, second_items=second_items,
+            total=len(mag), live=mag.live, blank=mag.blank, table=split_key(gid)[1],
+        )
+
+    @demon_roulette.command("牌桌")
+    async def list_tables(self, event: AstrMessageEvent):
+        """
+        查看本群牌桌：列出各牌桌的桌号、状态与玩家。
+        """
+        cid = await self._channel(event)
+        if not self._admit(event, cid):
+            return
+        numbers = sorted(self._tables.get(cid, ()))
+        if not numbers:
+            yield await self._reply(event, None, "══恶魔轮盘══\n本群当前没有牌桌，发送“/恶魔轮盘 创建游戏”开一桌吧。")
+            return
+        status_names = {"waiting": "等待加入", "full": "等待开始", "started": "进行中"}
+        lines = ["══恶魔轮盘══", f"-- 本群牌桌（{len(numbers)} 张）--"]
+        for n in numbers:
+            g = self.games[game_key(cid, n)]
+            names = " vs ".join(p.name for p in g.players if p is not None)
+            lines.append(f"{n} 号桌：{status_names.get(g.status, g.status)}，{names}")
+        yield await self._reply(event, None, lines)
+
+    def _find_game(self, cid: str, player: str, table: str = ""):
+        """
+        解析指令作用的牌桌，返回游戏键，找不到时返回 None：
+        指定了桌号时取该桌；否则取 player 所在的牌桌；player 不在任何牌桌且本群只有一张牌桌时取这一张。
+        """
+        if table:
+            number = parse_table(table)
+            gid = game_key(cid, number) if number is not None else None
+            return gid if gid in self.games else None
+        gid = self._seats.get((cid, player))
+        if gid is None:
+            tables = self._tables.get(cid)
+            if tables is not None and len(tables) == 1:
+                gid = game_key(cid, next(iter(tables)))
+        return gid
+
+    def _admit(self, event: AstrMessageEvent, cid: str) -> bool:
+        """玩家指令的流控检查：放行时返回 True；超限时计入指标并返回 False，指令不回复（管理员不受限）"""
+        sender = event.get_sender_id()
+        if sender in self.config["admin"]:
+            return True
+        reason = self.flood.admit(cid, sender)
+        self.metrics.inc("requests", reason or "processed")
+        return reason is None
+
+    def _no_game(self, cid: str, text: str) -> str:
+        """找不到牌桌时的回复；本群有多张牌桌时提示附上桌号"""
+        if len(self._tables.get(cid, ())) > 1:
+            text += "\n本群有多张牌桌，请在指令后附上桌号（发送“/恶魔轮盘 牌桌”查看）。"
+        return text
 
     @demon_roulette.command("对战信息")
-    async def show_game_info(self, event: AstrMessageEvent):
+    async def show_game_info(self, event: AstrMessageEvent, table: str = ""):
         """
         查看对战信息：显示双方当前血量和持有的道具情况。
+        默认查看自己所在的牌桌，也可附上桌号查看其它牌桌。
         """
-        cid = self.get_channel_id(event)
-        if cid not in self.games or self.games[cid]["status"] != "started":
-            yield event.plain_result("══恶魔轮盘══\n当前没有正在进行的游戏。")
-            return
-        g = self.games[cid]
-        p1 = g["player1"]
-        p2 = g["player2"]
-        msg = textwrap.dedent(f"""\ 
-            ══恶魔轮盘══\n-- 血量状况 --\n玩家1 ({p1["name"]})：{p1["hp"]}/6\n玩家2 ({p2["name"]})：{p2["hp"]}/6
-
-            -- 玩家1的道具 ({len(p1["item"])}/8) --
-        """)
-        msg += "\n".join(f"{it} ({self.item_list[it]['description']})" for it in p1["item"])
-        msg += textwrap.dedent(f"""\n
-            -- 玩家2的道具 ({len(p2["item"])}/8) --
-        """)
-        msg += "\n".join(f"{it} ({self.item_list[it]['description']})" for it in p2["item"])
-        msg += textwrap.dedent(f"""\n
-            请发送道具名以使用对应道具,
-            或发送“自己” / “对方” 来开枪!
-        """)
-        yield event.plain_result(msg)
+        cid = await self._channel(event)
+        if not self._admit(event, cid):
+            return
+        gid = self._find_game(cid, event.get_sender_id(), table)
+        if gid is None or self.games[gid].status != "started":
+            yield await self._reply(event, None, self._no_game(cid, "══恶魔轮盘══\n当前没有正在进行的游戏。"))
+            return
+        start = time.perf_counter_ns()
+        side = self._side(gid, cid)
+        image = self.render_board(gid, side)
+        if image is not None:
+            text = f"══恶魔轮盘══\n{split_key(gid)[1]} 号桌对战信息："
+        else:
+            text = self._cached_render(gid, "info", self.render_info, side)
+        self.metrics.observe("show_game_info", time.perf_counter_ns() - start)
+        yield await self._reply(event, gid, text, image)
+
+    @demon_roulette.command("概率")
+    async def show_odds(self, event: AstrMessageEvent, table: str = ""):
+        """
+        查看概率：按已公开的信息（每轮公布的数量、已出膛的子弹与道具揭示）
+        计算弹夹中每一发为实弹的概率。默认查看自己所在的牌桌，也可附上桌号。
+        """
+        cid = await self._channel(event)
+        if not self._admit(event, cid):
+            return
+        gid = self._find_game(cid, event.get_sender_id(), table)
+        if gid is None or self.games[gid].status != "started":
+            yield await self._reply(event, None, self._no_game(cid, "══恶魔轮盘══\n当前没有正在进行的游戏。"))
+            return
+        start = time.perf_counter_ns()
+        text = self._cached_render(gid, "odds", self.render_odds, self._side(gid, cid))
+        self.metrics.observe("show_odds", time.perf_counter_ns() - start)
+        yield await self._reply(event, gid, text)
+
+    def _side(self, gid: str, cid: str) -> int:
+        """在群 cid 中查看该局时可用的信息属于哪一方：跨群对局中玩家2所在的群为 1，其余为 0"""
+        remote = self.games[gid].remote
+        return 1 if remote is not None and remote[0] == cid else 0
+
+    def _cached_render(self, gid: str, kind: str, render, side: int = 0) -> str:
+        """只读指令的渲染结果在该局状态变化（版本号改变）之前直接复用；跨群对局双方的群各自缓存"""
+        version = self._versions.get(gid)
+        hit = self._renders.get((gid, kind, side))
+        if hit is not None and hit[0] == version:
+            self.metrics.inc("render_cache", "hit")
+            return hit[1]
+        self.metrics.inc("render_cache", "miss")
+        text = render(gid, side)
+        if version is not None:
+            self._renders[gid, kind, side] = (version, text)
+        return text
+
+    def _forget_renders(self, gid: str):
+        for side in (0, 1):
+            self._renders.pop((gid, "info", side), None)
+            self._renders.pop((gid, "odds", side), None)
+        if self.board is not None:
+            self.board.forget(gid)
+
+    def render_board(self, gid: str, side: int = 0):
+        """
+        图片模式下该局的对战图片（PNG 字节）；未开启图片模式或游戏不在进行中时为 None。
+        side 为查看者一方（见 _side），决定图中的下一发实弹概率。
+        """
+        game = self.games.get(gid)
+        if self.board is None or game is None or game.status != "started":
+            return None
+        start = time.perf_counter_ns()
+        probs = odds(*self._knowledge_key(gid, side))
+        png, outcome = self.board.render(gid, game, split_key(gid)[1], percent(probs[0]) if probs else "-")
+        self.metrics.inc("board", outcome)
+        self.metrics.observe("render_board", time.perf_counter_ns() - start)
+        return png
+
+    def render_info(self, gid: str, side: int = 0) -> str:
+        game = self.games[gid]
+        p1, p2 = game.players
+        mag = game.bullet
+        key = self._knowledge_key(gid, side)
+        probs = odds(*key)
+        live = self._live_text(key)
+        tpl = self.templates
+        return tpl.render(
+            "info",
+            p1_name=p1.name, p1_hp=p1.hp, p2_name=p2.name, p2_hp=p2.hp, max_hp=MAX_HP,
+            p1_count=len(p1.items), p1_items=tpl.inventory(p1.items.counts, game.table),
+            p2_count=len(p2.items), p2_items=tpl.inventory(p2.items.counts, game.table),
+            max_items=MAX_ITEMS,
+            total=len(mag), live=live[0], blank=live[1], next_odds=percent(probs[0]) if probs else "-",
+        )
+
+    def _knowledge_key(self, gid: str, side: int = 0) -> tuple:
+        """该局当前一方的知识状态，作为概率缓存的键"""
+        mag = self.games[gid].bullet
+        knowledge = (self._remote_knowledge if side else self._knowledge).get(gid)
+        if knowledge is None:
+            return mag.size, mag.live, 0, 0, 0
+        return knowledge.key(mag)
+
+    @staticmethod
+    def _live_text(key: tuple) -> tuple:
+        """按知识状态显示的 (实弹数, 空包弹数)；对手的逆转器翻转了未知的子弹时为「最少~最多」的范围"""
+        size = key[0]
+        least, most = live_range(*key)
+        if least == most:
+            return least, size - least
+        return f"{least}~{most}", f"{size - most}~{size - least}"
+
+    def render_odds(self, gid: str, side: int = 0) -> str:
+        key = self._knowledge_key(gid, side)
+        size, _, kmask, _, fmask = key
+        lines = []
+        for order, p in enumerate(odds(*key), 1):
+            bit = 1 << (size - order)
+            if kmask & bit:
+                lines.append(f"第 {order} 发：{bullet_name(p == 1.0)}（已揭示）")
+            elif fmask & bit:
+                lines.append(f"第 {order} 发：{percent(p)}（已被逆转器翻转）")
+            else:
+                lines.append(f"第 {order} 发：{percent(p)}")
+        dist = live_in_next(*key, k=2)
+        live, blank = self._live_text(key)
+        return self.templates.render(
+            "odds", total=size, live=live, blank=blank,
+            positions="\n".join(lines), two_live=percent(1.0 - dist[0]),
+        )
 
     @demon_roulette.command("结束游戏")
-    async def end_game(self, event: AstrMessageEvent):
+    async def end_game(self, event: AstrMessageEvent, table: str = ""):
         """
-        结束游戏：允许游戏参与者或管理员主动结束当前游戏。
+        结束游戏：允许游戏参与者或管理员主动结束游戏。
+        参与者结束自己所在的牌桌；管理员可附上桌号结束指定牌桌。
         """
-        cid = self.get_channel_id(event)
-        if cid not in self.games:
-            yield event.plain_result("══恶魔轮盘══\n当前没有可结束的游戏。")
+        cid = await self._channel(event)
+        if not self._admit(event, cid):
+            return
+        gid = self._find_game(cid, event.get_sender_id(), table)
+        if gid is None:
+            yield await self._reply(event, None, self._no_game(cid, "══恶魔轮盘══\n当前没有可结束的游戏。"))
+            return
+        yield await self._reply(event, gid, await self._run("end_game", gid, self._do_end, event, gid))
+
+    def _do_end(self, event: AstrMessageEvent, gid: str) -> str:
+        if gid not in self.games:
+            return "══恶魔轮盘══\n当前没有可结束的游戏。"
+        game = self.games[gid]
+        quitter = game.player_by_id(event.get_sender_id())
+        if quitter is None and event.get_sender_id() not in self.config["admin"]:
+            return "══恶魔轮盘══\n只有游戏参与者或管理员可以结束游戏。"
+        if quitter is not None and game.status == "started":
+            # 参与者中途结束视为认输；管理员结束不计战绩
+            self._forfeit(game, game.players.index(quitter))
+            self._record_result(gid, game, "forfeit", game.winner)
+        text = f"{self.at_id(event.get_sender_name())} 已强制结束 {split_key(gid)[1]} 号桌的游戏。"
+        self._stash_broadcast(gid, f"\n{text}", event.unified_msg_origin)
+        del self.games[gid]
+        self._commit("end", gid)
+        self.metrics.inc("games_finished", "ended")
+        return f"══恶魔轮盘══\n{text}"
+
+    # ------------- 观战转播 -------------
+    @demon_roulette.command("观战")
+    async def spectate(self, event: AstrMessageEvent, target: str = "", table: str = ""):
+        """
+        观战（仅管理员）：把其它群的一局游戏转播到本群。
+        target 为「群号#桌号」，也可写群号再附上桌号（该群只有一张牌桌时可省略桌号）；不带参数时列出本群正在观战的对局。
+        放大镜、逆转器与一次性电话揭示的子弹信息不会转播。
+        """
+        if event.get_sender_id() not in self.config["admin"]:
+            yield await self._reply(event, None, "权限不足！")
+            return
+        cid = await self._channel(event)
+        umo = event.unified_msg_origin
+        if not target:
+            watching = self.spectators.subscriptions(umo)
+            text = ("本群正在观战：" + "、".join(watching)) if watching else "用法：/恶魔轮盘 观战 <群号#桌号>"
+            yield await self._reply(event, None, f"══恶魔轮盘══\n{text}")
+            return
+        gid = await self._spectate_target(target, table)
+        limit = self.config["spectatorLimit"]
+        if not limit:
+            text = "观战功能未开启。"
+        elif gid is None or gid not in self.games:
+            text = f"没有找到对局 {target}{'#' + table if table else ''}。"
+        elif split_key(gid)[0] == cid:
+            text = "本群的对局无需观战。"
+        elif self.spectators.count(gid) >= limit:
+            text = f"该对局的观战群数已达上限（{limit}）。"
+        elif not self.spectators.subscribe(gid, umo, cid):
+            text = f"本群已在观战 {gid}。"
+        else:
+            game = self.games[gid]
+            names = " vs ".join(p.name for p in game.players if p is not None)
+            status = {"waiting": "等待加入", "full": "等待开始", "started": "进行中"}.get(game.status, game.status)
+            text = (
+                f"开始转播 {gid}：{names}（{status}）。\n"
+                "此后的开枪、道具、换轮与结局将同步到本群，放大镜、逆转器与一次性电话揭示的子弹信息不会转播。"
+            )
+        yield await self._reply(event, None, f"══恶魔轮盘══\n{text}")
+
+    async def _spectate_target(self, target: str, table: str):
+        """解析观战目标为游戏键，找不到时返回 None"""
+        src, _, number = target.partition("#")
+        number = number or table
+        await self._load_channel(src)
+        if not number:
+            tables = self._tables.get(src)
+            if tables is None or len(tables) != 1:
+                return None
+            number = str(next(iter(tables)))
+        number = parse_table(number)
+        return game_key(src, number) if number is not None else None
+
+    @demon_roulette.command("取消观战")
+    async def unspectate(self, event: AstrMessageEvent, target: str = ""):
+        """
+        取消观战（仅管理员）：停止向本群转播指定对局（「群号#桌号」），不带参数时停止全部转播。
+        """
+        if event.get_sender_id() not in self.config["admin"]:
+            yield await self._reply(event, None, "权限不足！")
+            return
+        self.get_channel_id(event)
+        removed = self.spectators.unsubscribe(event.unified_msg_origin, target or None)
+        text = f"已停止转播：{'、'.join(removed)}。" if removed else "本群没有正在观战的对局。"
+        yield await self._reply(event, None, f"══恶魔轮盘══\n{text}")
+
+    # ------------- 跨群匹配 -------------
+    @demon_roulette.command("匹配")
+    async def matchmake(self, event: AstrMessageEvent):
+        """
+        匹配：加入跨群匹配队列，与评分相近、同样在匹配的玩家（可以来自其它群）配对，配对成功后自动开局。
+        容许的评分差随等待时间逐渐放宽，等待超时自动退出；评分按 Elo 计算，每局双人对战结束后更新。
+        """
+        cid = await self._channel(event)
+        if not self._admit(event, cid):
+            return
+        sender = event.get_sender_id()
+        text = self._match_refusal(cid, sender)
+        rating = DEFAULT_RATING
+        if text is None and self.stats is not None:
+            rating = (await asyncio.to_thread(self.stats.rating, sender))[0]
+            # 查询评分期间可能已入座或重复发送了匹配
+            text = self._match_refusal(cid, sender)
+        if text is not None:
+            yield await self._reply(event, None, f"══恶魔轮盘══\n{text}")
+            return
+        umo = event.unified_msg_origin
+        pair = self.matchmaking.enqueue(sender, event.get_sender_name(), cid, umo, rating)
+        self.metrics.inc("matchmaking", "queued" if pair is None else "matched")
+        if pair is None:
+            self._arm_match_timer()
+            yield await self._reply(event, None, (
+                f"══恶魔轮盘══\n{self.at_id(event.get_sender_name())} 已加入匹配队列"
+                f"（评分 {rating:.0f}，队列中共 {len(self.matchmaking)} 人）。\n"
+                f"超过 {self.config['matchTimeout']} 秒未匹配到对手将自动退出，发送“/恶魔轮盘 取消匹配”可随时退出。"
+            ))
+            return
+        gid, text = await self._start_match(*pair, here=umo)
+        yield await self._reply(event, gid, text)
+
+    def _match_refusal(self, cid: str, player: str):
+        """不能加入匹配队列的原因，可以加入时返回 None"""
+        if not self.config["matchTimeout"]:
+            return "匹配功能未开启。"
+        seat = self._seats.get((cid, player))
+        if seat is not None:
+            return f"你正在 {split_key(seat)[1]} 号桌中，无法匹配。"
+        entry = self.matchmaking.get(player)
+        if entry is not None:
+            waited = self.matchmaking.clock() - entry.since
+            return f"你已在匹配队列中（已等待 {waited:.0f} 秒），发送“/恶魔轮盘 取消匹配”可退出。"
+        return None
+
+    @demon_roulette.command("取消匹配")
+    async def cancel_match(self, event: AstrMessageEvent):
+        """
+        取消匹配：退出跨群匹配队列。
+        """
+        cid = await self._channel(event)
+        if not self._admit(event, cid):
+            return
+        entry = self.matchmaking.cancel(event.get_sender_id())
+        text = "已退出匹配队列。" if entry is not None else "你不在匹配队列中。"
+        yield await self._reply(event, None, f"══恶魔轮盘══\n{text}")
+
+    async def _start_match(self, first, second, here: str = None) -> tuple:
+        """
+        为一对配对成功的玩家开局：在先入队玩家的群开桌（该群牌桌已满时改在对方的群），开局通知主动发往双方的群。
+        here 为发起本次配对的会话，发往它的通知由调用方作为回复发送。
+        返回 (游戏键, 发往 here 的通知)，开桌失败时游戏键为 None。
+        """
+        # 双方的群可能有休眠或待恢复的牌桌：先载入内存，入座检查与桌号分配才能看到它们
+        await self._load_channel(second.cid)
+        await self._load_channel(first.cid)
+        host, guest = first, second
+        if not self._has_room(first.cid) and self._has_room(second.cid):
+            host, guest = second, first
+        res = await self._run("match", host.cid, self._do_match, host, guest)
+        if res is None:
+            gid, text = None, "══恶魔轮盘══\n匹配到了对手，但有玩家已入座其它牌桌或牌桌已满，请重新匹配。"
+        else:
+            gid, text = res
+        reply = None
+        for entry in (host, guest) if guest.umo != host.umo else (host,):
+            if entry.umo == here:
+                reply = text
+            else:
+                await self.outbox.send(self.context, entry.umo, entry.cid, MessageChain().message(text), gid)
+        return gid, reply
+
+    def _has_room(self, cid: str) -> bool:
+        limit = self.config["maxTables"]
+        return not limit or len(self._tables.get(cid, ())) < limit
+
+    def _do_match(self, host, guest):
+        """在 host 的群开一张新牌桌并立即开局，返回 (游戏键, 开局通知)；有玩家已入座或牌桌已满时返回 None"""
+        if (host.cid, host.player) in self._seats or (guest.cid, guest.player) in self._seats:
+            return None
+        if not self._has_room(host.cid):
+            return None
+        if not self._shared and (host.cid in self.hibernation or guest.cid in self.hibernation):
+            # 唤醒失败（或开桌前又被休眠）：休眠的牌桌不在索引中，不能据此分配桌号、判断入座
+            return None
+        tables = self._tables.get(host.cid, ())
+        number = next(n for n in itertools.count(1) if n not in tables)
+        gid = game_key(host.cid, number)
+        table = self.item_table
+        game = GameState(PlayerState(host.name, host.player, len(table)), table)
+        game.players[1] = PlayerState(guest.name, guest.player, len(table))
+        game.origin = host.umo
+        if guest.cid != host.cid:
+            game.remote = (guest.cid, guest.umo)
+        replay.seed_game(game)
+        self.games[gid] = game
+        start = self._start(gid, game)
+        self._commit("start", gid)
+        text = (
+            f"{self._start_text(gid, game, start)}\n"
+            f"（匹配成功：{host.name} 评分 {host.rating:.0f} vs {guest.name} 评分 {guest.rating:.0f}）"
+        )
+        if game.remote is not None:
+            self._link_peers(gid, game)
+            text += f"\n这是跨群对局（{host.cid} 群 {number} 号桌），对手的行动会同步到本群。"
+        return gid, text
+
+    def _arm_match_timer(self):
+        """队列中有玩家时安排下一次放宽检查"""
+        if self._match_timer is None and len(self.matchmaking):
+            self._match_timer = self.scheduler.call_later(MATCH_TICK, self._on_match_tick)
+
+    def _on_match_tick(self):
+        """定时放宽容许的评分差：为新配对的玩家开局，通知等待超时的玩家"""
+        self._match_timer = None
+        matches, expired = self.matchmaking.tick()
+        self._arm_match_timer()
+        if matches or expired:
+            asyncio.get_running_loop().create_task(self._handle_match_tick(matches, expired))
+
+    async def _handle_match_tick(self, matches: list, expired: list):
+        for first, second in matches:
+            self.metrics.inc("matchmaking", "matched")
+            await self._start_match(first, second)
+        for entry in expired:
+            self.metrics.inc("matchmaking", "expired")
+            text = f"══恶魔轮盘══\n{self.at_id(entry.name)} 匹配超时，已退出匹配队列。"
+            await self.outbox.send(self.context, entry.umo, entry.cid, MessageChain().message(text))
+
+    # ------------- 战绩与排行榜 -------------
+    # 查询在线程池中访问 SQLite，刚结束的对局会在写线程下一次批量提交后（约 0.5 秒内）计入
+    @demon_roulette.command("排行榜")
+    async def show_leaderboard(self, event: AstrMessageEvent, limit: int = 10):
+        """
+        查看本群排行榜：按胜场排序（同胜场时负场少者在前），默认前 10 名，最多 50 名。
+        """
+        if self.stats is None:
+            yield await self._reply(event, None, "══恶魔轮盘══\n战绩记录未开启。")
+            return
+        cid = await self._channel(event)
+        if not self._admit(event, cid):
             return
-        p1_id = self.games[cid]["player1"]["id"]
-        p2_id = self.games[cid].get("player2", {}).get("id", "")
-        if event.get_sender_id() not in [p1_id, p2_id, *self.config["admin"]]:
-            yield event.plain_result("══恶魔轮盘══\n只有游戏参与者或管理员可以结束游戏。")
+        start = time.perf_counter_ns()
+        rows = await asyncio.to_thread(self.stats.leaderboard, cid, max(1, min(limit, 50)))
+        self.metrics.observe("show_leaderboard", time.perf_counter_ns() - start)
+        if not rows:
+            yield await self._reply(event, None, "══恶魔轮盘══\n本群还没有已结束的对局记录。")
             return
-        del self.games[cid]
-        yield event.plain_result(f"══恶魔轮盘══\n{self.at_id(event.get_sender_name())} 已强制结束当前游戏。")
+        lines = ["══恶魔轮盘══", "-- 本群排行榜 --"]
+        for rank, (name, games, wins, losses) in enumerate(rows, 1):
+            lines.append(f"{rank}. {name}：{wins} 胜 {losses} 负，胜率 {percent(wins / games)}")
+        yield await self._reply(event, None, lines)
+
+    @demon_roulette.command("战绩")
+    async def show_record(self, event: AstrMessageEvent):
+        """
+        查看我的战绩：本群的胜负、排名、开枪与道具次数、造成与承受的伤害，以及所有群的合计。
+        """
+        if self.stats is None:
+            yield await self._reply(event, None, "══恶魔轮盘══\n战绩记录未开启。")
+            return
+        cid = await self._channel(event)
+        if not self._admit(event, cid):
+            return
+        start = time.perf_counter_ns()
+        res = await asyncio.to_thread(self.stats.player_record, cid, event.get_sender_id())
+        rating, rated = await asyncio.to_thread(self.stats.rating, event.get_sender_id())
+        self.metrics.observe("show_record", time.perf_counter_ns() - start)
+        if res is None:
+            yield await self._reply(event, None, f"══恶魔轮盘══\n{self.at_id(event.get_sender_name())} 还没有已结束的对局记录。")
+            return
+        here, rank, overall = res
+        fmt = lambda r: (
+            f"{r['games']} 局 {r['wins']} 胜 {r['losses']} 负，胜率 {percent(r['wins'] / r['games'])}\n"
+            f"开枪 {r['shots']} 次，使用道具 {r['items']} 个，造成伤害 {r['damage_dealt']}，承受伤害 {r['damage_taken']}"
+        )
+        lines = ["══恶魔轮盘══", f"-- {event.get_sender_name()} 的战绩 --"]
+        if here is not None:
+            lines += [f"本群（第 {rank} 名）：", fmt(here)]
+        else:
+            lines.append("本群：暂无记录")
+        lines += ["所有群合计：", fmt(overall)]
+        if rated:
+            lines.append(f"匹配评分：{rating:.0f}（计入评分 {rated} 局）")
+        yield await self._reply(event, None, lines)
 
     # ------------- 商店兑换功能 -------------
     @demon_roulette.command("兑换")
     async def exchange_item(self, event: AstrMessageEvent, source: str, target: str):
         """
         兑换道具：如果你拥有2个相同的【source】道具，则可兑换为1个【target】道具。
-        允许兑换规则：
+        默认兑换规则如下（可在道具配置中修改）：
           香烟：可兑换为 手锯、放大镜、炸弹、幸运星、护盾
           啤酒：可兑换为 手铐、护盾
           手锯：可兑换为 逆转器
           放大镜：可兑换为 一次性电话
         """
-        allowed_exchanges = {
-            "香烟": ["手锯", "放大镜", "炸弹", "幸运星", "护盾"],
-            "啤酒": ["手铐", "护盾"],
-            "手锯": ["逆转器"],
-            "放大镜": ["一次性电话"],
-        }
-        cid = self.get_channel_id(event)
-        if cid not in self.games or self.games[cid]["status"] != "started":
-            yield event.plain_result("当前没有正在进行的游戏。")
+        cid = await self._channel(event)
+        if not self._admit(event, cid):
             return
-        if source not in allowed_exchanges or target not in allowed_exchanges[source]:
-            yield event.plain_result(f"【{source}】无法兑换成【{target}】。")
+        gid = self._find_game(cid, event.get_sender_id())
+        if gid is None:
+            yield await self._reply(event, None, self._no_game(cid, "当前没有正在进行的游戏。"))
             return
-        game = self.games[cid]
-        cur_player = f"player{game['currentTurn']}"
-        if game[cur_player]["item"].count(source) < 2:
-            yield event.plain_result(f"你没有足够的【{source}】进行兑换（需要2个）。")
-            return
-        for _ in range(2):
-            game[cur_player]["item"].remove(source)
-        game[cur_player]["item"].append(target)
-        yield event.plain_result(f"兑换成功：2个【{source}】已兑换为1个【{target}】！")
+        yield await self._reply(event, gid, await self._run(
+            "exchange_item", gid, self._do_exchange, gid, event.get_sender_id(), source, target,
+        ))
+
+    def _do_exchange(self, gid: str, sender: str, source: str, target: str) -> str:
+        """当前玩家兑换道具；兑换花费的是当前玩家的背包，其他人（含同桌的对手）发送时拒绝"""
+        if gid not in self.games or self.games[gid].status != "started":
+            return "当前没有正在进行的游戏。"
+        game = self.games[gid]
+        if game.current.id != sender:
+            return "现在不是你的回合，只能在自己的回合兑换道具。"
+        table = game.table
+        src, tgt = table.lookup.get(source), table.lookup.get(target)
+        result = "invalid"
+        if src is not None and tgt is not None:
+            result = engine.exchange(game, src, tgt)
+        if result == "invalid":
+            if src is not None and table.exchanges[src]:
+                options = "、".join(table.names[i] for i in sorted(table.exchanges[src]))
+                return f"【{source}】无法兑换成【{target}】，可兑换为：{options}。"
+            return f"【{source}】无法兑换成【{target}】。"
+        source, target = table.names[src], table.names[tgt]
+        if result == "insufficient":
+            return f"你没有足够的【{source}】进行兑换（需要{table.exchange_cost}个）。"
+        replay.record(game, replay.EXCHANGE, src, tgt)
+        self._commit("exchange", gid)
+        return f"兑换成功：{table.exchange_cost}个【{source}】已兑换为1个【{target}】！"
 
     # ------------- Debug 模式（仅管理员可用） -------------
     @demon_roulette.group("debug")
@@ -300,373 +1703,723 @@ class BuckshotRoulette(Star):
     @debug.command("给道具")
     async def debug_give_item(self, event: AstrMessageEvent, target: str, item: str, quantity: int):
         if event.get_sender_id() not in self.config["admin"]:
-            yield event.plain_result("权限不足！")
+            yield await self._reply(event, None, "权限不足！")
             return
-        cid = self.get_channel_id(event)
-        if cid not in self.games:
-            yield event.plain_result("当前群中没有游戏。")
-            return
-        game = self.games[cid]
-        player = None
-        if game["player1"]["id"] == target:
-            player = game["player1"]
-        elif "player2" in game and game["player2"]["id"] == target:
-            player = game["player2"]
-        if not player:
-            yield event.plain_result("指定的玩家不在当前游戏中。")
+        cid = await self._channel(event)
+        gid = self._find_game(cid, target)
+        if gid is None:
+            yield await self._reply(event, None, self._no_player(cid))
             return
-        for _ in range(quantity):
-            player["item"].append(item)
-        yield event.plain_result(f"已给玩家 {player['name']} 添加了 {quantity} 个【{item}】。")
+        yield await self._reply(event, gid, await self._run("debug_give_item", gid, self._do_give_item, gid, target, item, quantity))
+
+    def _do_give_item(self, gid: str, target: str, item: str, quantity: int) -> str:
+        if gid not in self.games:
+            return "当前群中没有游戏。"
+        game = self.games[gid]
+        idx = game.table.lookup.get(item)
+        if idx is None:
+            return f"不存在名为【{item}】的道具。"
+        player = game.player_by_id(target)
+        if not player:
+            return "指定的玩家不在当前游戏中。"
+        added = player.items.add(idx, quantity)
+        replay.record(game, replay.GIVE, game.players.index(player), idx, quantity)
+        self._commit("debug", gid)
+        item = game.table.names[idx]
+        if added != quantity:
+            return f"单种道具数量限制为 0~255，已给玩家 {player.name} 调整了 {added} 个【{item}】。"
+        return f"已给玩家 {player.name} 添加了 {quantity} 个【{item}】。"
 
     @debug.command("修改血量")
     async def debug_set_hp(self, event: AstrMessageEvent, target: str, hp: int):
         if event.get_sender_id() not in self.config["admin"]:
-            yield event.plain_result("权限不足！")
+            yield await self._reply(event, None, "权限不足！")
             return
-        cid = self.get_channel_id(event)
-        if cid not in self.games:
-            yield event.plain_result("当前群中没有游戏。")
-            return
-        game = self.games[cid]
-        player = None
-        if game["player1"]["id"] == target:
-            player = game["player1"]
-        elif "player2" in game and game["player2"]["id"] == target:
-            player = game["player2"]
-        if not player:
-            yield event.plain_result("指定的玩家不在当前游戏中。")
+        cid = await self._channel(event)
+        gid = self._find_game(cid, target)
+        if gid is None:
+            yield await self._reply(event, None, self._no_player(cid))
             return
-        player["hp"] = hp
-        yield event.plain_result(f"已将玩家 {player['name']} 的血量设置为 {hp}。")
+        yield await self._reply(event, gid, await self._run("debug_set_hp", gid, self._do_set_hp, gid, target, hp))
+
+    def _do_set_hp(self, gid: str, target: str, hp: int) -> str:
+        if gid not in self.games:
+            return "当前群中没有游戏。"
+        game = self.games[gid]
+        player = game.player_by_id(target)
+        if not player:
+            return "指定的玩家不在当前游戏中。"
+        player.hp = hp
+        replay.record(game, replay.SET_HP, game.players.index(player), hp)
+        self._commit("debug", gid)
+        return f"已将玩家 {player.name} 的血量设置为 {hp}。"
+
+    def _no_player(self, cid: str) -> str:
+        """调试指令的目标玩家不在任何牌桌时的回复"""
+        return "指定的玩家不在本群的任何牌桌中。" if self._tables.get(cid) else "当前群中没有游戏。"
 
     @debug.command("查询子弹")
-    async def debug_query_bullet(self, event: AstrMessageEvent):
+    async def debug_query_bullet(self, event: AstrMessageEvent, table: str = ""):
         if event.get_sender_id() not in self.config["admin"]:
-            yield event.plain_result("权限不足！")
+            yield await self._reply(event, None, "权限不足！")
             return
-        cid = self.get_channel_id(event)
-        if cid not in self.games:
-            yield event.plain_result("当前群中没有游戏。")
+        cid = await self._channel(event)
+        gid = self._find_game(cid, event.get_sender_id(), table)
+        if gid is None:
+            yield await self._reply(event, None, self._no_game(cid, "当前群中没有游戏。"))
             return
-        bullet_list = self.games[cid].get("bullet", [])
-        yield event.plain_result(f"当前弹夹：{bullet_list}")
+        yield await self._reply(event, None, f"当前弹夹：{self.games[gid].bullet.to_list()}")
 
     @debug.command("查询游戏")
-    async def debug_query_game(self, event: AstrMessageEvent):
+    async def debug_query_game(self, event: AstrMessageEvent, table: str = ""):
         if event.get_sender_id() not in self.config["admin"]:
-            yield event.plain_result("权限不足！")
+            yield await self._reply(event, None, "权限不足！")
             return
-        cid = self.get_channel_id(event)
-        if cid not in self.games:
-            yield event.plain_result("当前群中没有游戏。")
+        cid = await self._channel(event)
+        gid = self._find_game(cid, event.get_sender_id(), table)
+        if gid is None:
+            yield await self._reply(event, None, self._no_game(cid, "当前群中没有游戏。"))
+            return
+        yield await self._reply(event, None, f"当前游戏数据：{self.games[gid].to_dict()}")
+
+    @debug.command("重载道具")
+    async def debug_reload_items(self, event: AstrMessageEvent):
+        """重新加载道具配置：之后创建的游戏使用新配置，进行中的游戏不受影响"""
+        if event.get_sender_id() not in self.config["admin"]:
+            yield await self._reply(event, None, "权限不足！")
+            return
+        try:
+            table = await asyncio.to_thread(self._load_items)
+        except (OSError, ValueError) as e:
+            yield await self._reply(event, None, f"道具配置有误，继续使用原配置：{e}")
+            return
+        if table.fingerprint == self.item_table.fingerprint:
+            yield await self._reply(event, None, "道具配置没有变化。")
+            return
+        self.item_table = table
+        self._item_tables[table.fingerprint] = table
+        self._move_words = self._move_words.union(table.lookup)
+        if self.board is not None:
+            self.board.prepare(table)
+        running = sum(1 for g in self.games.values() if g.table is not table)
+        yield await self._reply(
+            event, None,
+            f"已重载道具配置：{len(table)} 种道具（指纹 {table.fingerprint:08x}）。\n"
+            f"新创建的游戏将使用新配置，进行中的 {running} 局游戏继续使用原配置。"
+        )
+
+    @debug.command("统计")
+    async def debug_stats(self, event: AstrMessageEvent):
+        """查看运行时指标：游戏状态分布、消息与指令计数、道具使用、结局分布及各指令耗时"""
+        if event.get_sender_id() not in self.config["admin"]:
+            yield await self._reply(event, None, "权限不足！")
+            return
+        yield await self._reply(event, None, self.render_stats())
+
+    @debug.command("性能采样")
+    async def debug_profile(self, event: AstrMessageEvent, seconds: int = PROFILE_SECONDS):
+        """在接下来的若干秒内对插件的处理函数做栈采样，折叠栈写入数据目录，并回复耗时最多的函数"""
+        if event.get_sender_id() not in self.config["admin"]:
+            yield await self._reply(event, None, "权限不足！")
+            return
+        if self.profiler.running:
+            yield await self._reply(event, None, "已有一次性能采样正在进行，请等待其结束。")
             return
-        yield event.plain_result(f"当前游戏数据：{self.games[cid]}")
+        if not profiling_supported():
+            yield await self._reply(event, None, "当前环境不支持性能采样（需要类 Unix 系统，且事件循环运行在主线程）。")
+            return
+        seconds = max(1, min(seconds, MAX_PROFILE_SECONDS))
+        self.profiler.start(seconds)
+        yield await self._reply(event, None, f"开始性能采样，持续 {seconds} 秒……")
+        await asyncio.sleep(seconds)
+        self.profiler.stop()
+        path = os.path.join(DATA_DIR, "profiles", time.strftime("profile-%Y%m%d-%H%M%S.folded"))
+        try:
+            await asyncio.to_thread(self.profiler.write, path)
+        except OSError:
+            logger.warning("恶魔轮盘性能采样结果写入失败", exc_info=True)
+            path = None
+        yield await self._reply(event, None, self.render_profile(path))
+
+    def render_profile(self, path: str = None, top: int = 5) -> str:
+        """上一次性能采样的摘要：样本中插件代码所占的比例、各入口的占比与自身 / 累计耗时最多的函数"""
+        prof = self.profiler
+        samples = prof.samples
+        lines = [
+            "══恶魔轮盘══",
+            f"性能采样 {prof.elapsed:.1f} 秒：采样 {prof.ticks} 次，其中 {samples} 次在执行插件代码"
+            f"（{samples / prof.ticks * 100 if prof.ticks else 0:.1f}%）",
+        ]
+        if samples:
+            fmt = lambda rows: [f"{label} {k / samples * 100:.1f}%" for label, k in rows]
+            lines += ["-- 入口 --", "，".join(fmt(prof.top_roots(top)))]
+            lines += [f"-- 自身耗时 Top {top} --", *fmt(prof.top_self(top))]
+            lines += [f"-- 累计耗时 Top {top} --", *fmt(prof.top_total(top))]
+        if path is not None:
+            lines.append(f"折叠栈（可用 flamegraph.pl / speedscope 生成火焰图）：{path}")
+        return "\n".join(lines)
+
+    def render_stats(self) -> str:
+        snap = self.metrics.summary()
+        counters = snap["counters"]
+        games = snap["gauges"]["games"]
+        msgs = counters["messages"]
+        # 进入处理的消息数即开枪与道具指令数，不在热路径上单独计数
+        moves = counters["commands"].get("fire", 0) + counters["commands"].get("use_item", 0)
+        outcome_names = {"win": "分出胜负", "ended": "强制结束", "afk_forfeit": "挂机判负",
+                         "join_timeout": "等待超时", "idle": "闲置回收"}
+        fmt = lambda d: "，".join(f"{k} {v}" for k, v in sorted(d.items(), key=lambda kv: -kv[1])) or "无"
+        lines = [
+            "══恶魔轮盘══",
+            "-- 游戏 --",
+            f"等待中 {games.get('waiting', 0)} / 已满员 {games.get('full', 0)} / 进行中 {games.get('started', 0)}，"
+            f"待触发定时器 {snap['gauges']['timers']['']}，有操作排队的牌桌 {snap['gauges']['mailboxes']['']}",
+            "-- 消息 --",
+            f"处理 {moves}，过滤 {sum(msgs.values())}"
+            f"（无游戏 {msgs.get('no_game', 0)} / 非当前玩家 {msgs.get('not_turn', 0)} / 非操作 {msgs.get('not_move', 0)}）",
+            "-- 指令 --",
+            fmt(counters["commands"]),
+            "-- 开枪 / 道具 --",
+            f"开枪：{fmt(counters['fires'])}",
+            f"道具：{fmt(counters['items'])}",
+            f"换轮 {counters['rounds'].get('', 0)} 次",
+            "-- 结局 --",
+            fmt({outcome_names.get(k, k): v for k, v in counters["games_finished"].items()}),
+            "-- 耗时 p50 / p99 / max (微秒) --",
+        ]
+        for name, lat in snap["latency"].items():
+            lines.append(f"{name}：{lat['p50_us']:.0f} / {lat['p99_us']:.0f} / {lat['max_us']:.0f}（{lat['count']} 次）")
+        out = self.outbox.stats()
+        lines.append(f"出站调用 {out['calls']} 次，已结束游戏平均每局 {out['calls_per_game']:.1f} 次")
+        requests = counters["requests"]
+        renders = counters["render_cache"]
+        lines.append(
+            f"流控：放行 {requests.get('processed', 0)}，丢弃 重复操作 {requests.get('debounced', 0)} / "
+            f"群限流 {requests.get('channel_limited', 0)} / 玩家限流 {requests.get('user_limited', 0)}；"
+            f"只读指令缓存命中 {renders.get('hit', 0)} / 未命中 {renders.get('miss', 0)}"
+        )
+        watch = self.spectators.stats()
+        if watch["published"] or watch["subscribers"]:
+            lines.append(
+                f"观战：{watch['games']} 局 / {watch['subscribers']} 个群，转播事件 {watch['published']}，"
+                f"发送 {watch['sent']}，队列满丢弃 {watch['dropped']}，失败 {watch['failed']}"
+            )
+        queue = self.matchmaking.stats()
+        if queue["queued"] or queue["matched"] or queue["expired"]:
+            lines.append(
+                f"匹配：队列中 {queue['queued']} 人（{queue['buckets']} 个评分段），已配对 {queue['matched']} 对，"
+                f"平均等待 {queue['avg_wait']:.1f} 秒，超时 {queue['expired']} 人"
+            )
+        hibernated = counters["hibernate"]
+        if hibernated:
+            line = (
+                f"休眠：内存中 {len(self.games)} 局（上限 {self.config['maxActiveGames']}），"
+                f"累计休眠 {hibernated.get('parked', 0)} / 唤醒 {hibernated.get('woken', 0)} 局"
+            )
+            if self.hibernation is not None:
+                info = self.hibernation.stats()
+                line += f"，库中 {self.hibernation.count()} 局（{info['db_bytes'] // 1024} KB）"
+            lines.append(line)
+        if self.board is not None:
+            images = counters["board"]
+            cache = self.board.stats()
+            lines.append(
+                f"对战图片：复用 {images.get('cached', 0)} / 增量重绘 {images.get('warm', 0)} / 整帧绘制 {images.get('cold', 0)}，"
+                f"缓存 {cache['frames']} 帧、{cache['pngs']} 张 PNG（{cache['png_bytes'] // 1024} KB）"
+            )
+        if self._shared:
+            store = counters["store"]
+            lines.append(
+                f"共享存储：写入 {store.get('write', 0)}，版本冲突 {store.get('conflict', 0)}，"
+                f"重新读取 {store.get('reload', 0)}，放弃 {store.get('gave_up', 0)}"
+            )
+        return "\n".join(lines)
 
     # ------------- 消息监听 -------------
     @event_message_type(EventMessageType.ALL)
     async def on_message(self, event: AstrMessageEvent):
         """
-        监听消息：如果游戏正在进行且处于当前玩家回合，
+        监听消息：如果发言者所在牌桌的游戏正在进行且处于其回合，
         则判断玩家是否选择了“自己”或“对方”开枪，或使用道具。
+        发言者的牌桌由玩家索引一次查得，与本群的牌桌数量无关，开枪与道具无需附上桌号。
         """
-        cid = self.get_channel_id(event)
-        if cid not in self.games or self.games[cid]["status"] != "started":
+        metrics = self.metrics
+        content = event.message_obj.message_str.strip()
+        if self._shared:
+            # 共享存储：同步缓存需要读取存储，先按关键词滤掉闲聊，只为可能是开枪或道具的消息同步
+            if content not in self._move_words:
+                metrics.inc("messages", "not_move")
+                return
+            await self._channel(event)
+        elif self.hibernation or (self.journal and self.journal.recovered):
+            # 有休眠或待恢复的游戏：先同步判断本群是否涉及，只为可能是开枪或道具的消息唤醒，
+            # 闲聊不读取磁盘，也不刷新该群的活动时间
+            if content in self._move_words:
+                cid = event.get_group_id() or event.session_id
+                if cid in self.hibernation or self._is_pending(cid):
+                    await self._channel(event)
+        if not self._routes:
+            metrics.inc("messages", "no_game")
             return
-        g = self.games[cid]
-        cur_player = f"player{g['currentTurn']}"
-        if g[cur_player]["id"] != event.get_sender_id():
+        sender = event.get_sender_id()
+        gid = self._seats.get((event.get_group_id() or event.session_id, sender))
+        route = self._routes.get(gid) if gid is not None else None
+        if route is None:
+            metrics.inc("messages", "no_game")
             return
-        content = event.message_obj.message_str.strip()
+        if route[0] != sender:
+            metrics.inc("messages", "not_turn")
+            return
+        if content not in route[1]:
+            metrics.inc("messages", "not_move")
+            return
+        dropped = self.flood.admit_move(split_key(gid)[0], sender, gid, content, self._versions.get(gid))
+        metrics.inc("requests", dropped or "processed")
+        if dropped is not None:
+            return
+        # 热路径上直接计时，不经 _run 多包一层协程
+        name = "fire" if content in ("自己", "对方") else "use_item"
+        round_before = self.games[gid].round
+        start = time.perf_counter_ns()
+        if self._shared:
+            lines = await self.actors.run(gid, self._attempt, self._do_move, (gid, content, event))
+        else:
+            lines = await self.actors.run(gid, self._do_move, gid, content, event)
+        metrics.observe(name, time.perf_counter_ns() - start)
+        # lines 为 None 表示共享存储下的写入被放弃，回复提示稍后重试
+        if lines != []:
+            yield await self._reply(event, gid, lines, self._round_board(gid, round_before))
+
+    def _do_move(self, gid: str, content: str, event: AstrMessageEvent):
+        """
+        在该牌桌的 actor 中执行一次开枪或道具使用。
+        路由索引只做快速预筛，排队期间状态可能已经改变，因此这里按最新状态重新校验，已不能执行时返回空列表（不回复）。
+        """
+        g = self.games.get(gid)
+        if g is None or g.status != "started" or g.current.id != event.get_sender_id():
+            return []
         if content in ["自己", "对方"]:
-            async for msg_ret in self.fire(cid, content, event):
-                yield msg_ret
-            return
-        if content in g[cur_player]["item"]:
-            async for msg_ret in self.use_item(cid, content, event):
-                yield msg_ret
-
-    # ------------- 核心函数：开枪 -------------
-    async def fire(self, cid: str, target: str, event: AstrMessageEvent):
-        """
-        开枪逻辑：根据枪膛中子弹的类型计算伤害、切换回合或结束游戏，
-        并反馈详细情景描述。
-        """
-        game = self.games[cid]
-        cur_p = f"player{game['currentTurn']}"
-        oth_p = f"player{1 if game['currentTurn'] == 2 else 2}"
-        bullet = game["bullet"].pop() if game["bullet"] else None
-        if not bullet:
-            yield event.plain_result("══恶魔轮盘══\n当前弹夹已空，自动进入下一轮。")
-            yield event.plain_result(self.next_round(game))
-            return
-        text = f"══恶魔轮盘══\n你将枪口对准了【{target}】，扣下扳机……结果是【{bullet}】\n"
-        if bullet == "实弹":
-            damage = 2 if game["double"] else 1
-            if target == "自己":
-                game[cur_p]["hp"] -= damage
-                text += f"你遭受猛烈反噬，损失了 {damage} 点血量！"
-                if game[cur_p]["hp"] <= 0:
-                    yield event.plain_result(text)
-                    lines = self.game_over(cid, winner=oth_p, loser=cur_p)
-                    for ln in lines:
-                        yield event.plain_result(ln)
-                    return
-            else:
-                if game[oth_p].get("shield", False):
-                    text += "但对方的护盾闪耀，将伤害全部吸收！"
-                    game[oth_p]["shield"] = False
-                else:
-                    game[oth_p]["hp"] -= damage
-                    text += f"对方被你狠狠击中，损失了 {damage} 点血量！"
-                    if game[oth_p]["hp"] <= 0:
-                        yield event.plain_result(text)
-                        lines = self.game_over(cid, winner=cur_p, loser=oth_p)
-                        for ln in lines:
-                            yield event.plain_result(ln)
-                        return
-        if bullet == "空包弹" and target == "自己":
-            text += "\n幸好只是空包弹，你仍保有行动权！"
+            return self.fire(gid, content)
+        idx = g.table.lookup.get(content)
+        if idx is not None and g.current.items.count(idx):
+            return self.use_item(gid, content)
+        return []
+
+    # ------------- 核心函数：开枪与道具 -------------
+    # 规则由 engine 模块结算，这里只负责把事件渲染为聊天文本并处理游戏结束
+    def fire(self, gid: str, target: str) -> list:
+        """
+        开枪：由规则引擎结算伤害、回合切换与游戏结束，
+        返回详细情景描述的文本行。
+        """
+        game = self.games[gid]
+        self.metrics.inc("fires", target)
+        mover = game.turn
+        at_self = target == "自己"
+        events = engine.fire(game, at_self, game.rng)
+        replay.record(game, replay.FIRE_SELF if at_self else replay.FIRE_OTHER)
+        lines = self.render_events(game, events)
+        self._settle(gid, game, "fire", events, mover)
+        return lines
+
+    def use_item(self, gid: str, item: str) -> list:
+        """
+        使用道具（item 为道具名或别名）：由规则引擎结算效果并从背包中移除该道具，返回反馈文本行。
+        """
+        game = self.games[gid]
+        mover = game.turn
+        idx = game.table.lookup[item]
+        events = engine.use_item(game, idx, game.rng)
+        replay.record(game, replay.ITEM, idx)
+        lines = [f"你尝试使用【{game.table.names[idx]}】道具……", *self.render_events(game, events)]
+        self._settle(gid, game, "use", events, mover)
+        return lines
+
+    def _settle(self, gid: str, game: GameState, op: str, events: list, mover: int):
+        """
+        一次操作结算完毕：更新公开信息与战绩累计，游戏已结束则记录结果并移除，
+        否则按是否换轮记录状态变化。mover 为执行本次操作的玩家下标。
+        """
+        self._observe((self._knowledge.get(gid), self._remote_knowledge.get(gid)),
+                      game.remote is not None, mover, events)
+        tallies = self._tallies.get(gid)
+        if tallies is not None:
+            self._tally(tallies, mover, events)
+        metrics = self.metrics
+        for ev in events:
+            kind = ev[0]
+            if kind == "item":
+                metrics.inc("items", game.table.names[ev[1]])
+            elif kind == "round":
+                metrics.inc("rounds")
+            elif kind == "over":
+                metrics.inc("games_finished", "win")
+        if self.spectators.watching(gid):
+            self._stash_broadcast(gid, "\n".join([
+                f" {game.players[mover].name} 的行动：",
+                *self.render_events(game, events, public=True),
+            ]), game.origin_of(mover))
+        if game.status == "over":
+            self._record_result(gid, game, "win", game.winner)
+            del self.games[gid]
+            self._commit("over", gid)
         else:
-            if not game[oth_p]["handcuff"]:
-                game["currentTurn"] = 1 if game["currentTurn"] == 2 else 2
-                new_p = f"player{game['currentTurn']}"
-                text += f"\n切换回合：现在由 {self.at_id(game[new_p]['name'])} 决定下一步！"
-                game["usedHandcuff"] = False
-            else:
-                game[oth_p]["handcuff"] = False
-                text += "\n对方被手铐束缚，无法反击，你继续掌控全局！"
-        yield event.plain_result(text)
-        game["double"] = False
-        if len(game["bullet"]) == 0:
-            yield event.plain_result(self.next_round(game))
-
-    def next_round(self, game: dict):
-        """
-        进入下一轮：重新生成弹夹，并为双方发放新的随机道具。
-        """
-        game["round"] += 1
-        game["bullet"] = generate_random_bullet_list()
-        bullet_list = game["bullet"]
-        item_pool = list(self.item_list.keys())
-        item_count = random.randint(2, 5)
-        cur_p = f"player{game['currentTurn']}"
-        oth_p = f"player{1 if game['currentTurn'] == 2 else 2}"
-        for _ in range(item_count):
-            game[cur_p]["item"].append(random.choice(item_pool))
-            game[oth_p]["item"].append(random.choice(item_pool))
-        game["player1"]["item"] = game["player1"]["item"][:8]
-        game["player2"]["item"] = game["player2"]["item"][:8]
-        msg = textwrap.dedent(f"""\ 
-            ══恶魔轮盘══
-            弹夹打空，进入第 {game["round"]} 轮！
-            新弹夹中共有 {len(bullet_list)} 发子弹，
-            其中实弹 {self.count_bullet(bullet_list, "实弹")} 发, 空包弹 {self.count_bullet(bullet_list, "空包弹")} 发.
-            双方各获得 {item_count} 个随机道具（上限 8）。
-        """)
-        return msg
-
-    async def use_item(self, cid: str, item: str, event: AstrMessageEvent):
-        """
-        使用道具：调用对应道具效果，并将反馈信息发送到聊天，
-        使用成功后从玩家背包中移除该道具。
-        """
-        game = self.games[cid]
-        cur_p = f"player{game['currentTurn']}"
-        yield event.plain_result(f"你尝试使用【{item}】道具……")
-        lines = await self.item_list[item]["use"](self, cid, cur_p, None, event)
-        for ln in lines:
-            yield event.plain_result(ln)
-        if item in game[cur_p]["item"]:
-            game[cur_p]["item"].remove(item)
-            yield event.plain_result(f"【{item}】已从你的背包中移除，希望这能助你一臂之力！")
-
-    # ------------- 各道具具体实现 -------------
+            self._commit("round" if any(ev[0] == "round" for ev in events) else op, gid)
+
+    @staticmethod
+    def _observe(knowledge: tuple, remote: bool, mover: int, events: list):
+        """
+        把一次操作的事件交给双方的 Knowledge (主场群, 玩家2所在群)，mover 为执行操作的玩家下标。
+        跨群对局中道具揭示的子弹只发送到使用者的群，另一方只看到隐去结果的转播。
+        """
+        home, away = knowledge
+        if home is not None:
+            home.observe(events, not remote or mover == 0)
+        if away is not None:
+            away.observe(events, mover == 1)
+
+    @staticmethod
+    def _tally(tallies: tuple, mover: int, events: list):
+        """把一次操作的事件计入双方的战绩累计 [开枪, 道具, 造成伤害, 承受伤害]，mover 为执行操作的玩家下标"""
+        mine = tallies[mover]
+        for ev in events:
+            kind = ev[0]
+            if kind == "shot":
+                mine[0] += 1
+            elif kind == "item":
+                mine[1] += 1
+            elif kind == "damage":
+                tallies[ev[1]][3] += ev[2]
+                if ev[1] != mover:
+                    mine[2] += ev[2]
+
+    def render_events(self, game: GameState, events: list, public: bool = False) -> list:
+        """
+        将规则引擎产生的事件渲染为文本行。
+        一次开枪的命中、伤害与回合变化合并为同一段描述，换轮与游戏结束各占一行。
+        public 为 True 时渲染给观战群：放大镜、逆转器与一次性电话揭示的子弹信息被隐去。
+        """
+        lines = []
+        shot = None        # 当前开枪描述段
+        shot_self = False  # 当前这一枪是否打向自己
+        at = lambda idx: self.at_id(game.players[idx].name)
+        for ev in events:
+            kind = ev[0]
+            if kind == "shot":
+                shot_self = ev[1]
+                target = "自己" if shot_self else "对方"
+                shot = f"══恶魔轮盘══\n你将枪口对准了【{target}】，扣下扳机……结果是【{bullet_name(ev[2])}】\n"
+            elif kind == "damage":
+                # 道具造成的伤害已包含在道具描述中，这里只渲染开枪伤害
+                if shot is not None:
+                    shot += (
+                        f"你遭受猛烈反噬，损失了 {ev[2]} 点血量！" if shot_self
+                        else f"对方被你狠狠击中，损失了 {ev[2]} 点血量！"
+                    )
+            elif kind == "shield_block":
+                shot += "但对方的护盾闪耀，将伤害全部吸收！"
+            elif kind == "keep_turn":
+                shot += "\n幸好只是空包弹，你仍保有行动权！"
+            elif kind == "handcuffed":
+                shot += "\n对方被手铐束缚，无法反击，你继续掌控全局！"
+            elif kind == "turn":
+                shot += f"\n切换回合：现在由 {at(ev[1])} 决定下一步！"
+            elif kind == "empty":
+                lines.append("══恶魔轮盘══\n当前弹夹已空，自动进入下一轮。")
+            elif kind == "round":
+                if shot is not None:
+                    lines.append(shot)
+                    shot = None
+                lines.append(self.templates.render(
+                    "round", round=ev[1], total=ev[2], live=ev[3], blank=ev[4],
+                    items=ev[5], max_items=MAX_ITEMS,
+                ))
+            elif kind == "over":
+                if shot is not None:
+                    lines.append(shot)
+                    shot = None
+                lines.append(self.templates.render("game_over", winner=at(ev[1]), loser=at(ev[2])))
+            elif kind == "item":
+                if public and game.table.kinds[ev[1]] in SECRET_EFFECTS:
+                    who = "使用者一方" if game.remote is not None else "对局双方"
+                    lines.append(f"使用了【{game.table.names[ev[1]]}】，它揭示的子弹信息只有{who}知道。")
+                    continue
+                custom = game.table.text(ev[1], ev[2], ev[3:])
+                if custom is None:
+                    custom = self._item_texts[game.table.kinds[ev[1]]](self, game, ev[2], *ev[3:])
+                lines += custom
+            elif kind == "consumed":
+                if game.status == "over":
+                    continue
+                lines.append(f"【{game.table.names[ev[1]]}】已从你的背包中移除，希望这能助你一臂之力！")
+        if shot is not None:
+            lines.append(shot)
+        return lines
+
+    # ------------- 各道具效果的内置文本描述 -------------
+    # 函数签名统一为 (plugin, game, result, *args)，result 与 args 见 engine 中对应的道具效果
     @staticmethod
-    async def use_saw(plugin, cid, cur_player, pick, event):
+    def saw_text(plugin, game, result):
         """手锯：下一发造成双倍伤害，不可叠加"""
-        g = plugin.games[cid]
-        g["double"] = True
         return [
             "你小心翼翼地取出手锯，锯短了枪管……",
             "【手锯】效果启动：下一发子弹伤害翻倍！"
         ]
 
     @staticmethod
-    async def use_magnifier(plugin, cid, cur_player, pick, event):
+    def magnifier_text(plugin, game, result, live=None):
         """放大镜：查看当前膛内的子弹"""
-        g = plugin.games[cid]
-        if not g["bullet"]:
+        if result == "empty":
             return ["你拿着放大镜仔细查看，发现枪膛中已无子弹。"]
-        bullet_type = g["bullet"][-1]
         return [
             "你取出放大镜，凑近枪膛仔细观察……",
-            f"发现下一发子弹是【{bullet_type}】！"
+            f"发现下一发子弹是【{bullet_name(live)}】！"
         ]
 
     @staticmethod
-    async def use_beer(plugin, cid, cur_player, pick, event):
+    def beer_text(plugin, game, result, live=None):
         """啤酒：卸下当前膛内的一发子弹"""
-        g = plugin.games[cid]
-        if not g["bullet"]:
+        if result == "empty":
             return ["你试图用啤酒卸下子弹，但枪膛已空。"]
-        bullet = g["bullet"].pop()
-        msg = [
+        return [
             "你大口喝下冰镇啤酒，猛然敲击枪膛……",
-            f"“叮”地一声，一发【{bullet}】弹飞而出！"
+            f"“叮”地一声，一发【{bullet_name(live)}】弹飞而出！"
         ]
-        if len(g["bullet"]) == 0:
-            msg.append(plugin.next_round(g))
-        return msg
 
     @staticmethod
-    async def use_cigarette(plugin, cid, cur_player, pick, event):
+    def cigarette_text(plugin, game, result):
         """香烟：恢复1点生命值（最多6点）"""
-        g = plugin.games[cid]
-        if g[cur_player]["hp"] < 6:
-            g[cur_player]["hp"] += 1
+        if result == "ok":
             return [
                 "你点燃一根香烟，缓缓吸入袅袅烟雾……",
                 "感觉紧张得以缓解，恢复了 1 点血量！"
             ]
-        else:
-            return [
-                "你点燃香烟，但发现自己已满血，",
-                "不过这也让你稍微放松了一下。"
-            ]
+        return [
+            "你点燃香烟，但发现自己已满血，",
+            "不过这也让你稍微放松了一下。"
+        ]
 
     @staticmethod
-    async def use_handcuff(plugin, cid, cur_player, pick, event):
+    def handcuff_text(plugin, game, result):
         """手铐：让对方跳过下一回合"""
-        g = plugin.games[cid]
-        if g.get("usedHandcuff", False):
+        if result == "used":
             return ["你试图再次使用手铐，但本回合已使用，请冷静。"]
-        other_p = f"player{1 if g['currentTurn'] == 2 else 2}"
-        g[other_p]["handcuff"] = True
-        g["usedHandcuff"] = True
         return [
             "你迅速掏出手铐，瞬间锁住了对方双手……",
             "对方下一回合将被迫放弃行动！"
         ]
 
     @staticmethod
-    async def use_expired_medicine(plugin, cid, cur_player, pick, event):
+    def expired_medicine_text(plugin, game, result, amount):
         """过期药物：50%几率恢复2点血；50%几率损失1点血（可能导致自己死亡）"""
-        g = plugin.games[cid]
-        if random.random() < 0.5:
-            recover = min(6 - g[cur_player]["hp"], 2)
-            g[cur_player]["hp"] += recover
+        if result == "heal":
             return [
                 "你从口袋中摸出一瓶泛黄药剂，毫不犹豫地服下……",
-                f"顿时感觉体内充满温暖，恢复了 {recover} 点血量！"
+                f"顿时感觉体内充满温暖，恢复了 {amount} 点血量！"
             ]
-        else:
-            g[cur_player]["hp"] -= 1
-            if g[cur_player]["hp"] <= 0:
-                other_p = f"player{1 if g['currentTurn'] == 2 else 2}"
-                msg = textwrap.dedent(f"""\
-                    你吞下药剂后，胃中剧痛难忍……
-                    眼前一黑，你彻底倒下。
-                    
-                    {plugin.at_id(g[other_p]["name"])} 获得了最终胜利！
-                """)
-                await event.plain_result(msg)
-                lines = plugin.game_over(cid, winner=other_p, loser=cur_player)
-                for ln in lines:
-                    await event.plain_result(ln)
-                return []
-            else:
-                return [
-                    "你盲目服下药剂，突然感到胃中一阵绞痛……",
-                    "遗憾地损失了 1 点血量。"
-                ]
+        if game.status == "over":
+            return [
+                "你吞下药剂后，胃中剧痛难忍……\n"
+                "眼前一黑，你彻底倒下。\n\n"
+                f"{plugin.at_id(game.players[game.winner].name)} 获得了最终胜利！"
+            ]
+        return [
+            "你盲目服下药剂，突然感到胃中一阵绞痛……",
+            "遗憾地损失了 1 点血量。"
+        ]
 
     @staticmethod
-    async def use_reverser(plugin, cid, cur_player, pick, event):
+    def reverser_text(plugin, game, result, now_live=None):
         """逆转器：将当前膛内最后一发子弹的类型进行反转"""
-        g = plugin.games[cid]
-        if not g["bullet"]:
+        if result == "empty":
             return ["你轻抚逆转器，却发现枪膛中无子弹可逆转。"]
-        old_bullet = g["bullet"].pop()
-        new_bullet = "空包弹" if old_bullet == "实弹" else "实弹"
-        g["bullet"].append(new_bullet)
         return [
             "你拿起那闪烁着神秘光芒的逆转器，轻按一下……",
-            f"原本的【{old_bullet}】瞬间变为【{new_bullet}】！"
+            f"原本的【{bullet_name(not now_live)}】瞬间变为【{bullet_name(now_live)}】！"
         ]
 
     @staticmethod
-    async def use_once_phone(plugin, cid, cur_player, pick, event):
-        """
-        一次性电话：随机告知枪膛中某发子弹的类型，但不移除该子弹。
-        说明：子弹列表以先进后出顺序发射，因此列表末尾为下一发（显示为第一发）。
-        """
-        g = plugin.games[cid]
-        bullet_count = len(g["bullet"])
-        if bullet_count == 0:
+    def once_phone_text(plugin, game, result, order=None, live=None):
+        """一次性电话：随机告知枪膛中某发子弹的类型，但不移除该子弹"""
+        if result == "empty":
             return ["你拿起神秘电话，却发现枪膛中空空如也……"]
-        idx = random.randint(0, bullet_count - 1)
-        firing_order = bullet_count - idx  # 列表末尾为第一发
-        bullet_type = g["bullet"][idx]
         return [
             "你拨通了一次性电话，耳边响起低沉电子声……",
-            f"“秘密告诉你，第 {firing_order} 发子弹竟是【{bullet_type}】！”"
+            f"“秘密告诉你，第 {order} 发子弹竟是【{bullet_name(live)}】！”"
         ]
 
     @staticmethod
-    async def use_zhandan(plugin, cid, cur_player, pick, event):
+    def zhandan_text(plugin, game, result, damage=None):
         """炸弹：投掷后对对手造成2点伤害（若对方有护盾则抵消）"""
-        g = plugin.games[cid]
-        oth_p = f"player{1 if g['currentTurn'] == 2 else 2}"
-        if g[oth_p].get("shield", False):
-            g[oth_p]["shield"] = False
+        if result == "blocked":
             return ["你投掷炸弹，但对方的护盾闪耀，将爆炸伤害全部抵消！"]
-        else:
-            g[oth_p]["hp"] -= 2
-            return ["你果断投掷炸弹，对方受到猛烈爆炸冲击，损失了 2 点血量！"]
+        return [f"你果断投掷炸弹，对方受到猛烈爆炸冲击，损失了 {damage} 点血量！"]
 
     @staticmethod
-    async def use_xingyunxing(plugin, cid, cur_player, pick, event):
+    def xingyunxing_text(plugin, game, result, new_item=None):
         """幸运星：随机获得血量恢复或额外道具"""
-        g = plugin.games[cid]
-        if random.random() < 0.5:
-            if g[cur_player]["hp"] < 6:
-                g[cur_player]["hp"] += 1
-                return ["幸运星闪耀，你感觉体内充满力量，血量增加了 1 点！"]
-            else:
-                return ["幸运星闪烁，但你已满血，效果无效。"]
-        else:
-            new_item = random.choice(list(plugin.item_list.keys()))
-            g[cur_player]["item"].append(new_item)
-            return [f"幸运星降临，你意外获得了额外道具【{new_item}】！"]
+        if result == "heal":
+            return ["幸运星闪耀，你感觉体内充满力量，血量增加了 1 点！"]
+        if result == "full":
+            return ["幸运星闪烁，但你已满血，效果无效。"]
+        return [f"幸运星降临，你意外获得了额外道具【{game.table.names[new_item]}】！"]
 
     @staticmethod
-    async def use_hudun(plugin, cid, cur_player, pick, event):
+    def hudun_text(plugin, game, result):
         """护盾：获得护盾效果，下一次受到攻击时自动抵消伤害"""
-        g = plugin.games[cid]
-        g[cur_player]["shield"] = True
         return ["你装备了护盾，下一次受到攻击时将自动抵消伤害！"]
 
+    # ------------- 人机对战 -------------
+    def _ai_turn_check(self, gid: str):
+        """轮到 AI 行动且 AI 不在思考中时，安排一个 AI 回合；游戏已不存在时清理 AI 状态"""
+        g = self.games.get(gid)
+        if g is None:
+            self._ai_games.pop(gid, None)
+            return
+        if g.status == "started" and g.current.id == ai.AI_ID and gid not in self._ai_tasks:
+            self._ai_tasks[gid] = asyncio.get_running_loop().create_task(self._ai_turn(gid))
+
+    async def _ai_turn(self, gid: str):
+        try:
+            await self._ai_act(gid)
+        except Exception:
+            logger.exception("恶魔轮盘 AI 行动失败")
+            return
+        finally:
+            self._ai_tasks.pop(gid, None)
+        # 使用道具不结束回合，AI 可能需要继续行动
+        self._ai_turn_check(gid)
+
+    async def _ai_act(self, gid: str):
+        """在该牌桌的 actor 中搜索并执行一个动作，再主动发送结果"""
+        res = await self.actors.run(gid, self._ai_step, gid)
+        if res is None:
+            return
+        origin, lines, image = res
+        await self.outbox.send(self.context, origin, split_key(gid)[0], self._chain(lines, image), gid)
+        if gid not in self.games:
+            self.outbox.game_finished(gid)
+
+    async def _ai_step(self, gid: str):
+        """
+        （在该牌桌的 actor 中）在线程池中搜索一个动作并执行，返回 (origin, 文本行, 换轮图片)，未执行时返回 None。
+        搜索不阻塞事件循环，期间该牌桌的其它操作（挂机超时、结束游戏、调试指令等）在邮箱中排队，搜索结果不会过时。
+        """
+        g = self.games.get(gid)
+        level = self._ai_games.get(gid)
+        if g is None or level is None:
+            return None
+        snap = ai.snapshot(g, g.turn, self._knowledge.get(gid))
+        if self._ai_pool is None:
+            self._ai_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="buckshot-ai")
+        start = time.perf_counter_ns()
+        action, _, _ = await asyncio.get_running_loop().run_in_executor(
+            self._ai_pool, self._ai_searcher.choose, snap, level, replay.decision_rng(g), g.table.kind_probs
+        )
+        self.metrics.observe("ai_search", time.perf_counter_ns() - start)
+        round_before = g.round
+        start = time.perf_counter_ns()
+        # 已在该牌桌的 actor 中，不能再经 _run 投递到同一邮箱
+        if self._shared:
+            res = await self._attempt(self._do_ai_move, (gid, snap, action))
+        else:
+            res = self._do_ai_move(gid, snap, action)
+        self.metrics.observe("ai_move", time.perf_counter_ns() - start)
+        if res is None:
+            return None
+        return (*res, self._round_board(gid, round_before))
+
+    def _do_ai_move(self, gid: str, snap: tuple, action: int):
+        """
+        执行 AI 选定的动作，返回 (origin, 文本行)。
+        局面已与搜索时不同（共享存储下重新读取到了其它进程的写入）时放弃本次结果，由 _ai_turn 重新安排。
+        """
+        g = self.games.get(gid)
+        if g is None or gid not in self._ai_games or g.status != "started" or g.current.id != ai.AI_ID:
+            return None
+        if ai.snapshot(g, g.turn, self._knowledge.get(gid)) != snap:
+            return None
+        content = ai.action_text(action, g)
+        lines = [f"══恶魔轮盘══\n{self.at_id(ai.AI_NAME)} 思考片刻，选择了【{content}】。"]
+        lines += self.fire(gid, content) if action < 0 else self.use_item(gid, content)
+        return g.origin, lines
+
     # ------------- 游戏结束及辅助函数 -------------
-    def game_over(self, cid: str, winner: str, loser: str):
-        """
-        宣告胜者并删除当前游戏数据。
-        """
-        g = self.games[cid]
-        winner_name = g[winner]["name"]
-        loser_name = g[loser]["name"]
-        text = textwrap.dedent(f"""\
-            ══恶魔轮盘══
-            {self.at_id(loser_name)} 倒下了！
-            {self.at_id(winner_name)} 获得了最终胜利！
-            游戏正式结束，感谢参与，期待下次再战！
-        """)
-        del self.games[cid]
+    def game_over(self, gid: str, winner: PlayerState, loser: PlayerState, outcome: str = "win"):
+        """
+        宣告胜者、记录战绩并删除当前游戏数据。
+        """
+        text = self.templates.render("game_over", loser=self.at_id(loser.name), winner=self.at_id(winner.name))
+        game = self.games[gid]
+        # 由定时器触发，通知已直接发往创建游戏的群
+        self._stash_broadcast(gid, f"\n{text}", game.origin)
+        self._record_result(gid, game, outcome, game.players.index(winner))
+        del self.games[gid]
+        self._commit("over", gid)
         return [text]
 
-    def count_bullet(self, bullet_list, key):
-        """统计列表中指定类型子弹的数量"""
-        return sum(1 for b in bullet_list if b == key)
+    @staticmethod
+    def _forfeit(game: GameState, loser: int):
+        """判定 loser 认输，并记入回放操作流"""
+        engine.forfeit(game, loser)
+        replay.record(game, replay.FORFEIT, loser)
+
+    def _record_result(self, gid: str, game: GameState, outcome: str, winner: int):
+        """记下一局的结果连同回放，随后的 _commit 写入存储成功后入队写入战绩库（仅入队，不阻塞）"""
+        if self.stats is None:
+            return
+        tallies = self._tallies.get(gid, ([0, 0, 0, 0], [0, 0, 0, 0]))
+        self._results[gid] = GameResult(split_key(gid)[0], outcome, game.round, tuple(
+            (p.id, p.name, idx == winner, *tallies[idx]) for idx, p in enumerate(game.players)
+        ), replay=replay.encode(game), rated=game.player_by_id(ai.AI_ID) is None)
+
+    def _refresh_index(self, gid: str):
+        """
+        按该牌桌的当前状态同步玩家索引、群内桌号集合与消息路由。
+        仅在入座玩家变化时改写玩家索引（创建、加入、结束），开枪与道具只重建路由项。
+        跨群对局的玩家2登记在自己所在的群下，桌号仍只属于创建游戏的群。
+        """
+        g = self.games.get(gid)
+        cid, number = split_key(gid)
+        seats = ()
+        if g is not None:
+            peer = g.remote[0] if g.remote is not None else cid
+            seats = tuple(
+                (peer if idx else cid, p.id) for idx, p in enumerate(g.players) if p is not None and p.id != ai.AI_ID
+            )
+        if self._seated.get(gid, ()) != seats:
+            for seat in self._seated.pop(gid, ()):
+                if self._seats.get(seat) == gid:
+                    del self._seats[seat]
+            if g is None:
+                tables = self._tables.get(cid)
+                if tables is not None:
+                    tables.discard(number)
+                    if not tables:
+                        del self._tables[cid]
+            else:
+                for seat in seats:
+                    self._seats[seat] = gid
+                self._seated[gid] = seats
+                self._tables.setdefault(cid, set()).add(number)
+        self._refresh_route(gid)
+
+    def _refresh_route(self, gid: str):
+        """
+        根据游戏当前状态重建该牌桌的消息路由项：
+        记录当前行动玩家ID及其可用关键词（“自己”/“对方”及持有的道具名）。
+        游戏不存在或未开始时移除路由项。
+        """
+        g = self.games.get(gid)
+        if not g or g.status != "started":
+            self._routes.pop(gid, None)
+            return
+        p = g.current
+        keywords = g.table.keywords
+        self._routes[gid] = (
+            p.id,
+            frozenset(("自己", "对方", *(w for i, n in enumerate(p.items.counts) if n for w in keywords[i]))),
+        )
 
     def at_id(self, nickname: str) -> str:
         """
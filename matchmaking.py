@@ -0,0 +1,222 @@
+# matchmaking.py
+"""
+跨群匹配队列与 Elo 评分。
+
+玩家发送「匹配」后进入全局队列，按 Elo 评分与其它群（或本群）正在匹配的玩家配对：
+  - 队列按评分分桶（每桶 bucket_width 分），非空桶号保存在有序列表中，用二分查找定位；
+    同一桶内按入队先后排列（先到先配）；
+  - 配对时从自己所在的桶向两侧逐桶扩展，取评分差最小的桶里等待最久的玩家，评分差超出容许范围即停止；
+  - 容许的评分差从 window 开始，每等待 widen_every 秒放宽 widen 分，最多 max_window；
+    放宽由一个按下次检查时间排序的小顶堆驱动，tick() 只处理到期的条目；
+  - 等待超过 timeout 秒的玩家被移出队列。
+桶宽与容许范围都是常数，一次配对最多检查 2 * max_window / bucket_width + 1 个桶，
+入队、出队与每次放宽检查都是 O(log n)。
+
+评分在对局结果写入战绩库时由写线程更新（见 stats.py），队列本身只保存入队时的评分。
+队列只保存在本进程内存中，插件重载后需重新匹配。
+"""
+import heapq
+import itertools
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+# 新玩家的初始评分与每局的最大变动
+DEFAULT_RATING = 1500.0
+K_FACTOR = 32.0
+
+
+def expected(rating: float, other: float) -> float:
+    """评分为 rating 的玩家对 other 的期望得分"""
+    return 1.0 / (1.0 + 10.0 ** ((other - rating) / 400.0))
+
+
+def rate(winner: float, loser: float, k: float = K_FACTOR) -> tuple:
+    """一局结束后双方的新评分：(胜者, 负者)"""
+    delta = k * (1.0 - expected(winner, loser))
+    return winner + delta, loser - delta
+
+
+class Entry:
+    """队列中的一名玩家：入队时的评分、所在群与入队时间"""
+
+    __slots__ = ("player", "name", "cid", "umo", "rating", "since", "bucket", "queued")
+
+    def __init__(self, player: str, name: str, cid: str, umo: str, rating: float, since: float):
+        self.player = player
+        self.name = name
+        self.cid = cid
+        self.umo = umo
+        self.rating = rating
+        self.since = since
+        self.bucket = 0
+        self.queued = False
+
+
+class MatchQueue:
+    """按评分分桶的全局匹配队列"""
+
+    def __init__(self, bucket_width: float = 25.0, window: float = 100.0, widen: float = 25.0,
+                 widen_every: float = 5.0, max_window: float = 800.0, timeout: float = 300.0, clock=time.monotonic):
+        """
+        :param bucket_width: 每个评分桶的宽度
+        :param window: 刚入队时容许的最大评分差
+        :param widen: 每次放宽增加的评分差
+        :param widen_every: 放宽的间隔（秒）
+        :param max_window: 容许评分差的上限
+        :param timeout: 最长等待秒数，0 为不限制
+        :param clock: 时钟函数，默认 time.monotonic
+        """
+        self.bucket_width = bucket_width
+        self.window = window
+        self.widen = widen
+        self.widen_every = widen_every
+        self.max_window = max_window
+        self.timeout = timeout
+        self.clock = clock
+        self._buckets = {}   # 桶号 -> OrderedDict(玩家ID -> Entry)，按入队先后排列
+        self._keys = []      # 非空桶的桶号，升序
+        self._players = {}   # 玩家ID -> Entry
+        self._checks = []    # 小顶堆 (下次放宽检查的时间, 序号, Entry)，已出队的条目惰性跳过
+        self._seq = itertools.count()
+        self.matched = 0     # 配对成功的对数
+        self.expired = 0     # 等待超时的人数
+        self.wait_total = 0.0  # 配对成功的玩家累计等待秒数
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    def __contains__(self, player: str) -> bool:
+        return player in self._players
+
+    def get(self, player: str):
+        return self._players.get(player)
+
+    def window_of(self, entry: Entry, now: float) -> float:
+        """该玩家当前容许的最大评分差"""
+        steps = int((now - entry.since) // self.widen_every) if self.widen_every > 0 else 0
+        return min(self.max_window, self.window + self.widen * steps)
+
+    def next_check(self):
+        """最早一次放宽检查的时间，队列为空时为 None"""
+        return self._checks[0][0] if self._checks else None
+
+    def enqueue(self, player: str, name: str, cid: str, umo: str, rating: float, now: float = None):
+        """
+        玩家入队：容许范围内已有对手时立即配对并返回 (先入队者, 本玩家)，否则入队并返回 None。
+        玩家已在队列中时抛出 ValueError。
+        """
+        if player in self._players:
+            raise ValueError(player)
+        now = self.clock() if now is None else now
+        entry = Entry(player, name, cid, umo, rating, now)
+        other = self._find(entry, now)
+        if other is not None:
+            self._remove(other)
+            self._paired(other, entry, now)
+            return other, entry
+        self._add(entry)
+        if self.widen_every > 0:
+            heapq.heappush(self._checks, (now + self.widen_every, next(self._seq), entry))
+        return None
+
+    def cancel(self, player: str):
+        """玩家退出队列，返回其条目；不在队列中时返回 None"""
+        entry = self._players.get(player)
+        if entry is not None:
+            self._remove(entry)
+        return entry
+
+    def tick(self, now: float = None) -> tuple:
+        """
+        处理到期的放宽检查：放宽后能配对的玩家出队配对，等待超时的玩家出队。
+        返回 (配对列表 [(先入队者, 后入队者)], 超时条目列表)。
+        """
+        now = self.clock() if now is None else now
+        matches = []
+        expired = []
+        checks = self._checks
+        while checks and checks[0][0] <= now:
+            _, _, entry = heapq.heappop(checks)
+            if not entry.queued:
+                continue
+            if self.timeout and now - entry.since >= self.timeout:
+                self._remove(entry)
+                self.expired += 1
+                expired.append(entry)
+                continue
+            other = self._find(entry, now)
+            if other is not None:
+                self._remove(entry)
+                self._remove(other)
+                pair = (other, entry) if other.since < entry.since else (entry, other)
+                self._paired(*pair, now)
+                matches.append(pair)
+                continue
+            heapq.heappush(checks, (now + self.widen_every, next(self._seq), entry))
+        return matches, expired
+
+    def _paired(self, first: Entry, second: Entry, now: float):
+        self.matched += 1
+        self.wait_total += (now - first.since) + (now - second.since)
+
+    def _find(self, entry: Entry, now: float):
+        """
+        在容许范围内查找对手：从本玩家的桶向两侧逐桶扩展，按桶离本玩家评分的远近依次检查，
+        返回第一个评分差在容许范围内的桶中等待最久的玩家（跳过 entry 自己）；找不到时返回 None。
+        """
+        keys = self._keys
+        if not keys:
+            return None
+        width = self.bucket_width
+        rating = entry.rating
+        limit = max(self.window_of(entry, now), 0.0)
+        hi = bisect_left(keys, int(rating // width))
+        lo = hi - 1
+        while lo >= 0 or hi < len(keys):
+            # 桶到评分的距离：评分在桶内为 0，否则为到桶边界的距离
+            d_lo = rating - (keys[lo] + 1) * width if lo >= 0 else None
+            d_hi = keys[hi] * width - rating if hi < len(keys) else None
+            if d_hi is None or (d_lo is not None and d_lo < d_hi):
+                side, gap = lo, max(d_lo, 0.0)
+                lo -= 1
+            else:
+                side, gap = hi, max(d_hi, 0.0)
+                hi += 1
+            if gap > limit:
+                break
+            for other in self._buckets[keys[side]].values():
+                # 容许范围取双方中较窄的一方，等待较久的玩家不会被拉到其范围之外
+                if other is not entry and abs(other.rating - rating) <= min(limit, self.window_of(other, now)):
+                    return other
+        return None
+
+    def _add(self, entry: Entry):
+        key = int(entry.rating // self.bucket_width)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = OrderedDict()
+            i = bisect_left(self._keys, key)
+            self._keys.insert(i, key)
+        bucket[entry.player] = entry
+        entry.bucket = key
+        entry.queued = True
+        self._players[entry.player] = entry
+
+    def _remove(self, entry: Entry):
+        bucket = self._buckets[entry.bucket]
+        del bucket[entry.player]
+        if not bucket:
+            del self._buckets[entry.bucket]
+            del self._keys[bisect_left(self._keys, entry.bucket)]
+        entry.queued = False
+        del self._players[entry.player]
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._players),
+            "buckets": len(self._keys),
+            "matched": self.matched,
+            "expired": self.expired,
+            "avg_wait": self.wait_total / (2 * self.matched) if self.matched else 0.0,
+        }
@@ -0,0 +1,225 @@
+# metrics.py
+"""
+运行时指标。
+
+计数器是以 (指标名, 标签值) 为键的普通字典，自增一次只是一次哈希查找；
+延迟直方图采用 HDR 风格的对数-线性分桶，记录一次只需几次整数位运算，
+因此可以常驻开启。状态分布等仪表值不在热路径上维护，而是在读取时由回调现算。
+指标可渲染为 Prometheus 文本格式，供 node_exporter 的 textfile 收集器读取。
+"""
+from collections import defaultdict
+
+# 计数器：指标名 -> (标签名, 说明)；标签名为 None 表示无标签
+COUNTERS = {
+    "commands": ("command", "各指令的调用次数（即该指令耗时直方图的样本数，不单独计数）"),
+    "messages": ("result", "on_message 过滤掉的消息数，按原因分类（进入处理的消息计入 fire / use_item 指令）"),
+    "fires": ("target", "开枪次数"),
+    "items": ("item", "道具使用次数"),
+    "rounds": (None, "换轮次数"),
+    "games_finished": ("outcome", "结束的游戏数，按结束方式分类"),
+    "requests": ("result", "经过入站流控的游戏请求数：processed 为放行，其余按丢弃原因分类（debounced / channel_limited / user_limited）"),
+    "render_cache": ("result", "对战信息与概率指令的渲染缓存命中（hit）与未命中（miss）次数"),
+    "board": ("result", "对战图片渲染次数：cached 为直接复用 PNG，warm 为只重绘变化区域，cold 为整帧绘制"),
+    "store": ("result", "状态存储的写入、版本冲突、重新读取次数，以及因持续冲突而放弃的操作数"),
+    "hibernate": ("result", "休眠（parked）与唤醒（woken）的牌桌数"),
+    "matchmaking": ("result", "跨群匹配：queued 为进入队列等待，matched 为配对成功的对数，expired 为等待超时"),
+}
+
+# 仪表值：指标名 -> (标签名, 说明)，数值由 Metrics 的 gauges 回调在读取时提供
+GAUGES = {
+    "games": ("status", "当前游戏数，按状态分类"),
+    "timers": (None, "待触发的定时器数"),
+    "mailboxes": (None, "有协程操作（AI 回合、共享存储写入）执行或排队中的牌桌数"),
+}
+
+SUB_BITS = 4                    # 每个 2 的幂区间再等分为 16 个子桶，相对误差不超过 1/16
+SUB_COUNT = 1 << SUB_BITS
+MAX_VALUE = (1 << 40) - 1       # 约 18 分钟（纳秒），更大的值计入最后一个桶
+BUCKETS = (MAX_VALUE.bit_length() - SUB_BITS + 1) * SUB_COUNT
+
+
+def _bucket_index(v: int) -> int:
+    if v < SUB_COUNT:
+        return v
+    shift = v.bit_length() - SUB_BITS - 1
+    return ((shift + 1) << SUB_BITS) + (v >> shift) - SUB_COUNT
+
+
+def _bucket_upper(idx: int) -> int:
+    """桶内最大值"""
+    if idx < SUB_COUNT:
+        return idx
+    shift = (idx >> SUB_BITS) - 1
+    mantissa = (idx & (SUB_COUNT - 1)) + SUB_COUNT
+    return ((mantissa + 1) << shift) - 1
+
+
+class Histogram:
+    """
+    HDR 风格的纳秒延迟直方图。
+    热路径上的 add() 只把样本追加到缓冲区，攒满一批或读取时再统一分桶，
+    让分桶计算在紧凑的循环中完成，而不是散落在每次处理的末尾。
+    """
+
+    __slots__ = ("counts", "count", "sum", "max", "pending")
+
+    FLUSH_AT = 1024
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+        self.pending = []
+
+    def add(self, ns: int):
+        pending = self.pending
+        pending.append(ns)
+        if len(pending) >= self.FLUSH_AT:
+            self.flush()
+
+    def flush(self):
+        """把缓冲区中的样本计入分桶"""
+        pending, self.pending = self.pending, []
+        for ns in pending:
+            self.record(ns)
+
+    def record(self, ns: int):
+        if ns >= SUB_COUNT:
+            if ns > MAX_VALUE:
+                ns = MAX_VALUE
+            shift = ns.bit_length() - SUB_BITS - 1
+            self.counts[((shift + 1) << SUB_BITS) + (ns >> shift) - SUB_COUNT] += 1
+        else:
+            if ns < 0:
+                ns = 0
+            self.counts[ns] += 1
+        self.count += 1
+        self.sum += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, q: float) -> int:
+        """返回第 q 分位（0~1）所在桶的上界（纳秒）"""
+        self.flush()
+        if not self.count:
+            return 0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for idx, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(_bucket_upper(idx), self.max)
+        return self.max
+
+    def cumulative(self, bounds: tuple) -> list:
+        """各上界（纳秒，升序）以内的累计样本数，用于导出 Prometheus 分桶"""
+        self.flush()
+        out = []
+        seen = 0
+        idx = 0
+        for bound in bounds:
+            last = _bucket_index(min(bound, MAX_VALUE))
+            # 只累加完全落在上界以内的桶
+            if _bucket_upper(last) > bound:
+                last -= 1
+            while idx <= last:
+                seen += self.counts[idx]
+                idx += 1
+            out.append(seen)
+        return out
+
+
+# 导出 Prometheus 直方图时使用的固定上界（秒）：10 微秒 ~ 10 秒
+EXPORT_BOUNDS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2,
+                 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metrics:
+    """计数器 + 延迟直方图 + 读取时计算的仪表值"""
+
+    def __init__(self, gauges=None, prefix: str = "buckshot"):
+        """
+        :param gauges: 无参回调，返回 {指标名: {标签值: 数值}}（指标名见 GAUGES，无标签时标签值为空串），
+                       在读取指标时调用
+        :param prefix: 导出到 Prometheus 时的指标名前缀
+        """
+        self.counters = defaultdict(int)
+        self.latency = {}
+        self.gauges = gauges
+        self.prefix = prefix
+
+    def inc(self, name: str, label: str = "", n: int = 1):
+        self.counters[name, label] += n
+
+    def observe(self, handler: str, ns: int):
+        """记录一次指令处理耗时（纳秒），同时计为该指令的一次调用"""
+        hist = self.latency.get(handler)
+        if hist is None:
+            hist = self.latency[handler] = Histogram()
+        hist.add(ns)
+
+    def counter_values(self, name: str) -> dict:
+        """某个计数器各标签值的计数"""
+        if name == "commands":
+            return {handler: h.count + len(h.pending) for handler, h in self.latency.items()}
+        return {label: n for (key, label), n in self.counters.items() if key == name}
+
+    def summary(self) -> dict:
+        """供调试指令展示的快照"""
+        for h in self.latency.values():
+            h.flush()
+        return {
+            "gauges": self.gauges() if self.gauges else {},
+            "counters": {name: self.counter_values(name) for name in COUNTERS},
+            "latency": {
+                name: {
+                    "count": h.count,
+                    "p50_us": h.percentile(0.5) / 1000,
+                    "p99_us": h.percentile(0.99) / 1000,
+                    "max_us": h.max / 1000,
+                }
+                for name, h in sorted(self.latency.items())
+            },
+        }
+
+    def prometheus(self) -> str:
+        """渲染为 Prometheus 文本格式"""
+        p = self.prefix
+        lines = []
+        gauges = self.gauges() if self.gauges else {}
+        for name, (label_name, help_text) in GAUGES.items():
+            if name not in gauges:
+                continue
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} gauge")
+            for label, v in gauges[name].items():
+                if label_name:
+                    lines.append(f'{p}_{name}{{{label_name}="{_escape(label)}"}} {v}')
+                else:
+                    lines.append(f"{p}_{name} {v}")
+        for name, (label_name, help_text) in COUNTERS.items():
+            values = self.counter_values(name)
+            lines.append(f"# HELP {p}_{name}_total {help_text}")
+            lines.append(f"# TYPE {p}_{name}_total counter")
+            for label, v in sorted(values.items()):
+                if label_name:
+                    lines.append(f'{p}_{name}_total{{{label_name}="{_escape(label)}"}} {v}')
+                else:
+                    lines.append(f"{p}_{name}_total {v}")
+        lines.append(f"# HELP {p}_handler_seconds 指令处理耗时")
+        lines.append(f"# TYPE {p}_handler_seconds histogram")
+        bounds_ns = tuple(int(b * 1e9) for b in EXPORT_BOUNDS)
+        for handler, h in sorted(self.latency.items()):
+            h.flush()
+            label = f'handler="{_escape(handler)}"'
+            for bound, n in zip(EXPORT_BOUNDS, h.cumulative(bounds_ns)):
+                lines.append(f'{p}_handler_seconds_bucket{{{label},le="{bound:g}"}} {n}')
+            lines.append(f'{p}_handler_seconds_bucket{{{label},le="+Inf"}} {h.count}')
+            lines.append(f"{p}_handler_seconds_sum{{{label}}} {h.sum / 1e9:.9f}")
+            lines.append(f"{p}_handler_seconds_count{{{label}}} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
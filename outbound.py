@@ -0,0 +1,170 @@
+# outbound.py
+"""
+出站消息管道。
+
+一次玩家操作产生的所有文本行由调用方合并为一条消息，
+发送前依次通过「每群」与「每平台」两级令牌桶限流；
+主动发送（定时器通知等）经由 Outbox.send 排队发送，失败时退避重试。
+后台发送（观战转播）只在两级令牌桶都有余量时发送、从不透支，玩家自己的回复始终优先。
+同时按群统计平台 API 调用次数，游戏结束时计入每局调用数。
+"""
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("astrbot")
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多积攒 capacity 个"""
+
+    __slots__ = ("rate", "capacity", "tokens", "stamp")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+
+    def reserve(self) -> float:
+        """预占一个令牌，返回需要等待的秒数（令牌不足时允许透支并排队）"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def wait_time(self) -> float:
+        """距离攒够一个令牌还需等待的秒数（不取令牌）"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> bool:
+        """取一个令牌，令牌不足时不透支，返回 False"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class Outbox:
+    """按群 / 按平台限流的出站管道"""
+
+    def __init__(self, channel_rate: float = 1.0, channel_burst: int = 5,
+                 platform_rate: float = 20.0, platform_burst: int = 40,
+                 retries: int = 3, max_entries: int = 10000):
+        """
+        :param channel_rate: 每个群每秒可发送的消息数
+        :param channel_burst: 每个群允许的突发消息数
+        :param platform_rate: 每个平台每秒可发送的消息数
+        :param platform_burst: 每个平台允许的突发消息数
+        :param retries: 主动发送失败时的最大重试次数
+        :param max_entries: 令牌桶超过该数量时清理已闲置的令牌桶
+        """
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.platform_rate = platform_rate
+        self.platform_burst = platform_burst
+        self.retries = retries
+        self.max_entries = max_entries
+        self._channels = {}
+        self._platforms = {}
+        self._sweep_at = max_entries
+        self._game_calls = {}   # 游戏键 -> 当前这局游戏已产生的 API 调用数
+        self.calls = 0          # 累计 API 调用数
+        self.games = 0          # 已结束并计入统计的游戏局数
+        self.game_calls = 0     # 已结束游戏的 API 调用总数
+
+    def _bucket(self, table: dict, key: str, rate: float, burst: int) -> TokenBucket:
+        bucket = table.get(key)
+        if bucket is None:
+            if len(self._channels) + len(self._platforms) >= self._sweep_at:
+                self._sweep()
+            bucket = table[key] = TokenBucket(rate, burst)
+        return bucket
+
+    def _sweep(self):
+        """清理已回满（闲置足够久）的令牌桶，它们与新建的令牌桶没有区别；之后到条目数翻倍时才再次清理"""
+        now = time.monotonic()
+        for table in (self._channels, self._platforms):
+            for key in [k for k, b in table.items() if b.tokens + (now - b.stamp) * b.rate >= b.capacity]:
+                del table[key]
+        self._sweep_at = max(self.max_entries, 2 * (len(self._channels) + len(self._platforms)))
+
+    def tracking(self, game: str) -> bool:
+        """该局游戏当前是否正在计数"""
+        return game in self._game_calls
+
+    async def throttle(self, cid: str, platform: str, game: str = None):
+        """
+        为一次发送申请群与平台两级令牌，不足时等待；同时计入调用统计。
+        :param game: 本次调用计入的游戏键，None 表示不属于任何一局
+        """
+        delay = max(
+            self._bucket(self._channels, cid, self.channel_rate, self.channel_burst).reserve(),
+            self._bucket(self._platforms, platform, self.platform_rate, self.platform_burst).reserve(),
+        )
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.calls += 1
+        if game is not None:
+            self._game_calls[game] = self._game_calls.get(game, 0) + 1
+
+    async def send(self, context, umo: str, cid: str, chain, game: str = None) -> bool:
+        """
+        通过 context.send_message 主动发送一条消息链，限流后发送，失败时指数退避重试。
+        :param umo: 目标会话的 unified_msg_origin，其首段为平台名
+        :param game: 本次发送计入的游戏键
+        """
+        platform = umo.split(":", 1)[0]
+        for attempt in range(self.retries + 1):
+            await self.throttle(cid, platform, game)
+            try:
+                if await context.send_message(umo, chain) is not False:
+                    return True
+            except Exception:
+                logger.warning(f"恶魔轮盘消息发送失败（第 {attempt + 1} 次）", exc_info=True)
+            if attempt < self.retries:
+                await asyncio.sleep(0.5 * 2 ** attempt)
+        return False
+
+    async def send_background(self, context, umo: str, cid: str, chain) -> bool:
+        """
+        后台发送一条消息链：等到群与平台两级令牌桶都有余量时才取令牌（不透支、不与玩家的回复争抢），
+        只尝试一次，失败时返回 False，由调用方决定是否放弃。
+        """
+        platform = umo.split(":", 1)[0]
+        channel = self._bucket(self._channels, cid, self.channel_rate, self.channel_burst)
+        plat = self._bucket(self._platforms, platform, self.platform_rate, self.platform_burst)
+        while True:
+            delay = max(channel.wait_time(), plat.wait_time())
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        channel.take()
+        plat.take()
+        self.calls += 1
+        try:
+            return await context.send_message(umo, chain) is not False
+        except Exception:
+            logger.debug("恶魔轮盘后台消息发送失败", exc_info=True)
+            return False
+
+    def game_finished(self, game: str):
+        """一局游戏结束：把这局的调用数计入每局统计"""
+        calls = self._game_calls.pop(game, None)
+        if calls is not None:
+            self.games += 1
+            self.game_calls += calls
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "games": self.games,
+            "calls_per_game": self.game_calls / self.games if self.games else 0.0,
+        }
@@ -0,0 +1,153 @@
+# profiler.py
+"""
+按需开启的采样分析器。
+
+管理员用「debug 性能采样 <秒数>」开启一个有限时长的采样窗口：
+以 setitimer(ITIMER_PROF) 每消耗 interval 秒 CPU 时间触发一次 SIGPROF，
+信号处理函数在主线程（即运行事件循环的线程）中取得被打断处的调用栈，
+只保留正在执行插件代码的栈（on_message、各指令处理函数、开枪 / 道具 / 换轮、定时器回调等），
+栈从最外层的插件帧截起，其下调用的标准库函数（random、json、sqlite3 等）一并保留。
+窗口结束后按 flamegraph.pl / speedscope 可读的折叠栈格式（「帧;帧;帧 次数」每行一条）写入文件。
+
+不用后台线程轮询 sys._current_frames()：采样线程只能在事件循环线程释放 GIL 时取得它，
+而事件循环每一轮都在 select() 中释放 GIL，采到的几乎全是空闲的 select()。
+信号在字节码边界处理，采样点与插件代码的执行时间成正比；进程空闲时不消耗 CPU 时间，也就不采样。
+
+定时器与信号处理函数只在窗口内设置，插件代码中没有任何埋点，关闭时热路径零开销；
+开启时每次采样在主线程中遍历一次调用栈（约数微秒）。
+依赖 SIGPROF 与 setitimer，只支持类 Unix 系统，且事件循环须运行在主线程。
+"""
+import os
+import signal
+import threading
+import time
+from collections import Counter
+
+# 默认采样间隔（秒，按进程 CPU 时间计）
+SAMPLE_INTERVAL = 0.005
+
+_ROOT = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+
+def _label(code) -> str:
+    """栈帧的显示名「模块:限定名」，如 main:BuckshotRoulette.fire、random:Random.choice"""
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def supported() -> bool:
+    """当前平台与线程能否开启采样（类 Unix 系统，且在主线程中调用）"""
+    return hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+
+
+class SamplingProfiler:
+    """SIGPROF 栈采样器，一次只运行一个窗口；start / stop 都须在主线程中调用"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, root: str = _ROOT):
+        """
+        :param interval: 采样间隔（秒，按进程 CPU 时间计）
+        :param root: 插件代码所在目录，栈中有该目录下的帧时才计入样本
+        """
+        self.interval = interval
+        self.root = root
+        self._deadline = None
+        self._previous = None
+        self._started = 0.0
+        self._labels = {}        # code -> (显示名, 是否为插件代码)，窗口内每个函数只格式化一次
+        self.stacks = Counter()  # 折叠后的栈（元组，最外层在前）-> 样本数
+        self.ticks = 0           # 采样次数（含未在执行插件代码的次数）
+        self.elapsed = 0.0       # 窗口的实际时长（秒）
+
+    @property
+    def running(self) -> bool:
+        return self._deadline is not None
+
+    def start(self, seconds: float):
+        """
+        开始一个采样窗口，seconds 秒后的下一次采样时自动停止；上一个窗口的结果被清空。
+        已有窗口在运行，或当前平台 / 线程不支持时抛出 RuntimeError。
+        """
+        if self.running:
+            raise RuntimeError("profiler already running")
+        if not supported():
+            raise RuntimeError("SIGPROF sampling needs setitimer and the main thread")
+        self.stacks = Counter()
+        self.ticks = 0
+        self.elapsed = 0.0
+        self._labels = {}
+        self._previous = signal.signal(signal.SIGPROF, self._sample)
+        self._started = time.perf_counter()
+        self._deadline = time.monotonic() + seconds
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        """结束窗口并恢复原有的信号处理（窗口已结束时直接返回）"""
+        if self._deadline is None:
+            return
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        # 原处理为默认动作（终止进程）时改为忽略，已在途的 SIGPROF 不会误杀进程
+        previous = self._previous
+        signal.signal(signal.SIGPROF, previous if callable(previous) else signal.SIG_IGN)
+        self._previous = None
+        self._deadline = None
+        self._labels = {}
+        self.elapsed = time.perf_counter() - self._started
+
+    def _sample(self, signum, frame):
+        if time.monotonic() >= self._deadline:
+            self.stop()
+            return
+        self.ticks += 1
+        labels = self._labels
+        root = self.root
+        stack = []
+        depth = 0  # 截到最外层插件帧为止的栈深
+        while frame is not None:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                label = labels[code] = (_label(code), code.co_filename.startswith(root))
+            stack.append(label[0])
+            if label[1]:
+                depth = len(stack)
+            frame = frame.f_back
+        if depth:
+            self.stacks[tuple(reversed(stack[:depth]))] += 1
+
+    @property
+    def samples(self) -> int:
+        """落在插件代码中的样本数"""
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """折叠栈文本，按样本数降序"""
+        return "".join(f"{';'.join(stack)} {n}\n" for stack, n in self.stacks.most_common())
+
+    def write(self, path: str) -> str:
+        """把折叠栈写入 path（目录不存在时创建），返回 path"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as fp:
+            fp.write(self.collapsed())
+        return path
+
+    def top_self(self, n: int = 5) -> list:
+        """自身耗时最多的函数（栈顶帧）：[(显示名, 样本数)]"""
+        counts = Counter()
+        for stack, k in self.stacks.items():
+            counts[stack[-1]] += k
+        return counts.most_common(n)
+
+    def top_total(self, n: int = 5) -> list:
+        """累计耗时（含其调用的函数）最多的函数，同一栈中重复出现的函数只计一次：[(显示名, 样本数)]"""
+        counts = Counter()
+        for stack, k in self.stacks.items():
+            for label in set(stack):
+                counts[label] += k
+        return counts.most_common(n)
+
+    def top_roots(self, n: int = 5) -> list:
+        """样本按入口（最外层插件帧，如 on_message 或某个指令处理函数）分组：[(显示名, 样本数)]"""
+        counts = Counter()
+        for stack, k in self.stacks.items():
+            counts[stack[0]] += k
+        return counts.most_common(n)
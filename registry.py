@@ -0,0 +1,203 @@
+# registry.py
+"""
+道具注册表。
+
+道具以声明式配置定义（默认为插件目录的 items.json，可由数据目录下的同名文件覆盖）：
+每个道具给出名称、别名、效果、掉落权重、说明、兑换规则以及可选的自定义文本。
+加载时配置被编译为 ItemTable：
+  - 道具按配置顺序获得 0 起的整数编号，效果编译为效果编号，规则引擎按编号查表分派；
+  - 掉落权重预先构建为 Walker 别名表，每次抽取为 O(1)，权重全部相同时与 randrange 完全一致；
+  - 兑换规则编译为按源道具编号索引的目标集合。
+ItemTable 一经编译不再修改；热重载只是编译一张新表，进行中的游戏继续使用开局时的表。
+每张表有一个由配置内容计算的指纹，日志与回放据此找回对应的表。
+"""
+import json
+import os
+import zlib
+
+from .magazine import bullet_name
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "items.json")
+
+# 规则引擎实现的效果，顺序即效果编号；各效果的结果及其参数名（自定义文本中可用作 {参数名}）
+EFFECTS = {
+    "saw": {"ok": ()},
+    "magnifier": {"ok": ("bullet",), "empty": ()},
+    "beer": {"ok": ("bullet",), "empty": ()},
+    "cigarette": {"ok": (), "full": ()},
+    "handcuff": {"ok": (), "used": ()},
+    "medicine": {"heal": ("amount",), "hurt": ("amount",)},
+    "reverser": {"ok": ("bullet",), "empty": ()},
+    "phone": {"ok": ("order", "bullet"), "empty": ()},
+    "bomb": {"ok": ("damage",), "blocked": ()},
+    "lucky_star": {"heal": (), "full": (), "gift": ("gift",)},
+    "shield": {"ok": ()},
+}
+KINDS = tuple(EFFECTS)
+KIND_INDEX = {kind: idx for idx, kind in enumerate(KINDS)}
+
+# 道具编号需能放入回放的单字节操作码（见 replay.py）
+MAX_ITEM_TYPES = 238
+
+
+def _alias_table(weights: list) -> tuple:
+    """Vose 别名法：返回 (各列保留本列的概率, 各列的别名)"""
+    n = len(weights)
+    total = sum(weights)
+    scaled = [w * n / total for w in weights]
+    prob = [1.0] * n
+    alias = list(range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        s, g = small.pop(), large.pop()
+        prob[s] = scaled[s]
+        alias[s] = g
+        scaled[g] -= 1.0 - scaled[s]
+        (small if scaled[g] < 1.0 else large).append(g)
+    return tuple(prob), tuple(alias)
+
+
+class ItemTable:
+    """
+    编译后的道具表。
+    names / keywords / kinds / descriptions / texts 均按道具编号索引，keywords 为可触发该道具的名称与别名；
+    lookup 为名称与别名到编号的映射；
+    exchanges[源道具编号] 为可兑换的目标编号集合，每次兑换消耗 exchange_cost 个源道具；
+    kind_probs[效果编号] 为一次随机抽取得到该效果道具的概率（供 AI 推演幸运星）。
+    """
+
+    __slots__ = ("names", "keywords", "lookup", "kinds", "weights", "descriptions", "texts",
+                 "exchanges", "exchange_cost", "kind_probs", "fingerprint", "config", "_prob", "_alias", "_n")
+
+    def __init__(self, config: dict):
+        """由已通过校验的配置构建，应使用 compile_table"""
+        items = config["items"]
+        self.config = config
+        self.names = tuple(it["name"] for it in items)
+        self.keywords = tuple((it["name"], *it.get("aliases", ())) for it in items)
+        self.lookup = {name: idx for idx, words in enumerate(self.keywords) for name in words}
+        self.kinds = tuple(KIND_INDEX[it["effect"]] for it in items)
+        self.weights = tuple(float(it.get("weight", 1)) for it in items)
+        self.descriptions = tuple(it.get("description", "") for it in items)
+        self.texts = tuple(
+            {result: tuple(lines) if isinstance(lines, list) else (lines,)
+             for result, lines in it.get("text", {}).items()}
+            for it in items
+        )
+        self.exchanges = tuple(frozenset(self.lookup[t] for t in it.get("exchange", ())) for it in items)
+        self.exchange_cost = int(config.get("exchange_cost", 2))
+        total = sum(self.weights)
+        probs = [0.0] * len(KINDS)
+        for kind, w in zip(self.kinds, self.weights):
+            probs[kind] += w / total
+        self.kind_probs = tuple(probs)
+        self._prob, self._alias = _alias_table(self.weights)
+        self._n = len(items)
+        canonical = json.dumps(config, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        self.fingerprint = zlib.crc32(canonical.encode("utf-8"))
+
+    def __len__(self):
+        return self._n
+
+    def draw(self, rng) -> int:
+        """按掉落权重随机抽取一个道具编号"""
+        i = rng.randrange(self._n)
+        p = self._prob[i]
+        if p >= 1.0 or rng.random() < p:
+            return i
+        return self._alias[i]
+
+    def text(self, item: int, result: str, args: tuple):
+        """
+        道具的自定义文本行，未配置该结果的文本时返回 None。
+        文本中可使用 {item} 以及该效果结果的参数名，子弹类型渲染为实弹 / 空包弹，获得的道具渲染为道具名。
+        """
+        lines = self.texts[item].get(result)
+        if lines is None:
+            return None
+        values = {"item": self.names[item]}
+        for name, v in zip(EFFECTS[KINDS[self.kinds[item]]][result], args):
+            if name == "bullet":
+                v = bullet_name(v)
+            elif name == "gift":
+                v = self.names[v]
+            values[name] = v
+        return [line.format(**values) for line in lines]
+
+
+def compile_table(config: dict) -> ItemTable:
+    """校验并编译道具配置，配置有误时抛出 ValueError（说明第一处错误）"""
+    if not isinstance(config, dict) or not isinstance(config.get("items"), list) or not config["items"]:
+        raise ValueError("配置需包含非空的 items 列表")
+    items = config["items"]
+    if len(items) > MAX_ITEM_TYPES:
+        raise ValueError(f"道具种类过多（最多 {MAX_ITEM_TYPES} 种）")
+    cost = config.get("exchange_cost", 2)
+    if not isinstance(cost, int) or cost < 1:
+        raise ValueError("exchange_cost 须为正整数")
+    names = set()
+    for it in items:
+        name = it.get("name") if isinstance(it, dict) else None
+        if not isinstance(name, str) or not name:
+            raise ValueError(f"道具缺少名称：{it!r}")
+        for n in (name, *it.get("aliases", ())):
+            if n in names or n in ("自己", "对方"):
+                raise ValueError(f"道具名或别名重复或与开枪指令冲突：{n}")
+            names.add(n)
+        effect = it.get("effect")
+        if effect not in EFFECTS:
+            raise ValueError(f"道具【{name}】的效果未知：{effect}（可选：{', '.join(KINDS)}）")
+        weight = it.get("weight", 1)
+        if not isinstance(weight, (int, float)) or weight < 0:
+            raise ValueError(f"道具【{name}】的掉落权重须为非负数")
+        for result, lines in it.get("text", {}).items():
+            if result not in EFFECTS[effect]:
+                raise ValueError(f"道具【{name}】的效果 {effect} 没有结果 {result}（可选：{', '.join(EFFECTS[effect])}）")
+            fields = {"item", *EFFECTS[effect][result]}
+            for line in lines if isinstance(lines, list) else (lines,):
+                try:
+                    line.format(**{f: "" for f in fields})
+                except (KeyError, IndexError, ValueError) as e:
+                    raise ValueError(
+                        f"道具【{name}】的 {result} 文本有误：{line!r}（可用字段：{', '.join(sorted(fields))}）"
+                    ) from e
+    for it in items:
+        for target in it.get("exchange", ()):
+            if target not in names:
+                raise ValueError(f"道具【{it['name']}】的兑换目标不存在：{target}")
+    if not sum(it.get("weight", 1) for it in items):
+        raise ValueError("掉落权重之和须大于 0")
+    return ItemTable(config)
+
+
+def load_table(path: str = DEFAULT_PATH) -> ItemTable:
+    """从 JSON 文件加载并编译道具表；文件或配置有误时抛出 OSError / ValueError"""
+    with open(path, encoding="utf-8") as fp:
+        return compile_table(json.load(fp))
+
+
+def archive(table: ItemTable, directory: str) -> str:
+    """把道具表的配置以指纹为文件名存档（已存在时跳过），供日志恢复与回放工具找回旧表"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{table.fingerprint:08x}.json")
+    if not os.path.exists(path):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fp:
+            json.dump(table.config, fp, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    return path
+
+
+def find_table(fingerprint: int, directory: str = None):
+    """按指纹找回道具表：内置表或存档目录中的表，找不到时返回 None"""
+    if fingerprint == DEFAULT_TABLE.fingerprint:
+        return DEFAULT_TABLE
+    if directory:
+        path = os.path.join(directory, f"{fingerprint:08x}.json")
+        if os.path.exists(path):
+            return load_table(path)
+    return None
+
+
+DEFAULT_TABLE = load_table()
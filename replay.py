@@ -0,0 +1,397 @@
+# replay.py
+"""
+对局回放：种子 + 操作流的紧凑二进制编码。
+
+每局游戏在创建时获得独立的 64 位种子与 random.Random 生成器，
+规则引擎的所有随机决定（弹夹、先后手、道具发放、过期药物 / 幸运星 / 一次性电话的结果）
+都只从这个生成器中抽取，因此「种子 + 按顺序执行的操作」即可完整重建整局游戏。
+插件每执行一次改变状态的操作就向 game.log 追加一条编码，游戏结束时封装为回放写入战绩库。
+
+回放格式（整数均为小端）：
+  b"BR" + 版本(1 字节) + 种子(8 字节) + 道具表指纹(4 字节，版本 1 没有此字段，使用内置道具表)
+  操作流：每条操作 1 字节操作码，部分操作带参数
+    0x01 开始游戏          0x02 对自己开枪        0x03 对对方开枪
+    0x04 兑换 源 目标       0x05 挂机跳过          0x06 认输 败者
+    0x07 调试给道具 玩家 道具 数量    0x08 调试修改血量 玩家 血量
+    0x10 + 道具编号 使用道具（单字节）
+  0xFF + 胜者(1 字节) + 终局状态的 CRC32(4 字节)
+数量与血量为 zigzag 变长整数，其余参数各占 1 字节。
+校验时按种子与道具表重放操作流，比较胜者与终局状态的 CRC32；
+非内置的道具表从战绩库同目录下的 item_tables/ 中按指纹找回。
+
+在 AstrBot 根目录运行：
+    python -m astrbot_plugin_buckshot_roulette.replay verify
+    python -m astrbot_plugin_buckshot_roulette.replay list -n 20
+    python -m astrbot_plugin_buckshot_roulette.replay show <对局编号>
+"""
+import argparse
+import logging
+import os
+import random
+import sqlite3
+import struct
+import time
+import zlib
+
+from . import engine, registry
+from .magazine import bullet_name
+from .registry import DEFAULT_TABLE, ItemTable
+from .state import GameState, PlayerState
+
+logger = logging.getLogger("astrbot")
+
+MAGIC = b"BR"
+VERSION = 2
+HEADER = struct.Struct("<2sBQI")
+HEADER_V1 = struct.Struct("<2sBQ")
+TRAILER = struct.Struct("<BI")
+
+START = 0x01
+FIRE_SELF = 0x02
+FIRE_OTHER = 0x03
+EXCHANGE = 0x04
+SKIP = 0x05
+FORFEIT = 0x06
+GIVE = 0x07
+SET_HP = 0x08
+ITEM = 0x10     # 0x10 + 道具编号
+END = 0xFF
+
+# 各操作码的参数：b 为单字节，z 为 zigzag 变长整数
+OPERANDS = {
+    START: "", FIRE_SELF: "", FIRE_OTHER: "", SKIP: "",
+    EXCHANGE: "bb", FORFEIT: "b", GIVE: "bbz", SET_HP: "bz",
+}
+
+STATUS_CODES = {"waiting": 0, "full": 1, "started": 2, "over": 3}
+
+DEFAULT_DB = os.path.join("data", "plugin_data", "astrbot_plugin_buckshot_roulette", "stats.db")
+
+
+def seed_game(game: GameState, seed: int = None):
+    """为新游戏设置独立的种子、随机数生成器与空操作流"""
+    game.seed = random.getrandbits(64) if seed is None else seed
+    game.rng = random.Random(game.seed)
+    game.log = bytearray()
+
+
+def decision_rng(game: GameState):
+    """
+    AI 为该局当前局面做决策时使用的随机数生成器：由本局种子与操作流长度确定，
+    同一局面重放时得到同样的随机决定（如简单难度的失误）。不使用 game.rng，
+    因为 AI 的抽取不在操作流中，占用它会使重放的弹夹与道具偏离。该局不可回放时使用 random 模块。
+    """
+    if game.seed is None or game.log is None:
+        return random
+    return random.Random(f"{game.seed}:{len(game.log)}")
+
+
+def record(game: GameState, op: int, *args):
+    """向操作流追加一条操作（该局不可回放时忽略）"""
+    log = game.log
+    if log is None:
+        return
+    if op == ITEM:
+        # 道具表最多 registry.MAX_ITEM_TYPES 种道具，编号总能放入单字节操作码
+        log.append(ITEM + args[0])
+        return
+    log.append(op)
+    for kind, v in zip(OPERANDS[op], args):
+        if kind == "b":
+            log.append(v)
+        else:
+            v = (v << 1) ^ (v >> 63)
+            while v > 0x7F:
+                log.append(v & 0x7F | 0x80)
+                v >>= 7
+            log.append(v)
+
+
+def digest(game: GameState) -> int:
+    """终局状态的 CRC32：状态、行动方、弹夹、回合标志以及双方血量、道具与效果"""
+    buf = bytearray(struct.pack(
+        "<5BHBI", STATUS_CODES[game.status], game.turn, game.double, game.used_handcuff,
+        0xFF if game.winner is None else game.winner, game.round, game.bullet.size, game.bullet.bits,
+    ))
+    for p in game.players:
+        if p is not None:
+            buf += struct.pack("<i2B", p.hp, p.handcuff, p.shield)
+            buf += p.items.counts
+    return zlib.crc32(buf)
+
+
+def encode(game: GameState) -> bytes:
+    """把已结束（或被认输）的一局封装为回放；该局不可回放时返回 None"""
+    if game.log is None:
+        return None
+    winner = 0xFF if game.winner is None else game.winner
+    return HEADER.pack(MAGIC, VERSION, game.seed, game.table.fingerprint) + game.log + bytes((END,)) + TRAILER.pack(winner, digest(game))
+
+
+def decode(blob: bytes) -> tuple:
+    """解析回放，返回 (种子, 道具表指纹, [(操作码, 参数元组)], 胜者, CRC32)；格式错误时抛出 ValueError"""
+    if len(blob) < HEADER_V1.size + 1 + TRAILER.size:
+        raise ValueError("回放数据过短")
+    magic, version, seed = HEADER_V1.unpack_from(blob)
+    if magic != MAGIC or version not in (1, VERSION):
+        raise ValueError(f"不支持的回放格式：{magic!r} v{version}")
+    if version == 1:
+        fingerprint, start = DEFAULT_TABLE.fingerprint, HEADER_V1.size
+    else:
+        fingerprint, start = HEADER.unpack_from(blob)[3], HEADER.size
+    end = len(blob) - TRAILER.size - 1
+    ops, pos = _ops(blob, start, end)
+    if pos != end or blob[end] != END:
+        raise ValueError("回放缺少结束标记")
+    winner, crc = TRAILER.unpack_from(blob, end + 1)
+    return seed, fingerprint, ops, None if winner == 0xFF else winner, crc
+
+
+def _ops(buf, pos: int, end: int) -> tuple:
+    """解析 buf[pos:end] 中的操作流，返回 ([(操作码, 参数元组)], 解析结束的位置)"""
+    ops = []
+    while pos < end:
+        op = buf[pos]
+        pos += 1
+        if op >= ITEM:
+            ops.append((ITEM, (op - ITEM,)))
+            continue
+        kinds = OPERANDS.get(op)
+        if kinds is None:
+            raise ValueError(f"未知操作码 0x{op:02x}（偏移 {pos - 1}）")
+        args = []
+        for kind in kinds:
+            if kind == "b":
+                args.append(buf[pos])
+                pos += 1
+            else:
+                v = shift = 0
+                while True:
+                    b = buf[pos]
+                    pos += 1
+                    v |= (b & 0x7F) << shift
+                    shift += 7
+                    if b < 0x80:
+                        break
+                args.append((v >> 1) ^ -(v & 1))
+        ops.append((op, tuple(args)))
+    return ops, pos
+
+
+def apply(game: GameState, op: int, args: tuple) -> list:
+    """在 game 上执行一条操作，返回规则引擎的事件（调试与兑换操作返回描述用的伪事件）"""
+    rng = game.rng
+    if op == ITEM:
+        return engine.use_item(game, args[0], rng)
+    if op == FIRE_SELF or op == FIRE_OTHER:
+        return engine.fire(game, op == FIRE_SELF, rng)
+    if op == START:
+        return engine.start(game, rng)
+    if op == EXCHANGE:
+        return [("exchange", *args, engine.exchange(game, *args))]
+    if op == SKIP:
+        return engine.skip_turn(game)
+    if op == FORFEIT:
+        return engine.forfeit(game, args[0])
+    if op == GIVE:
+        game.players[args[0]].items.add(args[1], args[2])
+        return [("give", *args)]
+    game.players[args[0]].hp = args[1]
+    return [("set_hp", *args)]
+
+
+def new_game(seed: int, table: ItemTable = DEFAULT_TABLE, names: tuple = ("玩家1", "玩家2")) -> GameState:
+    """按种子与道具表创建一局待重放的空白游戏（双方都已就座）"""
+    game = GameState(PlayerState(names[0], "1", len(table)), table)
+    game.players[1] = PlayerState(names[1], "2", len(table))
+    game.status = "full"
+    seed_game(game, seed)
+    game.log = None
+    return game
+
+
+def replay(blob: bytes, names: tuple = ("玩家1", "玩家2"), on_event=None, table_dir: str = None) -> tuple:
+    """
+    重放一局，返回 (终局 GameState, 是否与记录的胜者及 CRC32 一致)。
+    :param on_event: 可选回调 on_event(game, 操作码, 参数, 事件列表)，用于逐步展示
+    :param table_dir: 道具表存档目录，回放使用非内置道具表时从中找回
+    """
+    seed, fingerprint, ops, winner, crc = decode(blob)
+    table = registry.find_table(fingerprint, table_dir)
+    if table is None:
+        raise ValueError(f"找不到回放使用的道具表 {fingerprint:08x}")
+    game = new_game(seed, table, names)
+    for op, args in ops:
+        events = apply(game, op, args)
+        if on_event is not None:
+            on_event(game, op, args, events)
+    return game, game.winner == winner and digest(game) == crc
+
+
+def restore(game: GameState, on_event=None) -> bool:
+    """
+    由日志恢复的游戏只有种子与操作流，随机数生成器需按种子重放操作流来重建。
+    重放结果与恢复的状态一致时接上原生成器并返回 True；
+    否则（旧版记录或数据不一致）换用新种子继续游戏，该局不再可回放。
+    :param on_event: 可选回调，参数同 replay()，在重放每条操作后调用，供插件重建揭示信息与战绩累计
+    """
+    if game.seed is not None and game.log is not None:
+        scratch = new_game(game.seed, game.table)
+        if game.players[1] is None:
+            scratch.players[1] = None
+            scratch.status = "waiting"
+        try:
+            for op, args in _ops(game.log, 0, len(game.log))[0]:
+                events = apply(scratch, op, args)
+                if on_event is not None:
+                    on_event(scratch, op, args, events)
+        except (ValueError, IndexError):
+            logger.exception("恶魔轮盘回放数据损坏")
+        else:
+            if digest(scratch) == digest(game):
+                game.rng = scratch.rng
+                return True
+        logger.warning("恶魔轮盘恢复的游戏与回放不一致，该局将不可回放")
+    game.seed = random.getrandbits(64)
+    game.rng = random.Random(game.seed)
+    game.log = None
+    return False
+
+
+# ------------- 命令行工具 -------------
+
+def describe(game: GameState, op: int, args: tuple, events: list) -> list:
+    """把一条操作及其事件转换为展示文本"""
+    names = [p.name if p is not None else "?" for p in game.players]
+    item_names = game.table.names
+    lines = []
+    if op == ITEM:
+        lines.append(f"使用【{item_names[args[0]]}】")
+    elif op == FIRE_SELF or op == FIRE_OTHER:
+        lines.append("对自己开枪" if op == FIRE_SELF else "对对方开枪")
+    elif op == FORFEIT:
+        lines.append(f"{names[args[0]]} 认输")
+    for ev in events:
+        kind = ev[0]
+        if kind == "start":
+            lines.append(f"开始游戏，{names[ev[1]]} 先手，道具 {ev[2]} / {ev[3]} 个")
+        elif kind == "round":
+            lines.append(f"第 {ev[1]} 轮：{ev[2]} 发子弹（{ev[3]} 实 {ev[4]} 空），每人 {ev[5]} 个道具")
+        elif kind == "shot":
+            lines.append(f"  → {bullet_name(ev[2])}")
+        elif kind == "damage":
+            lines.append(f"  → {names[ev[1]]} 受到 {ev[2]} 点伤害")
+        elif kind == "shield_block":
+            lines.append(f"  → {names[ev[1]]} 的护盾挡下了伤害")
+        elif kind == "item":
+            lines.append(f"  → {'，'.join(bullet_name(v) if isinstance(v, bool) else str(v) for v in ev[2:])}")
+        elif kind == "handcuffed":
+            lines.append("  → 对方被手铐限制，继续行动")
+        elif kind == "skipped":
+            lines.append(f"{names[ev[1]]} 挂机，回合被跳过")
+        elif kind == "exchange":
+            lines.append(f"兑换【{item_names[ev[1]]}】→【{item_names[ev[2]]}】：{ev[3]}")
+        elif kind == "give":
+            lines.append(f"[调试] {names[ev[1]]} 获得 {ev[3]} 个【{item_names[ev[2]]}】")
+        elif kind == "set_hp":
+            lines.append(f"[调试] {names[ev[1]]} 血量设为 {ev[2]}")
+        elif kind == "over":
+            lines.append(f"游戏结束，{names[ev[1]]} 获胜")
+    if op in (FIRE_SELF, FIRE_OTHER, ITEM) and game.status != "over":
+        p1, p2 = game.players
+        lines.append(f"  血量 {p1.hp} : {p2.hp}，轮到 {names[game.turn]}")
+    return lines
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    if not os.path.exists(path):
+        raise SystemExit(f"战绩库不存在：{path}")
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def verify_all(rows, table_dir: str = None) -> dict:
+    """
+    重放并校验 (编号, 回放) 序列，返回统计：对局数、失败编号、缺少道具表的编号、平均字节数与速度。
+    :param table_dir: 道具表存档目录（见 registry.archive）
+    """
+    games = size = 0
+    failed = []
+    missing = []
+    start = time.perf_counter()
+    for gid, blob in rows:
+        games += 1
+        size += len(blob)
+        try:
+            ok = replay(blob, table_dir=table_dir)[1]
+        except (ValueError, IndexError) as e:
+            if str(e).startswith("找不到"):
+                missing.append(gid)
+                continue
+            ok = False
+        if not ok:
+            failed.append(gid)
+    elapsed = time.perf_counter() - start
+    return {
+        "games": games,
+        "failed": failed,
+        "missing_table": missing,
+        "bytes_per_game": size / games if games else 0.0,
+        "elapsed": elapsed,
+        "games_per_sec": games / elapsed if elapsed else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="恶魔轮盘对局回放工具")
+    parser.add_argument("--db", default=DEFAULT_DB, help="战绩库路径")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("verify", help="重放并校验所有已记录的对局")
+    p.add_argument("--channel", help="只校验指定群的对局")
+    p = sub.add_parser("list", help="列出最近的对局")
+    p.add_argument("--channel", help="只列出指定群的对局")
+    p.add_argument("-n", "--limit", type=int, default=20)
+    p = sub.add_parser("show", help="重放一局并输出完整过程")
+    p.add_argument("id", type=int, help="对局编号（见 list）")
+    args = parser.parse_args(argv)
+    conn = _connect(args.db)
+    table_dir = os.path.join(os.path.dirname(os.path.abspath(args.db)), "item_tables")
+    where = "replay IS NOT NULL" + (" AND channel = ?" if getattr(args, "channel", None) else "")
+    params = (args.channel,) if getattr(args, "channel", None) else ()
+
+    if args.cmd == "verify":
+        res = verify_all(conn.execute(f"SELECT id, replay FROM games WHERE {where}", params), table_dir)
+        print(f"对局数：{res['games']}，校验失败：{len(res['failed'])}，缺少道具表：{len(res['missing_table'])}")
+        if res["failed"]:
+            print("失败的对局编号：" + ", ".join(map(str, res["failed"][:50])))
+        print(f"平均每局 {res['bytes_per_game']:.1f} 字节，耗时 {res['elapsed']:.2f} 秒，"
+              f"{res['games_per_sec']:.0f} 局/秒")
+        raise SystemExit(1 if res["failed"] else 0)
+
+    if args.cmd == "list":
+        rows = conn.execute(
+            f"SELECT id, channel, finished_at, outcome, rounds, winner, loser, LENGTH(replay) FROM games "
+            f"WHERE {where} ORDER BY id DESC LIMIT ?", (*params, args.limit),
+        )
+        for gid, channel, at, outcome, rounds, winner, loser, size in rows:
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(at))
+            print(f"#{gid} {stamp} 群 {channel} {outcome} 胜 {winner} 负 {loser}，{rounds} 轮，{size} 字节")
+        return
+
+    row = conn.execute("SELECT replay, winner, loser FROM games WHERE id = ?", (args.id,)).fetchone()
+    if row is None or row[0] is None:
+        raise SystemExit(f"对局 #{args.id} 不存在或没有回放")
+    blob, winner_id, loser_id = row
+    seed, fingerprint, _, winner, _ = decode(blob)
+    names = ("玩家1", "玩家2")
+    if winner is not None:
+        names = (winner_id, loser_id) if winner == 0 else (loser_id, winner_id)
+    print(f"对局 #{args.id}，种子 {seed:016x}，道具表 {fingerprint:08x}，{len(blob)} 字节")
+    try:
+        game, ok = replay(blob, names, lambda g, op, a, ev: print("\n".join(describe(g, op, a, ev))), table_dir)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print("校验通过" if ok else "校验失败：重放结果与记录不一致")
+
+
+if __name__ == "__main__":
+    main()
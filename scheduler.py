@@ -0,0 +1,128 @@
+# scheduler.py
+"""
+共享定时器调度器。
+
+所有游戏的定时事件（等待加入超时、回合挂机超时、闲置游戏回收）
+都放在同一个最小堆中，由单个后台任务驱动，取代每局一个 sleep 任务的做法。
+取消定时器只是打上标记（O(1)），过期条目在出堆时被丢弃，
+当已取消条目过多时整体重建堆以回收内存。
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger("astrbot")
+
+
+class Timer:
+    """调度器返回的定时器句柄"""
+
+    __slots__ = ("when", "seq", "callback", "args", "cancelled", "_scheduler")
+
+    def __init__(self, when: float, seq: int, callback, args: tuple, scheduler: "TimerScheduler"):
+        self.when = when
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self._scheduler = scheduler
+
+    def __lt__(self, other: "Timer"):
+        return (self.when, self.seq) < (other.when, other.seq)
+
+    def cancel(self):
+        """取消定时器（O(1)），重复取消无副作用"""
+        if not self.cancelled:
+            self.cancelled = True
+            self.callback = self.args = None
+            self._scheduler._cancelled += 1
+
+
+class TimerScheduler:
+    """基于最小堆的单任务定时器调度器"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._heap = []
+        self._seq = itertools.count()
+        self._cancelled = 0
+        self._wakeup = None
+        self._task = None
+        self._closing = None  # close() 取消、尚未结束的后台任务
+
+    def __len__(self):
+        return len(self._heap) - self._cancelled
+
+    def call_later(self, delay: float, callback, *args) -> Timer:
+        """
+        在 delay 秒后调用 callback(*args)；callback 可以是普通函数或协程函数。
+        必须在事件循环中调用，首次调用时启动后台任务。
+        """
+        timer = Timer(self.clock() + delay, next(self._seq), callback, args, self)
+        heapq.heappush(self._heap, timer)
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        elif self._heap[0] is timer:
+            self._wakeup.set()
+        return timer
+
+    def close(self):
+        """停止后台任务并丢弃所有定时器；后台任务只是被取消，需再 await wait_closed() 等它结束"""
+        if self._task is not None:
+            self._task.cancel()
+            self._closing = self._task
+            self._task = None
+            self._wakeup.set()
+        self._heap.clear()
+        self._cancelled = 0
+
+    async def wait_closed(self):
+        """等待 close() 取消的后台任务结束"""
+        task, self._closing = self._closing, None
+        if task is not None:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def _compact(self):
+        self._heap = [t for t in self._heap if not t.cancelled]
+        heapq.heapify(self._heap)
+        self._cancelled = 0
+
+    async def _run(self):
+        heap = self._heap
+        me = asyncio.current_task()
+        # wait_for 可能吞掉取消（等待的事件与取消同时完成时），因此也以 close() 清空 _task 作为退出条件
+        while self._task is me:
+            if self._cancelled > 1024 and self._cancelled * 2 > len(self._heap):
+                self._compact()
+                heap = self._heap
+            while heap and heap[0].cancelled:
+                heapq.heappop(heap)
+                self._cancelled -= 1
+            self._wakeup.clear()
+            if not heap:
+                await self._wakeup.wait()
+                continue
+            delay = heap[0].when - self.clock()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            timer = heapq.heappop(heap)
+            callback, args = timer.callback, timer.args
+            # 已出堆的定时器直接标记为取消，之后再调用 cancel() 不会计入待回收数量
+            timer.cancelled = True
+            timer.callback = timer.args = None
+            try:
+                res = callback(*args)
+                if asyncio.iscoroutine(res):
+                    asyncio.get_running_loop().create_task(res)
+            except Exception:
+                logger.exception("恶魔轮盘定时器回调执行失败")
@@ -0,0 +1,290 @@
+# selfplay.py
+"""
+恶魔轮盘自对战模拟器。
+
+直接驱动 engine 中的规则，在多个进程中批量进行带种子的机器人对局，
+统计胜率、对局长度与道具使用情况，用于检验弹夹大小、道具发放数量、兑换比例等平衡性参数。
+
+在插件目录的上一级目录中运行：
+    python -m astrbot_plugin_buckshot_roulette.selfplay -n 1000000 --p1 heuristic --p2 random
+
+策略是一个函数 policy(game, rng, known) -> 动作：
+  game  为当前 GameState（轮到该策略行动），rng 为本局的随机数生成器，
+  known 为该玩家已知的下一发子弹类型（True 实弹 / False 空包弹 / None 未知）。
+  动作为 ("fire", 是否打自己)、("item", 道具编号) 或 ("exchange", 源道具编号, 目标道具编号)。
+除内置策略外，也可用 "模块:函数" 的形式指定任意可导入的策略函数。
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import engine
+from .state import GameState, PlayerState, ITEM_NAMES, ITEM_INDEX, MAX_HP
+
+# 单局最多执行的动作数，防止自定义策略陷入死循环
+MAX_STEPS = 10000
+
+SAW = ITEM_INDEX["手锯"]
+MAGNIFIER = ITEM_INDEX["放大镜"]
+BEER = ITEM_INDEX["啤酒"]
+CIGARETTE = ITEM_INDEX["香烟"]
+HANDCUFF = ITEM_INDEX["手铐"]
+REVERSER = ITEM_INDEX["逆转器"]
+BOMB = ITEM_INDEX["炸弹"]
+SHIELD = ITEM_INDEX["护盾"]
+
+
+# ------------- 内置策略 -------------
+
+def random_policy(game: GameState, rng, known):
+    """在开枪（自己 / 对方）与使用任一持有道具之间均匀随机选择"""
+    counts = game.current.items.counts
+    actions = [("fire", True), ("fire", False)]
+    actions += [("item", idx) for idx, n in enumerate(counts) if n]
+    return actions[rng.randrange(len(actions))]
+
+
+def heuristic_policy(game: GameState, rng, known):
+    """
+    简单的贪心策略：缺血先回血，未知时用放大镜看膛，
+    确认实弹时上手锯 / 手铐后打对方，确认空包弹时打自己或用逆转器翻转，
+    否则按剩余实弹比例决定开枪方向。
+    """
+    me, other = game.current, game.opponent
+    counts = me.items.counts
+    if counts[CIGARETTE] >= 2 and me.hp == MAX_HP:
+        target = SAW if me.shield else SHIELD
+        return ("exchange", CIGARETTE, target)
+    if me.hp < MAX_HP and counts[CIGARETTE]:
+        return ("item", CIGARETTE)
+    if counts[BOMB] and not other.shield:
+        return ("item", BOMB)
+    if counts[SHIELD] and not me.shield:
+        return ("item", SHIELD)
+    if known is None and game.bullet and counts[MAGNIFIER]:
+        return ("item", MAGNIFIER)
+    if known is None:
+        mag = game.bullet
+        known = mag.live * 2 > len(mag) if mag else False
+    if known:
+        if counts[SAW] and not game.double:
+            return ("item", SAW)
+        if counts[HANDCUFF] and not game.used_handcuff and not other.handcuff:
+            return ("item", HANDCUFF)
+        return ("fire", False)
+    if counts[REVERSER]:
+        return ("item", REVERSER)
+    if counts[BEER] and len(game.bullet) > 1:
+        return ("item", BEER)
+    return ("fire", True)
+
+
+POLICIES = {
+    "random": random_policy,
+    "heuristic": heuristic_policy,
+}
+
+
+def resolve_policy(spec: str):
+    """按名称取内置策略，或按 "模块:函数" 导入自定义策略"""
+    if spec in POLICIES:
+        return POLICIES[spec]
+    module, sep, name = spec.partition(":")
+    if not sep:
+        raise ValueError(f"未知策略：{spec}（可用：{', '.join(POLICIES)}，或 模块:函数）")
+    return getattr(importlib.import_module(module), name)
+
+
+# ------------- 对局与统计 -------------
+
+def play_game(policies: tuple, rng) -> dict:
+    """
+    用给定的两个策略（按座位）进行一局对局，返回本局结果：
+    winner 胜者座位（超出步数上限时为 None）、first 先手座位、
+    shots 开枪次数、rounds 换轮次数、items 各道具使用次数、exchanges 兑换次数。
+    """
+    game = GameState(PlayerState("p1", "1"))
+    game.players[1] = PlayerState("p2", "2")
+    first = engine.start(game, rng)[0][1]
+    known = [None, None]
+    items = [0] * len(ITEM_NAMES)
+    shots = exchanges = 0
+    for _ in range(MAX_STEPS):
+        me = game.turn
+        action = policies[me](game, rng, known[me])
+        if action[0] == "fire":
+            events = engine.fire(game, action[1], rng)
+            shots += 1
+        elif action[0] == "item":
+            if not game.current.items.count(action[1]):
+                raise ValueError(f"策略使用了未持有的道具：{ITEM_NAMES[action[1]]}")
+            events = engine.use_item(game, action[1], rng)
+            items[action[1]] += 1
+        else:
+            if engine.exchange(game, action[1], action[2]) != "ok":
+                raise ValueError(f"策略进行了无效兑换：{ITEM_NAMES[action[1]]} -> {ITEM_NAMES[action[2]]}")
+            exchanges += 1
+            continue
+        for ev in events:
+            kind = ev[0]
+            if kind == "shot" or kind == "round":
+                known[0] = known[1] = None
+            elif kind == "item":
+                if ev[1] == MAGNIFIER and ev[2] == "ok":
+                    known[me] = ev[3]
+                elif ev[1] == REVERSER and ev[2] == "ok":
+                    known[me] = ev[3]
+                    known[1 - me] = None
+                elif ev[1] == BEER and ev[2] == "ok":
+                    known[0] = known[1] = None
+        if game.status == "over":
+            break
+    return {
+        "winner": game.winner,
+        "first": first,
+        "shots": shots,
+        "rounds": game.round,
+        "items": items,
+        "exchanges": exchanges,
+    }
+
+
+def _new_totals() -> dict:
+    return {
+        "games": 0,
+        "unfinished": 0,
+        "seat_wins": [0, 0],
+        "policy_wins": {},
+        "first_wins": 0,
+        "shots": 0,
+        "rounds": 0,
+        "max_shots": 0,
+        "items": [0] * len(ITEM_NAMES),
+        "exchanges": 0,
+    }
+
+
+def _merge(total: dict, part: dict):
+    for key in ("games", "unfinished", "first_wins", "shots", "rounds", "exchanges"):
+        total[key] += part[key]
+    total["max_shots"] = max(total["max_shots"], part["max_shots"])
+    for i in range(2):
+        total["seat_wins"][i] += part["seat_wins"][i]
+    for i, n in enumerate(part["items"]):
+        total["items"][i] += n
+    for name, n in part["policy_wins"].items():
+        total["policy_wins"][name] = total["policy_wins"].get(name, 0) + n
+
+
+def run_chunk(specs: tuple, seed: int, count: int, swap: bool) -> dict:
+    """
+    在当前进程中进行 count 局对局，第 i 局使用种子 seed + i。
+    swap 为 True 时奇数局交换双方座位，以抵消座位带来的优势。
+    """
+    policies = tuple(resolve_policy(s) for s in specs)
+    totals = _new_totals()
+    for i in range(seed, seed + count):
+        order = (1, 0) if swap and i % 2 else (0, 1)
+        res = play_game((policies[order[0]], policies[order[1]]), random.Random(i))
+        totals["games"] += 1
+        totals["shots"] += res["shots"]
+        totals["rounds"] += res["rounds"]
+        totals["exchanges"] += res["exchanges"]
+        totals["max_shots"] = max(totals["max_shots"], res["shots"])
+        for idx, n in enumerate(res["items"]):
+            totals["items"][idx] += n
+        winner = res["winner"]
+        if winner is None:
+            totals["unfinished"] += 1
+            continue
+        totals["seat_wins"][winner] += 1
+        name = specs[order[winner]]
+        totals["policy_wins"][name] = totals["policy_wins"].get(name, 0) + 1
+        if winner == res["first"]:
+            totals["first_wins"] += 1
+    return totals
+
+
+def simulate(specs: tuple, games: int, seed: int = 0, workers: int = None,
+             chunk: int = 10000, swap: bool = True) -> dict:
+    """
+    将 games 局对局按 chunk 局一组分发到进程池，返回汇总统计与耗时。
+    :param specs: 两个座位的策略名（或 模块:函数）
+    :param workers: 进程数，默认为 CPU 核数
+    """
+    workers = workers or os.cpu_count() or 1
+    totals = _new_totals()
+    start = time.perf_counter()
+    if workers == 1:
+        for s in range(seed, seed + games, chunk):
+            _merge(totals, run_chunk(specs, s, min(chunk, seed + games - s), swap))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(run_chunk, specs, s, min(chunk, seed + games - s), swap)
+                for s in range(seed, seed + games, chunk)
+            ]
+            for fut in futures:
+                _merge(totals, fut.result())
+    elapsed = time.perf_counter() - start
+    totals["elapsed"] = elapsed
+    totals["workers"] = workers
+    totals["games_per_sec"] = totals["games"] / elapsed if elapsed else 0.0
+    totals["games_per_sec_per_core"] = totals["games_per_sec"] / workers
+    return totals
+
+
+def format_report(specs: tuple, totals: dict) -> str:
+    games = totals["games"] or 1
+    finished = (games - totals["unfinished"]) or 1
+    lines = [
+        f"对局数：{totals['games']}（未分胜负 {totals['unfinished']}）",
+        f"座位胜率：玩家1 {totals['seat_wins'][0] / finished:.2%}，玩家2 {totals['seat_wins'][1] / finished:.2%}",
+        f"先手胜率：{totals['first_wins'] / finished:.2%}",
+    ]
+    if specs[0] != specs[1]:
+        for name in specs:
+            lines.append(f"策略 {name} 胜率：{totals['policy_wins'].get(name, 0) / finished:.2%}")
+    lines += [
+        f"平均开枪次数：{totals['shots'] / games:.2f}（最多 {totals['max_shots']}）",
+        f"平均换轮次数：{totals['rounds'] / games:.2f}",
+        f"平均兑换次数：{totals['exchanges'] / games:.3f}",
+        "每局道具使用次数：",
+    ]
+    for name, n in zip(ITEM_NAMES, totals["items"]):
+        lines.append(f"  {name}：{n / games:.3f}")
+    lines.append(
+        f"耗时 {totals['elapsed']:.2f} 秒，{totals['workers']} 个进程，"
+        f"{totals['games_per_sec']:.0f} 局/秒，{totals['games_per_sec_per_core']:.0f} 局/秒/核"
+    )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="恶魔轮盘自对战模拟器")
+    parser.add_argument("-n", "--games", type=int, default=100000, help="对局数")
+    parser.add_argument("--p1", default="heuristic", help="玩家1的策略（内置名称或 模块:函数）")
+    parser.add_argument("--p2", default="heuristic", help="玩家2的策略（内置名称或 模块:函数）")
+    parser.add_argument("--seed", type=int, default=0, help="起始种子，第 i 局使用 seed + i")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="进程数，默认为 CPU 核数")
+    parser.add_argument("--chunk", type=int, default=10000, help="每个任务包含的对局数")
+    parser.add_argument("--no-swap", action="store_true", help="不交换座位（默认奇数局交换）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出统计结果")
+    args = parser.parse_args(argv)
+    specs = (args.p1, args.p2)
+    for spec in specs:
+        resolve_policy(spec)
+    totals = simulate(specs, args.games, args.seed, args.workers, args.chunk, not args.no_swap)
+    if args.json:
+        out = dict(totals, items=dict(zip(ITEM_NAMES, totals["items"])), policies=list(specs))
+        print(json.dumps(out, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(specs, totals))
+
+
+if __name__ == "__main__":
+    main()
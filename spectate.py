@@ -0,0 +1,138 @@
+# spectate.py
+"""
+观战转播。
+
+其它群可以订阅一局游戏（见 main.py 的「观战」指令），该局的开枪、道具、换轮与结束由插件为观众渲染一次，
+得到的同一条消息链投递到每个订阅者的队列：
+  - 每个订阅者一个有界队列（deque），满时丢弃最旧的消息，慢的平台只会让自己的观众错过消息；
+  - 每个订阅者队列由专属的发送任务排空，排空后任务退出；投递只是入队，不在该局的 actor 中等待发送；
+  - 连续发送失败 max_failures 次的订阅者被移除；
+  - 游戏结束时移除该局的全部订阅，已入队的消息仍会发完。
+跨群匹配的对局也经由这里让双方的群互相看到对手的行动（行动方自己的群已直接收到回复，投递时跳过）。
+订阅只保存在本进程内存中，插件重载后需重新订阅。
+"""
+import asyncio
+from collections import deque
+
+
+class _Subscriber:
+    """一个订阅群：会话标识、群ID、待发送队列与正在排空队列的任务"""
+
+    __slots__ = ("umo", "cid", "queue", "task", "failures")
+
+    def __init__(self, umo: str, cid: str, queue_size: int):
+        self.umo = umo
+        self.cid = cid
+        self.queue = deque(maxlen=queue_size)
+        self.task = None
+        self.failures = 0
+
+
+class Spectators:
+    """游戏键 -> 订阅者 的观战表"""
+
+    def __init__(self, send, queue_size: int = 20, max_failures: int = 5):
+        """
+        :param send: 协程函数 send(umo, cid, chain) -> bool，向一个订阅群发送一条消息链（应自行限流，不重试）
+        :param queue_size: 每个订阅者最多积压的消息数
+        :param max_failures: 连续发送失败多少次后移除该订阅者
+        """
+        self._send = send
+        self.queue_size = queue_size
+        self.max_failures = max_failures
+        self._games = {}    # 游戏键 -> {umo: _Subscriber}
+        self._tasks = set()
+        self.published = 0  # 转播的事件数（每个事件只渲染一次）
+        self.sent = 0       # 成功发送给订阅者的消息数
+        self.dropped = 0    # 因队列已满被丢弃的消息数
+        self.failed = 0     # 发送失败的消息数
+
+    def watching(self, gid: str) -> bool:
+        """该局是否有订阅者"""
+        return gid in self._games
+
+    def count(self, gid: str) -> int:
+        return len(self._games.get(gid, ()))
+
+    def subscribe(self, gid: str, umo: str, cid: str) -> bool:
+        """订阅一局；已订阅时返回 False"""
+        subs = self._games.setdefault(gid, {})
+        if umo in subs:
+            return False
+        subs[umo] = _Subscriber(umo, cid, self.queue_size)
+        return True
+
+    def unsubscribe(self, umo: str, gid: str = None) -> list:
+        """取消订阅（gid 为 None 时取消该会话的全部订阅），返回被取消的游戏键"""
+        removed = []
+        for key in ([gid] if gid is not None else list(self._games)):
+            subs = self._games.get(key)
+            if subs is not None and subs.pop(umo, None) is not None:
+                removed.append(key)
+                if not subs:
+                    del self._games[key]
+        return removed
+
+    def subscriptions(self, umo: str) -> list:
+        """该会话订阅的游戏键"""
+        return [gid for gid, subs in self._games.items() if umo in subs]
+
+    def publish(self, gid: str, chain, skip: str = None):
+        """
+        把一条已渲染好的消息链投递给该局的全部订阅者（只入队，须在事件循环中调用）。
+        :param skip: 不投递的会话（已直接收到这条消息的群）
+        """
+        subs = self._games.get(gid)
+        if not subs:
+            return
+        self.published += 1
+        loop = None
+        for sub in subs.values():
+            if sub.umo == skip:
+                continue
+            if len(sub.queue) == self.queue_size:
+                self.dropped += 1
+            sub.queue.append(chain)
+            if sub.task is None:
+                loop = loop or asyncio.get_running_loop()
+                sub.task = loop.create_task(self._drain(gid, sub))
+                self._tasks.add(sub.task)
+                sub.task.add_done_callback(self._tasks.discard)
+
+    def finish(self, gid: str):
+        """游戏结束：移除该局的全部订阅，已入队的消息由各自的任务发完"""
+        self._games.pop(gid, None)
+
+    async def _drain(self, gid: str, sub: _Subscriber):
+        try:
+            queue = sub.queue
+            while queue:
+                if await self._send(sub.umo, sub.cid, queue.popleft()):
+                    self.sent += 1
+                    sub.failures = 0
+                    continue
+                self.failed += 1
+                sub.failures += 1
+                if sub.failures >= self.max_failures:
+                    self.dropped += len(queue)
+                    queue.clear()
+                    subs = self._games.get(gid)
+                    if subs is not None and subs.get(sub.umo) is sub:
+                        self.unsubscribe(sub.umo, gid)
+        finally:
+            sub.task = None
+
+    def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        self._games.clear()
+
+    def stats(self) -> dict:
+        return {
+            "games": len(self._games),
+            "subscribers": sum(len(subs) for subs in self._games.values()),
+            "published": self.published,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
@@ -0,0 +1,231 @@
+# state.py
+"""
+恶魔轮盘的紧凑游戏状态。
+
+每局游戏由一个 GameState 与两个 PlayerState 表示，均使用 __slots__，
+玩家以整数下标 0/1 区分，背包为按道具编号计数的定长数组，
+因此道具的增删、计数与上限判断都是 O(1)。
+道具编号由道具表（registry.ItemTable）决定，每局游戏持有开局时的道具表。
+"""
+
+from .magazine import Magazine
+from .registry import DEFAULT_TABLE, ItemTable
+
+# 内置道具表的道具名，道具编号即其在此元组中的下标，顺序同时决定背包展示顺序
+ITEM_NAMES = DEFAULT_TABLE.names
+ITEM_INDEX = {name: idx for idx, name in enumerate(ITEM_NAMES)}
+
+MAX_HP = 6      # 生命值上限
+MAX_ITEMS = 8   # 背包道具上限
+
+
+class Inventory:
+    """按道具编号计数的背包，total 为道具总数"""
+
+    __slots__ = ("counts", "total")
+
+    def __init__(self, size: int = len(ITEM_NAMES)):
+        """:param size: 道具种类数（道具表的长度）"""
+        self.counts = bytearray(size)
+        self.total = 0
+
+    def count(self, idx: int) -> int:
+        return self.counts[idx]
+
+    def add(self, idx: int, n: int = 1) -> int:
+        """
+        无视背包上限地加入道具（幸运星、调试指令使用），n 为负数时移除。
+        单种道具的数量限制在 0~255（计数数组的单字节范围），返回实际的增减量。
+        """
+        old = self.counts[idx]
+        new = min(max(old + n, 0), 255)
+        self.counts[idx] = new
+        self.total += new - old
+        return new - old
+
+    def fill(self, idx: int) -> bool:
+        """在不超过上限的前提下加入一个道具，返回是否成功"""
+        if self.total >= MAX_ITEMS:
+            return False
+        self.counts[idx] += 1
+        self.total += 1
+        return True
+
+    def remove(self, idx: int, n: int = 1) -> bool:
+        """移除 n 个指定道具，数量不足时不做修改并返回 False"""
+        if self.counts[idx] < n:
+            return False
+        self.counts[idx] -= n
+        self.total -= n
+        return True
+
+    def names(self, item_names: tuple = ITEM_NAMES) -> list:
+        """按道具编号顺序展开为道具名列表，item_names 为所用道具表的道具名"""
+        return [item_names[idx] for idx, n in enumerate(self.counts) for _ in range(n)]
+
+    def __len__(self):
+        return self.total
+
+
+class PlayerState:
+    """单个玩家的状态"""
+
+    __slots__ = ("name", "id", "hp", "items", "handcuff", "shield")
+
+    def __init__(self, name: str, id: str, item_types: int = len(ITEM_NAMES)):
+        """:param item_types: 所在游戏道具表的道具种类数"""
+        self.name = name
+        self.id = id
+        self.hp = MAX_HP
+        self.items = Inventory(item_types)
+        self.handcuff = False
+        self.shield = False
+
+    def to_dict(self, item_names: tuple = ITEM_NAMES) -> dict:
+        return {
+            "name": self.name,
+            "id": self.id,
+            "hp": self.hp,
+            "item": self.items.names(item_names),
+            "handcuff": self.handcuff,
+            "shield": self.shield,
+        }
+
+    def to_record(self) -> list:
+        return [self.name, self.id, self.hp, self.items.counts.hex(), self.handcuff, self.shield]
+
+    @classmethod
+    def from_record(cls, rec: list) -> "PlayerState":
+        p = cls(rec[0], rec[1])
+        p.hp = rec[2]
+        p.items.counts[:] = bytes.fromhex(rec[3])
+        p.items.total = sum(p.items.counts)
+        p.handcuff = rec[4]
+        p.shield = rec[5]
+        return p
+
+
+class GameState:
+    """
+    一局游戏的状态。
+    players[0] 为玩家1（创建者），players[1] 为玩家2，未加入时为 None；
+    turn 为当前行动玩家的下标；origin 为该群的 unified_msg_origin，用于主动发送消息；
+    remote 为跨群匹配对局中玩家2所在群的 (群ID, unified_msg_origin)，同群对局为 None；
+    winner 为游戏结束（status == "over"）时胜者的下标。
+    seed / rng 为本局独立的随机种子与随机数生成器，log 为回放用的操作流（见 replay.py），
+    三者由插件在创建游戏时设置；log 为 None 表示该局无法回放。
+    table 为本局使用的道具表，开局后道具表热重载不影响进行中的游戏。
+    """
+
+    __slots__ = ("status", "players", "turn", "bullet", "double", "round", "used_handcuff", "origin", "winner",
+                 "seed", "rng", "log", "table", "remote")
+
+    def __init__(self, creator: PlayerState, table: ItemTable = DEFAULT_TABLE):
+        self.table = table
+        self.status = "waiting"
+        self.players = [creator, None]
+        self.turn = 0
+        self.bullet = Magazine()
+        self.double = False
+        self.round = 0
+        self.used_handcuff = False
+        self.origin = ""
+        self.winner = None
+        self.seed = None
+        self.rng = None
+        self.log = None
+        self.remote = None
+
+    @property
+    def current(self) -> PlayerState:
+        return self.players[self.turn]
+
+    @property
+    def opponent(self) -> PlayerState:
+        return self.players[1 - self.turn]
+
+    def switch_turn(self):
+        self.turn = 1 - self.turn
+
+    def origin_of(self, idx: int) -> str:
+        """下标为 idx 的玩家所在群的 unified_msg_origin（跨群对局中玩家2为 remote 的群）"""
+        if idx == 1 and self.remote is not None:
+            return self.remote[1]
+        return self.origin
+
+    def player_by_id(self, pid: str):
+        """按玩家ID查找玩家，不在本局中时返回 None"""
+        for p in self.players:
+            if p is not None and p.id == pid:
+                return p
+        return None
+
+    def to_record(self) -> list:
+        """
+        序列化为紧凑的 JSON 友好列表，用于日志持久化：
+        [status, turn, 弹夹位图, 弹夹长度, double, round, usedHandcuff, 玩家1, 玩家2, origin, 种子, 操作流, 道具表指纹(, remote)]
+        随机数生成器的内部状态不写入，恢复时由种子重放操作流重建；remote 仅跨群对局写入。
+        """
+        rec = [
+            self.status, self.turn, self.bullet.bits, self.bullet.size,
+            self.double, self.round, self.used_handcuff,
+            *(p.to_record() if p is not None else None for p in self.players),
+            self.origin, self.seed, self.log.hex() if self.log is not None else None,
+            self.table.fingerprint,
+        ]
+        if self.remote is not None:
+            rec.append(list(self.remote))
+        return rec
+
+    @staticmethod
+    def record_fingerprint(rec: list) -> int:
+        """记录所用道具表的指纹，旧版记录使用内置道具表"""
+        return rec[12] if len(rec) > 12 else DEFAULT_TABLE.fingerprint
+
+    @staticmethod
+    def record_seed(rec: list):
+        """记录中的随机种子，旧版记录为 None"""
+        return rec[10] if len(rec) > 10 else None
+
+    @staticmethod
+    def record_player_ids(rec: list) -> tuple:
+        """记录中已入座玩家的ID，玩家1在前"""
+        return tuple(p[1] for p in (rec[7], rec[8]) if p is not None)
+
+    @staticmethod
+    def record_remote(rec: list):
+        """记录中玩家2所在群的 (群ID, unified_msg_origin)，同群对局为 None"""
+        return tuple(rec[13]) if len(rec) > 13 and rec[13] else None
+
+    @classmethod
+    def from_record(cls, rec: list, table: ItemTable = DEFAULT_TABLE) -> "GameState":
+        """由 to_record 的结果还原游戏状态，table 为 record_fingerprint 对应的道具表"""
+        g = cls(PlayerState.from_record(rec[7]), table)
+        if rec[8] is not None:
+            g.players[1] = PlayerState.from_record(rec[8])
+        g.status, g.turn = rec[0], rec[1]
+        g.bullet = Magazine(rec[2], rec[3])
+        g.double, g.round, g.used_handcuff = rec[4], rec[5], rec[6]
+        g.origin = rec[9]
+        if len(rec) > 10:
+            # 旧版记录没有种子与操作流，恢复后无法回放
+            g.seed = rec[10]
+            g.log = bytearray.fromhex(rec[11]) if rec[11] is not None else None
+        g.remote = cls.record_remote(rec)
+        return g
+
+    def to_dict(self) -> dict:
+        """兼容旧版嵌套字典结构的只读视图，供 debug 查询使用"""
+        d = {"status": self.status}
+        for idx, p in enumerate(self.players):
+            if p is not None:
+                d[f"player{idx + 1}"] = p.to_dict(self.table.names)
+        if self.status == "started":
+            d.update({
+                "bullet": self.bullet.to_list(),
+                "currentTurn": self.turn + 1,
+                "double": self.double,
+                "round": self.round,
+                "usedHandcuff": self.used_handcuff,
+            })
+        return d
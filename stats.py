@@ -0,0 +1,295 @@
+# stats.py
+"""
+玩家战绩与排行榜存储（SQLite）。
+
+每局结束时插件把一条对局结果（含回放，见 replay.py）入队（不做任何磁盘 IO），
+由后台写线程把队列中积累的结果合并为一个事务批量写入：
+games 表逐局追加，players 表按 (群, 玩家) 累加胜负、开枪、道具与伤害。
+数据库使用 WAL 模式，查询走一个小型只读连接池，与写线程互不阻塞。
+
+players 表以 (群, 胜场 DESC, 负场) 建索引，「本群前 N 名」与「我的排名」都是索引范围扫描；
+按玩家ID的索引用于汇总同一玩家在所有群的战绩。
+
+ratings 表保存每名玩家跨群通用的 Elo 评分（供跨群匹配使用，见 matchmaking.py）：
+计入评分的对局由写线程按结束先后逐局更新双方评分，与战绩写在同一个事务中。
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from .matchmaking import DEFAULT_RATING, rate
+
+logger = logging.getLogger("astrbot")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    finished_at REAL NOT NULL,
+    outcome TEXT NOT NULL,
+    rounds INTEGER NOT NULL,
+    winner TEXT,
+    loser TEXT,
+    replay BLOB
+);
+CREATE TABLE IF NOT EXISTS players (
+    channel TEXT NOT NULL,
+    player TEXT NOT NULL,
+    name TEXT NOT NULL,
+    games INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    shots INTEGER NOT NULL DEFAULT 0,
+    items INTEGER NOT NULL DEFAULT 0,
+    damage_dealt INTEGER NOT NULL DEFAULT 0,
+    damage_taken INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (channel, player)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS players_rank ON players (channel, wins DESC, losses);
+CREATE INDEX IF NOT EXISTS players_by_player ON players (player);
+CREATE TABLE IF NOT EXISTS ratings (
+    player TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    rating REAL NOT NULL,
+    games INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+
+# players 表中逐局累加的列，与 GameResult.players 中的统计字段一一对应
+TALLY_COLUMNS = ("shots", "items", "damage_dealt", "damage_taken")
+
+UPSERT = f"""
+INSERT INTO players (channel, player, name, games, wins, losses, {", ".join(TALLY_COLUMNS)})
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (channel, player) DO UPDATE SET
+    name = excluded.name,
+    games = games + excluded.games,
+    wins = wins + excluded.wins,
+    losses = losses + excluded.losses,
+    {", ".join(f"{c} = {c} + excluded.{c}" for c in TALLY_COLUMNS)}
+"""
+
+RECORD_COLUMNS = ("games", "wins", "losses", *TALLY_COLUMNS)
+
+
+class GameResult:
+    """
+    一局的结果：channel 为群ID，outcome 为结束方式（win / afk / forfeit），
+    players 为两名玩家的 (玩家ID, 昵称, 是否获胜, 开枪数, 道具数, 造成伤害, 承受伤害)，
+    replay 为该局的二进制回放（不可回放时为 None），rated 为是否计入双方的评分（人机对战不计）。
+    """
+
+    __slots__ = ("channel", "finished_at", "outcome", "rounds", "players", "replay", "rated")
+
+    def __init__(self, channel: str, outcome: str, rounds: int, players: tuple, finished_at: float = None,
+                 replay: bytes = None, rated: bool = True):
+        self.channel = channel
+        self.outcome = outcome
+        self.rounds = rounds
+        self.players = players
+        self.replay = replay
+        self.rated = rated
+        self.finished_at = time.time() if finished_at is None else finished_at
+
+
+class StatsStore:
+    """
+    对局结果的批量写入器 + 排行榜查询。
+    record() 可在事件循环中调用，仅做一次入队；
+    查询方法会访问数据库，应在线程池中调用（如 asyncio.to_thread）。
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.5, pool_size: int = 2):
+        """
+        :param path: 数据库文件路径
+        :param flush_interval: 写线程等待新结果的间隔（秒），也是关闭时的响应粒度
+        :param pool_size: 只读连接池的大小
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._pool = queue.SimpleQueue()
+        self._pool_size = pool_size
+        self._opened = 0
+        self._pool_lock = threading.Lock()
+        self.ready = threading.Event()
+        self.written = 0    # 写线程已提交的对局数
+
+    # ------------- 事件循环侧 -------------
+    def start(self):
+        """启动写线程；线程会先创建数据库与索引，完成后置位 ready"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="buckshot-stats", daemon=True)
+            self._thread.start()
+
+    def record(self, result: GameResult):
+        self._queue.put(result)
+
+    def flush(self, timeout: float = None) -> bool:
+        """等待此前入队的结果全部提交（会阻塞），返回是否在超时前完成"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        """写入剩余结果并停止写线程，关闭所有连接（会阻塞，应在线程池中调用）"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    # ------------- 写线程侧 -------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _run(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        if "replay" not in {row[1] for row in conn.execute("PRAGMA table_info(games)")}:
+            # 旧版数据库没有回放列
+            conn.execute("ALTER TABLE games ADD COLUMN replay BLOB")
+        self.ready.set()
+        try:
+            while True:
+                try:
+                    first = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                batch = [first]
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                results = [r for r in batch if isinstance(r, GameResult)]
+                if results:
+                    try:
+                        self._write(conn, results)
+                    except sqlite3.Error:
+                        logger.exception("恶魔轮盘战绩写入失败，丢弃 %d 局结果", len(results))
+                for r in batch:
+                    if isinstance(r, threading.Event):
+                        r.set()
+                if None in batch:
+                    return
+        finally:
+            conn.close()
+
+    def _write(self, conn: sqlite3.Connection, results: list):
+        """一个事务写入一批结果；同一玩家在批内的多局先在内存中合并，评分按对局先后逐局更新"""
+        games = []
+        totals = {}
+        ratings = {}  # 玩家ID -> [昵称, 评分, 计入评分的局数]
+        for r in results:
+            winner = loser = None
+            for pid, name, won, *tally in r.players:
+                if won:
+                    winner = pid
+                else:
+                    loser = pid
+                if r.rated and pid not in ratings:
+                    row = conn.execute("SELECT rating, games FROM ratings WHERE player = ?", (pid,)).fetchone()
+                    ratings[pid] = [name, *(row or (DEFAULT_RATING, 0))]
+                row = totals.get((r.channel, pid))
+                if row is None:
+                    row = totals[r.channel, pid] = [name, 0, 0, 0, 0, 0, 0, 0]
+                row[0] = name
+                row[1] += 1
+                row[2 if won else 3] += 1
+                for i, v in enumerate(tally, 4):
+                    row[i] += v
+            if r.rated and winner is not None and loser is not None:
+                w, l = ratings[winner], ratings[loser]
+                w[1], l[1] = rate(w[1], l[1])
+                w[2] += 1
+                l[2] += 1
+            games.append((r.channel, r.finished_at, r.outcome, r.rounds, winner, loser, r.replay))
+        with conn:
+            conn.executemany(
+                "INSERT INTO games (channel, finished_at, outcome, rounds, winner, loser, replay) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                games,
+            )
+            conn.executemany(UPSERT, [(cid, pid, *row) for (cid, pid), row in totals.items()])
+            if ratings:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO ratings (player, name, rating, games) VALUES (?, ?, ?, ?)",
+                    [(pid, *row) for pid, row in ratings.items()],
+                )
+        self.written += len(results)
+
+    # ------------- 查询 -------------
+    @contextmanager
+    def _reader(self):
+        """从连接池借出一个只读连接，池未满时按需新建"""
+        self.ready.wait(10)
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                grow = self._opened < self._pool_size
+                if grow:
+                    self._opened += 1
+            conn = self._connect() if grow else self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def leaderboard(self, channel: str, limit: int = 10) -> list:
+        """本群胜场前 limit 名：[(昵称, 局数, 胜, 负)]，同胜场时负场少者在前"""
+        with self._reader() as conn:
+            return conn.execute(
+                "SELECT name, games, wins, losses FROM players WHERE channel = ? "
+                "ORDER BY wins DESC, losses LIMIT ?",
+                (channel, limit),
+            ).fetchall()
+
+    def player_record(self, channel: str, player: str):
+        """
+        玩家战绩：返回 (本群战绩, 本群排名, 所有群合计)，战绩为 RECORD_COLUMNS 对应的字典；
+        没有任何记录时返回 None。
+        """
+        cols = ", ".join(RECORD_COLUMNS)
+        with self._reader() as conn:
+            here = conn.execute(
+                f"SELECT {cols} FROM players WHERE channel = ? AND player = ?", (channel, player)
+            ).fetchone()
+            overall = conn.execute(
+                f"SELECT {', '.join(f'TOTAL({c})' for c in RECORD_COLUMNS)}, COUNT(*) FROM players WHERE player = ?",
+                (player,),
+            ).fetchone()
+            if not overall[-1]:
+                return None
+            rank = None
+            if here is not None:
+                # 与排行榜同序：胜场更多，或胜场相同而负场更少的玩家都排在前面
+                rank = 1 + conn.execute(
+                    "SELECT COUNT(*) FROM players WHERE channel = ? AND (wins > ? OR (wins = ? AND losses < ?))",
+                    (channel, here[1], here[1], here[2]),
+                ).fetchone()[0]
+        return (
+            dict(zip(RECORD_COLUMNS, here)) if here is not None else None,
+            rank,
+            dict(zip(RECORD_COLUMNS, (int(v) for v in overall[:-1]))),
+        )
+
+    def rating(self, player: str) -> tuple:
+        """玩家的 (评分, 计入评分的局数)，没有记录时为初始评分"""
+        with self._reader() as conn:
+            row = conn.execute("SELECT rating, games FROM ratings WHERE player = ?", (player,)).fetchone()
+        return tuple(row) if row is not None else (DEFAULT_RATING, 0)
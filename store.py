@@ -0,0 +1,381 @@
+# store.py
+"""
+游戏状态存储（GameStore）。
+
+插件对游戏状态的每次写入都经由存储完成：记录为 GameState.to_record() 的结果，
+每局带一个版本号，写入时给出读到的版本（乐观并发控制），
+版本已被其它写入者推进时抛出 StoreConflict，由插件丢弃本地副本、重新读取后重试。
+此外每个群有一个群版本号，该群任一牌桌的写入都会使其加一，
+进程只需读取一次群版本即可判断本地缓存的各牌桌是否仍是最新（见 main.py 的 _sync）。
+
+局被移除后保留其版本号（墓碑），同一游戏键再次创建时版本继续递增，
+因此「版本号相同」总是意味着「内容相同」，不会出现 ABA。
+
+后端：
+  - MemoryStore：进程内字典，默认后端，不可跨进程共享，只记录版本号；
+  - SQLiteStore：SQLite（WAL），同一台机器上的多个进程共享一个数据库文件；
+  - RedisStore：Redis 协议（RESP2），用 WATCH / MULTI / EXEC 实现比较并写入，
+    除真实的 Redis 外也可连接 bench/respserver.py 提供的本地替身服务。
+后端的接口是同步的；插件在共享后端上的读写都交给专用的存储线程执行（见 main.py 的 _store_io），
+不阻塞事件循环，同一时刻只有这一个线程使用连接。
+"""
+import json
+import os
+import socket
+import sqlite3
+from urllib.parse import unquote, urlparse
+
+
+class StoreConflict(Exception):
+    """写入时版本已被推进（其它进程先写入了该局）"""
+
+    def __init__(self, gid: str):
+        super().__init__(gid)
+        self.gid = gid
+
+
+class StoreError(Exception):
+    """存储后端返回了错误"""
+
+
+def _dumps(rec: list) -> str:
+    return json.dumps(rec, ensure_ascii=False, separators=(",", ":"))
+
+
+class GameStore:
+    """
+    存储接口。
+    save 的 expected 为写入者读到的版本：0 表示新建（该键当前不能有存活的局），
+    否则要求存活的局版本恰为 expected；delete 同理。两者都返回 (新版本, 新群版本)。
+    """
+
+    shared = False  # 能否被多个进程共享；为 False 时进程内缓存即为权威副本，无需同步
+
+    def channel_version(self, cid: str) -> int:
+        """群版本号，该群从未写入过时为 0"""
+        raise NotImplementedError
+
+    def versions(self, cid: str) -> dict:
+        """该群存活的各局：游戏键 -> 版本"""
+        raise NotImplementedError
+
+    def load(self, gid: str):
+        """读取一局，返回 (版本, 记录)，不存在时返回 None"""
+        raise NotImplementedError
+
+    def save(self, cid: str, gid: str, rec: list, expected: int) -> tuple:
+        raise NotImplementedError
+
+    def delete(self, cid: str, gid: str, expected: int) -> tuple:
+        raise NotImplementedError
+
+    def write(self, cid: str, gid: str, rec, expected: int) -> tuple:
+        """rec 为 None 时删除该局，否则写入"""
+        if rec is None:
+            return self.delete(cid, gid, expected)
+        return self.save(cid, gid, rec, expected)
+
+    def close(self):
+        pass
+
+
+class MemoryStore(GameStore):
+    """
+    进程内存储：只记录各局的版本号，不保存记录。
+    不可跨进程共享，插件的进程内缓存即为权威副本，没有其它读者需要读取记录（load 不可用），
+    也不会出现 ABA，局被移除后不保留墓碑。
+    """
+
+    def __init__(self):
+        self._games = {}     # 存活的游戏键 -> 版本
+        self._channels = {}  # 群ID -> 群版本
+
+    def channel_version(self, cid: str) -> int:
+        return self._channels.get(cid, 0)
+
+    def versions(self, cid: str) -> dict:
+        prefix = f"{cid}#"
+        return {gid: v for gid, v in self._games.items() if gid.startswith(prefix)}
+
+    def _write(self, cid: str, gid: str, live: bool, expected: int) -> tuple:
+        version = self._games.get(gid)
+        if version != (expected or None) or (version is None and not live):
+            raise StoreConflict(gid)
+        if live:
+            version = self._games[gid] = (version or 0) + 1
+        else:
+            del self._games[gid]
+            version += 1
+        channel = self._channels[cid] = self._channels.get(cid, 0) + 1
+        return version, channel
+
+    def save(self, cid: str, gid: str, rec, expected: int) -> tuple:
+        return self._write(cid, gid, True, expected)
+
+    def delete(self, cid: str, gid: str, expected: int) -> tuple:
+        return self._write(cid, gid, False, expected)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    gid TEXT PRIMARY KEY,
+    channel TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    record TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS games_channel ON games (channel);
+CREATE TABLE IF NOT EXISTS channels (
+    channel TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteStore(GameStore):
+    """
+    SQLite 存储（WAL 模式，读写互不阻塞）。
+    games 表每局一行，record 为 NULL 表示已移除；channels 表保存群版本。
+    写入在 BEGIN IMMEDIATE 事务中先比较版本再更新，同一数据库的写入者之间由 SQLite 的写锁串行化。
+    """
+
+    shared = True
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        """
+        :param path: 数据库文件路径
+        :param timeout: 等待其它进程释放写锁的最长秒数
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        # 连接在加载插件的线程中创建、在存储线程中使用，两者不会同时访问
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+
+    def channel_version(self, cid: str) -> int:
+        row = self._conn.execute("SELECT version FROM channels WHERE channel = ?", (cid,)).fetchone()
+        return row[0] if row is not None else 0
+
+    def versions(self, cid: str) -> dict:
+        return dict(self._conn.execute(
+            "SELECT gid, version FROM games WHERE channel = ? AND record IS NOT NULL", (cid,)
+        ))
+
+    def load(self, gid: str):
+        row = self._conn.execute("SELECT version, record FROM games WHERE gid = ?", (gid,)).fetchone()
+        if row is None or row[1] is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def _write(self, cid: str, gid: str, text, expected: int) -> tuple:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT version, record IS NOT NULL FROM games WHERE gid = ?", (gid,)).fetchone()
+            live = row is not None and row[1]
+            if (live and row[0] != expected) or (not live and (expected or text is None)):
+                raise StoreConflict(gid)
+            version = (row[0] if row is not None else 0) + 1
+            conn.execute(
+                "INSERT INTO games (gid, channel, version, record) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (gid) DO UPDATE SET version = excluded.version, record = excluded.record",
+                (gid, cid, version, text),
+            )
+            channel = conn.execute(
+                "INSERT INTO channels (channel, version) VALUES (?, 1) "
+                "ON CONFLICT (channel) DO UPDATE SET version = version + 1 RETURNING version",
+                (cid,),
+            ).fetchone()[0]
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return version, channel
+
+    def save(self, cid: str, gid: str, rec: list, expected: int) -> tuple:
+        return self._write(cid, gid, _dumps(rec), expected)
+
+    def delete(self, cid: str, gid: str, expected: int) -> tuple:
+        return self._write(cid, gid, None, expected)
+
+    def close(self):
+        self._conn.close()
+
+
+class RespClient:
+    """最小的同步 RESP2 客户端：一次发送多条命令并按序读取回复（管道）"""
+
+    def __init__(self, host: str, port: int, db: int = 0, password: str = None, timeout: float = 5.0):
+        self.address = (host, port)
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+
+    def _connect(self):
+        self._sock = socket.create_connection(self.address, self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rb")
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            self._send(setup)
+            for _ in setup:
+                reply = self._read()
+                if isinstance(reply, StoreError):
+                    raise reply
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = self._file = None
+
+    def _send(self, commands):
+        out = bytearray()
+        for cmd in commands:
+            out += b"*%d\r\n" % len(cmd)
+            for arg in cmd:
+                if isinstance(arg, str):
+                    arg = arg.encode("utf-8")
+                elif isinstance(arg, int):
+                    arg = b"%d" % arg
+                out += b"$%d\r\n%s\r\n" % (len(arg), arg)
+        self._sock.sendall(out)
+
+    def _read(self):
+        line = self._file.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("连接已断开")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            return StoreError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            n = int(body)
+            if n < 0:
+                return None
+            data = self._file.read(n + 2)
+            if len(data) != n + 2:
+                raise ConnectionError("连接已断开")
+            return data[:-2]
+        if kind == b"*":
+            n = int(body)
+            return None if n < 0 else [self._read() for _ in range(n)]
+        raise StoreError(f"无法解析的回复：{line!r}")
+
+    def pipeline(self, *commands) -> list:
+        """发送多条命令并返回各自的回复；命令出错时其回复为 StoreError 实例。连接异常时断开，下次调用重连"""
+        try:
+            if self._sock is None:
+                self._connect()
+            self._send(commands)
+            return [self._read() for _ in commands]
+        except (OSError, ValueError, StoreError):
+            self.close()
+            raise
+
+    def call(self, *args):
+        reply = self.pipeline(args)[0]
+        if isinstance(reply, StoreError):
+            raise reply
+        return reply
+
+
+class RedisStore(GameStore):
+    """
+    Redis 协议存储。键布局（prefix 默认为 "buckshot:"）：
+      ver:<游戏键>   该局版本号（移除后保留）
+      rec:<游戏键>   该局记录（JSON），移除后删除
+      ch:<群ID>      群版本号
+      idx:<群ID>     哈希：存活的游戏键 -> 版本
+    写入先 WATCH 版本键并比较，再以 MULTI / EXEC 原子地写入记录、版本与群索引；
+    EXEC 返回空表示 WATCH 之后版本键被改动，同样视为冲突。
+    """
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "buckshot:"):
+        """:param url: redis://[:密码@]主机[:端口][/库号]"""
+        u = urlparse(url)
+        if u.scheme != "redis" or not u.hostname:
+            raise ValueError(f"无效的 Redis 地址：{url}")
+        db = u.path.strip("/")
+        self.client = RespClient(
+            u.hostname, u.port or 6379, int(db) if db else 0, unquote(u.password) if u.password else None
+        )
+        self.prefix = prefix
+
+    def channel_version(self, cid: str) -> int:
+        v = self.client.call("GET", f"{self.prefix}ch:{cid}")
+        return int(v) if v is not None else 0
+
+    def versions(self, cid: str) -> dict:
+        flat = self.client.call("HGETALL", f"{self.prefix}idx:{cid}")
+        return {flat[i].decode(): int(flat[i + 1]) for i in range(0, len(flat), 2)}
+
+    def load(self, gid: str):
+        v, rec = self.client.call("MGET", f"{self.prefix}ver:{gid}", f"{self.prefix}rec:{gid}")
+        if rec is None:
+            return None
+        return int(v), json.loads(rec)
+
+    def _write(self, cid: str, gid: str, text, expected: int) -> tuple:
+        p = self.prefix
+        ver_key, rec_key = f"{p}ver:{gid}", f"{p}rec:{gid}"
+        client = self.client
+        _, current, live = client.pipeline(("WATCH", ver_key), ("GET", ver_key), ("EXISTS", rec_key))
+        current = int(current) if current is not None else 0
+        if (live and current != expected) or (not live and (expected or text is None)):
+            client.call("UNWATCH")
+            raise StoreConflict(gid)
+        version = current + 1
+        if text is None:
+            writes = [("DEL", rec_key), ("SET", ver_key, version), ("HDEL", f"{p}idx:{cid}", gid)]
+        else:
+            writes = [("SET", rec_key, text), ("SET", ver_key, version), ("HSET", f"{p}idx:{cid}", gid, version)]
+        replies = client.pipeline(("MULTI",), *writes, ("INCR", f"{p}ch:{cid}"), ("EXEC",))
+        result = replies[-1]
+        if isinstance(result, StoreError):
+            raise result
+        if result is None:
+            raise StoreConflict(gid)
+        return version, result[-1]
+
+    def save(self, cid: str, gid: str, rec: list, expected: int) -> tuple:
+        return self._write(cid, gid, _dumps(rec), expected)
+
+    def delete(self, cid: str, gid: str, expected: int) -> tuple:
+        return self._write(cid, gid, None, expected)
+
+    def close(self):
+        self.client.close()
+
+
+def open_store(spec: str, data_dir: str) -> GameStore:
+    """
+    按配置创建存储：
+    memory（或留空）-> MemoryStore；sqlite -> 数据目录下的 games.db；
+    sqlite:///绝对路径 或 sqlite:相对路径 -> 指定的数据库文件（相对路径相对数据目录）；redis://... -> RedisStore。
+    配置无法识别时抛出 ValueError。
+    """
+    if not spec or spec == "memory":
+        return MemoryStore()
+    if spec == "sqlite":
+        return SQLiteStore(os.path.join(data_dir, "games.db"))
+    if spec.startswith("sqlite:"):
+        path = spec[len("sqlite:"):]
+        if path.startswith("//"):
+            path = path[2:]
+        return SQLiteStore(path if os.path.isabs(path) else os.path.join(data_dir, path))
+    if spec.startswith("redis://"):
+        return RedisStore(spec)
+    raise ValueError(f"未知的状态存储：{spec}（可选：memory、sqlite、sqlite:///路径、redis://主机:端口/库号）")
@@ -0,0 +1,122 @@
+# templates.py
+"""
+消息模板层。
+
+插件加载时把每条消息骨架编译为「字面量 / 字段」片段序列，
+渲染时只需按顺序拼接到复用的缓冲区，不再对大段 f-string 反复执行 textwrap.dedent。
+道具说明行（“道具名 (说明)”）按道具表预先渲染一次并缓存，按道具编号索引。
+
+默认语言包为内置的 zh_CN；可在插件目录的 locales/<名称>.json 中提供其它语言包，
+其中 "messages" 覆盖同名模板，"items" 覆盖道具说明，未提供的键沿用默认值。
+"""
+import json
+import os
+import string
+
+LOCALE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales")
+
+DEFAULT_MESSAGES = {
+    "create": (
+        "══恶魔轮盘══\n游戏创建成功！（{table} 号桌）\n玩家1：{name} ({id})\n玩家2：正在等待中……\n\n"
+        "请发送“/恶魔轮盘 加入游戏 {table}”加入本游戏，超时后将自动取消！"
+    ),
+    "join": (
+        "══恶魔轮盘══\n成功加入 {table} 号桌！\n玩家1：{p1_name} ({p1_id})\n玩家2：{p2_name} ({p2_id})\n\n"
+        "请由玩家1发送“/恶魔轮盘 开始游戏”以正式开始对战！"
+    ),
+    "start": (
+        "══恶魔轮盘══\n{table} 号桌游戏开始!\n玩家1：{p1_name} ({p1_id})\n玩家2：{p2_name} ({p2_id})\n"
+        "由 {first} 先手!\n先手获得 {first_items} 个道具，后手获得 {second_items} 个道具.\n"
+        "当前弹夹中共有 {total} 发子弹,\n其中实弹 {live} 发, 空包弹 {blank} 发.\n"
+        "请发送“/恶魔轮盘 对战信息”查看详细情况，祝你好运!"
+    ),
+    "info": (
+        "══恶魔轮盘══\n-- 血量状况 --\n玩家1 ({p1_name})：{p1_hp}/{max_hp}\n玩家2 ({p2_name})：{p2_hp}/{max_hp}\n\n"
+        "-- 玩家1的道具 ({p1_count}/{max_items}) --\n{p1_items}\n\n"
+        "-- 玩家2的道具 ({p2_count}/{max_items}) --\n{p2_items}\n\n"
+        "-- 弹夹 --\n剩余 {total} 发（实弹 {live} / 空包弹 {blank}），下一发为实弹的概率：{next_odds}\n\n"
+        "请发送道具名以使用对应道具,\n或发送“自己” / “对方” 来开枪!"
+    ),
+    "odds": (
+        "══恶魔轮盘══\n-- 弹夹概率 --\n剩余 {total} 发：实弹 {live} 发，空包弹 {blank} 发\n{positions}\n\n"
+        "接下来两发中至少一发实弹：{two_live}\n"
+        "（按已公开的信息计算：每轮公布的数量、已出膛的子弹，以及放大镜 / 逆转器 / 一次性电话的揭示）"
+    ),
+    "round": (
+        "══恶魔轮盘══\n弹夹打空，进入第 {round} 轮！\n新弹夹中共有 {total} 发子弹，\n"
+        "其中实弹 {live} 发, 空包弹 {blank} 发.\n双方各获得 {items} 个随机道具（上限 {max_items}）。"
+    ),
+    "game_over": (
+        "══恶魔轮盘══\n{loser} 倒下了！\n{winner} 获得了最终胜利！\n游戏正式结束，感谢参与，期待下次再战！"
+    ),
+}
+
+
+class Template:
+    """编译后的消息模板：字面量与字段名交替排列的片段序列"""
+
+    __slots__ = ("parts",)
+
+    def __init__(self, source: str):
+        parts = []
+        for literal, field, _, _ in string.Formatter().parse(source):
+            if literal:
+                parts.append((literal, None))
+            if field is not None:
+                parts.append((None, field))
+        self.parts = tuple(parts)
+
+    def render_into(self, buf: list, values: dict):
+        for literal, field in self.parts:
+            buf.append(literal if field is None else str(values[field]))
+
+
+class TemplatePack:
+    """一个语言包：已编译的消息模板 + 按道具表缓存的道具说明行"""
+
+    def __init__(self, messages: dict = None, item_descriptions: dict = None):
+        """
+        :param messages: 覆盖默认模板的消息骨架
+        :param item_descriptions: 道具名 -> 说明，覆盖道具表中的说明
+        """
+        merged = dict(DEFAULT_MESSAGES)
+        if messages:
+            merged.update(messages)
+        self.templates = {key: Template(src) for key, src in merged.items()}
+        self.item_descriptions = item_descriptions or {}
+        self._item_lines = {}   # 道具表指纹 -> 按道具编号排列的说明行
+        self._buf = []
+
+    @classmethod
+    def load(cls, locale: str) -> "TemplatePack":
+        """
+        加载语言包：zh_CN 或找不到对应文件时使用内置文本，
+        否则以 locales/<locale>.json 覆盖内置文本。
+        """
+        path = os.path.join(LOCALE_DIR, f"{locale}.json")
+        if locale == "zh_CN" or not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as fp:
+            data = json.load(fp)
+        return cls(data.get("messages"), data.get("items"))
+
+    def render(self, key: str, **values) -> str:
+        buf = self._buf
+        buf.clear()
+        self.templates[key].render_into(buf, values)
+        return "".join(buf)
+
+    def item_lines(self, table) -> tuple:
+        """某张道具表的说明行（“道具名 (说明)”），首次使用时渲染"""
+        lines = self._item_lines.get(table.fingerprint)
+        if lines is None:
+            override = self.item_descriptions
+            lines = self._item_lines[table.fingerprint] = tuple(
+                f"{name} ({override.get(name, desc)})" for name, desc in zip(table.names, table.descriptions)
+            )
+        return lines
+
+    def inventory(self, counts, table) -> str:
+        """按背包计数数组展开道具说明行，每个道具一行；table 为该局的道具表"""
+        lines = self.item_lines(table)
+        return "\n".join(lines[idx] for idx, n in enumerate(counts) for _ in range(n))